@@ -1,15 +1,22 @@
 
 __version__ = 0.1
 
-import base64,binascii,re,sys,traceback,ldap
-from time import time
+import base64,binascii,hashlib,hmac,itertools,os,re,sys,threading,traceback,ldap
+from time import gmtime,sleep,strftime,time
 from datetime import datetime
 import ConfigParser
+import contextlib
 import logging
+from ldap.controls import SimplePagedResultsControl
+from ldap.filter import escape_filter_chars
 
 import DirectoryToolsIndexes as index
 import DirectoryToolsSchemas as schema
 import DirectoryToolsExceptions as exceptions
+import DirectoryToolsPool as pool
+import DirectoryToolsCache as cache
+import DirectoryToolsSettings as settings
+import DirectoryToolsGraph as graph
 
 DEBUG_LEVEL_NONE = 0
 DEBUG_LEVEL_MINOR = 1
@@ -24,6 +31,64 @@ LOG_LEVEL_WARNING = 30
 LOG_LEVEL_ERROR = 40
 LOG_LEVEL_CRITICAL = 50
 
+## Nested group engine that walks nested groups one search at a time.
+NESTED_ENGINE_RECURSIVE = 'recursive'
+## Nested group engine that asks the server for transitive memberships using the in-chain matching rule (Active Directory).
+NESTED_ENGINE_IN_CHAIN = 'in-chain'
+## Nested group engine that expands nested groups one level at a time, reading every object on a level in one batch.
+NESTED_ENGINE_BREADTH_FIRST = 'breadth-first'
+
+## Server selection strategy that takes turns between servers.
+SERVER_STRATEGY_ROUND_ROBIN = pool.STRATEGY_ROUND_ROBIN
+## Server selection strategy that picks the server with the fewest operations in progress.
+SERVER_STRATEGY_LEAST_OUTSTANDING = pool.STRATEGY_LEAST_OUTSTANDING
+## Server selection strategy that favours the servers that have been answering fastest.
+SERVER_STRATEGY_LATENCY_WEIGHTED = pool.STRATEGY_LATENCY_WEIGHTED
+
+## OID of Active Directory's LDAP_MATCHING_RULE_IN_CHAIN matching rule.
+MATCHING_RULE_IN_CHAIN = '1.2.840.113556.1.4.1941'
+
+## Matches the name of an attribute that the server returned only part of, such as 'member;range=0-1499'. Active Directory does this for attributes with more values than its MaxValRange policy.
+RANGED_ATTRIBUTE_PATTERN = re.compile(r'^([^;]+);range=(\d+)-(\d+|\*)$',re.I)
+
+## Source files of standard library modules whose frames sit between DirectoryTools methods on the stack, such as the context managers around pooled connections. getCallerMethod() walks through them.
+PASSTHROUGH_FILES = (contextlib.contextmanager.__code__.co_filename,)
+
+def readConfigFile(configFilePath,section='DirectoryTools'):
+    '''
+    Read the properties in a configuration file.
+    
+    Args:
+        configFilePath: Path to an ini-style configuration file.
+        section: Name of the section to read. All other sections are ignored.
+        
+    Returns:
+        A dictionary of property values, indexed by property name. Values that look like booleans or integers are converted.
+    '''
+    
+    parser = ConfigParser.ConfigParser()
+    parser.read(configFilePath)
+    
+    properties = {}
+    if section in parser.sections():
+        for option in parser.options(section):
+            # Get our value and strip out quotes.
+            v = re.sub(r'^[\'\"]*|[\'\"]*$','',parser.get(section,option))
+            if v.lower() in ['yes','true',"1"]:
+                # Boolean true.
+                properties[option] = True
+            elif v.lower() in ['no','false',"0","nope"]:
+                # Boolean false.
+                # Added "nope" for humour.
+                properties[option] = False
+            elif re.match(r'^[1-90]*$',v):
+                # Is an integer.
+                properties[option] = int(v)
+            else:
+                # Standard. Is a string.
+                properties[option] = v
+    return properties
+
 class DirectoryTools:
     """
     Class containing methods for querying an LDAP server.
@@ -47,6 +112,42 @@ class DirectoryTools:
         index.PROXY_IS_ANONYMOUS:False,
         index.DEFAULT_CACHE_CATEGORY:'general',
         index.DEFAULT_CACHE_ID:'general',
+        index.POOL_MIN_SIZE:0,
+        index.POOL_MAX_SIZE:10,
+        index.POOL_TIMEOUT:30,
+        index.POOL_MAX_IDLE:60,
+        index.AUTH_POOL_MAX_SIZE:10,
+        index.PAGE_SIZE:500,
+        index.BATCH_SIZE:100,
+        index.NESTED_ENGINE:NESTED_ENGINE_RECURSIVE,
+        index.USE_TOKEN_GROUPS:False,
+        index.CACHE_MAX_ENTRIES:10000,
+        index.CACHE_TTL:600,
+        index.CACHE_CATEGORIES:{},
+        index.NEGATIVE_CACHE_MAX_ENTRIES:1000,
+        index.NEGATIVE_CACHE_TTL:60,
+        index.CACHE_PERSISTENT_PATH:None,
+        index.CACHE_PERSISTENT_CATEGORIES:['resolvedUsers','resolvedGroups','classCache','groupMembers'],
+        index.CACHE_GROUP_MEMBERS:False,
+        index.ASYNC_CONNECTIONS:2,
+        index.ASYNC_POLL_INTERVAL:0.005,
+        index.SYNC_ATTRIBUTE:'modifyTimestamp',
+        index.SYNC_INTERVAL:0,
+        index.SYNC_CLOCK_SKEW:60,
+        index.MEMBERSHIP_GRAPH:False,
+        index.MEMBERSHIP_GRAPH_TTL:600,
+        index.COALESCE_QUERIES:True,
+        index.SERVER_STRATEGY:SERVER_STRATEGY_ROUND_ROBIN,
+        index.SERVER_EJECT_AFTER:1,
+        index.SERVER_EJECT_TIME:30,
+        index.HEDGE_READS:False,
+        index.HEDGE_PERCENTILE:95,
+        index.HEDGE_MIN_DELAY:0.005,
+        index.HEDGE_BUDGET:0.05,
+        index.AUTH_CACHE:False,
+        index.AUTH_CACHE_TTL:60,
+        index.AUTH_CACHE_MAX_ENTRIES:1000,
+        index.AUTH_CACHE_ITERATIONS:10000,
     }
     
     ## No debugging.
@@ -61,11 +162,113 @@ class DirectoryTools:
     ## The name of the .INI file section that configuration entries are to be placed under.
     CONFIG_SECTION_HEADER='DirectoryTools'
     
-    ## Handle used to search the directory server.
-    proxyHandle = False
+    ## Exceptions raised while getting a connection. These are passed up as-is instead of being reported as a bad query.
+    CONNECTION_EXCEPTIONS = (
+        exceptions.ProxyAuthFailedException,
+        exceptions.ProxyFailedException,
+        exceptions.ConnectionFailedException,
+        exceptions.PoolTimeoutException,
+        exceptions.PoolClosedException,
+    )
+    
+    ## Errors that a server gives when it does not support the in-chain matching rule.
+    IN_CHAIN_REJECTIONS = (
+        ldap.INAPPROPRIATE_MATCHING,
+        ldap.UNWILLING_TO_PERFORM,
+        ldap.PROTOCOL_ERROR,
+        ldap.FILTER_ERROR,
+    )
+    
+    ## Properties that affect how connections are made. Changing one of these closes any pooled connections.
+    CONNECTION_PROPERTIES = [
+        index.SERVER_ADDRESS,
+        index.SERVER_PORT,
+        index.USE_SSL,
+        index.USE_TLS,
+        index.LDAP_PROPERTIES,
+        index.PROXY_IS_ANONYMOUS,
+        index.PROXY_USER,
+        index.PROXY_PASSWORD,
+        index.POOL_MIN_SIZE,
+        index.POOL_MAX_SIZE,
+        index.POOL_TIMEOUT,
+        index.POOL_MAX_IDLE,
+        index.AUTH_POOL_MAX_SIZE,
+        index.ASYNC_CONNECTIONS,
+        index.SERVER_STRATEGY,
+        index.SERVER_EJECT_AFTER,
+        index.SERVER_EJECT_TIME,
+        index.HEDGE_PERCENTILE,
+        index.HEDGE_MIN_DELAY,
+        index.HEDGE_BUDGET,
+    ]
+    
+    ## Properties that affect the cache. Changing one of these reconfigures the cache. The server and base DN decide which persistent cache entries are shared.
+    CACHE_PROPERTIES = [
+        index.CACHE_MAX_ENTRIES,
+        index.CACHE_TTL,
+        index.CACHE_CATEGORIES,
+        index.NEGATIVE_CACHE_MAX_ENTRIES,
+        index.NEGATIVE_CACHE_TTL,
+        index.AUTH_CACHE_TTL,
+        index.AUTH_CACHE_MAX_ENTRIES,
+        index.CACHE_PERSISTENT_PATH,
+        index.CACHE_PERSISTENT_CATEGORIES,
+        index.SERVER_ADDRESS,
+        index.SERVER_PORT,
+        index.BASE_DN,
+    ]
     
-    ## Cache for reducing the number of queries that need to be run, especially common ones like resolving a DN.
-    cache = {}
+    ## Negative cache categories, indexed by the resolution cache category that they belong to. Names that could not be resolved are remembered here instead of in the resolution cache, with their own limits.
+    NEGATIVE_CACHE_CATEGORIES = {
+        'resolvedUsers':'unresolvedUsers',
+        'resolvedGroups':'unresolvedGroups',
+    }
+    
+    ## Properties that decide which changes a cache sync has already seen. Changing one of these makes the next sync start over.
+    SYNC_PROPERTIES = [
+        index.SYNC_ATTRIBUTE,
+        index.SERVER_ADDRESS,
+        index.SERVER_PORT,
+        index.BASE_DN,
+        index.CACHE_PERSISTENT_PATH,
+    ]
+    
+    ## Properties that decide what the membership graph holds. Changing one of these drops the graph, so that it is loaded again on next use.
+    GRAPH_PROPERTIES = [
+        index.MEMBERSHIP_GRAPH,
+        index.SERVER_ADDRESS,
+        index.SERVER_PORT,
+        index.BASE_DN,
+        index.GROUP_RDN,
+        index.GROUP_CLASS,
+        index.GROUP_UID_ATTRIBUTE,
+        index.MEMBER_ATTRIBUTE,
+        index.MEMBER_ATTRIBUTE_IS_DN,
+        index.NESTED_GROUPS,
+        index.MAX_DEPTH,
+    ]
+    
+    ## Cache category of recent successful authentications (see the AUTH_CACHE property). Never written to the persistent cache.
+    AUTH_CACHE_CATEGORY = 'authenticatedUsers'
+    
+    ## Cache categories that syncCaches() removes changed entries from. Items are removed if their key or value is the DN or a name of a changed entry.
+    SYNC_CACHE_CATEGORIES = ['resolvedUsers','resolvedGroups','resolvedSids','classCache','unresolvedUsers','unresolvedGroups',AUTH_CACHE_CATEGORY]
+    
+    ## Persistent cache category that the sync high-water mark is saved in.
+    SYNC_STATE_CATEGORY = 'syncState'
+    
+    ## Cache categories that only hold per-call scratch data. These are freed when the call that created them returns, so they are never limited.
+    SCRATCH_CACHE_CATEGORIES = ['searchedGroups']
+    
+    ## Counter used to generate unique cache IDs.
+    cacheIdCounter = itertools.count()
+    
+    ## The value of the LOG_LEVEL property, cached for printDebug(). Debug output is off until the properties have been loaded.
+    logLevel = LOG_LEVEL_NONE
+    
+    ## Read-only snapshot of frequently read properties. Rebuilt by updateSettings() whenever one of them changes.
+    settings = None
     
 
     def __init__(self,properties=False,template='openldap',configFile=False,enableStdOut=False):
@@ -88,9 +291,51 @@ class DirectoryTools:
         else:
             self.logger.addHandler(NullHandler())
         
+        ## Single bound proxy handle for callers that run their own operations. Created on first use by getProxyHandle().
+        self.proxyHandle = False
+        ## Pool of bound proxy connections used for searches. Created on first use by getProxyPool().
+        self.proxyPool = None
+        ## Pool of connections used for authentication binds. Created on first use by getAuthPool().
+        self.authPool = None
+        ## Picks the server for each new connection and tracks server health. Created on first use by getServerSelector().
+        self.serverSelector = None
+        ## Method called with a connection URI to open a new connection. Defaults to ldap.initialize() if left at None. Tests can point it at a stand-in such as DirectoryToolsFakeServer.FakeDirectory.initialize().
+        self.connectionFactory = None
+        ## Decides when searches are hedged (see the HEDGE_READS property). Created on first use by getHedgingPolicy().
+        self.hedgingPolicy = None
+        ## Lock guarding the creation of connection pools.
+        self.poolLock = threading.RLock()
+        ## Set to True once the server has rejected the in-chain matching rule.
+        self.inChainRejected = False
+        
+        ## Lock that keeps cache syncs from running at the same time.
+        self.syncLock = threading.Lock()
+        ## Value of the SYNC_ATTRIBUTE property that the last cache sync reached, or None before the first sync.
+        self.syncMark = None
+        ## Lowercase DNs of the entries with a SYNC_ATTRIBUTE value equal to syncMark, which the last sync has already handled.
+        self.syncSeen = set()
+        ## The background sync thread and the event that stops it, if the thread is running.
+        self.syncThread = None
+        ## Sync generation of cached getGroupMembers() results. Incremented whenever they are flushed, so that expansions that were running at the time don't cache their results.
+        self.groupMembersGeneration = 0
+        ## Lock guarding groupMembersGeneration, so that a result can't be cached just after a flush that it should have missed.
+        self.groupMembersLock = threading.Lock()
+        
+        ## In-memory index of group memberships, used when the MEMBERSHIP_GRAPH property is set. Loaded on first use by getMembershipGraph().
+        self.membershipGraph = None
+        ## Lock that keeps more than one thread from loading the membership graph.
+        self.graphLock = threading.RLock()
+        
         ## Dictionary of property values.
         self.properties = self.defaultProperties.copy()
         
+        ## Cache for reducing the number of queries that need to be run, especially common ones like resolving a DN.
+        self.cache = cache.Cache()
+        ## Coalesces identical searches made by concurrent threads (see the COALESCE_QUERIES property).
+        self.queryFlight = cache.SingleFlight()
+        ## Receives measurements of LDAP operations and pool checkouts (see setMetricsHook()).
+        self.metricsHook = None
+        
         if template:
             try: 
                 self.properties.update(schema.getTemplate(template))
@@ -111,11 +356,20 @@ class DirectoryTools:
             except:
                 print "Error initializing DirectoryTools object, properties argument is expected to be a dictionary. Exiting..."
                 exit(1)
+        
+        self.updateSettings()
+        self.configureCache()
+        self.updateLogLevel()
+        
+        if self.getProperty(index.SYNC_INTERVAL):
+            self.startSync()
     
     def authenticate(self,userName,password,userNameIsDN=False):
         '''
         Attempts to do a simple bind to see if the user entered their password correctly.
         
+        If the AUTH_CACHE property is set, a successful bind is remembered for AUTH_CACHE_TTL seconds as a salted verifier of the password (see cacheAuthentication()), and a repeated check with the same password in that time is answered without contacting the server. A failed bind forgets the user's cached authentication. Cached authentications are also dropped when cache sync finds that the user's entry changed, for example because its password was changed or it was locked out (see syncCaches()).
+        
         Args:
             userName: User's login string. Can be either a login name or a distinguished name.
             password: User's password.
@@ -125,7 +379,7 @@ class DirectoryTools:
             True if the user successfully authenticates, false if there is an error.
         '''
         
-        self.printDebug("Attempting to authenticate user '{0}'.".format(userName), LOG_LEVEL_WARNING)
+        self.printDebug("Attempting to authenticate user '{0}'.",LOG_LEVEL_WARNING,userName)
         self.printDebug("INFO", LOG_LEVEL_INFO)
         self.printDebug("DEBUG", LOG_LEVEL_DEBUG)
 
@@ -139,26 +393,223 @@ class DirectoryTools:
             
             if not userDN:
                 # Don't bother authenticating if the user doesn't exist.
-                self.printDebug("User '{0}' cannot be found.".format(userName), LOG_LEVEL_WARNING)
+                self.printDebug("User '{0}' cannot be found.",LOG_LEVEL_WARNING,userName)
                 return False
         
-        handle = self.getHandle()
-        
-        try:
-            # Attempt to do a simple bind. If anything goes wrong, we'll be thrown to our 'except'.
-            result = handle.simple_bind_s(userDN,password)
-            self.printDebug("Successfully authenticated user '{0}'.".format(userName), LOG_LEVEL_WARNING)
+        # An empty password would be an anonymous bind, so it is never cached.
+        useAuthCache = self.getProperty(index.AUTH_CACHE) and password
+        if useAuthCache and self.isCachedAuthentication(userDN,password):
+            self.printDebug("Authenticated user '{0}' from the cache.",LOG_LEVEL_WARNING,userName)
             return True
-        except ldap.LDAPError, e:
+        
+        authPool = self.getAuthPool()
+        retried = False
+        
+        while True:
+            handle = authPool.checkout()
             
-            logLevel = self.getProperty(index.LOG_LEVEL)
+            try:
+                # Attempt to do a simple bind. If anything goes wrong, we'll be thrown to our 'except'.
+                # The handle is re-bound on every check, so it does not matter which user it was last bound as.
+                started = time()
+                try:
+                    result = handle.simple_bind_s(userDN,password)
+                finally:
+                    self.recordOperation('bind',started)
+                authPool.checkin(handle)
+                if useAuthCache:
+                    self.cacheAuthentication(userDN,password)
+                self.printDebug("Successfully authenticated user '{0}'.",LOG_LEVEL_WARNING,userName)
+                return True
+            except ldap.SERVER_DOWN, e:
+                # The pooled connection was dropped by the server. Discard it and try once more on a fresh connection, which may be to another server.
+                authPool.checkin(handle,failed=True)
+                if not retried:
+                    self.printDebug("Pooled authentication connection was lost. Retrying on a new connection.", LOG_LEVEL_WARNING)
+                    retried = True
+                    continue
+                error = e
+            except ldap.INVALID_CREDENTIALS, e:
+                # A failed bind leaves the connection usable for the next check.
+                authPool.checkin(handle)
+                error = e
+            except ldap.LDAPError, e:
+                # We can't be sure what state the connection was left in.
+                authPool.checkin(handle,discard=True)
+                error = e
             
-            if logLevel != LOG_LEVEL_NONE and logLevel >= LOG_LEVEL_CRITICAL:
+            if useAuthCache:
+                # The password may have been changed, or the account locked.
+                self.forgetAuthentication(userDN)
+            if self.logLevel != LOG_LEVEL_NONE and self.logLevel >= LOG_LEVEL_CRITICAL:
                 traceback.print_exc(file=sys.stdout)
-            self.printDebug("LDAP Error: {0}".format(e),LOG_LEVEL_CRITICAL)
+            self.printDebug("LDAP Error: {0}",LOG_LEVEL_CRITICAL,error)
             
             return False
             
+    def cacheAuthentication(self,userDN,password):
+        '''
+        Remember a successful authentication (see the AUTH_CACHE property).
+        
+        Only a salted PBKDF2 verifier of the password is kept, never the password itself.
+        
+        Args:
+            userDN: The distinguished name of the user.
+            password: The password that the user authenticated with.
+            
+        Returns:
+            None
+        '''
+        if not hasattr(hashlib,'pbkdf2_hmac'):
+            self.printDebug("This version of Python has no hashlib.pbkdf2_hmac. Authentications will not be cached.",LOG_LEVEL_ERROR)
+            return
+        salt = os.urandom(16)
+        iterations = self.getProperty(index.AUTH_CACHE_ITERATIONS)
+        cacheCategory,cacheId = self.initCache(self.AUTH_CACHE_CATEGORY)
+        self.cache[cacheCategory][cacheId][userDN.lower()] = (salt,iterations,self.getPasswordVerifier(password,salt,iterations))
+    
+    def cacheMiss(self,category,name):
+        '''
+        Remember that a name could not be resolved.
+        
+        Args:
+            category: The resolution cache category that the name was looked up for (for example, 'resolvedUsers').
+            name: The name or distinguished name that could not be resolved.
+            
+        Returns:
+            None
+        '''
+        if category not in self.NEGATIVE_CACHE_CATEGORIES:
+            return
+        cacheCategory,cacheId = self.initCache(self.NEGATIVE_CACHE_CATEGORIES[category])
+        self.cache[cacheCategory][cacheId][name] = True
+    
+    def closeConnections(self):
+        '''
+        Close all pooled connections, as well as the cached proxy handle. New connections will be opened as they are needed.
+        
+        Returns:
+            None
+        '''
+        with self.poolLock:
+            pools = [self.proxyPool,self.authPool]
+            self.proxyPool = None
+            self.authPool = None
+            # Server health and latencies are tracked for the old server list.
+            self.serverSelector = None
+            self.hedgingPolicy = None
+        for connectionPool in pools:
+            if connectionPool:
+                connectionPool.close()
+        
+        if self.proxyHandle:
+            try:
+                self.proxyHandle.unbind_s()
+            except Exception:
+                pass
+            self.proxyHandle = False
+
+    def completeRangedAttributes(self,dn,attributes,handle=None):
+        '''
+        Read the rest of any attributes that the server returned only part of (see iterRangedValues()).
+        
+        Args:
+            dn: Distinguished name of the object that the attributes were read from.
+            attributes: Attribute dictionary of the object. Changed in place.
+            handle: A connection that the caller already holds, to read the ranges on. If None, connections are taken from the proxy pool.
+            
+        Returns:
+            The attribute dictionary, with each partial attribute replaced by the complete attribute under its plain name.
+        '''
+        for key in [key for key in attributes if ';' in key]:
+            match = RANGED_ATTRIBUTE_PATTERN.match(key)
+            if not match:
+                continue
+            attribute = match.group(1)
+            values,low,high = self.getAttributeRange({key:attributes.pop(key)},attribute)
+            if high is not None:
+                self.printDebug("Reading the rest of attribute '{0}' of '{1}' in ranges.",LOG_LEVEL_DEBUG,attribute,dn)
+                values.extend(self.iterRangedValues(dn,attribute,high + 1,high - low + 1,handle))
+            attributes[attribute] = values
+        return attributes
+    
+    def configureCache(self):
+        '''
+        Apply the CACHE_MAX_ENTRIES, CACHE_TTL and CACHE_CATEGORIES properties to the cache.
+        
+        Negative cache categories (see NEGATIVE_CACHE_CATEGORIES) use the NEGATIVE_CACHE_MAX_ENTRIES and NEGATIVE_CACHE_TTL properties instead, unless they are listed in CACHE_CATEGORIES. Likewise, the authentication cache (see AUTH_CACHE_CATEGORY) uses AUTH_CACHE_MAX_ENTRIES and AUTH_CACHE_TTL.
+        
+        If the CACHE_PERSISTENT_PATH property is set, the categories listed in CACHE_PERSISTENT_CATEGORIES are also written to an SQLite database at that path (see DirectoryToolsCache.SqliteCacheStore). Processes that use the same file for the same server and base DN share these entries, so a new process starts with a warm cache.
+        
+        CACHE_CATEGORIES is a dictionary of per-category overrides, indexed by category name. Each value is a dictionary that may contain CACHE_MAX_ENTRIES and CACHE_TTL. For example, {'resolvedUsers':{index.CACHE_MAX_ENTRIES:50000}}.
+        
+        Returns:
+            None
+        '''
+        maxEntries = self.getProperty(index.CACHE_MAX_ENTRIES)
+        ttl = self.getProperty(index.CACHE_TTL)
+        
+        categorySettings = {}
+        for category,overrides in self.getProperty(index.CACHE_CATEGORIES).items():
+            categorySettings[category] = (overrides.get(index.CACHE_MAX_ENTRIES,maxEntries),overrides.get(index.CACHE_TTL,ttl))
+        for category in self.NEGATIVE_CACHE_CATEGORIES.values():
+            if category not in categorySettings:
+                categorySettings[category] = (self.getProperty(index.NEGATIVE_CACHE_MAX_ENTRIES),self.getProperty(index.NEGATIVE_CACHE_TTL))
+        if self.AUTH_CACHE_CATEGORY not in categorySettings:
+            categorySettings[self.AUTH_CACHE_CATEGORY] = (self.getProperty(index.AUTH_CACHE_MAX_ENTRIES),self.getProperty(index.AUTH_CACHE_TTL))
+        for category in self.SCRATCH_CACHE_CATEGORIES:
+            categorySettings[category] = (0,0)
+        
+        self.cache.configure(maxEntries,ttl,categorySettings)
+        
+        # Persistent store, shared with other processes that use the same file for the same directory.
+        path = self.getProperty(index.CACHE_PERSISTENT_PATH)
+        namespace = '{0}:{1}/{2}'.format(self.getProperty(index.SERVER_ADDRESS),self.getProperty(index.SERVER_PORT),self.getProperty(index.BASE_DN))
+        persistentCategories = frozenset(self.getProperty(index.CACHE_PERSISTENT_CATEGORIES)) - frozenset(self.SCRATCH_CACHE_CATEGORIES + [self.AUTH_CACHE_CATEGORY])
+        store = self.cache.store
+        if not path:
+            store = None
+        elif not store or store.path != path or store.namespace != namespace:
+            self.printDebug("Opening persistent cache '{0}' for '{1}'.",LOG_LEVEL_DEBUG,path,namespace)
+            store = cache.SqliteCacheStore(path,namespace)
+        if store is not self.cache.store or persistentCategories != self.cache.persistentCategories:
+            self.cache.setStore(store,persistentCategories)
+    
+    def createProxyHandle(self,server=None):
+        '''
+        Open a new connection and bind to it as the lookup proxy.
+        
+        Unlike getProxyHandle(), a new connection is made every time this method is called. Used by the proxy connection pool to create its connections.
+        
+        Args:
+            server: The DirectoryToolsPool.Server to connect to. If left at None, the server is picked by getServerSelector().
+        
+        Returns:
+            A new LDAP connection handle, bound as the proxy user unless the PROXY_IS_ANONYMOUS property is set to True.
+        '''
+        connection = self.getHandle(server)
+        
+        try:
+            if not self.getProperty(index.PROXY_IS_ANONYMOUS):
+                # Attempt to bind as the proxy user if we aren't searching anonymously.
+                started = time()
+                try:
+                    resultCode = connection.simple_bind_s(self.getProperty(index.PROXY_USER),self.getProperty(index.PROXY_PASSWORD))
+                finally:
+                    self.recordOperation('bind',started)
+        except ldap.LDAPError, e:
+            # This exception is thrown when the call to connection.simple_bind_s fails.
+            # print "Proxy connection failed."
+
+            if e.args[0]['desc'] == 'Invalid credentials':
+                # The error happened because the proxy connection was given the wrong credentials.
+                raise exceptions.ProxyAuthFailedException(originalException=e)
+            else:
+                raise exceptions.ProxyFailedException(originalException=e)
+        
+        self.printDebug("Successfully created proxy handle.",LOG_LEVEL_DEBUG)
+        return connection
+            
     def enableStdOut(self):
         '''
         DirectoryTools uses Python's logging module for debug output. By default, printing to stdout is not enabled.
@@ -180,22 +631,240 @@ class DirectoryTools:
         Returns:
             None
         '''
-        try:
-            if type(category) is str and type(cacheId) is str:
-                # A specific cache ID was requested in a category.
-                del self.cache[category][cacheId]
-            elif type(category) is str:
-                # A category was specified, but not a cache Id.
-                # Flush all items in this category.
-                if category in self.cache:
-                    del self.cache[category]
+        if type(category) is str and type(cacheId) is str:
+            # A specific cache ID was requested in a category.
+            self.cache.flush(category,cacheId)
+        elif type(category) is str:
+            # A category was specified, but not a cache Id.
+            # Flush all items in this category.
+            if category == 'groupMembers':
+                with self.groupMembersLock:
+                    self.groupMembersGeneration += 1
+                    self.cache.flush(category)
             else:
-                # No category was specified, flushing all caches by re-declaring the cache.
-                
-                ## Cache for reducing the number of queries that need to be run, especially common ones like resolving a DN.
-                self.cache = {}
-        except:
-            pass
+                self.cache.flush(category)
+        else:
+            # No category was specified, flushing all caches.
+            # Per-call caches are left to the calls that are using them.
+            with self.groupMembersLock:
+                self.groupMembersGeneration += 1
+                self.cache.flush(keep=self.SCRATCH_CACHE_CATEGORIES)
+    
+    def followRanges(self,dn,attribute,ranges,responses,step):
+        '''
+        Work through the answers to a window of ranged reads (see iterRangedValues()).
+        
+        Args:
+            dn: The distinguished name of the object.
+            attribute: The attribute name, without any range option.
+            ranges: List of the (low,high) ranges that were asked for, in order.
+            responses: The search results for each range, or the LDAPError that the read raised.
+            step: Number of values in each range.
+            
+        Returns:
+            A tuple of the lists of values that were read, in order; the index to read from next, or None if every value has been read; and the number of values to ask for in each range from then on.
+            
+        Raises:
+            BadQueryException: A range that was needed could not be read.
+        '''
+        valueLists = []
+        for (low,high),response in zip(ranges,responses):
+            if isinstance(response,Exception):
+                self.printDebug("BAD QUERY: Ranged read of attribute '{0}' of '{1}'.",LOG_LEVEL_CRITICAL,attribute,dn)
+                raise exceptions.BadQueryException(originalException=response)
+            
+            attributeRange = None
+            for resultDN,resultAttributes in response:
+                if resultDN:
+                    attributeRange = self.getAttributeRange(resultAttributes,attribute)
+            if not attributeRange:
+                # Nothing left at this index.
+                return valueLists,None,step
+            
+            values,gotLow,gotHigh = attributeRange
+            valueLists.append(values)
+            if gotHigh is None:
+                # The last range.
+                return valueLists,None,step
+            if gotLow != low or gotHigh != high:
+                # The server returned a different range than was asked for, so the rest of the window does not line up. Carry on from where this range ended.
+                return valueLists,gotHigh + 1,gotHigh - gotLow + 1
+        return valueLists,ranges[-1][1] + 1,step
+    
+    def forgetAuthentication(self,userDN):
+        '''
+        Forget a cached authentication, so that the next check for the user goes to the server.
+        
+        Args:
+            userDN: The distinguished name of the user.
+            
+        Returns:
+            None
+        '''
+        cacheCategory,cacheId = self.initCache(self.AUTH_CACHE_CATEGORY)
+        self.cache[cacheCategory][cacheId].pop(userDN.lower(),None)
+    
+    def formatGroupMembers(self,memberList,returnMembersAsDN=False,objectClassFilter=None,uidAttribute='uid'):
+        '''
+        Format a list of group members gathered by getGroupMembers(), resolving members between DNs and UIDs as needed.
+        
+        Args:
+            memberList: List of members, in the format that the server stores group members in.
+            returnMembersAsDN: If set to True, the list is returned as distinguished names. If set to False, it is returned as login names.
+            objectClassFilter: The class that members were filtered by.
+            uidAttribute: Attribute containing the member's login Id.
+        
+        Returns:
+            A deduplicated list of members.
+        '''
+        # We want to return a deduped listing of members.
+        # Resolved user names can be shared with the resolveUser* caches, as long as we are resolving users by their usual UID attribute.
+        resolveCacheCategory = None
+        if objectClassFilter == self.settings.userClass and uidAttribute == self.settings.userUidAttribute:
+            resolveCacheCategory = 'resolvedUsers'
+        
+        if returnMembersAsDN and not self.settings.memberAttributeIsDN:
+            # The user has requested the return list in DN format, but the list that they have is not in DN format.
+            # Resolve all of the names in batches rather than with one search per member.
+            memberDNs = self.resolveObjectDNs(objectClass=objectClassFilter,indexAttribute=uidAttribute,objectNames=set(memberList),cacheCategory=resolveCacheCategory)
+            return list(set([objectDN for objectDN in memberDNs.values() if objectDN]))
+        elif not returnMembersAsDN and self.settings.memberAttributeIsDN:
+            # The user has requested that the return list not be in DN format, but the list is in DN format.
+            # We will need to resolve the user's DN to a login ID. Resolve all of the DNs in batches rather than with one search per member.
+            memberUIDs = self.resolveObjectUIDs(objectDNs=set(memberList),objectIdentifier=uidAttribute,cacheCategory=resolveCacheCategory)
+            return list(set([uid for uid in memberUIDs.values() if uid]))
+        else:
+            # The list we are currently working on is already in the desired format.
+            return list(set(memberList))
+
+    def getAttributeRange(self,attributes,attribute):
+        '''
+        Find an attribute that the server returned only part of, such as 'member;range=0-1499'.
+        
+        Args:
+            attributes: Attribute dictionary of an object.
+            attribute: The attribute name, without any range option.
+            
+        Returns:
+            A tuple of the values, the index of the first value, and the index of the last value (or None if these are the last values), or None if the attribute was not returned in a range.
+        '''
+        for key,values in attributes.items():
+            match = RANGED_ATTRIBUTE_PATTERN.match(key)
+            if match and match.group(1).lower() == attribute.lower():
+                high = match.group(3)
+                return values,int(match.group(2)),(None if high == '*' else int(high))
+        return None
+    
+    def getAuthPool(self):
+        '''
+        Get the pool of connections used by authenticate(), creating it if it does not exist yet.
+        
+        Authentication connections are kept separate from the proxy pool because every credential check re-binds them as a different user. The number of bind connections held open against the directory is capped by the AUTH_POOL_MAX_SIZE property.
+        
+        Returns:
+            A DirectoryToolsPool.ServerPool of unbound connection handles, spread over the servers in the SERVER_ADDRESS property.
+        '''
+        with self.poolLock:
+            if not self.authPool:
+                self.printDebug("Creating authentication connection pool.",LOG_LEVEL_DEBUG)
+                self.authPool = pool.ServerPool(
+                    selector=self.getServerSelector(),
+                    factory=self.getHandle,
+                    maxSize=self.getProperty(index.AUTH_POOL_MAX_SIZE),
+                    timeout=self.getProperty(index.POOL_TIMEOUT),
+                    maxIdle=self.getProperty(index.POOL_MAX_IDLE),
+                    observer=lambda elapsed: self.recordPoolWait('auth',elapsed)
+                )
+            return self.authPool
+
+    def getCacheStatistics(self):
+        '''
+        Get the lookup counters of every cache category.
+        
+        Returns:
+            A dictionary of (hits,misses,evictions,entries) tuples, indexed by category name. Hits, misses and evictions count up from the creation of this object, even across flushCaches(). Entries is the number of items currently held in memory.
+        '''
+        return self.cache.getStatistics()
+    
+    def getCallerMethod(self):
+        '''
+        Get the name of the public method that the current call came in through, which is taken to be the outermost DirectoryTools method on the stack. Used to attribute LDAP operations in metrics.
+        
+        The stack is only walked up to the first frame that is outside of the DirectoryTools modules, since that is where the call came in, so the cost of an operation does not grow with the depth of the stack of the caller. Frames of the other modules in this directory, such as the connection pools, and of PASSTHROUGH_FILES are passed through.
+        
+        Returns:
+            The name of the method, or None if no DirectoryTools method is on the stack.
+        '''
+        filename = sys._getframe().f_code.co_filename
+        directory = os.path.dirname(filename)
+        method = None
+        frame = sys._getframe(1)
+        while frame:
+            code = frame.f_code
+            if code.co_filename == filename:
+                method = code.co_name
+            elif os.path.dirname(code.co_filename) != directory and code.co_filename not in PASSTHROUGH_FILES:
+                break
+            frame = frame.f_back
+        return method
+    
+    def getGraphGroupEntry(self,attributes):
+        '''
+        Pick the values that the membership graph needs out of the attributes of a group entry.
+        
+        Args:
+            attributes: Dictionary of the group's attributes, as returned by a search.
+            
+        Returns:
+            A tuple. The first value is the UID of the group (or None), and the second value is the list of its members.
+        '''
+        uid = None
+        members = []
+        for key in attributes:
+            if key.lower() == self.settings.groupUidAttribute.lower() and attributes[key]:
+                uid = attributes[key][0]
+            elif key.lower() == self.settings.memberAttribute.lower():
+                members = attributes[key]
+        return uid,members
+    
+    def getGraphGroupId(self,membershipGraph,groupName,groupNameIsDN=False):
+        '''
+        Find a group in the membership graph.
+        
+        Args:
+            membershipGraph: The DirectoryToolsGraph.MembershipGraph to look in.
+            groupName: The UID or distinguished name of the group.
+            groupNameIsDN: True if groupName is a distinguished name.
+            
+        Returns:
+            The node ID of the group, or None if the graph does not have the group.
+        '''
+        if not groupNameIsDN:
+            return membershipGraph.getGroupId(groupName)
+        nodeId = membershipGraph.getId(groupName)
+        if nodeId is None or not membershipGraph.isGroup(nodeId):
+            return None
+        return nodeId
+    
+    def getGraphMemberId(self,membershipGraph,userName,userNameIsDN=False):
+        '''
+        Find a user in the membership graph. The graph stores members in the format of the member attribute, so the user may need to be resolved first.
+        
+        Args:
+            membershipGraph: The DirectoryToolsGraph.MembershipGraph to look in.
+            userName: The UID or distinguished name of the user.
+            userNameIsDN: True if userName is a distinguished name.
+            
+        Returns:
+            The node ID of the user, or None if the user is not a member of any group.
+        '''
+        if userNameIsDN and not self.settings.memberAttributeIsDN:
+            userName = self.resolveUserUID(userName)
+        elif not userNameIsDN and self.settings.memberAttributeIsDN:
+            userName = self.resolveUserDN(userName)
+        if not userName:
+            return None
+        return membershipGraph.getId(userName)
     
     def getGroupBaseDN(self):
         '''
@@ -204,10 +873,10 @@ class DirectoryTools:
         Returns:
             A string composed of a combination of the relative group base DN provided by the GROUP_RDN property and the base DN provided by the BASE_DN property.
         '''
-        if len(self.getProperty(index.GROUP_RDN)):
-            return "{0},{1}".format(self.getProperty(index.GROUP_RDN),self.getProperty(index.BASE_DN))
+        if len(self.settings.groupRDN):
+            return "{0},{1}".format(self.settings.groupRDN,self.settings.baseDN)
         else:
-            return self.getProperty(index.BASE_DN)
+            return self.settings.baseDN
           
 
     def getGroupMembers(self,groupName,groupNameIsDN=False,returnMembersAsDN=False,objectClassFilter=None,uidAttribute='uid',depth=0,cacheId=False):
@@ -223,72 +892,109 @@ class DirectoryTools:
             depth: A count of how many times the function has been called. To be used in recursive calls.
             cacheId: ID of the cache that stores a list of searched groups.
         
+        If the CACHE_GROUP_MEMBERS property is set, the results of top-level calls are kept in the 'groupMembers' cache.
+        
         Returns:
             A list of all user accounts. Whether they are distinguished names or not depends on format of the LDAP server's group member property.
         '''
         
         cacheCategory = 'searchedGroups'
         if not cacheId:
-            cacheTuple = self.initCache(cacheCategory,cacheId,generateCacheId=True)
-        else:
-            cacheTuple = self.initCache(cacheCategory,cacheId)
+            # Top-level call.
+            cacheMembers = self.getProperty(index.CACHE_GROUP_MEMBERS)
+            if cacheMembers:
+                # Whole expansions are cached, keyed by all of the arguments that shape the result.
+                membersGeneration = self.groupMembersGeneration
+                membersCacheCategory,membersCacheId = self.initCache('groupMembers')
+                membersKey = repr((groupName,bool(groupNameIsDN),bool(returnMembersAsDN),objectClassFilter,uidAttribute))
+                found,cachedMembers = self.cache[membersCacheCategory][membersCacheId].lookup(membersKey)
+                if found:
+                    self.printDebug("Using cached members of group '{0}'.",LOG_LEVEL_DEBUG,groupName)
+                    return list(cachedMembers)
             
-        cacheCategory,cacheId = cacheTuple
+            # The list of searched groups is only needed until this call returns.
+            cacheCategory,cacheId = self.initCache(cacheCategory,cacheId,generateCacheId=True)
+            try:
+                memberList = self.getGroupMembers(groupName,groupNameIsDN=groupNameIsDN,returnMembersAsDN=returnMembersAsDN,objectClassFilter=objectClassFilter,uidAttribute=uidAttribute,depth=depth,cacheId=cacheId)
+            finally:
+                self.flushCaches(cacheCategory,cacheId)
+            
+            if cacheMembers:
+                with self.groupMembersLock:
+                    # A flush during the expansion may have been meant for a change that it read around.
+                    if self.groupMembersGeneration == membersGeneration:
+                        self.cache[membersCacheCategory][membersCacheId][membersKey] = list(memberList)
+            return memberList
+        
+        cacheCategory,cacheId = self.initCache(cacheCategory,cacheId)
         
         if not groupNameIsDN:
             # We want to confirm that the group exists and get its Distinguished Name.
-            groupDN = self.resolveGroupDN(groupName,self.getProperty(index.GROUP_UID_ATTRIBUTE))
+            groupDN = self.resolveGroupDN(groupName,self.settings.groupUidAttribute)
             if not groupDN:
-                self.printDebug("Could not locate group: {0}".format(groupName),LOG_LEVEL_ERROR)
+                self.printDebug("Could not locate group: {0}",LOG_LEVEL_ERROR,groupName)
                 return []
         else:
             # Group name is already a DN.
             groupDN = groupName
 
         # Making sure that we have not already searched this group.
-        if groupName not in self.cache[cacheCategory][cacheId]:
-                self.cache[cacheCategory][cacheId][groupName] = 1
-                self.printDebug("Getting members of group '{0}'.".format(groupName),LOG_LEVEL_INFO)
+        searchedGroups = self.cache[cacheCategory][cacheId]
+        if groupName not in searchedGroups:
+                searchedGroups[groupName] = 1
+                self.printDebug("Getting members of group '{0}'.",LOG_LEVEL_INFO,groupName)
         else:
-            self.printDebug("Skipping already searched group: {0}".format(groupName), LOG_LEVEL_DEBUG)
+            self.printDebug("Skipping already searched group: {0}",LOG_LEVEL_DEBUG,groupName)
             return []
         
+        if depth == 0 and self.useInChain():
+            # Let the server expand nested groups for us.
+            memberList = self.getGroupMembersInChain(groupDN=groupDN,returnMembersAsDN=returnMembersAsDN,objectClassFilter=objectClassFilter,uidAttribute=uidAttribute)
+            if memberList is not None:
+                return memberList
+        
+        if depth == 0 and self.useBreadthFirst():
+            # Expand the whole group tree level by level.
+            memberList = self.getGroupMembersBreadthFirst(groupDN=groupDN,objectClassFilter=objectClassFilter)
+            return self.formatGroupMembers(memberList=memberList,returnMembersAsDN=returnMembersAsDN,objectClassFilter=objectClassFilter,uidAttribute=uidAttribute)
+        
         memberList = []
         
-        if depth > self.getProperty(index.MAX_DEPTH) and not self.getProperty(index.MAX_DEPTH) < 0:
+        if depth > self.settings.maxDepth and not self.settings.maxDepth < 0:
             raise exceptions.ExceededMaxDepthException(depth=depth,resultItem=memberList)
-            #self.printDebug("Exceeded max depth of {1}.".format(self.getProperty(index.MAX_DEPTH)), DEBUG_LEVEL_MINOR)
+            #self.printDebug("Exceeded max depth of {1}.".format(self.settings.maxDepth), DEBUG_LEVEL_MINOR)
             #return memberList
 
         # Compile query for finding group.
-        #query = '(&(objectClass=%s)(%s=%s))' % tuple([self.getProperty(index.GROUP_CLASS),groupIdentifier,groupName])
+        #query = '(&(objectClass=%s)(%s=%s))' % tuple([self.settings.groupClass,groupIdentifier,groupName])
         #self.printDebug("Searching for member users in group '%s'. Query: %s: " % tuple([groupName,query]),DEBUG_LEVEL_MAJOR)
         query = '(%s=%s)'
-        self.printDebug("Searching for members in group '{0}'.".format(groupName),LOG_LEVEL_INFO)
+        self.printDebug("Searching for members in group '{0}'.",LOG_LEVEL_INFO,groupName)
 
-        members = self.getMultiAttribute(groupDN,self.getProperty(index.MEMBER_ATTRIBUTE))
+        # Members are streamed, so large groups are not read into a list first.
+        members = self.iterObjectAttribute(groupDN,self.settings.memberAttribute)
         for member in members:
                 
-            if self.getProperty(index.MEMBER_ATTRIBUTE_IS_DN):
+            if self.settings.memberAttributeIsDN:
                 # Distinguished names may be nested groups.
                 # We need to double check whether or not this DN is indeed a group.
                 
                 
                 if not objectClassFilter:
-                    self.printDebug("Adding object '{0}' to list (No Filter).".format(member), LOG_LEVEL_DEBUG)
+                    self.printDebug("Adding object '{0}' to list (No Filter).",LOG_LEVEL_DEBUG,member)
                     memberList.append(member)
                 elif objectClassFilter and self.isObjectOfClass(member,objectClassFilter):
                     # Either we are not filtering by group, or the object at this DN is of the class we want to filter by.
-                    self.printDebug("Adding object '{0}' to list (Passed Filter).".format(member), LOG_LEVEL_DEBUG)
+                    self.printDebug("Adding object '{0}' to list (Passed Filter).",LOG_LEVEL_DEBUG,member)
                     memberList.append(member)
                 
-                if self.getProperty(index.NESTED_GROUPS) and (not (depth >= self.getProperty(index.MAX_DEPTH)) and (not self.getProperty(index.MAX_DEPTH) < 0)) and self.isObjectGroup(member):
+                if self.settings.nestedGroups and (not (depth >= self.settings.maxDepth) and (not self.settings.maxDepth < 0)) and self.isObjectGroup(member):
                     # If this section is being executed we have confirmed three things: 
                     # * We want to search in nested groups.
                     # * We have not yet exceeded the maximum search depth.
                     # * The object is actually a group (kind of important!).
                     
-                    self.printDebug("Searching within nested group '{0}'".format(member), LOG_LEVEL_INFO)
+                    self.printDebug("Searching within nested group '{0}'",LOG_LEVEL_INFO,member)
                     
                     try:
                         memberList.extend(
@@ -308,57 +1014,232 @@ class DirectoryTools:
         
         # Begin top-level processing. The following code should only be processed if we're in the top call of this method.
             
-        self.printDebug("Finished gathering members of group '{0}'. Formatting results.".format(groupName),LOG_LEVEL_DEBUG)
+        self.printDebug("Finished gathering members of group '{0}'. Formatting results.",LOG_LEVEL_DEBUG,groupName)
         
-        # We want to return a deduped listing of members.
-        if returnMembersAsDN and not self.getProperty(index.MEMBER_ATTRIBUTE_IS_DN):
-            # The user has requested the return list in DN format, but the list that they have is not in DN format.
-            memberDNList = []
-            for i in memberList:
-                objectDN = self.resolveObjectDN(objectName=i,objectClass=objectClassFilter,indexAttribute=uidAttribute)
-                if objectDN:
-                    memberDNList.append(objectDN)
+        return self.formatGroupMembers(memberList=memberList,returnMembersAsDN=returnMembersAsDN,objectClassFilter=objectClassFilter,uidAttribute=uidAttribute)
+
+    def getGroupMembersBreadthFirst(self,groupDN,objectClassFilter=None):
+        '''
+        List all members of a group, expanding nested groups one level at a time.
+        
+        Every object that is discovered on a level is read in one pipelined batch (see getMultipleObjectAttributes()), so the number of round-trips grows with the nesting depth of the group rather than with its number of members. Nested groups are expanded if the NESTED_GROUPS property is set, down to the depth given by the MAX_DEPTH property. Objects are only read once, so cycles between groups are not followed. Objects whose classes are already in the class cache are not read at all, unless they are groups that need to be expanded.
+        
+        Args:
+            groupDN: The distinguished name of the group.
+            objectClassFilter: String specifing the class to filter by. If set to None, members of all classes are returned.
+        
+        Returns:
+            A list of member distinguished names. The list is not deduplicated or formatted; see formatGroupMembers().
+        '''
+        memberAttribute = self.settings.memberAttribute
+        groupClass = self.settings.groupClass
+        nested = self.settings.nestedGroups
+        maxDepth = self.settings.maxDepth
+        
+        groupCacheCategory,groupCacheId = self.initCache('classCache',groupClass)
+        if objectClassFilter:
+            filterCacheCategory,filterCacheId = self.initCache('classCache',objectClassFilter)
+        
+        memberList = []
+        seen = set([groupDN.lower()])
+        
+        # The level being read, as a list of distinguished names, and the depth of the groups that they were found in.
+        level = [groupDN]
+        depth = -1
+        
+        while level:
+            # Objects on this level are expanded if they are the top group, or a nested group that is within our maximum depth.
+            expand = depth < 0 or (nested and maxDepth >= 0 and depth < maxDepth)
+            
+            attributes = []
+            if expand:
+                attributes = ['objectClass',memberAttribute]
+            elif objectClassFilter:
+                attributes = ['objectClass']
+            else:
+                # Nothing more to learn about these objects.
+                break
+            
+            # Check the class cache first, the same way that isObjectOfClass() does.
+            known = {}
+            unknown = []
+            for dn in level:
+                if depth >= 0:
+                    foundGroup,isGroup = self.cache[groupCacheCategory][groupCacheId].lookup(dn)
+                    isMatch = True
+                    foundMatch = True
+                    if objectClassFilter:
+                        foundMatch,isMatch = self.cache[filterCacheCategory][filterCacheId].lookup(dn)
+                    if foundMatch and (not expand or (foundGroup and not isGroup)):
+                        known[dn] = (isGroup,isMatch)
+                        continue
+                unknown.append(dn)
+            
+            self.printDebug("Reading {0} objects at depth {1}. {2} more found in the class cache.",LOG_LEVEL_INFO,len(unknown),depth + 1,len(known))
+            results = self.getMultipleObjectAttributes(unknown,attributes)
+            
+            nextLevel = []
+            for dn in level:
+                if dn in known:
+                    objectAttributes = {}
+                    isGroup,isMatch = known[dn]
+                else:
+                    objectAttributes = results.get(dn,{})
+                    classes = objectAttributes.get('objectClass',[])
+                    isGroup = groupClass in classes
+                    isMatch = not objectClassFilter or objectClassFilter in classes
+                    
+                    if depth >= 0:
+                        # Record what we learned for isObjectOfClass().
+                        self.cache[groupCacheCategory][groupCacheId][dn] = isGroup
+                        if objectClassFilter:
+                            self.cache[filterCacheCategory][filterCacheId][dn] = isMatch
                 
-            return list(set(memberDNList))
-        elif not returnMembersAsDN and self.getProperty(index.MEMBER_ATTRIBUTE_IS_DN):
-            # The user has requested that the return list not be in DN format, but the list is in DN format.
-            # We will need to resolve the user's DN to a login ID.
-            memberUIDList = []
-            for i in memberList:
-                result = self.getSingleAttribute(dn=i,attribute=uidAttribute)
-                if result:
-                    memberUIDList.append(result)
-            return list(set(memberUIDList))
-        else:
-            # The list we are currently working on is already in the desired format.
-            return list(set(memberList))
+                if depth >= 0 and isMatch:
+                    self.printDebug("Adding object '{0}' to list.",LOG_LEVEL_DEBUG,dn)
+                    memberList.append(dn)
+                
+                if expand and (depth < 0 or isGroup):
+                    for member in objectAttributes.get(memberAttribute,[]):
+                        if member.lower() not in seen:
+                            seen.add(member.lower())
+                            nextLevel.append(member)
+                        else:
+                            self.printDebug("Skipping already seen object '{0}'.",LOG_LEVEL_DEBUG,member)
+            
+            level = nextLevel
+            depth += 1
+        
+        if level and not objectClassFilter:
+            # Members of the last level that we expanded are included without being read.
+            memberList.extend(level)
+        
+        return memberList
 
+    def getGroupMembersInChain(self,groupDN,returnMembersAsDN=False,objectClassFilter=None,uidAttribute='uid'):
+        '''
+        List all direct and nested members of a group with a single search, using the in-chain matching rule.
+        
+        The MAX_DEPTH property is not applied, since the server does the expansion. Only servers that support the rule (Active Directory) can answer this search.
+        
+        Args:
+            groupDN: The distinguished name of the group.
+            returnMembersAsDN: If set to True, members are returned as distinguished names. If set to False, members are returned as the values of their uidAttribute.
+            objectClassFilter: String specifing the class to filter by. If set to None, members of all classes are returned, including nested groups.
+            uidAttribute: Attribute containing the member's login Id.
+        
+        Returns:
+            A deduplicated list of members, or None if the server rejected the matching rule.
+        '''
+        query = '(memberOf:{0}:={1})'.format(MATCHING_RULE_IN_CHAIN,escape_filter_chars(groupDN))
+        if objectClassFilter:
+            query = '(&(objectClass={0}){1})'.format(objectClassFilter,query)
+        self.printDebug("Getting nested members of group '{0}' with the in-chain matching rule.",LOG_LEVEL_INFO,groupDN)
+        
+        if returnMembersAsDN:
+            results = self.queryInChain(query,['1.1'])
+        else:
+            results = self.queryInChain(query,[uidAttribute])
+        if results is None:
+            return None
+        
+        if returnMembersAsDN:
+            return list(set([dn for dn,attributes in results]))
+        
+        cacheCategory = None
+        if objectClassFilter == self.settings.userClass and uidAttribute == self.settings.userUidAttribute:
+            # Resolved user names can be shared with the resolveUser* caches.
+            cacheCategory,cacheId = self.initCache('resolvedUsers')
+        
+        memberUIDList = []
+        for dn,attributes in results:
+            try:
+                uid = attributes[uidAttribute][0]
+            except (KeyError,IndexError):
+                continue
+            memberUIDList.append(uid)
+            if cacheCategory:
+                self.cache[cacheCategory][cacheId][dn] = uid
+                self.cache[cacheCategory][cacheId][uid] = dn
+        return list(set(memberUIDList))
+    
+    def getHedgingPolicy(self):
+        '''
+        Get the policy that decides when searches are hedged, creating it if it does not exist yet.
+        
+        If the HEDGE_READS property is set and there is more than one server, a search that has not been answered within the HEDGE_PERCENTILE percentile of recent search times (but at least HEDGE_MIN_DELAY seconds) is sent to a second server as well. At most a HEDGE_BUDGET fraction of searches are hedged.
+        
+        Returns:
+            A DirectoryToolsPool.HedgingPolicy, or None if searches are not hedged.
+        '''
+        if not self.settings.hedgeReads or len(self.getServerSelector().servers) < 2:
+            return None
+        with self.poolLock:
+            if not self.hedgingPolicy:
+                self.hedgingPolicy = pool.HedgingPolicy(
+                    percentile=self.getProperty(index.HEDGE_PERCENTILE),
+                    minDelay=self.getProperty(index.HEDGE_MIN_DELAY),
+                    budget=self.getProperty(index.HEDGE_BUDGET)
+                )
+            return self.hedgingPolicy
     
-    def getHandle(self):
+    def getHandle(self,server=None):
         '''
         Attempts to establish a basic connection to the LDAP server.
         
+        Connections are not made until the first operation, so an unreachable server is only noticed then. Setting ldap.OPT_NETWORK_TIMEOUT in the LDAP_PROPERTIES property keeps that from taking as long as the system's TCP timeout.
+        
+        Args:
+            server: The DirectoryToolsPool.Server to connect to. If left at None, the server is picked by getServerSelector().
+        
         Returns:
             An initialized LDAP connection. Binding to the server is done in separate methods.
         '''
         try:
+            if not server:
+                server = self.getServerSelector().choose()
+            
             protocol = ('ldap','ldaps')[self.getProperty(index.USE_SSL)]
             
-            uri = '{0}://{1}:{2}'.format(protocol,self.getProperty(index.SERVER_ADDRESS),self.getProperty(index.SERVER_PORT))
-            self.printDebug("Connection URI: {0}".format(uri),LOG_LEVEL_DEBUG)
+            uri = '{0}://{1}:{2}'.format(protocol,server.address,server.port)
+            self.printDebug("Connection URI: {0}",LOG_LEVEL_DEBUG,uri)
             
             connectionProperties = self.getProperty(index.LDAP_PROPERTIES)
             
-            connection = ldap.initialize(uri)
+            connection = (self.connectionFactory or ldap.initialize)(uri)
             
             for i in connectionProperties:
-                self.printDebug('Applying connection property \'{0}\' to connection. Value: \'{1}\''.format(i,connectionProperties[i]),LOG_LEVEL_DEBUG)
+                self.printDebug('Applying connection property \'{0}\' to connection. Value: \'{1}\'',LOG_LEVEL_DEBUG,i,connectionProperties[i])
                 connection.set_option(i,connectionProperties[i])
             
             return connection
         except Exception, e:
             raise exceptions.ConnectionFailedException(originalException=e)
 
+    def getMembershipGraph(self):
+        '''
+        Get the membership graph that isUserInGroup(), getUserGroups() and getUsersInGroup() answer from when the MEMBERSHIP_GRAPH property is set.
+        
+        The graph is loaded by loadMembershipGraph() on first use, and loaded again once it is older than MEMBERSHIP_GRAPH_TTL seconds (0 to keep it until it is dropped). syncCaches() keeps a loaded graph up to date with changed groups.
+        
+        Returns:
+            A DirectoryToolsGraph.MembershipGraph, or None if the MEMBERSHIP_GRAPH property is not set.
+        '''
+        if not self.getProperty(index.MEMBERSHIP_GRAPH):
+            return None
+        
+        ttl = self.getProperty(index.MEMBERSHIP_GRAPH_TTL)
+        membershipGraph = self.membershipGraph
+        if membershipGraph and (not ttl or membershipGraph.loaded + ttl > time()):
+            return membershipGraph
+        
+        with self.graphLock:
+            # Another thread may have loaded the graph while we were waiting.
+            membershipGraph = self.membershipGraph
+            if membershipGraph and (not ttl or membershipGraph.loaded + ttl > time()):
+                return membershipGraph
+            return self.loadMembershipGraph()
+    
     def getMultiAttribute(self,dn,attribute):
         '''
         Get a single multi-valued attribute from the server. Alias for getObjectAttribute.
@@ -369,22 +1250,78 @@ class DirectoryTools:
         '''
         return self.getObjectAttribute(dn=dn,attribute=attribute)
 
-    def getObjectAttributes(self,dn,attributes):
+    def getMultipleObjectAttributes(self,dns,attributes):
         '''
-        Get multiple attributes from the server for the specified object.
+        Get attributes from many objects at once.
+        
+        Base-scope reads for all of the objects are pipelined on a single connection: up to BATCH_SIZE searches are sent before waiting on any of their results, which saves a round-trip per object over calling getObjectAttributes() in a loop.
         
         Args:
-            dn: Distinguished name to get attributes from.
+            dns: List of distinguished names to get attributes from.
             attributes: List of attributes to search for.
+            
+        Returns:
+            A dictionary of attribute dictionaries, indexed by the distinguished names given in the dns argument. Objects that could not be found are left out.
         '''
-        results = self.query('objectClass=*',attributes,dn)
+        dns = list(dns)
+        returnValue = {}
+        if not dns:
+            return returnValue
+        
+        batchSize = max(int(self.settings.batchSize),1)
+        self.printDebug("Reading attributes {0} from {1} objects.",LOG_LEVEL_DEBUG,attributes,len(dns))
+        
         try:
-            dn,attributes = results[0]
-            return attributes
+            with self.getProxyPool().connection() as handle:
+                for start in range(0,len(dns),batchSize):
+                    # Send the whole batch before collecting any results.
+                    pending = []
+                    started = time()
+                    for dn in dns[start:start+batchSize]:
+                        pending.append((dn,handle.search_ext(dn,ldap.SCOPE_BASE,'(objectClass=*)',attributes)))
+                    
+                    for dn,msgid in pending:
+                        try:
+                            resultType,results,resultId,serverControls = handle.result3(msgid)
+                        except ldap.NO_SUCH_OBJECT:
+                            self.recordOperation('search',started)
+                            self.printDebug("Object '{0}' could not be found.",LOG_LEVEL_DEBUG,dn)
+                            continue
+                        self.recordOperation('search',started,len(results))
+                        for resultDN,resultAttributes in results:
+                            if resultDN:
+                                returnValue[dn] = resultAttributes
+        except self.CONNECTION_EXCEPTIONS:
+            raise
+        except Exception, e:
+            self.printDebug("BAD QUERY: Batched read of {0} objects.",LOG_LEVEL_CRITICAL,len(dns))
+            raise exceptions.BadQueryException(originalException=e)
+        
+        # Attributes that the server returned in ranges are finished once the batch connection has been given back.
+        for dn,objectAttributes in returnValue.items():
+            self.completeRangedAttributes(dn,objectAttributes)
+        return returnValue
+
+    def getObjectAttributes(self,dn,attributes):
+        '''
+        Get multiple attributes from the server for the specified object.
+        
+        Attributes that the server returns in ranges are read in full (see completeRangedAttributes()).
+        
+        Args:
+            dn: Distinguished name to get attributes from.
+            attributes: List of attributes to search for.
+        '''
+        # Base scope, so that only the object itself is read and not its subtree.
+        results = self.query('objectClass=*',attributes,dn,scope=ldap.SCOPE_BASE)
+        try:
+            resultDN,attributes = results[0]
         except:
             # Assuming the index wasn't found.
             # Return an empty dictionary.
             return {}
+        # The result may be shared with other callers of query(), so it is copied before being completed.
+        return self.completeRangedAttributes(dn,dict(attributes))
 
     def getObjectAttribute(self,dn,attribute,returnSingle=False):
         '''
@@ -395,21 +1332,28 @@ class DirectoryTools:
             attribute: the attribute we want to fetch.
             returnSingle: If True, the method will only return one value of the property as a string. If the attribute can be a multi-valued attribute, only the first result for that attribute will be shown.
         '''
-        results = self.query('objectClass=*',[attribute],dn)
-
-        try:
-            dn,attributes = results[0]
-            if returnSingle:
-                return attributes[attribute][0]
-            else:
-                return attributes[attribute]
-        except:
-            # If we're getting an exception, then the index wasn't found.
-            if returnSingle:
-                return None
-            else:
-                return []
+        values = self.iterObjectAttribute(dn,attribute)
+        if returnSingle:
+            # No need to read the rest of the values.
+            return next(values,None)
+        return list(values)
 
+    def getPasswordVerifier(self,password,salt,iterations):
+        '''
+        Derive the verifier that a cached authentication is checked against.
+        
+        Args:
+            password: The password.
+            salt: Random salt of the cached authentication.
+            iterations: The number of PBKDF2 iterations.
+            
+        Returns:
+            The PBKDF2-HMAC-SHA256 digest of the password, as a string of binary data.
+        '''
+        if isinstance(password,unicode):
+            password = password.encode('utf-8')
+        return hashlib.pbkdf2_hmac('sha256',password,salt,iterations)
+    
     def getProperty(self,key,useDefault=True,defaultOverride=None,printDebugMessage=True):
         ''' 
         Gets a property value.
@@ -426,12 +1370,12 @@ class DirectoryTools:
         
         try:
             if printDebugMessage:
-                self.printDebug("Fetching property '{0}'".format(key),LOG_LEVEL_DEBUG)
+                self.printDebug("Fetching property '{0}'",LOG_LEVEL_DEBUG,key)
             return self.properties[key]
         except KeyError, e:
-            self.printDebug("Could not find key '{0}' in properties.".format(key),LOG_LEVEL_DEBUG)
+            self.printDebug("Could not find key '{0}' in properties.",LOG_LEVEL_DEBUG,key)
             if defaultOverride is not None:
-                self.printDebug("Using override default: {0}".format(defaultOverride),LOG_LEVEL_DEBUG)
+                self.printDebug("Using override default: {0}",LOG_LEVEL_DEBUG,defaultOverride)
                 return defaultOverride
             elif useDefault:
                 try:
@@ -439,7 +1383,7 @@ class DirectoryTools:
                     return self.defaultProperties[key]
                 except KeyError, e:
                     # The property *still* wasn't found in the default properties.
-                    self.printDebug("Could not find key '{0}' in default properties".format(key),LOG_LEVEL_DEBUG)
+                    self.printDebug("Could not find key '{0}' in default properties",LOG_LEVEL_DEBUG,key)
                     raise exceptions.PropertyNotFoundException(key=key,triedDefault=True)
             else:
                 # No override, and not using the default.
@@ -452,6 +1396,8 @@ class DirectoryTools:
         If the PROXY_IS_ANONYMOUS property is set to False, the method will attempt to bind to the server using the values of the PROXY_USER and PROXY_PASSWORD properties.
         
         If the PROXY_IS_ANONYMOUS property is set to True, then the method will skip attempting to bind.
+        
+        The handle returned by this method is a single cached handle, kept for callers that want to run their own operations. It is not safe to share between threads. DirectoryTools' own searches go through the pool from getProxyPool() instead.
                 
         Returns:
             An LDAP connection handle to be used by the object to retrieve information from the LDAP server.
@@ -459,28 +1405,80 @@ class DirectoryTools:
         
         if not self.proxyHandle:
             # Get a handle for our server, if one is not already present.
-            connection = self.getHandle()
-            
-            try:
-                if not self.getProperty(index.PROXY_IS_ANONYMOUS):
-                    # Attempt to bind as the proxy user if we aren't searching anonymously.
-                    resultCode = connection.simple_bind_s(self.getProperty(index.PROXY_USER),self.getProperty(index.PROXY_PASSWORD))
-                self.proxyHandle = connection
-            except ldap.LDAPError, e:
-                # This exception is thrown when the call to connection.simple_bind_s fails.
-                # print "Proxy connection failed."
-
-                if e.args[0]['desc'] == 'Invalid credentials':
-                    # The error happened because the proxy connection was given the wrong credentials.
-                    raise exceptions.ProxyAuthFailedException(originalException=e)
-                else:
-                    raise exceptions.ProxyFailedException(originalException=e)
-            
-            self.printDebug("Successfully created proxy handle.",LOG_LEVEL_DEBUG)
+            self.proxyHandle = self.createProxyHandle()
         else:
             self.printDebug("Returning cached proxy handle.",LOG_LEVEL_DEBUG)
         return self.proxyHandle
 
+    def getProxyPool(self):
+        '''
+        Get the pool of proxy connections used for searches, creating it if it does not exist yet.
+        
+        The pool is configured by the POOL_MIN_SIZE, POOL_MAX_SIZE, POOL_TIMEOUT and POOL_MAX_IDLE properties. Idle connections are checked for health before being handed out, and are re-bound if they have gone stale.
+        
+        Returns:
+            A DirectoryToolsPool.ServerPool of bound proxy handles, spread over the servers in the SERVER_ADDRESS property.
+        '''
+        with self.poolLock:
+            if not self.proxyPool:
+                self.printDebug("Creating proxy connection pool.",LOG_LEVEL_DEBUG)
+                self.proxyPool = pool.ServerPool(
+                    selector=self.getServerSelector(),
+                    factory=self.createProxyHandle,
+                    minSize=self.getProperty(index.POOL_MIN_SIZE),
+                    maxSize=self.getProperty(index.POOL_MAX_SIZE),
+                    timeout=self.getProperty(index.POOL_TIMEOUT),
+                    maxIdle=self.getProperty(index.POOL_MAX_IDLE),
+                    observer=lambda elapsed: self.recordPoolWait('proxy',elapsed)
+                )
+            return self.proxyPool
+
+    def getServers(self):
+        '''
+        Read the list of servers from the SERVER_ADDRESS and SERVER_PORT properties.
+        
+        SERVER_ADDRESS may be a single address, a list of addresses, or a string of addresses separated by commas or spaces. Each address may carry its own port as 'host:port' ('[address]:port' for IPv6 addresses). Addresses without a port use SERVER_PORT.
+        
+        Returns:
+            A list of DirectoryToolsPool.Server objects.
+        '''
+        addresses = self.getProperty(index.SERVER_ADDRESS)
+        if isinstance(addresses,basestring):
+            addresses = re.split(r'[,\s]+',addresses.strip()) or ['']
+        defaultPort = self.getProperty(index.SERVER_PORT)
+        
+        servers = []
+        for address in addresses:
+            port = defaultPort
+            match = re.match(r'^\[(.*)\](?::(\d+))?$',address) or re.match(r'^([^:]*)(?::(\d+))?$',address)
+            if match:
+                address = match.group(1)
+                if match.group(2):
+                    port = int(match.group(2))
+            servers.append(pool.Server(address,port))
+        return servers
+    
+    def getServerSelector(self):
+        '''
+        Get the selector that picks the server for each new operation, creating it if it does not exist yet.
+        
+        With more than one server in the SERVER_ADDRESS property, operations are spread between servers according to the SERVER_STRATEGY property. A server that fails SERVER_EJECT_AFTER times in a row is skipped for SERVER_EJECT_TIME seconds, and is then probed with a single operation before it is used again.
+        
+        Returns:
+            A DirectoryToolsPool.ServerSelector.
+        '''
+        with self.poolLock:
+            if not self.serverSelector:
+                servers = self.getServers()
+                self.printDebug("Spreading connections over {0} server(s) ({1}): {2}",LOG_LEVEL_DEBUG,len(servers),self.getProperty(index.SERVER_STRATEGY),servers)
+                self.serverSelector = pool.ServerSelector(
+                    servers,
+                    strategy=self.getProperty(index.SERVER_STRATEGY),
+                    ejectAfter=self.getProperty(index.SERVER_EJECT_AFTER),
+                    ejectTime=self.getProperty(index.SERVER_EJECT_TIME)
+                )
+            return self.serverSelector
+    
     def getSingleAttribute(self,dn,attribute):
         '''
         Retrieve a single attribute from a server. Mostly an alias of getObjectAttribute.
@@ -494,6 +1492,35 @@ class DirectoryTools:
         '''
         return self.getObjectAttribute(dn=dn,attribute=attribute,returnSingle=True)
 
+    def getSyncBaseline(self,attribute):
+        '''
+        Get the high-water mark that the first cache sync starts from.
+        
+        Args:
+            attribute: The attribute that changes are tracked with (see the SYNC_ATTRIBUTE property).
+            
+        Returns:
+            For 'uSNChanged', the highestCommittedUSN value of the root DSE. For timestamp attributes, the current time less SYNC_CLOCK_SKEW seconds, in generalized time format.
+        '''
+        if attribute.lower() == 'usnchanged':
+            # The root DSE can't be read through query(), which substitutes the base DN for an empty base.
+            with self.getProxyPool().connection() as handle:
+                started = time()
+                results = handle.search_s('',ldap.SCOPE_BASE,'(objectClass=*)',['highestCommittedUSN'])
+                self.recordOperation('search',started,len(results))
+            for dn,attributes in results:
+                for key in attributes:
+                    if key.lower() == 'highestcommittedusn':
+                        return attributes[key][0]
+            self.printDebug("Server did not provide a highestCommittedUSN value. The next sync will read every entry.",LOG_LEVEL_WARNING)
+            return '0'
+        
+        timestamp = strftime('%Y%m%d%H%M%S',gmtime(time() - self.getProperty(index.SYNC_CLOCK_SKEW)))
+        if attribute.lower() == 'entrycsn':
+            # Change sequence numbers start with a timestamp that has a fraction.
+            return timestamp + '.000000Z'
+        return timestamp + 'Z'
+
     def getUserBaseDN(self):
         '''
         Combine the relative group base DN with the base DN.
@@ -501,15 +1528,17 @@ class DirectoryTools:
         Returns:
             A string composed of a combination of the relative user base DN (indexes.USER_RDN) and the base DN (indexes.BASE_DN)
         '''
-        if len(self.getProperty(index.USER_RDN)):
-            return "{0},{1}".format(self.getProperty(index.USER_RDN),self.getProperty(index.BASE_DN))
+        if len(self.settings.userRDN):
+            return "{0},{1}".format(self.settings.userRDN,self.settings.baseDN)
         else:
-            return self.getProperty(index.BASE_DN)
+            return self.settings.baseDN
 
     def getUserGroups(self,userName,userNameIsDN=False,returnGroupsAsDN=False):
         '''
         Get all groups that the user is a member of.
         
+        If the MEMBERSHIP_GRAPH property is set, groups are read from the membership graph instead of the server. Nested groups are included if the NESTED_GROUPS property is set.
+        
         Args:
             userName: Name of the user to search for.
             userNameIsDN: Set to True if the provided userName argument is a distinguished name, False for a UID.
@@ -519,17 +1548,39 @@ class DirectoryTools:
             A list of groups that the specified user is a member of. List items are in either DN or CN format depending on value of returnMembersAsDN argument.
         '''
         
+        membershipGraph = self.getMembershipGraph()
+        if membershipGraph:
+            memberId = self.getGraphMemberId(membershipGraph,userName,userNameIsDN)
+            if memberId is None:
+                return []
+            groupIds = membershipGraph.getGroups(memberId)
+            if returnGroupsAsDN:
+                return [membershipGraph.names[groupId] for groupId in groupIds]
+            return [membershipGraph.groupUids.get(groupId) or self.resolveGroupUID(membershipGraph.names[groupId]) for groupId in groupIds]
+        
         # Adjust if the provided username does not match the format that the LDAP server stores members in.
-        if userNameIsDN and not self.getProperty(index.MEMBER_ATTRIBUTE_IS_DN):
+        if userNameIsDN and not self.settings.memberAttributeIsDN:
             queryUser = self.resolveUserUID(userName)
-        elif not userNameIsDN and self.getProperty(index.MEMBER_ATTRIBUTE_IS_DN):
+        elif not userNameIsDN and self.settings.memberAttributeIsDN:
             queryUser = self.resolveUserDN(userName)
         else:
             # Use provided user
             queryUser = userName
+        
+        if queryUser and self.settings.useTokenGroups and self.settings.nestedGroups and self.settings.memberAttributeIsDN:
+            # Read the full set of nested groups off of the user object.
+            groupList = self.getUserGroupsFromTokenGroups(queryUser,returnGroupsAsDN)
+            if groupList is not None:
+                return groupList
+        
+        if queryUser and self.useInChain():
+            # Let the server find nested group memberships for us.
+            groupList = self.getUserGroupsInChain(queryUser,returnGroupsAsDN)
+            if groupList is not None:
+                return groupList
             
         # Get eligible groups from the server.
-        returnedGroups = self.query('{0}={1}'.format(self.getProperty(index.MEMBER_ATTRIBUTE),queryUser),[self.getProperty(index.MEMBER_ATTRIBUTE),self.getProperty(index.GROUP_INDEX_ATTRIBUTE)],self.getGroupBaseDN())
+        returnedGroups = self.query('{0}={1}'.format(self.settings.memberAttribute,queryUser),[self.settings.memberAttribute,self.settings.groupIndexAttribute],self.getGroupBaseDN())
         
         groupList = []
         for groupTuple in returnedGroups:
@@ -543,10 +1594,112 @@ class DirectoryTools:
         else:
             return [self.resolveGroupUID(groupDN) for groupDN in groupList]
         
+    def getUserGroupsFromTokenGroups(self,userDN,returnGroupsAsDN=False):
+        '''
+        Get all groups that a user is a direct or nested member of, using Active Directory's tokenGroups constructed attribute.
+        
+        The user object is read with a base-scope search to get the SIDs of all of its groups, and the SIDs are then mapped to groups in batches of BATCH_SIZE. SIDs that have already been mapped are answered from the 'resolvedSids' cache. Groups outside of the group base DN (for example, built-in groups) are left out.
+        
+        Args:
+            userDN: Distinguished name of the user.
+            returnGroupsAsDN: Return the items in the list in DN format.
+        
+        Returns:
+            A list of groups, or None if the server did not provide a tokenGroups attribute.
+        '''
+        results = self.query('(objectClass=*)',['tokenGroups'],userDN,scope=ldap.SCOPE_BASE)
+        try:
+            dn,attributes = results[0]
+            binarySids = attributes['tokenGroups']
+        except (IndexError,KeyError):
+            self.printDebug("No tokenGroups attribute found for '{0}'.",LOG_LEVEL_WARNING,userDN)
+            return None
+        
+        utilities = Utilities()
+        uidAttribute = self.settings.groupUidAttribute
+        cacheCategory,cacheId = self.initCache('resolvedSids')
+        
+        groups = []
+        unresolved = {}
+        for binarySid in binarySids:
+            sid = utilities.decodeMicrosoftSid(base64.b64encode(binarySid))
+            cached,group = self.cache[cacheCategory][cacheId].lookup(sid)
+            if cached:
+                if group:
+                    groups.append(group)
+            else:
+                unresolved[binarySid] = sid
+        
+        self.printDebug("User '{0}' has {1} token groups, {2} of them not cached.",LOG_LEVEL_DEBUG,userDN,len(binarySids),len(unresolved))
+        
+        unresolvedSids = list(unresolved)
+        batchSize = max(int(self.settings.batchSize),1)
+        for start in range(0,len(unresolvedSids),batchSize):
+            batch = unresolvedSids[start:start+batchSize]
+            
+            # Binary SIDs are matched by escaping every byte.
+            sidFilter = ''.join(['(objectSid={0})'.format(''.join(['\\{0:02x}'.format(ord(c)) for c in binarySid])) for binarySid in batch])
+            query = '(&(objectClass={0})(|{1}))'.format(self.settings.groupClass,sidFilter)
+            
+            found = {}
+            for dn,attributes in self.query(query,[uidAttribute,'objectSid'],self.getGroupBaseDN()):
+                try:
+                    found[attributes['objectSid'][0]] = (dn,attributes[uidAttribute][0])
+                except (KeyError,IndexError):
+                    continue
+            
+            for binarySid in batch:
+                group = found.get(binarySid)
+                # Cache misses as well, so that built-in groups are not searched for again.
+                self.cache[cacheCategory][cacheId][unresolved[binarySid]] = group
+                if group:
+                    groups.append(group)
+        
+        if returnGroupsAsDN:
+            return [dn for dn,uid in groups]
+        return [uid for dn,uid in groups]
+    
+    def getUserGroupsInChain(self,userDN,returnGroupsAsDN=False):
+        '''
+        Get all groups that an object is a direct or nested member of with a single search, using the in-chain matching rule.
+        
+        Args:
+            userDN: Distinguished name of the object to search for.
+            returnGroupsAsDN: Return the items in the list in DN format.
+        
+        Returns:
+            A list of groups, or None if the server rejected the matching rule.
+        '''
+        uidAttribute = self.settings.groupUidAttribute
+        query = '(&(objectClass={0})(member:{1}:={2}))'.format(self.settings.groupClass,MATCHING_RULE_IN_CHAIN,escape_filter_chars(userDN))
+        self.printDebug("Getting nested groups of '{0}' with the in-chain matching rule.",LOG_LEVEL_INFO,userDN)
+        
+        results = self.queryInChain(query,[uidAttribute],self.getGroupBaseDN())
+        if results is None:
+            return None
+        
+        if returnGroupsAsDN:
+            return [dn for dn,attributes in results]
+        
+        cacheCategory,cacheId = self.initCache('resolvedGroups')
+        groupList = []
+        for dn,attributes in results:
+            try:
+                uid = attributes[uidAttribute][0]
+            except (KeyError,IndexError):
+                uid = self.resolveGroupUID(dn)
+            else:
+                self.cache[cacheCategory][cacheId][dn] = uid
+                self.cache[cacheCategory][cacheId][uid] = dn
+            groupList.append(uid)
+        return groupList
+    
     def getUsersInGroup(self,groupName,returnMembersAsDN=False):
         '''
         Alias of getGroupMembers(), pre-configured for retrieving user objects.
         
+        If the MEMBERSHIP_GRAPH property is set, members are read from the membership graph instead of the server. Members that are not groups are taken to be users without checking their object class.
+        
         Args:
             groupName: Name of the group to search in.
             returnMembersAsDN: If True, the list that is returned will be a list of distinguished names. If False, the list that is returned will be a list of user UIDs.
@@ -554,28 +1707,32 @@ class DirectoryTools:
         Returns:
             A list of users, formatted as either UIDs or distinguished names.
         '''
-        return self.getGroupMembers(groupName=groupName,returnMembersAsDN=returnMembersAsDN,objectClassFilter=self.getProperty(index.USER_CLASS),uidAttribute=self.getProperty(index.USER_UID_ATTRIBUTE))
+        membershipGraph = self.getMembershipGraph()
+        if membershipGraph:
+            groupId = self.getGraphGroupId(membershipGraph,groupName)
+            if groupId is None:
+                self.printDebug("Could not locate group: {0}",LOG_LEVEL_ERROR,groupName)
+                return []
+            memberList = [membershipGraph.names[memberId] for memberId in membershipGraph.getMembers(groupId) if not membershipGraph.isGroup(memberId)]
+            return self.formatGroupMembers(memberList=memberList,returnMembersAsDN=returnMembersAsDN,objectClassFilter=self.settings.userClass,uidAttribute=self.settings.userUidAttribute)
+        
+        return self.getGroupMembers(groupName=groupName,returnMembersAsDN=returnMembersAsDN,objectClassFilter=self.settings.userClass,uidAttribute=self.settings.userUidAttribute)
 
 
     def initCache(self,category='general',cacheId=None,generateCacheId=False):
         '''
-        Ensures that a cache is initialized. A specific cache will be a dictionary indexed by cacheId, which is nested in a cache for categories.
+        Ensures that a cache is initialized. A specific cache is a DirectoryToolsCache.CacheBucket indexed by cacheId, which is nested in a cache for categories.
+        
+        Caches are bounded by the CACHE_MAX_ENTRIES and CACHE_TTL properties (see configureCache). The least recently used items are evicted once a cache is full, and items expire once they are older than their TTL.
         
         Args:
             category: The general category of the cache. For example, 'searchedGroups', 'resolvedDNs'. If left at none, the default category will be used according to the DEFAULT_CACHE_CATEGORY property.
             cacheId: Specifies the cache ID. If a value is given, the cacheId will be set to this value. If left at default of None, the default cache will be used according to the DEFAULT_CACHE_ID property.
-            generateCacheId: If set to True, a cache ID will be generated using a UNIX timestamp and the current microseconds. Setting this value to True will take precedence over the value of cacheId.
+            generateCacheId: If set to True, a unique cache ID will be generated using a UNIX timestamp, the current microseconds and a counter. Setting this value to True will take precedence over the value of cacheId.
         Returns:
             A tuple. The first value will cacheCategory that was used, and the second value will be the cacheId being used.
         '''
         
-        # Make sure that the cache object is initialized.   
-        try:
-            if type(self.cache) is not dict:
-                self.cache = {}
-        except NameError:
-            self.cache = {}
-        
         # Check if we need to use the default category.
         if not category:
             category = self.getProperty(index.DEFAULT_CACHE_CATEGORY)
@@ -583,8 +1740,9 @@ class DirectoryTools:
         # Confirm the cache ID that we'll be working with.
         if generateCacheId:
             # Using a UNIX timestamp in milliseconds to get my cache Id.
+            # The counter keeps IDs unique between threads that start a search in the same microsecond.
             timeObj = datetime.now()
-            cacheId =  str(time()) + str(timeObj.microsecond)
+            cacheId =  str(time()) + str(timeObj.microsecond) + '-' + str(self.cacheIdCounter.next())
         elif cacheId:
             # We have been given a cache Id. If it doesn't already exist, we need to make it.
             
@@ -593,26 +1751,40 @@ class DirectoryTools:
         else:
             # Not using a specific cache Id. Defaulting to general.
             cacheId = self.getProperty(index.DEFAULT_CACHE_ID)
-            
-        # Make sure that the category is initialized.
-        # Do not overwrite an existing dictionary, but correct any non-dictionary that has snuck in.
-        if category not in self.cache or type(self.cache[category]) is not dict:
-            self.printDebug("Creating cache category '{0}'".format(category),LOG_LEVEL_DEBUG)
-            self.cache[category] = {}
-        else:
-            self.printDebug("Cache category '{0}' already exists.".format(category),LOG_LEVEL_DEBUG)
-
-        # Make sure that the cache ID of the category is initialized.
-        # Do not overwrite an existing dictionary, but correct any non-dictionary that has snuck in.
-        if cacheId not in self.cache[category] or type(self.cache[category][cacheId]) is not dict:
-            self.printDebug("Creating '{0}' cache with Id of '{1}'".format(category,cacheId),LOG_LEVEL_DEBUG)
-            self.cache[category][cacheId] = {}
+        
+        # Make sure that the category and the cache ID of the category are initialized.
+        # Existing caches are not overwritten.
+        bucket,created = self.cache.getBucket(category,cacheId)
+        if created:
+            self.printDebug("Creating '{0}' cache with Id of '{1}'",LOG_LEVEL_DEBUG,category,cacheId)
         else:
-            self.printDebug("'{0}' cache with id of '{1}' already exists.".format(category,cacheId),LOG_LEVEL_DEBUG)
+            self.printDebug("'{0}' cache with id of '{1}' already exists.",LOG_LEVEL_DEBUG,category,cacheId)
         
         # Return the cache id that we are using. A recursive function must use the same cache Id.
         return tuple([category,cacheId])
 
+    def loadMembershipGraph(self):
+        '''
+        Load every group under the group base DN into a new membership graph, with one paged search.
+        
+        Group members are read from the MEMBER_ATTRIBUTE property, and are keyed by DN or by UID according to the MEMBER_ATTRIBUTE_IS_DN property. Nested groups are followed if the NESTED_GROUPS property is set and members are stored as DNs, down to the depth given by the MAX_DEPTH property, so that the graph gives the same answers as the recursive and breadth-first lookups.
+        
+        Returns:
+            The new DirectoryToolsGraph.MembershipGraph, which is also kept for getMembershipGraph().
+        '''
+        with self.graphLock:
+            started = time()
+            membershipGraph = graph.MembershipGraph(nestedGroups=self.settings.nestedGroups and self.settings.memberAttributeIsDN,maxDepth=self.settings.maxDepth)
+            
+            query = '(objectClass={0})'.format(self.settings.groupClass)
+            for dn,attributes in self.queryIter(query,[self.settings.memberAttribute,self.settings.groupUidAttribute],self.getGroupBaseDN()):
+                uid,members = self.getGraphGroupEntry(attributes)
+                membershipGraph.addGroup(dn,uid,members)
+            
+            self.printDebug("Loaded membership graph with {0} groups and {1} nodes in {2:.3f} seconds.",LOG_LEVEL_INFO,len(membershipGraph.groups),len(membershipGraph),time() - started)
+            self.membershipGraph = membershipGraph
+            return membershipGraph
+
     def loadConfigFile(self,configFilePath):
         '''
         Loads the contents of a configuration file into self.properties.
@@ -621,26 +1793,121 @@ class DirectoryTools:
             configFilePath: Path to an ini-style configuration file. The contents of the [DirectoryTools] section are loaded into self.properties. All other sections are ignored.
         '''
         
-        parser = ConfigParser.ConfigParser()
-        parser.read(configFilePath)
-        
-        if self.CONFIG_SECTION_HEADER in parser.sections():
-            for option in parser.options(self.CONFIG_SECTION_HEADER):
-                # Get our value and strip out quotes.
-                v = re.sub(r'^[\'\"]*|[\'\"]*$','',parser.get(self.CONFIG_SECTION_HEADER,option))
-                if v.lower() in ['yes','true',"1"]:
-                    # Boolean true.
-                    self.setProperty(option,True)
-                elif v.lower() in ['no','false',"0","nope"]:
-                    # Boolean false.
-                    # Added "nope" for humour.
-                    self.setProperty(option,False)
-                elif re.match(r'^[1-90]*$',v):
-                    # Is an integer.
-                    self.setProperty(option,int(v))
+        self.updateProperties(readConfigFile(configFilePath,self.CONFIG_SECTION_HEADER))
+    
+    def isCachedAuthentication(self,userDN,password):
+        '''
+        Check a password against the verifier of a recent successful authentication (see the AUTH_CACHE property).
+        
+        Args:
+            userDN: The distinguished name of the user.
+            password: The password to check.
+            
+        Returns:
+            True if the user recently authenticated with this password, False otherwise.
+        '''
+        cacheCategory,cacheId = self.initCache(self.AUTH_CACHE_CATEGORY)
+        cached = self.cache[cacheCategory][cacheId].get(userDN.lower())
+        if not cached:
+            return False
+        salt,iterations,verifier = cached
+        return hmac.compare_digest(self.getPasswordVerifier(password,salt,iterations),verifier)
+    
+    def iterObjectAttribute(self,dn,attribute):
+        '''
+        Get all values of an attribute of a single object, as they arrive.
+        
+        If the server returns the attribute in ranges (see iterRangedValues()), the values of the first range are given out before the next ranges are read. A caller that stops iterating early saves reading the rest.
+        
+        Args:
+            dn: The distinguished name of the object that we are getting the attribute from.
+            attribute: The attribute we want to fetch.
+            
+        Returns:
+            A generator of attribute values. Nothing is generated if the object or attribute can't be found.
+        '''
+        # Base scope, so that only the object itself is read and not its subtree.
+        results = self.query('objectClass=*',[attribute],dn,scope=ldap.SCOPE_BASE)
+        if not results:
+            return
+        
+        attributes = results[0][1]
+        if attribute in attributes:
+            for value in attributes[attribute]:
+                yield value
+            return
+        
+        attributeRange = self.getAttributeRange(attributes,attribute)
+        if attributeRange:
+            values,low,high = attributeRange
+            for value in values:
+                yield value
+            if high is not None:
+                for value in self.iterRangedValues(dn,attribute,high + 1,high - low + 1):
+                    yield value
+    
+    def iterRangedValues(self,dn,attribute,start,step,handle=None):
+        '''
+        Read the remaining values of an attribute that the server returns in ranges.
+        
+        Active Directory returns at most MaxValRange values (1500 by default) of an attribute in one read, under a name such as 'member;range=0-1499'. The rest are read by asking for 'member;range=1500-2999' and so on, until a range ending in '*' comes back.
+        
+        The ranges are read in windows that are pipelined on one connection: every read in a window is sent before waiting on any of them. Since the number of values is not known up front, the first window holds two reads, and each window after that is twice as large as the last, up to BATCH_SIZE reads. Reads that turn out to be past the last range are thrown away. The connection is given back between windows, so none is held while the caller works through the values.
+        
+        A caller that is holding a connection that it can't give back yet, such as queryIter() in the middle of a paged search, passes it in as handle. The ranges are then read on that connection, rather than taking a second one from the pool, which could wait forever on a pool that is full.
+        
+        Args:
+            dn: The distinguished name of the object.
+            attribute: The attribute name, without any range option.
+            start: Index of the first value to read.
+            step: Number of values in each range, as the server's first answer showed.
+            handle: A connection that the caller already holds, to read the ranges on. If None, a connection is taken from the proxy pool for each window.
+            
+        Returns:
+            A generator of the attribute values from start onwards.
+        '''
+        batchSize = max(int(self.settings.batchSize),1)
+        window = min(2,batchSize)
+        proxyPool = self.getProxyPool()
+        
+        while start is not None:
+            ranges = [(start + i * step,start + (i + 1) * step - 1) for i in range(window)]
+            try:
+                if handle is not None:
+                    responses = self.readRanges(handle,dn,attribute,ranges)
                 else:
-                    # Standard. Is a string.
-                    self.setProperty(option,v)
+                    with proxyPool.connection() as pooledHandle:
+                        responses = self.readRanges(pooledHandle,dn,attribute,ranges)
+            except self.CONNECTION_EXCEPTIONS:
+                raise
+            except Exception, e:
+                if handle is not None and isinstance(e,ldap.SERVER_DOWN):
+                    # Let the caller's pool discard its connection.
+                    raise
+                self.printDebug("BAD QUERY: Ranged read of attribute '{0}' of '{1}'.",LOG_LEVEL_CRITICAL,attribute,dn)
+                raise exceptions.BadQueryException(originalException=e)
+            
+            valueLists,start,step = self.followRanges(dn,attribute,ranges,responses,step)
+            for values in valueLists:
+                for value in values:
+                    yield value
+            window = min(window * 2,batchSize)
+    
+    def isCachedMiss(self,category,name):
+        '''
+        Check whether a name recently failed to resolve.
+        
+        Args:
+            category: The resolution cache category that the name is being looked up for (for example, 'resolvedUsers').
+            name: The name or distinguished name being resolved.
+            
+        Returns:
+            True if the name is in the negative cache, False otherwise.
+        '''
+        if category not in self.NEGATIVE_CACHE_CATEGORIES:
+            return False
+        cacheCategory,cacheId = self.initCache(self.NEGATIVE_CACHE_CATEGORIES[category])
+        return name in self.cache[cacheCategory][cacheId]
     
     def isObjectGroup(self,groupDN):
         '''
@@ -652,7 +1919,7 @@ class DirectoryTools:
         Returns:
             True if the object is a member of a group, false otherwise.
         '''
-        return self.isObjectOfClass(objectDN=groupDN,objectClass=self.getProperty(index.GROUP_CLASS))
+        return self.isObjectOfClass(objectDN=groupDN,objectClass=self.settings.groupClass)
 
     def isObjectInGroup(self,objectName,groupName,objectNameIsDN=False,groupNameIsDN=False,objectIdentifier=False,objectClass=False,objectBase=False,depth=0,cacheId=False):
         '''
@@ -677,21 +1944,25 @@ class DirectoryTools:
         
         cacheCategory='searchedGroups'
         if not cacheId:
-            cacheTuple = self.initCache(cacheCategory,cacheId,generateCacheId=True)
-        else:
-            cacheTuple = self.initCache(cacheCategory,cacheId)
-            
-        cacheCategory,cacheId = cacheTuple
+            # Top-level call. The list of searched groups is only needed until this call returns.
+            cacheCategory,cacheId = self.initCache(cacheCategory,cacheId,generateCacheId=True)
+            try:
+                return self.isObjectInGroup(objectName,groupName,objectNameIsDN=objectNameIsDN,groupNameIsDN=groupNameIsDN,objectIdentifier=objectIdentifier,objectClass=objectClass,objectBase=objectBase,depth=depth,cacheId=cacheId)
+            finally:
+                self.flushCaches(cacheCategory,cacheId)
         
-        self.printDebug("Searching for user '{0}' in group '{1}'".format(objectName,groupName),LOG_LEVEL_INFO)
+        cacheCategory,cacheId = self.initCache(cacheCategory,cacheId)
         
-        if groupName in self.cache[cacheCategory][cacheId]:
+        self.printDebug("Searching for user '{0}' in group '{1}'",LOG_LEVEL_INFO,objectName,groupName)
+        
+        searchedGroups = self.cache[cacheCategory][cacheId]
+        if groupName in searchedGroups:
             # We have already searched in this group.
-            self.printDebug("Skipping group '{0}'. Already searched.".format(groupName),LOG_LEVEL_INFO)
+            self.printDebug("Skipping group '{0}'. Already searched.",LOG_LEVEL_INFO,groupName)
             return False
-        self.cache[cacheCategory][cacheId][groupName] = 1
+        searchedGroups[groupName] = 1
         
-        if int(depth) > self.getProperty(index.MAX_DEPTH) and not self.getProperty(index.MAX_DEPTH) < 0:
+        if int(depth) > self.settings.maxDepth and not self.settings.maxDepth < 0:
             raise exceptions.ExceededMaxDepthException(depth=depth,resultItem=False)
         
         # We need the DN of the group to get its attributes.
@@ -703,16 +1974,16 @@ class DirectoryTools:
             groupDN = self.resolveGroupDN(groupName)
             if not groupDN:
                 # Can't find group, no point in continuing.
-                self.printDebug("Cannot locate group '{0}' in order to search for member '{1}' within it. Returning False.".format(groupName,objectName),LOG_LEVEL_ERROR)
+                self.printDebug("Cannot locate group '{0}' in order to search for member '{1}' within it. Returning False.",LOG_LEVEL_ERROR,groupName,objectName)
                 return False
         
-        if not objectNameIsDN and self.getProperty(index.MEMBER_ATTRIBUTE_IS_DN):
+        if not objectNameIsDN and self.settings.memberAttributeIsDN:
             # If we are using a system which indexes its group members as distinguished names, we must resolve our given UID to a DN for matching.
             searchName = self.resolveObjectDN(objectClass,objectIdentifier,objectName,objectBase)
             if not searchName:    
                 # If this DN search does not yield any object, there's no point in continuing with our search.
                 return False
-        elif objectNameIsDN and not self.getProperty(index.MEMBER_ATTRIBUTE_IS_DN):
+        elif objectNameIsDN and not self.settings.memberAttributeIsDN:
             # If we are using a system which indexes its group members as UIDs, we must resolve our given DN to a UID.
             objectName  = self.resolveObjectUID(objectName,objectIdentifier)
             if not searchName:
@@ -722,43 +1993,54 @@ class DirectoryTools:
             # Not a DN, so no need to resolve.
             searchName = objectName
         
-        members = self.getMultiAttribute(groupDN,self.getProperty(index.MEMBER_ATTRIBUTE))
+        if depth == 0 and self.useInChain():
+            # Let the server check nested groups for us by reading the object with an in-chain filter.
+            results = self.queryInChain('(memberOf:{0}:={1})'.format(MATCHING_RULE_IN_CHAIN,escape_filter_chars(groupDN)),['1.1'],searchName,scope=ldap.SCOPE_BASE)
+            if results is not None:
+                self.printDebug("In-chain membership check of object '{0}' in group '{1}': {2}",LOG_LEVEL_INFO,objectName,groupName,len(results) > 0)
+                return len(results) > 0
+        
+        if depth == 0 and self.useBreadthFirst():
+            return self.isObjectInGroupBreadthFirst(objectDN=searchName,groupDN=groupDN)
+        
+        # Members are streamed, so the rest of a large group is not read once the object has been found.
+        members = self.iterObjectAttribute(groupDN,self.settings.memberAttribute)
         
         # This list will hold group definitions until we are done looking through non-group objects.
         nestedGroupList = []
         
-        if not self.getProperty(index.MEMBER_ATTRIBUTE_IS_DN):
+        if not self.settings.memberAttributeIsDN:
             # Groups in the LDAP server do not store its member properties as distinguished names.
         
             if searchName in members:
                 # If we are using a POSIX group, we can trust that the item is of the class we want.
                 # If members are DNs, then we have resolved the UID to an existing object.
-                self.printDebug("Verified object '{0}' as a member of group '{1}'".format(objectName,groupName),LOG_LEVEL_INFO)
+                self.printDebug("Verified object '{0}' as a member of group '{1}'",LOG_LEVEL_INFO,objectName,groupName)
                 return True
         
         else:
             # Groups in the LDAP server stores its member properties as distinguished names.
             
-            # self.getProperty(index.MEMBER_ATTRIBUTE_IS_DN) is true
+            # self.settings.memberAttributeIsDN is true
             # We cannot count on the objects in this group to only be users.
             for member in members:
                 # Cycle through group results.
                 
                 if member == searchName:
-                    self.printDebug("Verified object '{0}' as a member of group '{1}'".format(objectName,groupName),LOG_LEVEL_INFO)
+                    self.printDebug("Verified object '{0}' as a member of group '{1}'",LOG_LEVEL_INFO,objectName,groupName)
                     return True
-                elif self.getProperty(index.NESTED_GROUPS) and self.isObjectGroup(member):
+                elif self.settings.nestedGroups and self.isObjectGroup(member):
                     # We have stated that we want to search through nested groups.
                     # The item is a group, and the object is a member of it.
                     
                     # But first, we want to search through other direct memberships
                     # to make sure that the desired property is not here.
-                    self.printDebug("Observed group '{0}'. Will search through it if no direct matches are found in this group.".format(member),LOG_LEVEL_INFO)
+                    self.printDebug("Observed group '{0}'. Will search through it if no direct matches are found in this group.",LOG_LEVEL_INFO,member)
                     nestedGroupList.append(member)
                 else:
                     # If the if statement is not triggered, then the object is a object.
                     # Any object type other than the group is irrelevant, placing the else statement for the sake of verbosity.
-                    self.printDebug("Observed non-matching object '{0}'".format(member),LOG_LEVEL_DEBUG)
+                    self.printDebug("Observed non-matching object '{0}'",LOG_LEVEL_DEBUG,member)
         
             # We have completed cycling through the memberList variable for users, and have not found a matching user.
             for nestedGroup in nestedGroupList:
@@ -772,6 +2054,63 @@ class DirectoryTools:
         # Fall back to false if we have not gotten a True response back by this point.
         return False
 
+    def isObjectInGroupBreadthFirst(self,objectDN,groupDN):
+        '''
+        Determines whether or not an object is in a group, expanding nested groups one level at a time.
+        
+        Every group on a level is read in one pipelined batch, and the search stops at the first level that contains the object. Objects that the class cache knows are not groups are not read. Nested groups are searched if the NESTED_GROUPS property is set, down to the depth given by the MAX_DEPTH property. Unlike isObjectInGroup(), running out of depth returns False rather than raising an ExceededMaxDepthException.
+        
+        Args:
+            objectDN: Distinguished name of the object to search for.
+            groupDN: Distinguished name of the group.
+        
+        Returns:
+            True if the object is a member of the group, False otherwise.
+        '''
+        memberAttribute = self.settings.memberAttribute
+        groupClass = self.settings.groupClass
+        nested = self.settings.nestedGroups
+        maxDepth = self.settings.maxDepth
+        
+        cacheCategory,cacheId = self.initCache('classCache',groupClass)
+        
+        target = objectDN.lower()
+        seen = set([groupDN.lower()])
+        level = [groupDN]
+        depth = 0
+        
+        while level:
+            if depth > 0:
+                # Objects that the class cache knows are not groups have no members to read.
+                level = [dn for dn in level if self.cache[cacheCategory][cacheId].lookup(dn) != (True,False)]
+            
+            self.printDebug("Searching for '{0}' in {1} objects at depth {2}.",LOG_LEVEL_INFO,objectDN,len(level),depth)
+            results = self.getMultipleObjectAttributes(level,['objectClass',memberAttribute])
+            
+            nextLevel = []
+            for dn in level:
+                objectAttributes = results.get(dn,{})
+                if depth > 0:
+                    isGroup = groupClass in objectAttributes.get('objectClass',[])
+                    self.cache[cacheCategory][cacheId][dn] = isGroup
+                    if not isGroup:
+                        continue
+                
+                for member in objectAttributes.get(memberAttribute,[]):
+                    if member.lower() == target:
+                        self.printDebug("Verified object '{0}' as a member of group '{1}'",LOG_LEVEL_INFO,objectDN,groupDN)
+                        return True
+                    if member.lower() not in seen:
+                        seen.add(member.lower())
+                        nextLevel.append(member)
+            
+            if not nested or (depth >= maxDepth and not maxDepth < 0):
+                break
+            level = nextLevel
+            depth += 1
+        
+        return False
+
     def isObjectOfClass(self,objectDN,objectClass):
         '''
         Check to see if an object has a certain objectClass value.
@@ -788,25 +2127,26 @@ class DirectoryTools:
         cacheTuple = self.initCache(cacheCategory,objectClass)
         cacheCategory,cacheId = cacheTuple
         
-        self.printDebug("Checking whether the object at '{0}' is of class '{1}'".format(objectDN,cacheId),LOG_LEVEL_INFO)
+        self.printDebug("Checking whether the object at '{0}' is of class '{1}'",LOG_LEVEL_INFO,objectDN,cacheId)
         
         # Attempt to find the object in the cache.
-        if objectDN in self.cache[cacheCategory][cacheId]:
-            if self.cache[cacheCategory][cacheId][objectDN]:
-                self.printDebug("Verified object as being of class '{0}' using cache.".format(cacheId),LOG_LEVEL_DEBUG)
+        found,isOfClass = self.cache[cacheCategory][cacheId].lookup(objectDN)
+        if found:
+            if isOfClass:
+                self.printDebug("Verified object as being of class '{0}' using cache.",LOG_LEVEL_DEBUG,cacheId)
                 return True
             else:
-                self.printDebug("Cache reports that we could not verify object as being of class '{0}'.".format(cacheId),LOG_LEVEL_DEBUG)
+                self.printDebug("Cache reports that we could not verify object as being of class '{0}'.",LOG_LEVEL_DEBUG,cacheId)
                 return False
             
         classes = self.getMultiAttribute(objectDN,'objectClass')
         if objectClass in classes:
             self.cache[cacheCategory][cacheId][objectDN] = True
-            self.printDebug("Verified object as being of class '{0}' using cache.".format(cacheId),LOG_LEVEL_DEBUG)
+            self.printDebug("Verified object as being of class '{0}' using cache.",LOG_LEVEL_DEBUG,cacheId)
             return True
         else:
             self.cache[cacheCategory][cacheId][objectDN] = False
-            self.printDebug("Cache reports that we could not verify object as being of class '{0}'.".format(cacheId),LOG_LEVEL_DEBUG)
+            self.printDebug("Cache reports that we could not verify object as being of class '{0}'.",LOG_LEVEL_DEBUG,cacheId)
             return False
 
     def isObjectUser(self,userDN):
@@ -819,12 +2159,14 @@ class DirectoryTools:
         Returns:
             True if the object is a member of a user, false otherwise.
         '''
-        return self.isObjectOfClass(objectDN=userDN,objectClass=self.getProperty(index.USER_CLASS))
+        return self.isObjectOfClass(objectDN=userDN,objectClass=self.settings.userClass)
 
     def isUserInGroup(self,userName,groupName,userNameIsDN=False,groupNameIsDN=False):
         '''
         Checks to see if a user is in the specified group. Pre-configured alias of isObjectInGroup()
         
+        If the MEMBERSHIP_GRAPH property is set, the membership graph is checked instead of the server. Only resolving a user name to a DN (or a DN to a UID) may still need a search, and that is cached.
+        
         Args:
             userName: The name of the user to be checked.
             groupName: The name of the group that we are checking in.
@@ -835,7 +2177,13 @@ class DirectoryTools:
             True if the user is in the group, False if they are not.
             
         '''
-        return self.isObjectInGroup(objectName=userName,groupName=groupName,objectNameIsDN=userNameIsDN,groupNameIsDN=groupNameIsDN,objectIdentifier=self.getProperty(index.USER_UID_ATTRIBUTE),objectClass=self.getProperty(index.USER_CLASS),objectBase=self.getUserBaseDN())
+        membershipGraph = self.getMembershipGraph()
+        if membershipGraph:
+            groupId = self.getGraphGroupId(membershipGraph,groupName,groupNameIsDN)
+            memberId = self.getGraphMemberId(membershipGraph,userName,userNameIsDN)
+            return groupId is not None and memberId is not None and membershipGraph.isMember(memberId,groupId)
+        
+        return self.isObjectInGroup(objectName=userName,groupName=groupName,objectNameIsDN=userNameIsDN,groupNameIsDN=groupNameIsDN,objectIdentifier=self.settings.userUidAttribute,objectClass=self.settings.userClass,objectBase=self.getUserBaseDN())
     
     def makeSpaces(self,spaceCount=0):
         '''
@@ -855,27 +2203,30 @@ class DirectoryTools:
             i = i + 1 
         return returnValue
 
-    def printDebug(self,message,secrecyLevel=100):
+    def printDebug(self,message,secrecyLevel=100,*args):
         '''
         Prints a debug message.
         
-        The message will only be printed if the debug level is equal to or greater than the clearance level.
+        The message will only be printed if the debug level is equal to or greater than the clearance level. The level is read from self.logLevel, which is kept in step with the LOG_LEVEL property by updateLogLevel().
         
         Args:
-            message: The message to print.
+            message: The message to print. If args are given, this is a format string that is only formatted if the message is printed.
             secrecyLevel: The authorization required to print. The LOG_LEVEL property must be equal to or greater than this secrecy level to print the message.
+            args: Values to format into the message with str.format().
             
         Returns:
             True if the message was sent, False otherwise.
         '''
         
-        logLevel = self.getProperty(index.LOG_LEVEL,printDebugMessage=False)
-        if logLevel != LOG_LEVEL_NONE and logLevel >= int(secrecyLevel):
-            self.logger.log(secrecyLevel,message)
-            return True
-        return False
+        logLevel = self.logLevel
+        if logLevel == LOG_LEVEL_NONE or logLevel < secrecyLevel:
+            return False
+        if args:
+            message = message.format(*args)
+        self.logger.log(secrecyLevel,message)
+        return True
     
-    def query(self,query='',attributes=None,base=None):
+    def query(self,query='',attributes=None,base=None,scope=ldap.SCOPE_SUBTREE):
         '''
         Executes an LDAP query.
         
@@ -883,26 +2234,63 @@ class DirectoryTools:
             query: the query string.
             attributes: A list of attributes that we wish to fetch.
             base: The distinguished name to base our search in.
+            scope: The scope of the search. Use ldap.SCOPE_BASE to read a single object.
+        
+        If the COALESCE_QUERIES property is set, a search that is identical to one that another thread is already running is not sent again. The caller waits for the running search and gets a copy of its results. This keeps a burst of requests for the same uncached name or group from all searching for it at once.
             
         Returns:
             The list of results. References are omitted.
         '''
-        handle = self.getProxyHandle()
-        
         if not base:
-            base = self.getProperty(index.BASE_DN)
-
+            base = self.settings.baseDN
+        
+        if not self.settings.coalesceQueries:
+            return self.runQuery(query,attributes,base,scope)
+        
+        if attributes is not None:
+            attributes = list(attributes)
+            key = (query,tuple(attributes),base,scope)
+        else:
+            key = (query,None,base,scope)
+        results,shared = self.queryFlight.do(key,self.runQuery,query,attributes,base,scope)
+        if shared:
+            self.printDebug("Shared the results of an identical search for '{0}' that was already running.",LOG_LEVEL_DEBUG,query)
+            # Callers are free to change the list that they get.
+            return list(results)
+        return results
+    
+    def runQuery(self,query,attributes,base,scope):
+        '''
+        Send a search to the server through the proxy pool. Used by query().
+        
+        Args:
+            query: the query string.
+            attributes: A list of attributes that we wish to fetch.
+            base: The distinguished name to base our search in.
+            scope: The scope of the search.
+            
+        Returns:
+            The list of results. References are omitted.
+        '''
         returnList = []
 
         self.printDebug("Executing LDAP search.",LOG_LEVEL_DEBUG)
-        self.printDebug("    Filter: {0}".format(str(query)),LOG_LEVEL_DEBUG)
-        self.printDebug("    Base: {0}".format(str(base)),LOG_LEVEL_DEBUG)
+        self.printDebug("    Filter: {0}",LOG_LEVEL_DEBUG,str(query))
+        self.printDebug("    Base: {0}",LOG_LEVEL_DEBUG,str(base))
         
-        try:        
-            results = handle.search_s(base,ldap.SCOPE_SUBTREE,query,attributes)
+        proxyPool = self.getProxyPool()
+        try:
+            try:
+                results = self.sendSearch(proxyPool,query,attributes,base,scope)
+            except ldap.SERVER_DOWN:
+                # The pooled connection was dropped by the server. It has been discarded, so try once more on a fresh connection.
+                self.printDebug("Pooled connection was lost. Retrying search on a new connection.",LOG_LEVEL_WARNING)
+                results = self.sendSearch(proxyPool,query,attributes,base,scope)
+        except self.CONNECTION_EXCEPTIONS:
+            raise
         except Exception, e:
             # A bad query becomes a much more important thing to log.
-            self.printDebug("BAD QUERY: {0}".format(str(query)),LOG_LEVEL_CRITICAL)
+            self.printDebug("BAD QUERY: {0}",LOG_LEVEL_CRITICAL,str(query))
             raise exceptions.BadQueryException(originalException=e)
         
         for result in results:
@@ -913,7 +2301,275 @@ class DirectoryTools:
                 returnList.append(result)
         return returnList
     
+    def sendSearch(self,proxyPool,query,attributes,base,scope):
+        '''
+        Send a search on a pooled connection and wait for all of its results. Used by runQuery().
+        
+        Args:
+            proxyPool: The pool to take connections from.
+            query: the query string.
+            attributes: A list of attributes that we wish to fetch.
+            base: The distinguished name to base our search in.
+            scope: The scope of the search.
+            
+        Returns:
+            The results of the search, including references.
+        '''
+        hedgingPolicy = self.getHedgingPolicy()
+        started = time()
+        try:
+            if hedgingPolicy:
+                results = self.sendHedgedSearch(proxyPool,hedgingPolicy,query,attributes,base,scope)
+            else:
+                with proxyPool.connection() as handle:
+                    results = handle.search_s(base,scope,query,attributes)
+        except:
+            self.recordOperation('search',started)
+            raise
+        self.recordOperation('search',started,len(results))
+        return results
+    
+    def sendHedgedSearch(self,proxyPool,hedgingPolicy,query,attributes,base,scope):
+        '''
+        Send a search, and send it to a second server as well if the first one is slow to answer. The first answer wins, and the other search is abandoned.
+        
+        Args:
+            proxyPool: The pool to take connections from.
+            hedgingPolicy: The DirectoryToolsPool.HedgingPolicy that decides whether and when to hedge.
+            query: the query string.
+            attributes: A list of attributes that we wish to fetch.
+            base: The distinguished name to base our search in.
+            scope: The scope of the search.
+            
+        Returns:
+            The results of the search, including references.
+        '''
+        delay = hedgingPolicy.nextDelay()
+        
+        # Searches in flight, as [handle,msgid,sent] lists.
+        requests = []
+        
+        def send(exclude):
+            handle = proxyPool.checkout(exclude=exclude)
+            request = [handle,None,time()]
+            try:
+                request[1] = handle.search_ext(base,scope,query,attributes)
+            except ldap.SERVER_DOWN:
+                proxyPool.checkin(handle,failed=True)
+                raise
+            except:
+                proxyPool.checkin(handle)
+                raise
+            requests.append(request)
+        
+        def collect(request,timeout):
+            # Returns the results, or None if the server has not answered yet.
+            try:
+                resultType,results,msgid,controls = request[0].result3(request[1],all=1,timeout=timeout)
+            except ldap.TIMEOUT:
+                return None
+            except ldap.SERVER_DOWN:
+                requests.remove(request)
+                proxyPool.checkin(request[0],failed=True)
+                if not requests:
+                    raise
+                return None
+            except:
+                # Any other error is the server's answer.
+                requests.remove(request)
+                proxyPool.checkin(request[0])
+                raise
+            if resultType is None:
+                return None
+            requests.remove(request)
+            proxyPool.checkin(request[0])
+            hedgingPolicy.record(time() - request[2])
+            return results
+        
+        try:
+            send(())
+            primary = requests[0]
+            if delay is None:
+                return collect(primary,None)
+            
+            results = collect(primary,delay)
+            if results is not None:
+                return results
+            
+            if hedgingPolicy.spend():
+                try:
+                    send([proxyPool.getServer(primary[0])])
+                    self.printDebug("No answer to '{0}' after {1:.3f} seconds. Sent it to a second server.",LOG_LEVEL_DEBUG,query,delay)
+                except (ldap.LDAPError,) + self.CONNECTION_EXCEPTIONS:
+                    # No second server to be had. Keep waiting for the first one.
+                    pass
+            
+            pollInterval = self.getProperty(index.ASYNC_POLL_INTERVAL)
+            while len(requests) > 1:
+                for request in list(requests):
+                    results = collect(request,0)
+                    if results is not None:
+                        if request is not primary:
+                            hedgingPolicy.recordWin()
+                        return results
+                sleep(pollInterval)
+            return collect(requests[0],None)
+        finally:
+            # Abandon the search that lost the race.
+            for handle,msgid,sent in requests:
+                try:
+                    handle.abandon_ext(msgid)
+                except ldap.LDAPError:
+                    pass
+                proxyPool.checkin(handle)
+    
+    def queryIter(self,query='',attributes=None,base=None,pageSize=None,scope=ldap.SCOPE_SUBTREE):
+        '''
+        Executes an LDAP query, fetching results one page at a time using the simple paged results control (RFC 2696).
+        
+        Unlike query(), results are not collected into a list. Only one page of results is held in memory at a time, so this method is suited to enumerating very large result sets that would otherwise run into the server's size limit. Attributes that the server returns in ranges are read in full (see completeRangedAttributes()).
+        
+        A pooled connection is held until the generator is exhausted or closed, since the server ties the paging cookie to the connection that the search was sent on. Callers that stop iterating early should call close() on the generator. Ranged attributes are read on the same connection, one page at a time, so an iterator never needs a second connection from the pool.
+        
+        Args:
+            query: the query string.
+            attributes: A list of attributes that we wish to fetch.
+            base: The distinguished name to base our search in.
+            pageSize: The number of entries to request per page. Defaults to the value of the PAGE_SIZE property.
+            scope: The scope of the search.
+            
+        Returns:
+            A generator of (dn,attributes) tuples. References are omitted.
+        '''
+        if not base:
+            base = self.settings.baseDN
+        if not pageSize:
+            pageSize = self.settings.pageSize
+        
+        self.printDebug("Executing paged LDAP search.",LOG_LEVEL_DEBUG)
+        self.printDebug("    Filter: {0}",LOG_LEVEL_DEBUG,str(query))
+        self.printDebug("    Base: {0}",LOG_LEVEL_DEBUG,str(base))
+        self.printDebug("    Page Size: {0}",LOG_LEVEL_DEBUG,pageSize)
+        
+        pageControl = SimplePagedResultsControl(True,size=pageSize,cookie='')
+        
+        with self.getProxyPool().connection() as handle:
+            while True:
+                started = time()
+                try:
+                    msgid = handle.search_ext(base,scope,query,attributes,serverctrls=[pageControl])
+                    resultType,results,resultId,serverControls = handle.result3(msgid)
+                except ldap.SERVER_DOWN:
+                    # Let the pool discard the connection.
+                    self.recordOperation('search',started)
+                    raise
+                except Exception, e:
+                    # A bad query becomes a much more important thing to log.
+                    self.recordOperation('search',started)
+                    self.printDebug("BAD QUERY: {0}",LOG_LEVEL_CRITICAL,str(query))
+                    raise exceptions.BadQueryException(originalException=e)
+                self.recordOperation('search',started,len(results))
+                
+                # Some LDAP servers include reference information in place of the attributes that we want to search for.
+                # If this is the case, the distinguished name of the 'row' will be set to None.
+                page = [(dn,self.completeRangedAttributes(dn,attrs,handle)) for dn,attrs in results if dn]
+                for dn,attrs in page:
+                    yield dn,attrs
+                
+                # Find the paging control in the server's response to get the cookie for the next page.
+                pageControl.cookie = ''
+                for control in serverControls:
+                    if control.controlType == SimplePagedResultsControl.controlType:
+                        pageControl.cookie = control.cookie
+                
+                if not pageControl.cookie:
+                    # No cookie means that this was the last page.
+                    break
 
+    def queryInChain(self,query,attributes,base=None,scope=ldap.SCOPE_SUBTREE):
+        '''
+        Executes an LDAP query that uses the in-chain matching rule.
+        
+        If the server rejects the matching rule, this is remembered so that later calls go straight to walking nested groups one search at a time.
+        
+        Args:
+            query: the query string.
+            attributes: A list of attributes that we wish to fetch.
+            base: The distinguished name to base our search in.
+            scope: The scope of the search. Subtree searches are paged.
+        
+        Returns:
+            The list of results, or None if the server rejected the matching rule.
+        '''
+        try:
+            if scope == ldap.SCOPE_BASE:
+                return self.query(query,attributes,base,scope=scope)
+            return list(self.queryIter(query,attributes,base,scope=scope))
+        except exceptions.BadQueryException, e:
+            if isinstance(e.originalException,ldap.NO_SUCH_OBJECT):
+                # The base object does not exist, so nothing can match.
+                return []
+            if not isinstance(e.originalException,self.IN_CHAIN_REJECTIONS):
+                raise
+            self.printDebug("Server rejected the in-chain matching rule. Falling back to the recursive nested group engine.",LOG_LEVEL_WARNING)
+            self.inChainRejected = True
+            return None
+    
+    def readRanges(self,handle,dn,attribute,ranges):
+        '''
+        Send a window of ranged reads on one connection, and collect the answers. Used by iterRangedValues().
+        
+        Args:
+            handle: The connection to read on.
+            dn: The distinguished name of the object.
+            attribute: The attribute name, without any range option.
+            ranges: List of (low,high) tuples of the ranges to read.
+            
+        Returns:
+            A list with the results of each read, or the ldap.LDAPError that it failed with, in the order of ranges.
+        '''
+        responses = []
+        started = time()
+        pending = [handle.search_ext(dn,ldap.SCOPE_BASE,'(objectClass=*)',['{0};range={1}-{2}'.format(attribute,low,high)]) for low,high in ranges]
+        for msgid in pending:
+            # Every response is collected, so that none are left behind on the connection.
+            try:
+                resultType,results,resultId,serverControls = handle.result3(msgid)
+                self.recordOperation('search',started,len(results))
+                responses.append(results)
+            except ldap.SERVER_DOWN:
+                raise
+            except ldap.LDAPError, e:
+                # Only an error if the range turns out to be needed. Reads past the last range may fail.
+                self.recordOperation('search',started)
+                responses.append(e)
+        return responses
+    
+    def recordOperation(self,operation,started,entries=0):
+        '''
+        Pass the measurements of a finished LDAP operation to the metrics hook, if there is one.
+        
+        Args:
+            operation: The type of operation: 'search' or 'bind'.
+            started: UNIX time at which the operation was sent.
+            entries: The number of entries that a search returned.
+        '''
+        metricsHook = self.metricsHook
+        if metricsHook:
+            metricsHook.operation(operation,self.getCallerMethod(),time() - started,entries)
+    
+    def recordPoolWait(self,poolName,elapsed):
+        '''
+        Pass the duration of a pool checkout to the metrics hook, if there is one.
+        
+        Args:
+            poolName: The name of the pool: 'proxy' or 'auth'.
+            elapsed: The number of seconds that the checkout took.
+        '''
+        metricsHook = self.metricsHook
+        if metricsHook:
+            metricsHook.poolWait(poolName,elapsed)
+    
     def resolveGroupDN(self,groupName,uidAttribute=False):
         '''
         Resolve a group DN based on the given index.
@@ -931,11 +2587,19 @@ class DirectoryTools:
         cacheCategory,cacheId = cacheTuple
         
         if not uidAttribute:
-            uidAttribute = self.getProperty(index.GROUP_UID_ATTRIBUTE)
-        if groupName in self.cache[cacheCategory][cacheId]:
-            self.printDebug("Using cached DN for '{0}'. Value: {1}".format(groupName,self.cache[cacheCategory][cacheId][groupName]),LOG_LEVEL_DEBUG)
-            return self.cache[cacheCategory][cacheId][groupName]
-        returnValue = self.resolveObjectDN(self.getProperty(index.GROUP_CLASS),uidAttribute,groupName,self.getGroupBaseDN())
+            uidAttribute = self.settings.groupUidAttribute
+        found,cachedValue = self.cache[cacheCategory][cacheId].lookup(groupName)
+        if found:
+            self.printDebug("Using cached DN for '{0}'. Value: {1}",LOG_LEVEL_DEBUG,groupName,cachedValue)
+            return cachedValue
+        if self.isCachedMiss(cacheCategory,groupName):
+            self.printDebug("Group '{0}' recently could not be found. Not searching again.",LOG_LEVEL_DEBUG,groupName)
+            return None
+        returnValue = self.resolveObjectDN(self.settings.groupClass,uidAttribute,groupName,self.getGroupBaseDN())
+        
+        if not returnValue:
+            self.cacheMiss(cacheCategory,groupName)
+            return returnValue
     
         # Add to the list of resolved groups.
         self.cache[cacheCategory][cacheId][groupName] = returnValue
@@ -965,17 +2629,27 @@ class DirectoryTools:
         
         if not uidAttribute:
             # No override provided.
-            uidAttribute = self.getProperty(index.GROUP_UID_ATTRIBUTE)
+            uidAttribute = self.settings.groupUidAttribute
         
-        query = "(&(objectClass={0})({1}=*))".format(self.getProperty(index.GROUP_CLASS),self.getProperty(index.GROUP_UID_ATTRIBUTE))
-        self.printDebug("Query for value of '{0}' for DN of '{1}': {2}".format(uidAttribute,groupDN,query), LOG_LEVEL_DEBUG)
+        query = "(&(objectClass={0})({1}=*))".format(self.settings.groupClass,self.settings.groupUidAttribute)
+        self.printDebug("Query for value of '{0}' for DN of '{1}': {2}",LOG_LEVEL_DEBUG,uidAttribute,groupDN,query)
 
         # Checking cached values.
-        if groupDN in self.cache[cacheCategory][cacheId]: 
-            self.printDebug("Using cached UID for '{0}'. Value: {1}".format(groupDN,self.cache[cacheCategory][cacheId][groupDN]),LOG_LEVEL_DEBUG)
-            return self.cache[cacheCategory][cacheId][groupDN]
+        found,cachedValue = self.cache[cacheCategory][cacheId].lookup(groupDN)
+        if found:
+            self.printDebug("Using cached UID for '{0}'. Value: {1}",LOG_LEVEL_DEBUG,groupDN,cachedValue)
+            return cachedValue
+        if self.isCachedMiss(cacheCategory,groupDN):
+            self.printDebug("Group '{0}' recently could not be resolved. Not searching again.",LOG_LEVEL_DEBUG,groupDN)
+            return False
         
-        result = self.query(query,[uidAttribute],groupDN)
+        try:
+            result = self.query(query,[uidAttribute],groupDN,scope=ldap.SCOPE_BASE)
+        except exceptions.BadQueryException, e:
+            if not isinstance(e.originalException,ldap.NO_SUCH_OBJECT):
+                raise
+            # The DN does not exist. Remembered as a miss like any other.
+            result = []
         
         try:
             for i in result:
@@ -992,10 +2666,11 @@ class DirectoryTools:
                     self.cache[cacheCategory][cacheId][returnValue] = groupDN
                 return returnValue
         except:
-            # Unable to find the group ID. Cache this failure.
-            
-            self.cache[cacheCategory][cacheId][groupDN] = None
-            return False
+            pass
+        
+        # Unable to find the group ID. Cache this failure.
+        self.cacheMiss(cacheCategory,groupDN)
+        return False
     
     def resolveObjectDN(self,objectClass,indexAttribute,objectName,base=None):
         '''
@@ -1010,9 +2685,9 @@ class DirectoryTools:
             A string with the object's distinguished name if they have been resolved, False otherwise.
         '''
         if not base:
-            base=self.getProperty(index.BASE_DN)
+            base=self.settings.baseDN
         query = '(&(objectClass={0})({1}={2}))'.format(objectClass,indexAttribute,objectName)
-        self.printDebug("Resolving the DN of an item with the objectClass '{0}': {1}".format(objectClass,query),LOG_LEVEL_DEBUG)
+        self.printDebug("Resolving the DN of an item with the objectClass '{0}': {1}",LOG_LEVEL_DEBUG,objectClass,query)
         
         result = self.query(query,['distinguishedName'],base=base)
         if len(result) > 0:
@@ -1021,6 +2696,78 @@ class DirectoryTools:
                 return dn
             return False
     
+    def resolveObjectDNs(self,objectClass,indexAttribute,objectNames,base=None,cacheCategory=None):
+        '''
+        Resolve the distinguished names of many objects at once.
+        
+        Names are packed into OR filters of up to BATCH_SIZE names each, so that resolving N objects takes N/BATCH_SIZE searches instead of N.
+        
+        Args:
+            objectClass: the objectClass that we want to resolve for. If set to None, objects of any class are resolved.
+            indexAttribute: the attribute that the object names can be found in.
+            objectNames: List of names that we are trying to resolve.
+            base: the search base.
+            cacheCategory: If provided, results are read from and saved to this cache category (for example, 'resolvedUsers').
+            
+        Returns:
+            A dictionary of distinguished names indexed by the given object names. Objects that could not be resolved have a value of None.
+        '''
+        if not base:
+            base=self.settings.baseDN
+        
+        returnValue = {}
+        unresolved = []
+        
+        if cacheCategory:
+            cacheCategory,cacheId = self.initCache(cacheCategory)
+        
+        for objectName in objectNames:
+            found,cachedValue = False,None
+            if cacheCategory:
+                found,cachedValue = self.cache[cacheCategory][cacheId].lookup(objectName)
+            if found:
+                returnValue[objectName] = cachedValue
+            elif cacheCategory and self.isCachedMiss(cacheCategory,objectName):
+                returnValue[objectName] = None
+            else:
+                unresolved.append(objectName)
+        
+        batchSize = max(int(self.settings.batchSize),1)
+        for start in range(0,len(unresolved),batchSize):
+            batch = unresolved[start:start+batchSize]
+            
+            # Attribute values are usually matched case-insensitively, so match results back to our names the same way.
+            batchNames = {}
+            for objectName in batch:
+                batchNames[objectName.lower()] = objectName
+                returnValue[objectName] = None
+            
+            nameFilter = ''.join(['({0}={1})'.format(indexAttribute,escape_filter_chars(objectName)) for objectName in batch])
+            if objectClass:
+                query = '(&(objectClass={0})(|{1}))'.format(objectClass,nameFilter)
+            else:
+                query = '(|{0})'.format(nameFilter)
+            self.printDebug("Resolving the DNs of {0} items with the objectClass '{1}'.",LOG_LEVEL_DEBUG,len(batch),objectClass)
+            
+            for dn,attributes in self.query(query,[indexAttribute],base=base):
+                for value in attributes.get(indexAttribute,[]):
+                    objectName = batchNames.get(value.lower())
+                    if objectName is not None and not returnValue[objectName]:
+                        returnValue[objectName] = dn
+            
+            if cacheCategory:
+                for objectName in batch:
+                    objectDN = returnValue[objectName]
+                    if not objectDN:
+                        self.cacheMiss(cacheCategory,objectName)
+                        continue
+                    self.cache[cacheCategory][cacheId][objectName] = objectDN
+                    if objectDN not in self.cache[cacheCategory][cacheId]:
+                        # May as well cache the reverse of this lookup as well.
+                        self.cache[cacheCategory][cacheId][objectDN] = objectName
+        
+        return returnValue
+    
     def resolveObjectUID(self,objectDN,objectIdentifier):
         '''
         Get the UID of an object. A pre-configured alias of getSingleAttribute()
@@ -1031,6 +2778,54 @@ class DirectoryTools:
         '''
         return self.getSingleAttribute(dn=objectDN,attribute=objectIdentifier)
     
+    def resolveObjectUIDs(self,objectDNs,objectIdentifier,cacheCategory=None):
+        '''
+        Get the UIDs of many objects at once. Reads are pipelined through getMultipleObjectAttributes().
+        
+        Args:
+            objectDNs: List of distinguished names to resolve.
+            objectIdentifier: the single-valued attribute representing an object's unique identifier.
+            cacheCategory: If provided, results are read from and saved to this cache category (for example, 'resolvedUsers').
+            
+        Returns:
+            A dictionary of UIDs indexed by the given distinguished names. Objects that could not be resolved have a value of None.
+        '''
+        returnValue = {}
+        unresolved = []
+        
+        if cacheCategory:
+            cacheCategory,cacheId = self.initCache(cacheCategory)
+        
+        for objectDN in objectDNs:
+            found,cachedValue = False,None
+            if cacheCategory:
+                found,cachedValue = self.cache[cacheCategory][cacheId].lookup(objectDN)
+            if found:
+                returnValue[objectDN] = cachedValue
+            elif cacheCategory and self.isCachedMiss(cacheCategory,objectDN):
+                returnValue[objectDN] = None
+            else:
+                unresolved.append(objectDN)
+        
+        results = self.getMultipleObjectAttributes(unresolved,[objectIdentifier])
+        for objectDN in unresolved:
+            try:
+                uid = results[objectDN][objectIdentifier][0]
+            except (KeyError,IndexError):
+                uid = None
+            returnValue[objectDN] = uid
+            
+            if cacheCategory:
+                if not uid:
+                    self.cacheMiss(cacheCategory,objectDN)
+                    continue
+                self.cache[cacheCategory][cacheId][objectDN] = uid
+                if uid not in self.cache[cacheCategory][cacheId]:
+                    # May as well cache the reverse of this lookup as well.
+                    self.cache[cacheCategory][cacheId][uid] = objectDN
+        
+        return returnValue
+    
     def resolveUserDN(self,userName,uidAttribute=False):
         '''
         Resolve a user DN based on the given index.
@@ -1048,11 +2843,19 @@ class DirectoryTools:
         cacheCategory,cacheId = cacheTuple
         
         if not uidAttribute:
-            uidAttribute = self.getProperty(index.USER_UID_ATTRIBUTE)
-        if userName in self.cache[cacheCategory][cacheId]:
-            self.printDebug("Using cached DN for '{0}'. Value: {1}".format(userName,self.cache[cacheCategory][cacheId][userName]),LOG_LEVEL_DEBUG)
-            return self.cache[cacheCategory][cacheId][userName]
-        returnValue = self.resolveObjectDN(self.getProperty(index.USER_CLASS),uidAttribute,userName,self.getUserBaseDN())
+            uidAttribute = self.settings.userUidAttribute
+        found,cachedValue = self.cache[cacheCategory][cacheId].lookup(userName)
+        if found:
+            self.printDebug("Using cached DN for '{0}'. Value: {1}",LOG_LEVEL_DEBUG,userName,cachedValue)
+            return cachedValue
+        if self.isCachedMiss(cacheCategory,userName):
+            self.printDebug("User '{0}' recently could not be found. Not searching again.",LOG_LEVEL_DEBUG,userName)
+            return None
+        returnValue = self.resolveObjectDN(self.settings.userClass,uidAttribute,userName,self.getUserBaseDN())
+        
+        if not returnValue:
+            self.cacheMiss(cacheCategory,userName)
+            return returnValue
         
         self.cache[cacheCategory][cacheId][userName] = returnValue
         
@@ -1079,17 +2882,27 @@ class DirectoryTools:
         
         if not uidAttribute:
             # No override provided.
-            uidAttribute = self.getProperty(index.USER_UID_ATTRIBUTE)
+            uidAttribute = self.settings.userUidAttribute
         
-        query = "(&(objectClass={0})({1}=*))".format(self.getProperty(index.USER_CLASS),self.getProperty(index.USER_UID_ATTRIBUTE))
-        self.printDebug("Query for value of '{0}' for DN of '{1}': {2}".format(uidAttribute,userDN,query), LOG_LEVEL_DEBUG)
+        query = "(&(objectClass={0})({1}=*))".format(self.settings.userClass,self.settings.userUidAttribute)
+        self.printDebug("Query for value of '{0}' for DN of '{1}': {2}",LOG_LEVEL_DEBUG,uidAttribute,userDN,query)
 
         # Checking cached values.
-        if userDN in self.cache[cacheCategory][cacheId]:
-            self.printDebug("Using cached UID for '{0}'. Value: {1}".format(userDN,self.cache[cacheCategory][cacheId][userDN]),LOG_LEVEL_DEBUG)
-            return self.cache[cacheCategory][cacheId][userDN]
+        found,cachedValue = self.cache[cacheCategory][cacheId].lookup(userDN)
+        if found:
+            self.printDebug("Using cached UID for '{0}'. Value: {1}",LOG_LEVEL_DEBUG,userDN,cachedValue)
+            return cachedValue
+        if self.isCachedMiss(cacheCategory,userDN):
+            self.printDebug("User '{0}' recently could not be resolved. Not searching again.",LOG_LEVEL_DEBUG,userDN)
+            return None
         
-        result = self.query(query,[uidAttribute],userDN)
+        try:
+            result = self.query(query,[uidAttribute],userDN,scope=ldap.SCOPE_BASE)
+        except exceptions.BadQueryException, e:
+            if not isinstance(e.originalException,ldap.NO_SUCH_OBJECT):
+                raise
+            # The DN does not exist. Remembered as a miss like any other.
+            result = []
         
         try:
             for i in result:
@@ -1107,9 +2920,82 @@ class DirectoryTools:
                 return returnValue
         except:
             # Unable to find the user ID.
-            self.cache[cacheCategory][cacheId][userDN] = None
             traceback.print_exc(file=sys.stdout)
-            return None
+        
+        self.cacheMiss(cacheCategory,userDN)
+        return None
+    
+    def resolveUserDNs(self,userNames,uidAttribute=False):
+        '''
+        Resolve the distinguished names of many users at once. Batched counterpart of resolveUserDN(), sharing its cache.
+        
+        Args:
+            userNames: List of usernames that we are trying to resolve.
+            uidAttribute: The attribute that the usernames can be found in.
+        
+        Returns:
+            A dictionary of distinguished names indexed by username. Users that could not be resolved have a value of None.
+        '''
+        if not uidAttribute:
+            uidAttribute = self.settings.userUidAttribute
+        return self.resolveObjectDNs(self.settings.userClass,uidAttribute,userNames,self.getUserBaseDN(),cacheCategory='resolvedUsers')
+
+    def resolveUserUIDs(self,userDNs,uidAttribute=False):
+        '''
+        Resolve the names of many users at once. Batched counterpart of resolveUserUID(), sharing its cache.
+        
+        Args:
+            userDNs: List of distinguished names that we want to find the UID attribute for.
+            uidAttribute: Attribute that we are searching for. Defaults to the value of USER_UID_ATTRIBUTE.
+        
+        Returns:
+            A dictionary of UIDs indexed by distinguished name. Users that could not be resolved have a value of None.
+        '''
+        if not uidAttribute:
+            uidAttribute = self.settings.userUidAttribute
+        return self.resolveObjectUIDs(userDNs,uidAttribute,cacheCategory='resolvedUsers')
+    
+    def propertiesChanged(self,keys):
+        '''
+        Refresh everything that is derived from properties after some of them have changed.
+        
+        Args:
+            keys: The names of the properties that changed.
+            
+        Returns:
+            None
+        '''
+        keys = set(keys)
+        
+        if settings.Settings.KEYS.intersection(keys):
+            self.updateSettings()
+        if index.LOG_LEVEL in keys:
+            self.updateLogLevel()
+        if keys.intersection(self.CONNECTION_PROPERTIES):
+            # Pooled connections were made with the old values.
+            self.closeConnections()
+        if keys.intersection(self.CACHE_PROPERTIES):
+            self.configureCache()
+        if keys.intersection(self.GRAPH_PROPERTIES):
+            self.membershipGraph = None
+        if keys.intersection(self.SYNC_PROPERTIES):
+            # The high-water mark belongs to the old server or attribute.
+            with self.syncLock:
+                self.syncMark = None
+                self.syncSeen = set()
+        if index.SYNC_INTERVAL in keys:
+            self.startSync()
+    
+    def setMetricsHook(self,hook):
+        '''
+        Install a hook that receives measurements of LDAP operations and pool checkouts. Cache counters can be read at any time through getCacheStatistics().
+        
+        Args:
+            hook: A DirectoryToolsMetrics.MetricsHook, such as a DirectoryToolsMetrics.PrometheusExporter. None removes the current hook.
+        '''
+        if hook:
+            hook.attach(self)
+        self.metricsHook = hook
     
     def setProperty(self,key,value):
         '''
@@ -1124,12 +3010,203 @@ class DirectoryTools:
         '''
         
         if key in self.properties:
-            self.printDebug("Setting the '{0}' property to the value of '{1}' (Old value: '{2}')".format(key,value,self.getProperty(key)),LOG_LEVEL_DEBUG)
+            self.printDebug("Setting the '{0}' property to the value of '{1}' (Old value: '{2}')",LOG_LEVEL_DEBUG,key,value,self.getProperty(key))
         else:
-            self.printDebug("Setting the '{0}' property to the value of '{1}'".format(key,value),LOG_LEVEL_DEBUG)
+            self.printDebug("Setting the '{0}' property to the value of '{1}'",LOG_LEVEL_DEBUG,key,value)
         
         self.properties[key] = value
         
+        self.propertiesChanged([key])
+    
+    def startSync(self,interval=None):
+        '''
+        Start a background thread that calls syncCaches() right away, and then every interval seconds. A sync thread that is already running is stopped first.
+        
+        Args:
+            interval: The number of seconds between syncs. Defaults to the value of the SYNC_INTERVAL property. If this is 0, no thread is started.
+            
+        Returns:
+            None
+        '''
+        self.stopSync()
+        if interval is None:
+            interval = self.getProperty(index.SYNC_INTERVAL)
+        if not interval:
+            return
+        
+        stopEvent = threading.Event()
+        thread = threading.Thread(target=self.runSync,args=(interval,stopEvent),name='DirectoryTools cache sync')
+        thread.daemon = True
+        self.syncThread = (thread,stopEvent)
+        thread.start()
+    
+    def stopSync(self):
+        '''
+        Stop the background sync thread started by startSync(), if it is running.
+        
+        Returns:
+            None
+        '''
+        if not self.syncThread:
+            return
+        thread,stopEvent = self.syncThread
+        self.syncThread = None
+        stopEvent.set()
+        if thread is not threading.current_thread():
+            thread.join()
+    
+    def runSync(self,interval,stopEvent):
+        '''
+        Body of the background sync thread.
+        
+        Args:
+            interval: The number of seconds between syncs.
+            stopEvent: threading.Event that is set to stop the thread.
+        '''
+        while not stopEvent.is_set():
+            try:
+                self.syncCaches()
+            except Exception, e:
+                # Try again on the next round. Entries still expire by their TTL in the meantime.
+                self.printDebug("Cache sync failed: {0}",LOG_LEVEL_ERROR,e)
+            stopEvent.wait(interval)
+    
+    def syncCaches(self):
+        '''
+        Bring the caches up to date by reading only the directory entries that changed since the last sync.
+        
+        Entries with a SYNC_ATTRIBUTE value at or above the high-water mark of the last sync are read in one paged search. Cached DNs, names, class checks and SIDs that refer to a changed entry are removed, along with remembered failures to resolve its names (see SYNC_CACHE_CATEGORIES). Cached getGroupMembers() results are flushed whenever anything changed, since a change to one group can affect the members of every group that it is nested in. Expansions that were running during the flush don't cache their results. Everything else stays cached, so long CACHE_TTL values can be used without serving stale memberships.
+        
+        Use 'uSNChanged' as the SYNC_ATTRIBUTE for Active Directory (the 'ad' template does this), and 'modifyTimestamp' or 'entryCSN' for other servers. Deleted entries are not returned by the search, so a deletion is only noticed through the entries that changed along with it, such as the groups that the entry was removed from. Names that pointed to a deleted entry stay cached until they expire.
+        
+        The first sync has no high-water mark to start from. It clears the caches and takes its mark from getSyncBaseline(). If a persistent cache is used, the mark is saved there as well, so that a new process carries on from the last sync of any process that shares the cache instead of clearing it.
+        
+        Returns:
+            The number of changed entries that were found.
+        '''
+        with self.syncLock:
+            attribute = self.getProperty(index.SYNC_ATTRIBUTE)
+            store = self.cache.store
+            
+            if self.syncMark is None and store:
+                found,state,expiry = store.get(self.SYNC_STATE_CATEGORY,attribute,'state')
+                if found:
+                    # The shared cache is up to date as of this mark, but our own memory may not be.
+                    self.printDebug("Continuing cache sync from shared mark '{0}'.",LOG_LEVEL_INFO,state['mark'])
+                    with self.groupMembersLock:
+                        self.groupMembersGeneration += 1
+                        self.cache.clear(keep=self.SCRATCH_CACHE_CATEGORIES)
+                    self.syncMark = state['mark']
+                    self.syncSeen = set(state['seen'])
+            
+            if self.syncMark is None:
+                self.syncMark = self.getSyncBaseline(attribute)
+                self.syncSeen = set()
+                self.printDebug("First cache sync. Clearing caches and starting from '{0}'.",LOG_LEVEL_INFO,self.syncMark)
+                self.flushCaches()
+                if store:
+                    store.set(self.SYNC_STATE_CATEGORY,attribute,'state',{'mark':self.syncMark,'seen':[]})
+                return 0
+            
+            # uSNChanged values are compared as numbers, timestamps as strings.
+            def order(value):
+                if value.isdigit():
+                    return int(value)
+                return value
+            
+            nameAttributes = []
+            for name in ['userUidAttribute','userIndexAttribute','groupUidAttribute','groupIndexAttribute']:
+                try:
+                    if getattr(self.settings,name).lower() not in nameAttributes:
+                        nameAttributes.append(getattr(self.settings,name).lower())
+                except exceptions.PropertyNotFoundException:
+                    # Not every template defines every attribute.
+                    pass
+            
+            # Entries at the mark that the last sync handled are skipped, unless the mark is a timestamp without a fraction that is recent enough for more changes to get the same value.
+            settled = self.syncMark.isdigit() or '#' in self.syncMark or self.syncMark[:14] < strftime('%Y%m%d%H%M%S',gmtime(time() - self.getProperty(index.SYNC_CLOCK_SKEW)))
+            
+            # A loaded membership graph is kept up to date with the changed groups.
+            membershipGraph = self.membershipGraph
+            searchAttributes = [attribute] + nameAttributes
+            if membershipGraph:
+                searchAttributes += ['objectClass',self.settings.memberAttribute]
+            
+            query = '({0}>={1})'.format(attribute,escape_filter_chars(self.syncMark))
+            count = 0
+            changed = set()
+            mark,seen = self.syncMark,set(self.syncSeen)
+            for dn,attributes in self.queryIter(query,searchAttributes):
+                attributes = dict([(key.lower(),values) for key,values in attributes.items()])
+                if membershipGraph and self.settings.groupClass.lower() in [v.lower() for v in attributes.get('objectclass',[])]:
+                    uid,members = self.getGraphGroupEntry(attributes)
+                    membershipGraph.addGroup(dn,uid,members)
+                
+                dn = dn.lower()
+                value = (attributes.get(attribute.lower()) or [self.syncMark])[0]
+                if settled and value == self.syncMark and dn in self.syncSeen:
+                    # Handled by the last sync.
+                    continue
+                
+                count += 1
+                changed.add(dn)
+                for name in nameAttributes:
+                    changed.update([v.lower() for v in attributes.get(name,[])])
+                
+                if order(value) > order(mark):
+                    mark,seen = value,set([dn])
+                elif value == mark:
+                    seen.add(dn)
+            
+            if changed:
+                def matches(key,value):
+                    if isinstance(key,basestring) and key.lower() in changed:
+                        return True
+                    return isinstance(value,basestring) and value.lower() in changed
+                removed = self.cache.removeMatching(self.SYNC_CACHE_CATEGORIES,matches)
+                self.flushCaches('groupMembers')
+                self.printDebug("Cache sync found changes since '{0}'. Removed {1} cached items.",LOG_LEVEL_INFO,self.syncMark,removed)
+            
+            self.syncMark,self.syncSeen = mark,seen
+            if store:
+                store.set(self.SYNC_STATE_CATEGORY,attribute,'state',{'mark':mark,'seen':sorted(seen)})
+            return count
+    
+    def useBreadthFirst(self):
+        '''
+        Check whether group lookups should use the breadth-first engine.
+        
+        Returns:
+            True if the NESTED_ENGINE property is set to NESTED_ENGINE_BREADTH_FIRST and members are stored as DNs.
+        '''
+        return self.settings.nestedEngine == NESTED_ENGINE_BREADTH_FIRST and self.settings.memberAttributeIsDN
+    
+    def useInChain(self):
+        '''
+        Check whether nested group lookups should use the in-chain matching rule.
+        
+        Returns:
+            True if the NESTED_ENGINE property is set to NESTED_ENGINE_IN_CHAIN, nested groups are enabled, members are stored as DNs, and the server has not rejected the rule.
+        '''
+        return self.settings.nestedEngine == NESTED_ENGINE_IN_CHAIN and self.settings.nestedGroups and self.settings.memberAttributeIsDN and not self.inChainRejected
+    
+    def updateLogLevel(self):
+        '''
+        Read the LOG_LEVEL property into self.logLevel, so that printDebug() does not need to look it up on every call.
+        
+        Returns:
+            None
+        '''
+        self.logLevel = int(self.getProperty(index.LOG_LEVEL,printDebugMessage=False))
+    
+    def updateSettings(self):
+        '''
+        Rebuild self.settings from the current properties.
+        
+        Returns:
+            None
+        '''
+        self.settings = settings.Settings(self.properties,self.defaultProperties)
     
     def updateProperties(self,newProperties):
         '''
@@ -1142,6 +3219,7 @@ class DirectoryTools:
             None
         '''
         self.properties.update(newProperties)
+        self.propertiesChanged(newProperties.keys())
 
 class Utilities:
     '''
@@ -0,0 +1,1151 @@
+#!/usr/bin/python
+
+import select,sys,ldap
+from collections import deque
+from functools import wraps
+from time import sleep,time
+from ldap.controls import SimplePagedResultsControl
+from ldap.filter import escape_filter_chars
+
+import DirectoryTools as directoryTools
+import DirectoryToolsIndexes as index
+import DirectoryToolsExceptions as exceptions
+
+from DirectoryTools import LOG_LEVEL_DEBUG,LOG_LEVEL_INFO,LOG_LEVEL_WARNING,LOG_LEVEL_ERROR,LOG_LEVEL_CRITICAL,MATCHING_RULE_IN_CHAIN
+
+class Return(Exception):
+    '''
+    Raised by a coroutine to return a value, since a generator cannot return a value in Python 2.
+    '''
+
+    def __init__(self,value=None):
+        '''
+        Args:
+            value: The return value of the coroutine.
+        '''
+        Exception.__init__(self)
+        ## The return value of the coroutine.
+        self.value = value
+
+class AsyncResult:
+    '''
+    The eventual result of an asynchronous operation.
+
+    Coroutines yield AsyncResults to wait on them. Other callers can register callbacks through addCallback(), or wait on the result through AsyncDirectoryTools.run().
+    '''
+
+    def __init__(self):
+        ## Set to True once the operation has finished.
+        self.finished = False
+        ## The result of the operation.
+        self.value = None
+        ## Exception information from sys.exc_info() if the operation failed, None otherwise.
+        self.excInfo = None
+        ## Methods to call with this object once the operation has finished.
+        self.callbacks = []
+
+    def addCallback(self,callback):
+        '''
+        Register a method to call once the operation has finished. If the operation has already finished, the method is called immediately.
+
+        Args:
+            callback: Method that takes this AsyncResult as its only argument.
+        '''
+        if self.finished:
+            callback(self)
+        else:
+            self.callbacks.append(callback)
+
+    def done(self):
+        '''
+        Returns:
+            True if the operation has finished, False otherwise.
+        '''
+        return self.finished
+
+    def finish(self):
+        '''
+        Mark the operation as finished and run callbacks.
+        '''
+        self.finished = True
+        callbacks = self.callbacks
+        self.callbacks = []
+        for callback in callbacks:
+            callback(self)
+
+    def result(self):
+        '''
+        Get the result of the operation, raising the operation's exception if it failed.
+
+        Returns:
+            The result of the operation.
+        '''
+        if not self.finished:
+            raise exceptions.AsyncNotDoneException()
+        if self.excInfo:
+            raise self.excInfo[0],self.excInfo[1],self.excInfo[2]
+        return self.value
+
+    def setException(self,excType,excValue=None,excTraceback=None):
+        '''
+        Finish the operation with an exception.
+
+        Args:
+            excType: The exception class, or an exception instance.
+            excValue: The exception instance.
+            excTraceback: The traceback of the exception.
+        '''
+        if excValue is None:
+            excType,excValue = excType.__class__,excType
+        self.excInfo = (excType,excValue,excTraceback)
+        self.finish()
+
+    def setResult(self,value):
+        '''
+        Finish the operation with a result.
+
+        Args:
+            value: The result of the operation.
+        '''
+        self.value = value
+        self.finish()
+
+class Task(AsyncResult):
+    '''
+    Drives a generator-based coroutine.
+
+    The generator yields AsyncResults (or lists of AsyncResults) to wait on, and is resumed with their results once they finish. It finishes by raising Return with its return value.
+    '''
+
+    def __init__(self,generator):
+        '''
+        Starts running the coroutine. The coroutine runs until it first waits on an unfinished AsyncResult.
+
+        Args:
+            generator: The generator object of the coroutine.
+        '''
+        AsyncResult.__init__(self)
+        ## The generator object of the coroutine.
+        self.generator = generator
+        self.step()
+
+    def resume(self,result):
+        '''
+        Callback for the AsyncResult that the coroutine is waiting on.
+        '''
+        self.step(result.value,result.excInfo)
+
+    def step(self,value=None,excInfo=None):
+        '''
+        Run the coroutine until it waits on an unfinished AsyncResult, or until it finishes.
+
+        Args:
+            value: The value to send into the coroutine.
+            excInfo: Exception information to throw into the coroutine instead of sending a value.
+        '''
+        while True:
+            try:
+                if excInfo:
+                    yielded = self.generator.throw(*excInfo)
+                else:
+                    yielded = self.generator.send(value)
+            except Return, e:
+                self.setResult(e.value)
+                return
+            except StopIteration:
+                self.setResult(None)
+                return
+            except Exception:
+                self.setException(*sys.exc_info())
+                return
+
+            if isinstance(yielded,(list,tuple)):
+                yielded = gather(yielded)
+
+            if not yielded.done():
+                yielded.addCallback(self.resume)
+                return
+            # Results that have already finished are handed straight back without going through a callback.
+            value,excInfo = yielded.value,yielded.excInfo
+
+def coroutine(method):
+    '''
+    Decorator for generator methods. Calling a decorated method starts it as a Task, which is returned.
+    '''
+    @wraps(method)
+    def wrapper(*args,**kwargs):
+        return Task(method(*args,**kwargs))
+    return wrapper
+
+def gather(results):
+    '''
+    Combine several AsyncResults into one.
+
+    Args:
+        results: List of AsyncResults.
+
+    Returns:
+        An AsyncResult for the list of results, in the same order. If any of the operations fail, it fails with the first exception.
+    '''
+    results = list(results)
+    combined = AsyncResult()
+    if not results:
+        combined.setResult([])
+        return combined
+
+    remaining = [len(results)]
+    def collect(result):
+        if combined.done():
+            return
+        if result.excInfo:
+            combined.setException(*result.excInfo)
+            return
+        remaining[0] -= 1
+        if not remaining[0]:
+            combined.setResult([item.value for item in results])
+
+    for result in results:
+        result.addCallback(collect)
+    return combined
+
+class AsyncConnection:
+    '''
+    A connection handle with operations in flight.
+    '''
+
+    def __init__(self,handle):
+        '''
+        Args:
+            handle: The LDAP connection handle.
+        '''
+        ## The LDAP connection handle.
+        self.handle = handle
+        ## Outstanding operations, stored as msgid:AsyncResult pairs.
+        self.pending = {}
+        ## UNIX time at which each outstanding operation was sent, indexed by msgid. Only kept while a metrics hook is installed.
+        self.sent = {}
+
+class AsyncDirectoryTools(directoryTools.DirectoryTools):
+    '''
+    Non-blocking front-end to DirectoryTools.
+
+    Searches and binds are sent with python-ldap's asynchronous msgid API (search_ext and simple_bind) and collected by polling result3() with a timeout of 0, so many lookups can be in flight at once on a small number of connections. Searches are spread over up to ASYNC_CONNECTIONS proxy connections. Binds for authentication use their own connections, up to AUTH_POOL_MAX_SIZE of them, with one bind in flight per connection.
+
+    Python 2 has no asyncio, so the *Async methods are generator-based coroutines driven by Task, and they return AsyncResults. A caller can block on a result with run(), or integrate with an existing event loop by calling poll() whenever the descriptors from getFileDescriptors() are readable.
+
+    Caches and properties are shared with the blocking methods inherited from DirectoryTools. An AsyncDirectoryTools object is meant to be driven from a single thread.
+    '''
+
+    def __init__(self,*args,**kwargs):
+        '''
+        Initializes the AsyncDirectoryTools object. Takes the same arguments as DirectoryTools.
+        '''
+        ## Proxy connections used for searches.
+        self.asyncConnections = []
+        ## Connections used for authentication binds.
+        self.authConnections = []
+        ## Binds waiting for a free authentication connection, stored as (dn,password,AsyncResult) tuples.
+        self.authQueue = deque()
+        directoryTools.DirectoryTools.__init__(self,*args,**kwargs)
+
+    @coroutine
+    def authenticateAsync(self,userName,password,userNameIsDN=False):
+        '''
+        Coroutine version of authenticate().
+
+        Args:
+            userName: User's login string. Can be either a login name or a distinguished name.
+            password: User's password.
+            userNameIsDN: True if the provided username is already a DN.
+
+        Returns:
+            An AsyncResult for True if the user successfully authenticates, False otherwise.
+        '''
+        self.printDebug("Attempting to authenticate user '{0}'.",LOG_LEVEL_WARNING,userName)
+
+        if userNameIsDN:
+            userDN = userName
+        else:
+            userDN = yield self.resolveUserDNAsync(userName)
+            if not userDN:
+                # Don't bother authenticating if the user doesn't exist.
+                self.printDebug("User '{0}' cannot be found.",LOG_LEVEL_WARNING,userName)
+                raise Return(False)
+
+        useAuthCache = self.getProperty(index.AUTH_CACHE) and password
+        if useAuthCache and self.isCachedAuthentication(userDN,password):
+            self.printDebug("Authenticated user '{0}' from the cache.",LOG_LEVEL_WARNING,userName)
+            raise Return(True)
+
+        try:
+            try:
+                yield self.bindAsync(userDN,password)
+            except ldap.SERVER_DOWN:
+                self.printDebug("Authentication connection was lost. Retrying on a new connection.", LOG_LEVEL_WARNING)
+                yield self.bindAsync(userDN,password)
+        except (ldap.LDAPError,exceptions.ConnectionFailedException), e:
+            if useAuthCache:
+                self.forgetAuthentication(userDN)
+            self.printDebug("LDAP Error: {0}",LOG_LEVEL_CRITICAL,e)
+            raise Return(False)
+
+        if useAuthCache:
+            self.cacheAuthentication(userDN,password)
+        self.printDebug("Successfully authenticated user '{0}'.",LOG_LEVEL_WARNING,userName)
+        raise Return(True)
+
+    def bindAsync(self,dn,password):
+        '''
+        Send a simple bind on a free authentication connection. Binds wait in a queue if all AUTH_POOL_MAX_SIZE connections are busy.
+
+        Args:
+            dn: The distinguished name to bind as.
+            password: The password to bind with.
+
+        Returns:
+            An AsyncResult that finishes once the bind has succeeded, or fails with the server's error (for example ldap.INVALID_CREDENTIALS).
+        '''
+        result = AsyncResult()
+        self.authQueue.append((dn,password,result))
+        self.dispatchBinds()
+        return result
+
+    def closeConnections(self):
+        '''
+        Close all pooled and asynchronous connections. Operations that are still in flight fail with a PoolClosedException.
+
+        Returns:
+            None
+        '''
+        directoryTools.DirectoryTools.closeConnections(self)
+
+        try:
+            raise exceptions.PoolClosedException()
+        except exceptions.PoolClosedException:
+            excInfo = sys.exc_info()
+        for connection in self.asyncConnections + self.authConnections:
+            self.dropConnection(connection,excInfo)
+        while self.authQueue:
+            dn,password,result = self.authQueue.popleft()
+            result.setException(*excInfo)
+
+    @coroutine
+    def completeRangedAttributesAsync(self,dn,attributes):
+        '''
+        Coroutine version of completeRangedAttributes(). The reads in each window are sent on one connection at the same time.
+
+        Returns:
+            An AsyncResult for the attribute dictionary, with each partial attribute replaced by the complete attribute under its plain name.
+        '''
+        batchSize = max(int(self.settings.batchSize),1)
+        for key in [key for key in attributes if ';' in key]:
+            match = directoryTools.RANGED_ATTRIBUTE_PATTERN.match(key)
+            if not match:
+                continue
+            attribute = match.group(1)
+            values,low,high = self.getAttributeRange({key:attributes.pop(key)},attribute)
+            if high is not None:
+                self.printDebug("Reading the rest of attribute '{0}' of '{1}' in ranges.",LOG_LEVEL_DEBUG,attribute,dn)
+                start,step = high + 1,high - low + 1
+                window = min(2,batchSize)
+                while start is not None:
+                    ranges = [(start + i * step,start + (i + 1) * step - 1) for i in range(window)]
+                    connection = self.getAsyncConnection()
+                    responses = yield [self.readRangeAsync(dn,attribute,rangeLow,rangeHigh,connection) for rangeLow,rangeHigh in ranges]
+                    valueLists,start,step = self.followRanges(dn,attribute,ranges,responses,step)
+                    for rangeValues in valueLists:
+                        values.extend(rangeValues)
+                    window = min(window * 2,batchSize)
+            attributes[attribute] = values
+        raise Return(attributes)
+
+    def dispatchBinds(self):
+        '''
+        Send queued binds on free authentication connections, opening new connections as needed.
+        '''
+        while self.authQueue:
+            connection = None
+            for authConnection in self.authConnections:
+                if not authConnection.pending:
+                    connection = authConnection
+                    break
+
+            if not connection:
+                if len(self.authConnections) >= max(int(self.getProperty(index.AUTH_POOL_MAX_SIZE)),1):
+                    # Every connection has a bind in flight. Queued binds are sent as those binds finish.
+                    return
+                dn,password,result = self.authQueue.popleft()
+                try:
+                    connection = AsyncConnection(self.getHandle())
+                except exceptions.ConnectionFailedException:
+                    result.setException(*sys.exc_info())
+                    continue
+                self.authConnections.append(connection)
+            else:
+                dn,password,result = self.authQueue.popleft()
+
+            try:
+                msgid = connection.handle.simple_bind(dn,password)
+                connection.pending[msgid] = result
+                if self.metricsHook:
+                    connection.sent[msgid] = time()
+            except ldap.LDAPError:
+                excInfo = sys.exc_info()
+                self.dropConnection(connection,excInfo)
+                result.setException(*excInfo)
+
+    def dropConnection(self,connection,excInfo):
+        '''
+        Close a connection, failing all of its outstanding operations.
+
+        Args:
+            connection: The AsyncConnection to close.
+            excInfo: Exception information to fail outstanding operations with.
+        '''
+        for connections in (self.asyncConnections,self.authConnections):
+            if connection in connections:
+                connections.remove(connection)
+
+        pending = connection.pending
+        connection.pending = {}
+        try:
+            connection.handle.unbind_s()
+        except Exception:
+            pass
+
+        for msgid in pending:
+            pending[msgid].setException(*excInfo)
+
+    @coroutine
+    def formatGroupMembersAsync(self,memberList,returnMembersAsDN=False,objectClassFilter=None,uidAttribute='uid'):
+        '''
+        Coroutine version of formatGroupMembers().
+
+        Returns:
+            An AsyncResult for a deduplicated list of members.
+        '''
+        resolveCacheCategory = None
+        if objectClassFilter == self.settings.userClass and uidAttribute == self.settings.userUidAttribute:
+            resolveCacheCategory = 'resolvedUsers'
+
+        if returnMembersAsDN and not self.settings.memberAttributeIsDN:
+            memberDNs = yield self.resolveObjectDNsAsync(objectClass=objectClassFilter,indexAttribute=uidAttribute,objectNames=set(memberList),cacheCategory=resolveCacheCategory)
+            raise Return(list(set([objectDN for objectDN in memberDNs.values() if objectDN])))
+        elif not returnMembersAsDN and self.settings.memberAttributeIsDN:
+            memberUIDs = yield self.resolveObjectUIDsAsync(objectDNs=set(memberList),objectIdentifier=uidAttribute,cacheCategory=resolveCacheCategory)
+            raise Return(list(set([uid for uid in memberUIDs.values() if uid])))
+        raise Return(list(set(memberList)))
+
+    def getAsyncConnection(self):
+        '''
+        Get the search connection with the fewest operations in flight, opening a new one if every connection is busy and there is room for another.
+
+        Returns:
+            An AsyncConnection.
+        '''
+        connection = None
+        if self.asyncConnections:
+            connection = min(self.asyncConnections,key=lambda asyncConnection: len(asyncConnection.pending))
+            if not connection.pending:
+                return connection
+
+        if len(self.asyncConnections) < max(int(self.getProperty(index.ASYNC_CONNECTIONS)),1):
+            self.printDebug("Opening asynchronous search connection #{0}.",LOG_LEVEL_DEBUG,len(self.asyncConnections) + 1)
+            connection = AsyncConnection(self.createProxyHandle())
+            self.asyncConnections.append(connection)
+        return connection
+
+    def getFileDescriptors(self):
+        '''
+        Get the socket descriptors of connections with operations in flight, for use with select() or an event loop.
+
+        Returns:
+            A list of file descriptors, or None if the descriptor of a busy connection could not be found. In that case, poll() has to be called on a timer.
+        '''
+        descriptors = []
+        for connection in self.asyncConnections + self.authConnections:
+            if not connection.pending:
+                continue
+            try:
+                descriptor = connection.handle.get_option(ldap.OPT_DESC)
+            except (AttributeError,ldap.LDAPError):
+                descriptor = None
+            if descriptor is None:
+                return None
+            descriptors.append(descriptor)
+        return descriptors
+
+    @coroutine
+    def getGroupMembersAsync(self,groupName,groupNameIsDN=False,returnMembersAsDN=False,objectClassFilter=None,uidAttribute='uid'):
+        '''
+        Coroutine version of getGroupMembers().
+
+        Nested groups are expanded with the in-chain matching rule if NESTED_ENGINE is set to in-chain, and level by level otherwise (see getGroupMembersBreadthFirst()), since the recursive engine would wait on one search at a time.
+
+        Returns:
+            An AsyncResult for a deduplicated list of members.
+        '''
+        if groupNameIsDN:
+            groupDN = groupName
+        else:
+            groupDN = yield self.resolveGroupDNAsync(groupName)
+            if not groupDN:
+                self.printDebug("Could not locate group: {0}",LOG_LEVEL_ERROR,groupName)
+                raise Return([])
+
+        if self.useInChain():
+            query = '(memberOf:{0}:={1})'.format(MATCHING_RULE_IN_CHAIN,escape_filter_chars(groupDN))
+            if objectClassFilter:
+                query = '(&(objectClass={0}){1})'.format(objectClassFilter,query)
+            results = yield self.queryInChainAsync(query,[uidAttribute])
+            if results is not None:
+                if returnMembersAsDN:
+                    raise Return(list(set([dn for dn,attributes in results])))
+                raise Return(list(set([attributes[uidAttribute][0] for dn,attributes in results if attributes.get(uidAttribute)])))
+
+        if self.settings.memberAttributeIsDN:
+            memberList = yield self.getGroupMembersBreadthFirstAsync(groupDN,objectClassFilter)
+        else:
+            # POSIX-style members will not be nested groups.
+            groupAttributes = yield self.getObjectAttributesAsync(groupDN,[self.settings.memberAttribute])
+            memberList = (groupAttributes or {}).get(self.settings.memberAttribute,[])
+
+        memberList = yield self.formatGroupMembersAsync(memberList,returnMembersAsDN,objectClassFilter,uidAttribute)
+        raise Return(memberList)
+
+    @coroutine
+    def getGroupMembersBreadthFirstAsync(self,groupDN,objectClassFilter=None):
+        '''
+        Coroutine version of getGroupMembersBreadthFirst().
+
+        Returns:
+            An AsyncResult for a list of member distinguished names.
+        '''
+        memberAttribute = self.settings.memberAttribute
+        groupClass = self.settings.groupClass
+        nested = self.settings.nestedGroups
+        maxDepth = self.settings.maxDepth
+
+        groupCacheCategory,groupCacheId = self.initCache('classCache',groupClass)
+        if objectClassFilter:
+            filterCacheCategory,filterCacheId = self.initCache('classCache',objectClassFilter)
+
+        memberList = []
+        seen = set([groupDN.lower()])
+        level = [groupDN]
+        depth = -1
+
+        while level:
+            expand = depth < 0 or (nested and maxDepth >= 0 and depth < maxDepth)
+            if expand:
+                attributes = ['objectClass',memberAttribute]
+            elif objectClassFilter:
+                attributes = ['objectClass']
+            else:
+                break
+
+            results = yield self.getMultipleObjectAttributesAsync(level,attributes)
+
+            nextLevel = []
+            for dn in level:
+                objectAttributes = results.get(dn,{})
+                classes = objectAttributes.get('objectClass',[])
+                isGroup = groupClass in classes
+
+                if depth >= 0:
+                    self.cache[groupCacheCategory][groupCacheId][dn] = isGroup
+                    if objectClassFilter:
+                        self.cache[filterCacheCategory][filterCacheId][dn] = objectClassFilter in classes
+                    if not objectClassFilter or objectClassFilter in classes:
+                        memberList.append(dn)
+
+                if expand and (depth < 0 or isGroup):
+                    for member in objectAttributes.get(memberAttribute,[]):
+                        if member.lower() not in seen:
+                            seen.add(member.lower())
+                            nextLevel.append(member)
+
+            level = nextLevel
+            depth += 1
+
+        if level and not objectClassFilter:
+            memberList.extend(level)
+
+        raise Return(memberList)
+
+    @coroutine
+    def getMultipleObjectAttributesAsync(self,dns,attributes):
+        '''
+        Coroutine version of getMultipleObjectAttributes(). Up to BATCH_SIZE reads are in flight at once for each call.
+
+        Returns:
+            An AsyncResult for a dictionary of attribute dictionaries, indexed by distinguished name. Objects that could not be found are left out.
+        '''
+        dns = list(dns)
+        returnValue = {}
+        batchSize = max(int(self.settings.batchSize),1)
+
+        for start in range(0,len(dns),batchSize):
+            batch = dns[start:start+batchSize]
+            results = yield [self.getObjectAttributesAsync(dn,attributes) for dn in batch]
+            for dn,objectAttributes in zip(batch,results):
+                if objectAttributes is not None:
+                    returnValue[dn] = objectAttributes
+
+        raise Return(returnValue)
+
+    @coroutine
+    def getObjectAttributesAsync(self,dn,attributes):
+        '''
+        Coroutine version of getObjectAttributes().
+
+        Returns:
+            An AsyncResult for the attribute dictionary of the object, or None if the object could not be found.
+        '''
+        try:
+            results = yield self.queryAsync('(objectClass=*)',attributes,dn,scope=ldap.SCOPE_BASE)
+        except exceptions.BadQueryException, e:
+            if not isinstance(e.originalException,ldap.NO_SUCH_OBJECT):
+                raise
+            results = []
+
+        objectAttributes = None
+        for resultDN,resultAttributes in results:
+            objectAttributes = resultAttributes
+        if objectAttributes is not None:
+            objectAttributes = yield self.completeRangedAttributesAsync(dn,objectAttributes)
+        raise Return(objectAttributes)
+
+    @coroutine
+    def getUserGroupsAsync(self,userName,userNameIsDN=False,returnGroupsAsDN=False):
+        '''
+        Coroutine version of getUserGroups(). Nested groups are found with the in-chain matching rule if NESTED_ENGINE is set to in-chain. The tokenGroups lookup is not available asynchronously.
+
+        Returns:
+            An AsyncResult for a list of groups.
+        '''
+        if userNameIsDN and not self.settings.memberAttributeIsDN:
+            queryUser = yield self.resolveUserUIDAsync(userName)
+        elif not userNameIsDN and self.settings.memberAttributeIsDN:
+            queryUser = yield self.resolveUserDNAsync(userName)
+        else:
+            queryUser = userName
+        if not queryUser:
+            raise Return([])
+
+        uidAttribute = self.settings.groupUidAttribute
+        results = None
+        if self.useInChain():
+            query = '(&(objectClass={0})(member:{1}:={2}))'.format(self.settings.groupClass,MATCHING_RULE_IN_CHAIN,escape_filter_chars(queryUser))
+            results = yield self.queryInChainAsync(query,[uidAttribute],self.getGroupBaseDN())
+        if results is None:
+            query = '({0}={1})'.format(self.settings.memberAttribute,escape_filter_chars(queryUser))
+            results = yield self.queryAsync(query,[uidAttribute],self.getGroupBaseDN())
+
+        groupList = [dn for dn,attributes in results]
+        if returnGroupsAsDN:
+            raise Return(groupList)
+
+        groupUIDs = yield self.resolveObjectUIDsAsync(groupList,uidAttribute,cacheCategory='resolvedGroups')
+        raise Return([groupUIDs[dn] for dn in groupList if groupUIDs[dn]])
+
+    @coroutine
+    def isUserInGroupAsync(self,userName,groupName,userNameIsDN=False,groupNameIsDN=False):
+        '''
+        Coroutine version of isUserInGroup(). Nested groups are checked with the in-chain matching rule if NESTED_ENGINE is set to in-chain, and level by level otherwise (see isObjectInGroupBreadthFirst()).
+
+        Returns:
+            An AsyncResult for True if the user is a member of the group, False otherwise.
+        '''
+        if groupNameIsDN:
+            groupDN = groupName
+        else:
+            groupDN = yield self.resolveGroupDNAsync(groupName)
+            if not groupDN:
+                self.printDebug("Cannot locate group '{0}' in order to search for member '{1}' within it. Returning False.",LOG_LEVEL_ERROR,groupName,userName)
+                raise Return(False)
+
+        memberIsDN = self.settings.memberAttributeIsDN
+        if memberIsDN and not userNameIsDN:
+            searchName = yield self.resolveUserDNAsync(userName)
+        elif userNameIsDN and not memberIsDN:
+            searchName = yield self.resolveUserUIDAsync(userName)
+        else:
+            searchName = userName
+        if not searchName:
+            raise Return(False)
+
+        if self.useInChain():
+            results = yield self.queryInChainAsync('(memberOf:{0}:={1})'.format(MATCHING_RULE_IN_CHAIN,escape_filter_chars(groupDN)),['1.1'],searchName,scope=ldap.SCOPE_BASE)
+            if results is not None:
+                raise Return(len(results) > 0)
+
+        if not memberIsDN:
+            groupAttributes = yield self.getObjectAttributesAsync(groupDN,[self.settings.memberAttribute])
+            raise Return(searchName in (groupAttributes or {}).get(self.settings.memberAttribute,[]))
+
+        isMember = yield self.isObjectInGroupBreadthFirstAsync(searchName,groupDN)
+        raise Return(isMember)
+
+    @coroutine
+    def isObjectInGroupBreadthFirstAsync(self,objectDN,groupDN):
+        '''
+        Coroutine version of isObjectInGroupBreadthFirst().
+
+        Returns:
+            An AsyncResult for True if the object is a member of the group, False otherwise.
+        '''
+        memberAttribute = self.settings.memberAttribute
+        groupClass = self.settings.groupClass
+        nested = self.settings.nestedGroups
+        maxDepth = self.settings.maxDepth
+
+        cacheCategory,cacheId = self.initCache('classCache',groupClass)
+
+        target = objectDN.lower()
+        seen = set([groupDN.lower()])
+        level = [groupDN]
+        depth = 0
+
+        while level:
+            results = yield self.getMultipleObjectAttributesAsync(level,['objectClass',memberAttribute])
+
+            nextLevel = []
+            for dn in level:
+                objectAttributes = results.get(dn,{})
+                if depth > 0:
+                    isGroup = groupClass in objectAttributes.get('objectClass',[])
+                    self.cache[cacheCategory][cacheId][dn] = isGroup
+                    if not isGroup:
+                        continue
+
+                for member in objectAttributes.get(memberAttribute,[]):
+                    if member.lower() == target:
+                        raise Return(True)
+                    if member.lower() not in seen:
+                        seen.add(member.lower())
+                        nextLevel.append(member)
+
+            if not nested or (depth >= maxDepth and not maxDepth < 0):
+                break
+            level = nextLevel
+            depth += 1
+
+        raise Return(False)
+
+    def poll(self):
+        '''
+        Collect the results of all operations that have been answered, without blocking. Coroutines waiting on those results are resumed.
+
+        Returns:
+            The number of operations that finished.
+        '''
+        finished = 0
+        for connection in list(self.asyncConnections + self.authConnections):
+            isAuthConnection = connection in self.authConnections
+            for msgid in list(connection.pending):
+                if msgid not in connection.pending:
+                    # Finished by an earlier callback, for example through dropConnection().
+                    continue
+                try:
+                    resultType,results,resultId,serverControls = connection.handle.result3(msgid,all=1,timeout=0)
+                except ldap.SERVER_DOWN:
+                    finished += len(connection.pending)
+                    self.dropConnection(connection,sys.exc_info())
+                    break
+                except ldap.LDAPError:
+                    excInfo = sys.exc_info()
+                    result = connection.pending.pop(msgid)
+                    self.recordAsyncOperation(connection,msgid,isAuthConnection)
+                    if isAuthConnection and not isinstance(excInfo[1],ldap.INVALID_CREDENTIALS):
+                        # We can't be sure what state the connection was left in.
+                        self.dropConnection(connection,excInfo)
+                    result.setException(*excInfo)
+                    finished += 1
+                    continue
+
+                if resultType is None:
+                    # Not answered yet.
+                    continue
+
+                result = connection.pending.pop(msgid)
+                self.recordAsyncOperation(connection,msgid,isAuthConnection,len(results or ()))
+                result.setResult((results,serverControls))
+                finished += 1
+
+        if self.authQueue:
+            self.dispatchBinds()
+        return finished
+
+    @coroutine
+    def queryAsync(self,query='',attributes=None,base=None,scope=ldap.SCOPE_SUBTREE,pageSize=None):
+        '''
+        Coroutine version of query(). A search that fails because its connection was lost is retried once on a new connection.
+
+        Args:
+            query: the query string.
+            attributes: A list of attributes that we wish to fetch.
+            base: The distinguished name to base our search in.
+            scope: The scope of the search.
+            pageSize: If set, results are fetched in pages of this many entries with the simple paged results control. All pages are sent on the same connection.
+
+        Returns:
+            An AsyncResult for the list of results. References are omitted. Errors are raised as a BadQueryException.
+        '''
+        if not base:
+            base = self.settings.baseDN
+
+        self.printDebug("Executing asynchronous LDAP search.",LOG_LEVEL_DEBUG)
+        self.printDebug("    Filter: {0}",LOG_LEVEL_DEBUG,str(query))
+        self.printDebug("    Base: {0}",LOG_LEVEL_DEBUG,str(base))
+
+        try:
+            try:
+                results = yield self.searchPagesAsync(base,scope,query,attributes,pageSize)
+            except ldap.SERVER_DOWN:
+                self.printDebug("Asynchronous connection was lost. Retrying search on a new connection.",LOG_LEVEL_WARNING)
+                results = yield self.searchPagesAsync(base,scope,query,attributes,pageSize)
+        except self.CONNECTION_EXCEPTIONS:
+            raise
+        except Exception, e:
+            self.printDebug("BAD QUERY: {0}",LOG_LEVEL_CRITICAL,str(query))
+            raise exceptions.BadQueryException(originalException=e)
+
+        raise Return([result for result in results if result[0]])
+
+    @coroutine
+    def queryInChainAsync(self,query,attributes,base=None,scope=ldap.SCOPE_SUBTREE):
+        '''
+        Coroutine version of queryInChain(). Subtree searches are paged.
+
+        Returns:
+            An AsyncResult for the list of results, or for None if the server rejected the matching rule.
+        '''
+        pageSize = None
+        if scope != ldap.SCOPE_BASE:
+            pageSize = self.settings.pageSize
+
+        try:
+            results = yield self.queryAsync(query,attributes,base,scope,pageSize)
+        except exceptions.BadQueryException, e:
+            if isinstance(e.originalException,ldap.NO_SUCH_OBJECT):
+                results = []
+            elif isinstance(e.originalException,self.IN_CHAIN_REJECTIONS):
+                self.printDebug("Server rejected the in-chain matching rule. Falling back to expanding nested groups level by level.",LOG_LEVEL_WARNING)
+                self.inChainRejected = True
+                results = None
+            else:
+                raise
+        raise Return(results)
+
+    @coroutine
+    def readRangeAsync(self,dn,attribute,low,high,connection):
+        '''
+        Read one range of an attribute for completeRangedAttributesAsync().
+
+        Returns:
+            An AsyncResult for the search results, or for the LDAPError that the read raised. Reads past the last range may fail, which is only an error if the range turns out to be needed (see followRanges()).
+        '''
+        try:
+            results,serverControls = yield self.searchAsync(dn,ldap.SCOPE_BASE,'(objectClass=*)',['{0};range={1}-{2}'.format(attribute,low,high)],connection=connection)
+        except ldap.SERVER_DOWN:
+            raise
+        except ldap.LDAPError, e:
+            raise Return(e)
+        raise Return(results)
+
+    def recordAsyncOperation(self,connection,msgid,isBind,entries=0):
+        '''
+        Pass the measurements of a finished asynchronous operation to the metrics hook, if there is one. Operations sent by the *Async methods are shared between lookups, so they are not attributed to a method.
+
+        Args:
+            connection: The AsyncConnection that the operation was sent on.
+            msgid: The message ID of the operation.
+            isBind: True if the operation was a bind, False if it was a search.
+            entries: The number of entries that a search returned.
+        '''
+        started = connection.sent.pop(msgid,None)
+        metricsHook = self.metricsHook
+        if metricsHook and started is not None:
+            metricsHook.operation(isBind and 'bind' or 'search',None,time() - started,entries)
+
+    def resolveGroupDNAsync(self,groupName,uidAttribute=False):
+        '''
+        Coroutine version of resolveGroupDN(), sharing its cache.
+
+        Returns:
+            An AsyncResult for the group's distinguished name, or None if it could not be resolved.
+        '''
+        if not uidAttribute:
+            uidAttribute = self.settings.groupUidAttribute
+        return self.resolveSingle(self.resolveObjectDNsAsync(self.settings.groupClass,uidAttribute,[groupName],self.getGroupBaseDN(),cacheCategory='resolvedGroups'),groupName)
+
+    def resolveGroupUIDAsync(self,groupDN,uidAttribute=False):
+        '''
+        Coroutine version of resolveGroupUID(), sharing its cache.
+
+        Returns:
+            An AsyncResult for the group's name, or None if it could not be resolved.
+        '''
+        if not uidAttribute:
+            uidAttribute = self.settings.groupUidAttribute
+        return self.resolveSingle(self.resolveObjectUIDsAsync([groupDN],uidAttribute,cacheCategory='resolvedGroups'),groupDN)
+
+    @coroutine
+    def resolveObjectDNsAsync(self,objectClass,indexAttribute,objectNames,base=None,cacheCategory=None):
+        '''
+        Coroutine version of resolveObjectDNs(). All batches are in flight at once.
+
+        Returns:
+            An AsyncResult for a dictionary of distinguished names indexed by the given object names. Objects that could not be resolved have a value of None.
+        '''
+        if not base:
+            base=self.settings.baseDN
+
+        returnValue = {}
+        unresolved = []
+
+        if cacheCategory:
+            cacheCategory,cacheId = self.initCache(cacheCategory)
+
+        for objectName in objectNames:
+            found,cachedValue = False,None
+            if cacheCategory:
+                found,cachedValue = self.cache[cacheCategory][cacheId].lookup(objectName)
+            if found:
+                returnValue[objectName] = cachedValue
+            elif cacheCategory and self.isCachedMiss(cacheCategory,objectName):
+                returnValue[objectName] = None
+            else:
+                unresolved.append(objectName)
+                returnValue[objectName] = None
+
+        batchSize = max(int(self.settings.batchSize),1)
+        batches = [unresolved[start:start+batchSize] for start in range(0,len(unresolved),batchSize)]
+        queries = []
+        for batch in batches:
+            nameFilter = ''.join(['({0}={1})'.format(indexAttribute,escape_filter_chars(objectName)) for objectName in batch])
+            if objectClass:
+                queries.append(self.queryAsync('(&(objectClass={0})(|{1}))'.format(objectClass,nameFilter),[indexAttribute],base=base))
+            else:
+                queries.append(self.queryAsync('(|{0})'.format(nameFilter),[indexAttribute],base=base))
+        batchResults = yield queries
+
+        for batch,results in zip(batches,batchResults):
+            batchNames = dict([(objectName.lower(),objectName) for objectName in batch])
+            for dn,attributes in results:
+                for value in attributes.get(indexAttribute,[]):
+                    objectName = batchNames.get(value.lower())
+                    if objectName is not None and not returnValue[objectName]:
+                        returnValue[objectName] = dn
+
+            if cacheCategory:
+                for objectName in batch:
+                    objectDN = returnValue[objectName]
+                    if not objectDN:
+                        self.cacheMiss(cacheCategory,objectName)
+                        continue
+                    self.cache[cacheCategory][cacheId][objectName] = objectDN
+                    if objectDN not in self.cache[cacheCategory][cacheId]:
+                        self.cache[cacheCategory][cacheId][objectDN] = objectName
+
+        raise Return(returnValue)
+
+    @coroutine
+    def resolveObjectUIDsAsync(self,objectDNs,objectIdentifier,cacheCategory=None):
+        '''
+        Coroutine version of resolveObjectUIDs().
+
+        Returns:
+            An AsyncResult for a dictionary of UIDs indexed by the given distinguished names. Objects that could not be resolved have a value of None.
+        '''
+        returnValue = {}
+        unresolved = []
+
+        if cacheCategory:
+            cacheCategory,cacheId = self.initCache(cacheCategory)
+
+        for objectDN in objectDNs:
+            found,cachedValue = False,None
+            if cacheCategory:
+                found,cachedValue = self.cache[cacheCategory][cacheId].lookup(objectDN)
+            if found:
+                returnValue[objectDN] = cachedValue
+            elif cacheCategory and self.isCachedMiss(cacheCategory,objectDN):
+                returnValue[objectDN] = None
+            else:
+                unresolved.append(objectDN)
+
+        results = yield self.getMultipleObjectAttributesAsync(unresolved,[objectIdentifier])
+        for objectDN in unresolved:
+            try:
+                uid = results[objectDN][objectIdentifier][0]
+            except (KeyError,IndexError):
+                uid = None
+            returnValue[objectDN] = uid
+
+            if cacheCategory:
+                if not uid:
+                    self.cacheMiss(cacheCategory,objectDN)
+                    continue
+                self.cache[cacheCategory][cacheId][objectDN] = uid
+                if uid not in self.cache[cacheCategory][cacheId]:
+                    self.cache[cacheCategory][cacheId][uid] = objectDN
+
+        raise Return(returnValue)
+
+    @coroutine
+    def resolveSingle(self,result,key):
+        '''
+        Pick a single value out of the dictionary returned by a batched resolve coroutine.
+        '''
+        values = yield result
+        raise Return(values.get(key))
+
+    def resolveUserDNAsync(self,userName,uidAttribute=False):
+        '''
+        Coroutine version of resolveUserDN(), sharing its cache.
+
+        Returns:
+            An AsyncResult for the user's distinguished name, or None if it could not be resolved.
+        '''
+        return self.resolveSingle(self.resolveUserDNsAsync([userName],uidAttribute),userName)
+
+    def resolveUserDNsAsync(self,userNames,uidAttribute=False):
+        '''
+        Coroutine version of resolveUserDNs(), sharing its cache.
+
+        Returns:
+            An AsyncResult for a dictionary of distinguished names indexed by username.
+        '''
+        if not uidAttribute:
+            uidAttribute = self.settings.userUidAttribute
+        return self.resolveObjectDNsAsync(self.settings.userClass,uidAttribute,userNames,self.getUserBaseDN(),cacheCategory='resolvedUsers')
+
+    def resolveUserUIDAsync(self,userDN,uidAttribute=False):
+        '''
+        Coroutine version of resolveUserUID(), sharing its cache.
+
+        Returns:
+            An AsyncResult for the user's name, or None if it could not be resolved.
+        '''
+        return self.resolveSingle(self.resolveUserUIDsAsync([userDN],uidAttribute),userDN)
+
+    def resolveUserUIDsAsync(self,userDNs,uidAttribute=False):
+        '''
+        Coroutine version of resolveUserUIDs(), sharing its cache.
+
+        Returns:
+            An AsyncResult for a dictionary of UIDs indexed by distinguished name.
+        '''
+        if not uidAttribute:
+            uidAttribute = self.settings.userUidAttribute
+        return self.resolveObjectUIDsAsync(userDNs,uidAttribute,cacheCategory='resolvedUsers')
+
+    def run(self,result,timeout=None):
+        '''
+        Block until an asynchronous operation finishes, polling for results in the meantime.
+
+        Args:
+            result: The AsyncResult (or list of AsyncResults) to wait on.
+            timeout: The number of seconds to wait. A value of None will wait forever.
+
+        Returns:
+            The result of the operation.
+        '''
+        if isinstance(result,(list,tuple)):
+            result = gather(result)
+
+        deadline = None
+        if timeout is not None:
+            deadline = time() + timeout
+
+        while not result.done():
+            if not self.poll() and not result.done():
+                if not self.authQueue and not [connection for connection in self.asyncConnections + self.authConnections if connection.pending]:
+                    # Nothing is in flight, so nothing can finish the operation.
+                    raise exceptions.AsyncNotDoneException()
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time()
+                    if remaining <= 0:
+                        raise exceptions.AsyncTimeoutException(timeout=timeout)
+                self.wait(remaining)
+        return result.result()
+
+    def searchAsync(self,base,scope,query,attributes,serverControls=None,connection=None):
+        '''
+        Send a search without waiting for its results.
+
+        Args:
+            base: The distinguished name to base our search in.
+            scope: The scope of the search.
+            query: the query string.
+            attributes: A list of attributes that we wish to fetch.
+            serverControls: List of server controls to send with the search.
+            connection: The AsyncConnection to send the search on. Defaults to the least busy connection.
+
+        Returns:
+            An AsyncResult for a (results,serverControls) tuple. Errors are raised as they came from python-ldap.
+        '''
+        result = AsyncResult()
+        try:
+            if not connection:
+                connection = self.getAsyncConnection()
+            msgid = connection.handle.search_ext(base,scope,query,attributes,serverctrls=serverControls)
+            connection.pending[msgid] = result
+            if self.metricsHook:
+                connection.sent[msgid] = time()
+        except ldap.SERVER_DOWN:
+            excInfo = sys.exc_info()
+            self.dropConnection(connection,excInfo)
+            result.setException(*excInfo)
+        except Exception:
+            result.setException(*sys.exc_info())
+        return result
+
+    @coroutine
+    def searchPagesAsync(self,base,scope,query,attributes,pageSize=None):
+        '''
+        Run a search, following the paged results control until the last page if a page size is given.
+
+        Returns:
+            An AsyncResult for the list of results from all pages.
+        '''
+        if not pageSize:
+            results,serverControls = yield self.searchAsync(base,scope,query,attributes)
+            raise Return(results)
+
+        # Paging cookies are only valid on the connection that they were handed out on.
+        connection = self.getAsyncConnection()
+        pageControl = SimplePagedResultsControl(True,size=pageSize,cookie='')
+        returnList = []
+        while True:
+            results,serverControls = yield self.searchAsync(base,scope,query,attributes,serverControls=[pageControl],connection=connection)
+            returnList.extend(results)
+
+            pageControl.cookie = ''
+            for control in serverControls or []:
+                if control.controlType == SimplePagedResultsControl.controlType:
+                    pageControl.cookie = control.cookie
+            if not pageControl.cookie:
+                break
+        raise Return(returnList)
+
+    def wait(self,timeout=None):
+        '''
+        Wait for up to ASYNC_POLL_INTERVAL seconds, returning early if a connection has results ready.
+
+        Args:
+            timeout: The longest number of seconds to wait.
+        '''
+        interval = self.getProperty(index.ASYNC_POLL_INTERVAL,printDebugMessage=False)
+        descriptors = self.getFileDescriptors()
+        if timeout is not None:
+            interval = min(interval,timeout)
+
+        if descriptors:
+            # Still bounded by the interval, since results can be left buffered by the client library after the socket has been read.
+            select.select(descriptors,[],[],interval)
+        else:
+            sleep(interval)
@@ -0,0 +1,745 @@
+#!/usr/bin/python
+
+import json,sqlite3,sys,threading
+from collections import OrderedDict
+from time import time
+
+class CacheBucket:
+    '''
+    A single cache, holding key/value pairs for one cache ID of a cache category.
+
+    The bucket is bounded: once it holds maxEntries items, the least recently used item is evicted to make room. Items also expire once they are older than their time-to-live. Expired items are removed as they are found.
+
+    Buckets can be used like dictionaries, and are safe to share between threads. Read items with lookup() or get(), which check for an item and read it in one step. An item can expire between a membership test and reading it.
+    '''
+
+    def __init__(self,maxEntries=0,ttl=0):
+        '''
+        Initializes an empty bucket.
+
+        Args:
+            maxEntries: The maximum number of items to hold. A value of 0 means that the bucket is unbounded.
+            ttl: The default number of seconds that an item lives for. A value of 0 means that items do not expire.
+        '''
+        ## The maximum number of items to hold.
+        self.maxEntries = maxEntries
+        ## The default number of seconds that an item lives for.
+        self.ttl = ttl
+        ## Items, stored as key:(value,expiry) pairs. The most recently used item is at the end.
+        self.items = OrderedDict()
+        ## Lock guarding the items.
+        self.lock = threading.RLock()
+        ## The number of lookups that found an item.
+        self.hits = 0
+        ## The number of lookups that did not find an item.
+        self.misses = 0
+        ## The number of items that were removed to make room, or because they expired.
+        self.evictions = 0
+
+    def __contains__(self,key):
+        return self.lookup(key)[0]
+
+    def __getitem__(self,key):
+        found,value = self.lookup(key)
+        if not found:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self,key,value):
+        self.set(key,value)
+
+    def __delitem__(self,key):
+        with self.lock:
+            del self.items[key]
+
+    def __len__(self):
+        return len(self.items)
+
+    def clear(self):
+        '''
+        Remove all items.
+        '''
+        with self.lock:
+            self.items.clear()
+
+    def get(self,key,default=None):
+        '''
+        Get an item, or a default value if it is not cached.
+        '''
+        found,value = self.lookup(key)
+        if not found:
+            return default
+        return value
+
+    def keys(self):
+        '''
+        Returns:
+            A list of the keys of all items that have not expired.
+        '''
+        with self.lock:
+            now = time()
+            return [key for key in self.items if not self.items[key][1] or self.items[key][1] > now]
+
+    def lookup(self,key,count=True):
+        '''
+        Look up an item, marking it as recently used.
+
+        Args:
+            key: The key of the item.
+            count: If False, the lookup is left out of the hit and miss counters.
+
+        Returns:
+            A tuple. The first value is True if the item was found, and the second value is the item.
+        '''
+        with self.lock:
+            try:
+                value,expiry = self.items.pop(key)
+            except KeyError:
+                if count:
+                    self.misses += 1
+                return False,None
+            if expiry and expiry <= time():
+                # Leave the expired item out.
+                self.evictions += 1
+                if count:
+                    self.misses += 1
+                return False,None
+            self.items[key] = (value,expiry)
+            if count:
+                self.hits += 1
+            return True,value
+
+    def pop(self,key,default=None):
+        '''
+        Remove an item and return it, or a default value if it is not cached.
+        '''
+        with self.lock:
+            found,value = self.lookup(key)
+            if not found:
+                return default
+            del self.items[key]
+            return value
+
+    def removeMatching(self,matches):
+        '''
+        Remove every item that a function selects.
+
+        Args:
+            matches: Function that is called with the key and value of each item, and returns True if the item should be removed.
+
+        Returns:
+            The number of items that were removed.
+        '''
+        with self.lock:
+            keys = [key for key in self.items if matches(key,self.items[key][0])]
+            for key in keys:
+                del self.items[key]
+        return len(keys)
+
+    def set(self,key,value,ttl=None):
+        '''
+        Store an item, evicting the least recently used item if the bucket is full.
+
+        Args:
+            key: The key of the item.
+            value: The item.
+            ttl: Override for the number of seconds that the item lives for.
+        '''
+        if ttl is None:
+            ttl = self.ttl
+        expiry = 0
+        if ttl:
+            expiry = time() + ttl
+
+        with self.lock:
+            self.items.pop(key,None)
+            self.items[key] = (value,expiry)
+            while self.maxEntries and len(self.items) > self.maxEntries:
+                self.items.popitem(last=False)
+                self.evictions += 1
+
+class PersistentCacheBucket(CacheBucket):
+    '''
+    A cache bucket that is backed by a SqliteCacheStore.
+
+    Items are kept in memory as usual. Items that are not in memory are read from the store, and new items are written through to it, so that other processes (and later runs) using the same store start with a warm cache. Items keep their expiry time in the store.
+    '''
+
+    def __init__(self,store,category,cacheId,maxEntries=0,ttl=0):
+        '''
+        Args:
+            store: The SqliteCacheStore to read from and write to.
+            category: The name of the category that the bucket belongs to.
+            cacheId: The cache ID of the bucket.
+            maxEntries: The maximum number of items to hold in memory.
+            ttl: The default number of seconds that an item lives for.
+        '''
+        CacheBucket.__init__(self,maxEntries=maxEntries,ttl=ttl)
+        ## The store to read from and write to.
+        self.store = store
+        ## The name of the category that the bucket belongs to.
+        self.category = category
+        ## The cache ID of the bucket.
+        self.cacheId = cacheId
+
+    def __delitem__(self,key):
+        with self.lock:
+            self.items.pop(key,None)
+        self.store.delete(self.category,self.cacheId,key)
+
+    def clear(self):
+        '''
+        Remove all items, from memory and from the store.
+        '''
+        CacheBucket.clear(self)
+        self.store.delete(self.category,self.cacheId)
+
+    def lookup(self,key,count=True):
+        '''
+        Look up an item, falling back to the store if it is not in memory.
+        '''
+        found,value = CacheBucket.lookup(self,key,count)
+        if found:
+            return found,value
+
+        found,value,expiry = self.store.get(self.category,self.cacheId,key)
+        if not found:
+            return False,None
+
+        with self.lock:
+            if count:
+                # Counted as a hit instead of the miss that was just recorded.
+                self.misses -= 1
+                self.hits += 1
+            CacheBucket.set(self,key,value)
+            self.items[key] = (value,expiry)
+        return True,value
+
+    def pop(self,key,default=None):
+        '''
+        Remove an item and return it, or a default value if it is not cached.
+        '''
+        value = CacheBucket.pop(self,key,default)
+        self.store.delete(self.category,self.cacheId,key)
+        return value
+
+    def set(self,key,value,ttl=None):
+        '''
+        Store an item in memory and in the store.
+        '''
+        if ttl is None:
+            ttl = self.ttl
+        CacheBucket.set(self,key,value,ttl)
+        expiry = 0
+        if ttl:
+            expiry = time() + ttl
+        self.store.set(self.category,self.cacheId,key,value,expiry)
+
+class SqliteCacheStore:
+    '''
+    Persistent cache storage in an SQLite database, shared by every process that opens the same file.
+
+    The database is opened in WAL mode, so that readers do not block on a writer. Each thread uses its own connection. Values are stored as JSON, so only strings, numbers, booleans, None, lists and dictionaries are kept as they are. Tuples come back as lists, and strings come back as UTF-8 encoded str objects.
+
+    The store is a best-effort cache. Errors from SQLite (for example, the database being locked for longer than the timeout) are treated as a miss when reading, and are ignored when writing.
+    '''
+
+    def __init__(self,path,namespace='',timeout=5):
+        '''
+        Opens the database, creating it if it does not exist, and removes expired items.
+
+        Args:
+            path: Path to the database file.
+            namespace: Items are only shared between stores with the same namespace. Used to keep the caches of different directories apart in one file.
+            timeout: The number of seconds to wait for another process to finish writing.
+        '''
+        ## Path to the database file.
+        self.path = path
+        ## Namespace that items are stored under.
+        self.namespace = namespace
+        ## The number of seconds to wait for another process to finish writing.
+        self.timeout = timeout
+        ## Per-thread database connections.
+        self.local = threading.local()
+
+        connection = self.getConnection()
+        with connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS cache (namespace TEXT NOT NULL, category TEXT NOT NULL, cacheId TEXT NOT NULL, key TEXT NOT NULL, value TEXT, expiry REAL NOT NULL, PRIMARY KEY (namespace,category,cacheId,key))')
+        self.purgeExpired()
+
+    def decode(self,value):
+        '''
+        Convert unicode strings returned by the JSON decoder back into str objects, which python-ldap expects.
+        '''
+        if isinstance(value,unicode):
+            return value.encode('utf-8')
+        if isinstance(value,list):
+            return [self.decode(item) for item in value]
+        if isinstance(value,dict):
+            return dict([(self.decode(k),self.decode(v)) for k,v in value.items()])
+        return value
+
+    def delete(self,category=None,cacheId=None,key=None):
+        '''
+        Remove items. Leaving out an argument removes all items that match the arguments before it.
+
+        Args:
+            category: The name of the category.
+            cacheId: The cache ID.
+            key: The key of the item.
+        '''
+        query = 'DELETE FROM cache WHERE namespace = ?'
+        arguments = [self.namespace]
+        for column,value in (('category',category),('cacheId',cacheId),('key',key)):
+            if value is None:
+                break
+            query += ' AND {0} = ?'.format(column)
+            arguments.append(self.encodeKey(value))
+        try:
+            connection = self.getConnection()
+            with connection:
+                connection.execute(query,arguments)
+        except sqlite3.Error:
+            pass
+
+    def deleteMatching(self,category,matches):
+        '''
+        Remove every item of a category that a function selects. Every item of the category is read to do this, so this is meant for occasional invalidation rather than for regular lookups.
+
+        Args:
+            category: The name of the category.
+            matches: Function that is called with the key and value of each item, and returns True if the item should be removed.
+
+        Returns:
+            The number of items that were removed.
+        '''
+        try:
+            connection = self.getConnection()
+            rows = connection.execute('SELECT cacheId,key,value FROM cache WHERE namespace = ? AND category = ?',(self.namespace,self.encodeKey(category))).fetchall()
+            doomed = [(self.namespace,self.encodeKey(category),cacheId,key) for cacheId,key,value in rows if matches(self.decode(key),self.decode(json.loads(value)))]
+            if doomed:
+                with connection:
+                    connection.executemany('DELETE FROM cache WHERE namespace = ? AND category = ? AND cacheId = ? AND key = ?',doomed)
+        except sqlite3.Error:
+            return 0
+        return len(doomed)
+
+    def encodeKey(self,key):
+        '''
+        Keys are stored as text. Non-string keys (such as None) are stored as their JSON form.
+        '''
+        if isinstance(key,str):
+            return key.decode('utf-8','replace')
+        if isinstance(key,unicode):
+            return key
+        return json.dumps(key)
+
+    def get(self,category,cacheId,key):
+        '''
+        Read an item that has not expired.
+
+        Returns:
+            A tuple. The first value is True if the item was found, the second value is the item, and the third value is its expiry time (0 if it does not expire).
+        '''
+        try:
+            row = self.getConnection().execute(
+                'SELECT value,expiry FROM cache WHERE namespace = ? AND category = ? AND cacheId = ? AND key = ? AND (expiry = 0 OR expiry > ?)',
+                (self.namespace,self.encodeKey(category),self.encodeKey(cacheId),self.encodeKey(key),time())
+            ).fetchone()
+        except sqlite3.Error:
+            return False,None,0
+        if row is None:
+            return False,None,0
+        return True,self.decode(json.loads(row[0])),row[1]
+
+    def getConnection(self):
+        '''
+        Get the database connection of the current thread, opening it if needed.
+        '''
+        connection = getattr(self.local,'connection',None)
+        if connection is None:
+            connection = sqlite3.connect(self.path,timeout=self.timeout)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.local.connection = connection
+        return connection
+
+    def purgeExpired(self):
+        '''
+        Remove all expired items, across all namespaces.
+        '''
+        try:
+            connection = self.getConnection()
+            with connection:
+                connection.execute('DELETE FROM cache WHERE expiry > 0 AND expiry <= ?',(time(),))
+        except sqlite3.Error:
+            pass
+
+    def set(self,category,cacheId,key,value,expiry=0):
+        '''
+        Write an item, replacing any existing item with the same key.
+
+        Args:
+            category: The name of the category.
+            cacheId: The cache ID.
+            key: The key of the item.
+            value: The item.
+            expiry: UNIX time at which the item expires. A value of 0 means that the item does not expire.
+        '''
+        try:
+            encoded = json.dumps(value)
+        except (TypeError,ValueError):
+            # Not something that we can store.
+            return
+        try:
+            connection = self.getConnection()
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO cache (namespace,category,cacheId,key,value,expiry) VALUES (?,?,?,?,?,?)',
+                    (self.namespace,self.encodeKey(category),self.encodeKey(cacheId),self.encodeKey(key),encoded,expiry)
+                )
+        except sqlite3.Error:
+            pass
+
+class CacheCategory:
+    '''
+    A category of caches, each indexed by a cache ID.
+    '''
+
+    def __init__(self,name,maxEntries=0,ttl=0,store=None):
+        '''
+        Args:
+            name: The name of the category.
+            maxEntries: The maximum number of items in each cache of this category.
+            ttl: The default number of seconds that items in this category live for.
+            store: If set, caches of this category are backed by this SqliteCacheStore.
+        '''
+        ## The name of the category.
+        self.name = name
+        ## The store that caches of this category are backed by, if any.
+        self.store = store
+        ## The maximum number of items in each cache of this category.
+        self.maxEntries = maxEntries
+        ## The default number of seconds that items in this category live for.
+        self.ttl = ttl
+        ## Caches of this category, indexed by cache ID.
+        self.buckets = {}
+        ## Lock guarding the buckets.
+        self.lock = threading.RLock()
+
+    def __contains__(self,cacheId):
+        return cacheId in self.buckets
+
+    def __getitem__(self,cacheId):
+        return self.buckets[cacheId]
+
+    def __delitem__(self,cacheId):
+        with self.lock:
+            del self.buckets[cacheId]
+
+    def clear(self):
+        '''
+        Empty every cache of this category in memory. The caches themselves are kept, so that threads that are using one carry on with an empty cache instead of one that is no longer part of the category.
+        '''
+        with self.lock:
+            buckets = self.buckets.values()
+        for bucket in buckets:
+            # Only the in-memory part. The store is left to the caller.
+            CacheBucket.clear(bucket)
+
+    def configure(self,maxEntries,ttl):
+        '''
+        Change the limits of this category. Existing caches shrink as items are added to them.
+        '''
+        with self.lock:
+            self.maxEntries = maxEntries
+            self.ttl = ttl
+            for cacheId in self.buckets:
+                self.buckets[cacheId].maxEntries = maxEntries
+                self.buckets[cacheId].ttl = ttl
+
+    def getBucket(self,cacheId):
+        '''
+        Get the cache for a cache ID, creating it if it does not exist.
+
+        Returns:
+            A tuple. The first value is the CacheBucket, and the second value is True if the bucket was just created.
+        '''
+        with self.lock:
+            if cacheId in self.buckets:
+                return self.buckets[cacheId],False
+            if self.store:
+                bucket = PersistentCacheBucket(self.store,self.name,cacheId,maxEntries=self.maxEntries,ttl=self.ttl)
+            else:
+                bucket = CacheBucket(maxEntries=self.maxEntries,ttl=self.ttl)
+            self.buckets[cacheId] = bucket
+            return bucket,True
+
+class Cache:
+    '''
+    The DirectoryTools cache. Holds cache categories (for example, 'resolvedUsers'), each of which holds caches indexed by cache ID.
+
+    Can be used like the nested dictionaries that it replaces: self.cache[category][cacheId][key]. Categories and caches are created through getBucket().
+    '''
+
+    def __init__(self,maxEntries=0,ttl=0,categorySettings=None):
+        '''
+        Args:
+            maxEntries: The default maximum number of items in each cache.
+            ttl: The default number of seconds that items live for.
+            categorySettings: Dictionary of per-category overrides, indexed by category name. Each value is a (maxEntries,ttl) tuple.
+        '''
+        ## Categories, indexed by name.
+        self.categories = {}
+        ## Lock guarding the categories.
+        self.lock = threading.RLock()
+        ## Persistent store for the categories in persistentCategories, if any.
+        self.store = None
+        ## Names of the categories that are backed by the store.
+        self.persistentCategories = frozenset()
+        ## Counters of the caches that have been removed, indexed by category name. Each value is a [hits,misses,evictions] list.
+        self.retired = {}
+        self.configure(maxEntries,ttl,categorySettings)
+
+    def __contains__(self,category):
+        return category in self.categories
+
+    def __getitem__(self,category):
+        return self.categories[category]
+
+    def __delitem__(self,category):
+        with self.lock:
+            self.retire(self.categories.pop(category))
+
+    def clear(self,keep=()):
+        '''
+        Empty every cache in memory, leaving the persistent store alone.
+
+        Caches are emptied in place rather than removed, so that a thread that is between looking a cache up and using it never finds it gone.
+
+        Args:
+            keep: Names of categories to leave alone.
+        '''
+        with self.lock:
+            cacheCategories = [self.categories[name] for name in self.categories if name not in keep]
+        for cacheCategory in cacheCategories:
+            cacheCategory.clear()
+
+    def flush(self,category=None,cacheId=None,keep=()):
+        '''
+        Empty a category, or everything, in memory and in the persistent store. A single cache can be removed instead.
+
+        Whole categories are emptied in place (see clear()). A single cache is removed, since that is how calls free the per-call caches that they created.
+
+        Args:
+            category: The name of the category to empty. If left at None, all categories are emptied.
+            cacheId: The cache ID to remove from the category. If left at None, the whole category is emptied.
+            keep: Names of categories to leave alone when everything is emptied.
+        '''
+        with self.lock:
+            if self.store:
+                # The store goes first, so that emptied caches aren't refilled from it.
+                if category is None:
+                    for persistentCategory in self.persistentCategories - frozenset(keep):
+                        self.store.delete(persistentCategory)
+                elif category in self.persistentCategories:
+                    self.store.delete(category,cacheId)
+
+            if category is None:
+                cacheCategories = [self.categories[name] for name in self.categories if name not in keep]
+            elif category in self.categories:
+                cacheCategories = [self.categories[category]]
+            else:
+                return
+
+            if category is None or cacheId is None:
+                for cacheCategory in cacheCategories:
+                    cacheCategory.clear()
+                return
+            cacheCategory = cacheCategories[0]
+            with cacheCategory.lock:
+                if cacheId in cacheCategory.buckets:
+                    self.retire(cacheCategory,[cacheCategory.buckets.pop(cacheId)])
+
+    def removeMatching(self,categories,matches):
+        '''
+        Remove every item of some categories that a function selects, from memory and from the persistent store.
+
+        Args:
+            categories: Names of the categories to look through.
+            matches: Function that is called with the key and value of each item, and returns True if the item should be removed.
+
+        Returns:
+            The number of items that were removed from memory.
+        '''
+        removed = 0
+        with self.lock:
+            buckets = []
+            for category in categories:
+                if category in self.categories:
+                    buckets.extend(self.categories[category].buckets.values())
+        for bucket in buckets:
+            # Only the in-memory part. The store is handled below, including categories that are not loaded.
+            removed += CacheBucket.removeMatching(bucket,matches)
+
+        if self.store:
+            for category in categories:
+                if category in self.persistentCategories:
+                    self.store.deleteMatching(category,matches)
+        return removed
+
+    def configure(self,maxEntries,ttl,categorySettings=None):
+        '''
+        Change the default and per-category limits.
+
+        Args:
+            maxEntries: The default maximum number of items in each cache.
+            ttl: The default number of seconds that items live for.
+            categorySettings: Dictionary of per-category overrides, indexed by category name. Each value is a (maxEntries,ttl) tuple.
+        '''
+        with self.lock:
+            ## The default maximum number of items in each cache.
+            self.maxEntries = maxEntries
+            ## The default number of seconds that items live for.
+            self.ttl = ttl
+            ## Per-category overrides.
+            self.categorySettings = categorySettings or {}
+            for name in self.categories:
+                self.categories[name].configure(*self.getSettings(name))
+
+    def getBucket(self,category,cacheId):
+        '''
+        Get a cache, creating it and its category if they do not exist.
+
+        Args:
+            category: The name of the category.
+            cacheId: The cache ID.
+
+        Returns:
+            A tuple. The first value is the CacheBucket, and the second value is True if the bucket was just created.
+        '''
+        with self.lock:
+            if category not in self.categories:
+                maxEntries,ttl = self.getSettings(category)
+                store = None
+                if category in self.persistentCategories:
+                    store = self.store
+                self.categories[category] = CacheCategory(category,maxEntries=maxEntries,ttl=ttl,store=store)
+            cacheCategory = self.categories[category]
+        return cacheCategory.getBucket(cacheId)
+
+    def setStore(self,store,persistentCategories=()):
+        '''
+        Back some categories with a persistent store. Categories that are in memory are dropped (without touching the store), so that they are recreated with the new backing.
+
+        Args:
+            store: A SqliteCacheStore, or None to keep all categories in memory only.
+            persistentCategories: Names of the categories to back with the store.
+        '''
+        with self.lock:
+            self.store = store
+            self.persistentCategories = frozenset(persistentCategories)
+            for cacheCategory in self.categories.values():
+                self.retire(cacheCategory)
+            self.categories.clear()
+
+    def getSettings(self,category):
+        '''
+        Get the limits for a category.
+
+        Returns:
+            A (maxEntries,ttl) tuple.
+        '''
+        return self.categorySettings.get(category,(self.maxEntries,self.ttl))
+
+    def getStatistics(self):
+        '''
+        Get the lookup counters of every category. Counters of caches that have since been removed are included, so they never go down.
+
+        Returns:
+            A dictionary of (hits,misses,evictions,entries) tuples, indexed by category name. Entries is the number of items currently held in memory.
+        '''
+        with self.lock:
+            statistics = {}
+            for name,(hits,misses,evictions) in self.retired.items():
+                statistics[name] = [hits,misses,evictions,0]
+            for name,cacheCategory in self.categories.items():
+                totals = statistics.setdefault(name,[0,0,0,0])
+                with cacheCategory.lock:
+                    buckets = cacheCategory.buckets.values()
+                for bucket in buckets:
+                    totals[0] += bucket.hits
+                    totals[1] += bucket.misses
+                    totals[2] += bucket.evictions
+                    totals[3] += len(bucket)
+        return dict([(name,tuple(totals)) for name,totals in statistics.items()])
+
+    def retire(self,cacheCategory,buckets=None):
+        '''
+        Add the counters of caches that are being removed to the retired counters of their category. Called with the lock held.
+
+        Args:
+            cacheCategory: The CacheCategory that the caches belong to.
+            buckets: The caches being removed. Defaults to every cache of the category.
+        '''
+        if buckets is None:
+            buckets = cacheCategory.buckets.values()
+        totals = self.retired.setdefault(cacheCategory.name,[0,0,0])
+        for bucket in buckets:
+            totals[0] += bucket.hits
+            totals[1] += bucket.misses
+            totals[2] += bucket.evictions
+
+class SingleFlight:
+    '''
+    Coalesces identical calls that are made at the same time.
+
+    The first thread to ask for a key runs the call. Threads that ask for the same key while the call is running wait for it and share its result, or its exception, instead of running the call again. Nothing is kept once the call finishes, so a later call runs again (results are cached elsewhere).
+
+    Calls must not depend on other coalesced calls, or two threads can end up waiting on each other.
+    '''
+
+    def __init__(self):
+        ## Calls that are running, indexed by key. Each value is a [event,result,exceptionInfo] list.
+        self.calls = {}
+        ## Lock guarding calls.
+        self.lock = threading.Lock()
+        ## The number of calls that were answered by waiting on another thread.
+        self.shared = 0
+
+    def do(self,key,function,*args,**kwargs):
+        '''
+        Run a call, or wait for an identical call that is already running.
+
+        Args:
+            key: Hashable value identifying the call.
+            function: Function to run if no call with this key is running. Any further arguments are passed to it.
+
+        Returns:
+            A tuple. The first value is the result of the call, and the second value is True if the result came from another thread.
+        '''
+        with self.lock:
+            call = self.calls.get(key)
+            if call is None:
+                call = self.calls[key] = [threading.Event(),None,None]
+                leader = True
+            else:
+                self.shared += 1
+                leader = False
+
+        if not leader:
+            call[0].wait()
+            if call[2]:
+                raise call[2][0],call[2][1],call[2][2]
+            return call[1],True
+
+        try:
+            call[1] = function(*args,**kwargs)
+        except:
+            call[2] = sys.exc_info()
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call[0].set()
+        return call[1],False
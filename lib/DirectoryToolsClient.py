@@ -0,0 +1,240 @@
+#!/usr/bin/python
+
+import json,socket,struct,threading
+
+import DirectoryToolsExceptions as exceptions
+
+'''
+Client for the DirectoryTools daemon (see DirectoryToolsDaemon), and the wire protocol that the two share.
+
+The client does not import python-ldap, so that short-lived callers (WSGI applications, PAM helpers, cron scripts) can ask a resident daemon with warm caches and bound connections instead of building a DirectoryTools object of their own.
+
+Protocol:
+    Every message is a 4-byte unsigned big-endian length, followed by that many bytes of UTF-8 JSON.
+    A request is a JSON array of the method name followed by its arguments, for example ["isUserInGroup","alan","admins"].
+    A response is either [true,result] or [false,exceptionName,message].
+    A connection can carry any number of requests, one at a time.
+'''
+
+## Socket that the daemon listens on, if neither the daemon nor the client is given another one.
+DEFAULT_SOCKET_PATH = '/var/run/directorytools/directorytools.sock'
+
+## Permissions of the daemon's socket, if it is not given others. Anyone who can connect can test passwords and list group members, so access is limited to the daemon's user and group.
+DEFAULT_SOCKET_MODE = 0660
+
+## Largest message that either side accepts, in bytes.
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+## Format of the length prefix of a message.
+LENGTH_FORMAT = '!I'
+
+## Size of the length prefix of a message, in bytes.
+LENGTH_SIZE = struct.calcsize(LENGTH_FORMAT)
+
+def readExactly(connection,size):
+    '''
+    Read a number of bytes from a socket.
+
+    Args:
+        connection: The socket to read from.
+        size: The number of bytes to read.
+
+    Returns:
+        The bytes, or None if the other side closed the connection before sending any of them.
+    '''
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = connection.recv(min(remaining,65536))
+        if not chunk:
+            if remaining == size:
+                return None
+            raise socket.error('Connection closed in the middle of a message.')
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return ''.join(chunks)
+
+def readMessage(connection):
+    '''
+    Read one message from a socket.
+
+    Args:
+        connection: The socket to read from.
+
+    Returns:
+        The decoded message, or None if the other side closed the connection.
+    '''
+    prefix = readExactly(connection,LENGTH_SIZE)
+    if prefix is None:
+        return None
+    size = struct.unpack(LENGTH_FORMAT,prefix)[0]
+    if size > MAX_MESSAGE_SIZE:
+        raise ValueError('Message of {0} bytes is over the limit of {1} bytes.'.format(size,MAX_MESSAGE_SIZE))
+    body = readExactly(connection,size)
+    if body is None:
+        raise socket.error('Connection closed in the middle of a message.')
+    return json.loads(body)
+
+def writeMessage(connection,message):
+    '''
+    Write one message to a socket.
+
+    Args:
+        connection: The socket to write to.
+        message: The message. Must be serializable as JSON.
+    '''
+    body = json.dumps(message,separators=(',',':'))
+    if len(body) > MAX_MESSAGE_SIZE:
+        raise ValueError('Message of {0} bytes is over the limit of {1} bytes.'.format(len(body),MAX_MESSAGE_SIZE))
+    connection.sendall(struct.pack(LENGTH_FORMAT,len(body)) + body)
+
+class DirectoryToolsClient:
+    '''
+    Sends lookups to a DirectoryTools daemon over its Unix socket.
+
+    The lookup methods take the same arguments as the DirectoryTools methods of the same names. One connection is kept open and reused. If it turns out to have been closed (for example because the daemon was restarted), the request is sent again once on a new connection.
+
+    A client can be shared between threads, but requests are sent one at a time.
+    '''
+
+    def __init__(self,socketPath=DEFAULT_SOCKET_PATH,timeout=30):
+        '''
+        Args:
+            socketPath: Path of the daemon's socket.
+            timeout: Seconds to wait for the daemon to answer, or None to wait for as long as it takes.
+        '''
+        ## Path of the daemon's socket.
+        self.socketPath = socketPath
+        ## Seconds to wait for the daemon to answer.
+        self.timeout = timeout
+        ## The open connection to the daemon, or None before the first request.
+        self.connection = None
+        ## Lock that keeps threads from sending requests over the connection at the same time.
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exceptionType,exceptionValue,trace):
+        self.close()
+
+    def authenticate(self,userName,password,userNameIsDN=False):
+        '''
+        Check a user's password. See DirectoryTools.authenticate().
+
+        Returns:
+            True if the password is correct, False otherwise.
+        '''
+        return self.call('authenticate',userName,password,userNameIsDN)
+
+    def call(self,method,*args):
+        '''
+        Send a request to the daemon and wait for its answer.
+
+        Args:
+            method: Name of the DirectoryTools method to call.
+            args: Arguments of the method.
+
+        Returns:
+            The value that the method returned in the daemon.
+
+        Raises:
+            DaemonRequestException: The method raised an exception in the daemon, or the daemon did not accept the request.
+            socket.error: The daemon could not be reached.
+        '''
+        request = [method] + list(args)
+        with self.lock:
+            reused = self.connection is not None
+            try:
+                response = self.send(request)
+            except (socket.error,ValueError):
+                self.close()
+                if not reused:
+                    raise
+                # The daemon may have closed an idle connection. Try once more on a new one.
+                response = self.send(request)
+
+        if response[0]:
+            return response[1]
+        raise exceptions.DaemonRequestException(name=response[1],message=response[2])
+
+    def close(self):
+        '''
+        Close the connection to the daemon. A new one is opened by the next request.
+        '''
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except socket.error:
+                pass
+            self.connection = None
+
+    def connect(self):
+        '''
+        Open a connection to the daemon.
+
+        Returns:
+            The connected socket.
+        '''
+        connection = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+        connection.settimeout(self.timeout)
+        try:
+            connection.connect(self.socketPath)
+        except:
+            connection.close()
+            raise
+        return connection
+
+    def getUserGroups(self,userName,userNameIsDN=False,returnGroupsAsDN=False):
+        '''
+        List the groups that a user is a member of. See DirectoryTools.getUserGroups().
+
+        Returns:
+            A list of group names or DNs.
+        '''
+        return self.call('getUserGroups',userName,userNameIsDN,returnGroupsAsDN)
+
+    def getUsersInGroup(self,groupName,returnMembersAsDN=False):
+        '''
+        List the users in a group. See DirectoryTools.getUsersInGroup().
+
+        Returns:
+            A list of user names or DNs.
+        '''
+        return self.call('getUsersInGroup',groupName,returnMembersAsDN)
+
+    def isUserInGroup(self,userName,groupName,userNameIsDN=False,groupNameIsDN=False):
+        '''
+        Check whether a user is in a group. See DirectoryTools.isUserInGroup().
+
+        Returns:
+            True if the user is a direct or nested member of the group, False otherwise.
+        '''
+        return self.call('isUserInGroup',userName,groupName,userNameIsDN,groupNameIsDN)
+
+    def ping(self):
+        '''
+        Check that the daemon is answering.
+
+        Returns:
+            True
+        '''
+        return self.call('ping')
+
+    def send(self,request):
+        '''
+        Send a request over the open connection, opening one first if needed.
+
+        Args:
+            request: The request message.
+
+        Returns:
+            The response message.
+        '''
+        if self.connection is None:
+            self.connection = self.connect()
+        writeMessage(self.connection,request)
+        response = readMessage(self.connection)
+        if response is None:
+            raise socket.error('The daemon closed the connection.')
+        return response
@@ -0,0 +1,243 @@
+#!/usr/bin/python
+
+import argparse,errno,os,signal,socket,stat,SocketServer
+
+import DirectoryTools
+import DirectoryToolsIndexes as index
+import DirectoryToolsClient as client
+
+'''
+A resident process that owns a DirectoryTools object and answers lookups for other processes over a Unix socket.
+
+Building a DirectoryTools object for every request means merging a schema template, binding the proxy user and starting with empty caches every time. The daemon does this once, and keeps its connection pools and caches warm between requests. Callers use DirectoryToolsClient, which speaks the protocol described there.
+
+Example:
+    python DirectoryToolsDaemon.py -c /etc/directorytools.ini -t ad -s /var/run/directorytools/directorytools.sock
+'''
+
+class DaemonRequestHandler(SocketServer.BaseRequestHandler):
+    '''
+    Answers the requests sent over one client connection, until the client closes it.
+    '''
+
+    def handle(self):
+        while True:
+            try:
+                request = client.readMessage(self.request)
+            except (socket.error,ValueError), e:
+                # A broken or oversized message leaves us unable to find the start of the next one.
+                self.server.daemon.printDebug("Dropping client connection: {0}",DirectoryTools.LOG_LEVEL_WARNING,e)
+                return
+            if request is None:
+                return
+
+            response = self.server.daemon.answer(request)
+            try:
+                client.writeMessage(self.request,response)
+            except ValueError, e:
+                client.writeMessage(self.request,[False,e.__class__.__name__,str(e)])
+            except socket.error:
+                return
+
+class DaemonServer(SocketServer.ThreadingMixIn,SocketServer.UnixStreamServer):
+    '''
+    Unix socket server that answers each client connection on its own thread.
+    '''
+
+    ## Don't wait for client threads when the daemon exits.
+    daemon_threads = True
+
+    def __init__(self,socketPath,daemon):
+        '''
+        Args:
+            socketPath: Path to listen on.
+            daemon: The DirectoryToolsDaemon that answers requests.
+        '''
+        ## The DirectoryToolsDaemon that answers requests.
+        self.daemon = daemon
+        SocketServer.UnixStreamServer.__init__(self,socketPath,DaemonRequestHandler)
+
+class DirectoryToolsDaemon:
+    '''
+    Answers DirectoryTools lookups sent over a Unix socket.
+
+    Only the lookups named in METHODS can be called. Everything else about the DirectoryTools object (the server, pools, caches and cache syncing) is set up through its properties as usual.
+    '''
+
+    ## Methods of DirectoryTools that clients can call.
+    METHODS = frozenset(['authenticate','isUserInGroup','getUserGroups','getUsersInGroup'])
+
+    def __init__(self,directoryTools,socketPath=None,socketMode=None):
+        '''
+        Args:
+            directoryTools: The DirectoryTools object to answer lookups with.
+            socketPath: Path to listen on. Defaults to the value of the DAEMON_SOCKET property, or DirectoryToolsClient.DEFAULT_SOCKET_PATH.
+            socketMode: Permissions of the socket, such as 0660. Defaults to the value of the DAEMON_SOCKET_MODE property, which is read as octal digits (such as '660'), or DirectoryToolsClient.DEFAULT_SOCKET_MODE.
+        '''
+        ## The DirectoryTools object to answer lookups with.
+        self.directoryTools = directoryTools
+        if socketPath is None:
+            socketPath = directoryTools.getProperty(index.DAEMON_SOCKET,defaultOverride=client.DEFAULT_SOCKET_PATH)
+        if socketMode is None:
+            configuredMode = directoryTools.getProperty(index.DAEMON_SOCKET_MODE,defaultOverride='')
+            # Configuration files give the mode as digits, which are loaded as a decimal integer.
+            socketMode = int(str(configuredMode),8) if configuredMode != '' else client.DEFAULT_SOCKET_MODE
+        ## Path to listen on.
+        self.socketPath = socketPath
+        ## Permissions of the socket.
+        self.socketMode = socketMode
+        ## The socket server, while the daemon is listening.
+        self.server = None
+
+    def answer(self,request):
+        '''
+        Answer one request.
+
+        Args:
+            request: The request message: a method name followed by its arguments.
+
+        Returns:
+            The response message.
+        '''
+        if not isinstance(request,list) or not request or not isinstance(request[0],basestring):
+            return [False,'BadRequest','A request must be a list of a method name followed by its arguments.']
+
+        method = request[0]
+        if method == 'ping':
+            return [True,True]
+        if method not in self.METHODS:
+            return [False,'BadRequest',"Unknown method '{0}'.".format(method)]
+
+        # python-ldap expects byte strings.
+        args = [self.encode(arg) for arg in request[1:]]
+        try:
+            result = getattr(self.directoryTools,method)(*args)
+        except Exception, e:
+            self.printDebug("Request '{0}' failed: {1}",DirectoryTools.LOG_LEVEL_ERROR,method,e)
+            return [False,e.__class__.__name__,str(e)]
+
+        if isinstance(result,(set,frozenset,tuple)):
+            result = list(result)
+        return [True,result]
+
+    def close(self):
+        '''
+        Stop listening, remove the socket, and close the directory connections.
+        '''
+        if self.server is not None:
+            self.server.server_close()
+            self.server = None
+            try:
+                os.unlink(self.socketPath)
+            except OSError:
+                pass
+        self.directoryTools.stopSync()
+        self.directoryTools.closeConnections()
+
+    def encode(self,value):
+        '''
+        Encode a decoded JSON value as UTF-8.
+
+        Args:
+            value: A request argument.
+
+        Returns:
+            The argument, with unicode strings encoded.
+        '''
+        if isinstance(value,unicode):
+            return value.encode('utf-8')
+        if isinstance(value,list):
+            return [self.encode(item) for item in value]
+        return value
+
+    def listen(self):
+        '''
+        Create the socket and start listening. A socket left behind by a daemon that is no longer running is removed first.
+        '''
+        self.removeStaleSocket()
+        # Don't let the socket exist with looser permissions than requested, even briefly.
+        previousMask = os.umask(0777 & ~self.socketMode)
+        try:
+            self.server = DaemonServer(self.socketPath,self)
+        finally:
+            os.umask(previousMask)
+        os.chmod(self.socketPath,self.socketMode)
+        self.printDebug("Listening on '{0}'.",DirectoryTools.LOG_LEVEL_WARNING,self.socketPath)
+
+    def printDebug(self,message,secrecyLevel,*args):
+        self.directoryTools.printDebug(message,secrecyLevel,*args)
+
+    def removeStaleSocket(self):
+        '''
+        Remove the socket file of a daemon that is no longer running.
+
+        Raises:
+            socket.error: Another daemon is answering on the socket, or the path is not a socket.
+        '''
+        try:
+            mode = os.stat(self.socketPath).st_mode
+        except OSError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise socket.error(errno.EEXIST,"'{0}' exists and is not a socket.".format(self.socketPath))
+
+        probe = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socketPath)
+        except socket.error:
+            # Nobody is listening.
+            os.unlink(self.socketPath)
+            return
+        finally:
+            probe.close()
+        raise socket.error(errno.EADDRINUSE,"Another daemon is listening on '{0}'.".format(self.socketPath))
+
+    def serveForever(self):
+        '''
+        Listen for requests until the process is interrupted or terminated.
+
+        The proxy connection is bound before the first request is accepted, so that the first caller does not pay for it and a misconfiguration shows up right away.
+        '''
+        try:
+            with self.directoryTools.getProxyPool().connection():
+                pass
+        except Exception, e:
+            self.printDebug("Unable to open a proxy connection: {0}",DirectoryTools.LOG_LEVEL_CRITICAL,e)
+
+        if self.server is None:
+            self.listen()
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+def loadArguments():
+    '''
+    Parse the command line arguments.
+    '''
+    parser = argparse.ArgumentParser(description='Answer DirectoryTools lookups over a Unix socket.')
+    parser.add_argument('-c',dest='configFile',required=True,help='DirectoryTools configuration file.')
+    parser.add_argument('-t',dest='template',default='openldap',help='Schema template. Defaults to openldap.')
+    parser.add_argument('-s',dest='socketPath',help='Socket to listen on. Defaults to the {0} property, or {1}.'.format(index.DAEMON_SOCKET,client.DEFAULT_SOCKET_PATH))
+    parser.add_argument('-v',dest='verbose',action='store_true',help='Print debug output.')
+    return parser.parse_args()
+
+def main():
+    args = loadArguments()
+    if not os.path.isfile(args.configFile):
+        print "ERROR: Configuration file '{0}' does not exist".format(args.configFile)
+        exit(1)
+
+    directoryTools = DirectoryTools.DirectoryTools(template=args.template,configFile=args.configFile,enableStdOut=args.verbose)
+    daemon = DirectoryToolsDaemon(directoryTools,socketPath=args.socketPath)
+
+    def terminate(signum,frame):
+        raise KeyboardInterrupt()
+    signal.signal(signal.SIGTERM,terminate)
+
+    daemon.serveForever()
+
+if __name__ == '__main__':
+    main()
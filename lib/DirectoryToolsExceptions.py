@@ -113,3 +113,84 @@ class ProxyFailedException(ExceptionWrapper):
     def cause():
         ''' Gets a hard-coded explanation of the cause of this exception. '''
         return "There was an error getting a proxy handle."
+
+class PoolTimeoutException(Exception):
+    '''
+    To be triggered when no connection could be checked out of a connection pool before the pool's timeout expired.
+    '''
+
+    def __init__(self,timeout=None):
+        '''
+        Initializes the exception.
+
+        Args:
+            timeout: The number of seconds that we waited for a connection.
+        '''
+        ## The number of seconds that we waited for a connection.
+        self.timeout = timeout
+
+    def cause(self):
+        ''' Gets a hard-coded explanation of the cause of this exception. '''
+        return "Timed out waiting for a pooled connection."
+
+class PoolClosedException(Exception):
+    '''
+    To be triggered when a connection is requested from a connection pool that has already been closed.
+    '''
+
+    def cause(self):
+        ''' Gets a hard-coded explanation of the cause of this exception. '''
+        return "The connection pool has been closed."
+
+class AsyncNotDoneException(Exception):
+    '''
+    To be triggered when the result of an asynchronous operation is requested before the operation has finished.
+    '''
+
+    def cause(self):
+        ''' Gets a hard-coded explanation of the cause of this exception. '''
+        return "The asynchronous operation has not finished yet."
+
+class AsyncTimeoutException(Exception):
+    '''
+    To be triggered when an asynchronous operation did not finish before a caller's timeout expired.
+    '''
+
+    def __init__(self,timeout=None):
+        '''
+        Initializes the exception.
+
+        Args:
+            timeout: The number of seconds that we waited for the operation.
+        '''
+        ## The number of seconds that we waited for the operation.
+        self.timeout = timeout
+
+    def cause(self):
+        ''' Gets a hard-coded explanation of the cause of this exception. '''
+        return "Timed out waiting for an asynchronous operation."
+
+class DaemonRequestException(Exception):
+    '''
+    To be triggered when a DirectoryTools daemon could not answer a request, either because the lookup raised an exception in the daemon or because the request was malformed.
+    '''
+
+    def __init__(self,name=None,message=''):
+        '''
+        Initializes the exception.
+
+        Args:
+            name: The class name of the exception that was raised in the daemon.
+            message: The message of the exception that was raised in the daemon.
+        '''
+        ## The class name of the exception that was raised in the daemon.
+        self.name = name
+        ## The message of the exception that was raised in the daemon.
+        self.message = message
+
+    def __str__(self):
+        return '{0}: {1}'.format(self.name,self.message)
+
+    def cause(self):
+        ''' Gets a hard-coded explanation of the cause of this exception. '''
+        return "The DirectoryTools daemon could not answer the request."
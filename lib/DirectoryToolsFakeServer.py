@@ -0,0 +1,689 @@
+#!/usr/bin/python
+
+import re,struct,threading,ldap
+from collections import OrderedDict
+from time import time,sleep,strftime,gmtime
+from ldap.controls import SimplePagedResultsControl
+
+import DirectoryToolsIndexes as index
+
+## OID of Active Directory's LDAP_MATCHING_RULE_IN_CHAIN matching rule.
+MATCHING_RULE_IN_CHAIN = '1.2.840.113556.1.4.1941'
+
+class FakeDirectory:
+    '''
+    An in-process stand-in for an LDAP server.
+
+    Entries are kept in memory, and connections made through FakeDirectory.initialize() answer binds and searches against them with the same calls that python-ldap's LDAPObject offers. Plug it into a DirectoryTools object with install().
+
+    Every operation is counted in self.counters, and an artificial per-operation latency can be injected so that network-bound regressions show up in benchmarks. Operations are answered asynchronously: an operation that was sent while others were still waiting only costs the latency once, like pipelined requests on a real connection.
+    '''
+
+    def __init__(self,shape='openldap',baseDN='dc=example,dc=lan',latency=0.0,maxValRange=None):
+        '''
+        Initializes an empty directory.
+
+        Args:
+            shape: The kind of server to imitate: 'openldap', 'ad' or 'freeipa'. The 'ad' shape adds objectSid, tokenGroups, memberOf, uSNChanged, ranged retrieval and the in-chain matching rule.
+            baseDN: The base DN of the directory.
+            latency: The number of seconds that each operation takes to be answered.
+            maxValRange: The number of values of a multi-valued attribute that will be returned before ranged retrieval is needed. Defaults to 1500 for the 'ad' shape, and unlimited otherwise.
+        '''
+        ## The kind of server to imitate.
+        self.shape = shape
+        ## The base DN of the directory.
+        self.baseDN = baseDN
+        ## The number of seconds that each operation takes to be answered.
+        self.latency = latency
+        ## Per-host latency overrides, indexed by the host part of the connection URI.
+        self.hostLatency = {}
+        ## Hosts that will refuse all operations with ldap.SERVER_DOWN.
+        self.downHosts = set()
+        ## Maximum number of values returned for a multi-valued attribute before ranged retrieval is needed.
+        if maxValRange is None and shape == 'ad':
+            maxValRange = 1500
+        self.maxValRange = maxValRange
+        ## Whether the extensible in-chain matching rule is supported.
+        self.supportsInChain = (shape == 'ad')
+        ## Whether the constructed tokenGroups attribute is returned.
+        self.supportsTokenGroups = (shape == 'ad')
+
+        ## Entries indexed by lowercase DN. Each value is a [dn,attributes] list.
+        self.entries = OrderedDict()
+        ## Operation counters.
+        self.counters = {}
+        ## Change sequence number, used for uSNChanged and modifyTimestamp values.
+        self.usn = 1000
+        ## Next relative identifier to hand out for objectSid values.
+        self.nextRid = 1000
+        ## Lock guarding entries and counters.
+        self.lock = threading.RLock()
+        ## Groups that each entry is a direct member of, indexed by lowercase DN. Rebuilt when the directory changes.
+        self.parents = None
+        ## Value of self.usn when self.parents was built.
+        self.parentsUsn = None
+        self.resetCounters()
+
+    def addEntry(self,dn,attributes):
+        '''
+        Add an entry to the directory, replacing any entry with the same DN.
+
+        Args:
+            dn: The distinguished name of the entry.
+            attributes: Dictionary of attribute values. Values may be single strings or lists of strings.
+        '''
+        with self.lock:
+            entryAttributes = {}
+            for key in attributes:
+                value = attributes[key]
+                if not isinstance(value,(list,tuple)):
+                    value = [value]
+                entryAttributes[key] = [str(v) for v in value]
+            if self.shape == 'ad' and 'objectSid' not in entryAttributes:
+                entryAttributes['objectSid'] = [self.encodeSid('S-1-5-21-1004336348-1177238915-682003330-{0}'.format(self.nextRid))]
+                self.nextRid += 1
+            self.entries[dn.lower()] = [dn,entryAttributes]
+            self.touchEntry(dn)
+
+    def modifyEntry(self,dn,attributes):
+        '''
+        Replace attribute values of an existing entry. An attribute with a value of None is removed.
+
+        Args:
+            dn: The distinguished name of the entry.
+            attributes: Dictionary of new attribute values.
+        '''
+        with self.lock:
+            entry = self.getEntry(dn)
+            for key in attributes:
+                value = attributes[key]
+                existing = self.getAttributeName(entry[1],key) or key
+                if value is None:
+                    entry[1].pop(existing,None)
+                    continue
+                if not isinstance(value,(list,tuple)):
+                    value = [value]
+                entry[1][existing] = [str(v) for v in value]
+            self.touchEntry(dn)
+
+    def removeEntry(self,dn):
+        '''
+        Remove an entry from the directory.
+
+        Args:
+            dn: The distinguished name of the entry.
+        '''
+        with self.lock:
+            self.entries.pop(dn.lower(),None)
+            self.usn += 1
+
+    def touchEntry(self,dn):
+        '''
+        Update the change tracking attributes of an entry.
+
+        Args:
+            dn: The distinguished name of the entry.
+        '''
+        self.usn += 1
+        entry = self.entries[dn.lower()]
+        now = strftime('%Y%m%d%H%M%S',gmtime())
+        entry[1]['modifyTimestamp'] = [now + 'Z']
+        # The change number stands in for the fraction so that changes made in the same second still sort in order.
+        entry[1]['entryCSN'] = [now + '.{0:06d}Z#000000#000#000000'.format(self.usn % 1000000)]
+        if self.shape == 'ad':
+            entry[1]['uSNChanged'] = [str(self.usn)]
+
+    def encodeSid(self,sid):
+        '''
+        Encode a string SID into its binary form.
+
+        Args:
+            sid: SID in 'S-1-5-21-...' form.
+
+        Returns:
+            A string of binary data.
+        '''
+        parts = sid.split('-')
+        subAuthorities = [int(p) for p in parts[3:]]
+        return struct.pack('<BB',int(parts[1]),len(subAuthorities)) + struct.pack('>Q',int(parts[2]))[2:] + ''.join([struct.pack('<I',s) for s in subAuthorities])
+
+    def getAttributeName(self,attributes,name):
+        '''
+        Find the stored spelling of an attribute name. Attribute names are case-insensitive.
+
+        Returns:
+            The stored attribute name, or None if the entry does not have the attribute.
+        '''
+        name = name.lower()
+        for key in attributes:
+            if key.lower() == name:
+                return key
+        return None
+
+    def getEntry(self,dn):
+        '''
+        Get an entry by DN.
+
+        Raises:
+            ldap.NO_SUCH_OBJECT if the entry does not exist.
+        '''
+        try:
+            return self.entries[dn.strip().lower()]
+        except KeyError:
+            raise ldap.NO_SUCH_OBJECT({'desc':'No such object','matched':self.baseDN})
+
+    def getValues(self,entry,name):
+        '''
+        Get the values of an attribute, including constructed attributes.
+
+        Args:
+            entry: A [dn,attributes] entry.
+            name: The attribute name.
+
+        Returns:
+            A list of values.
+        '''
+        lowerName = name.lower()
+        if lowerName == 'distinguishedname' or lowerName == 'entrydn':
+            return [entry[0]]
+        if lowerName == 'memberof' and self.shape != 'openldap':
+            return [group[0] for group in self.entries.values() if entry[0].lower() in [m.lower() for m in self.getValues(group,'member')]]
+        key = self.getAttributeName(entry[1],name)
+        if key is None:
+            return []
+        return entry[1][key]
+
+    def getTransitiveGroups(self,dn):
+        '''
+        Get the distinguished names of every group that an object is a member of, directly or through nesting.
+
+        Args:
+            dn: The distinguished name of the object.
+
+        Returns:
+            A set of lowercase group DNs.
+        '''
+        with self.lock:
+            if self.parentsUsn != self.usn:
+                parents = {}
+                for key in self.entries:
+                    for member in self.getValues(self.entries[key],'member'):
+                        parents.setdefault(member.lower(),[]).append(key)
+                self.parents = parents
+                self.parentsUsn = self.usn
+            parents = self.parents
+        found = set()
+        frontier = [dn.lower()]
+        while frontier:
+            nextFrontier = []
+            for child in frontier:
+                for parent in parents.get(child,[]):
+                    if parent not in found:
+                        found.add(parent)
+                        nextFrontier.append(parent)
+            frontier = nextFrontier
+        return found
+
+    def initialize(self,uri):
+        '''
+        Replacement for ldap.initialize().
+
+        Args:
+            uri: The connection URI. The host part selects per-host latency and failure settings.
+
+        Returns:
+            A FakeLDAPObject connected to this directory.
+        '''
+        return FakeLDAPObject(self,uri)
+
+    def install(self,directoryTools):
+        '''
+        Make a DirectoryTools object open its connections against this directory.
+
+        Args:
+            directoryTools: The DirectoryTools object.
+        '''
+        directoryTools.connectionFactory = self.initialize
+        directoryTools.closeConnections()
+
+    def countOperation(self,operation,entries=0):
+        '''
+        Count an operation.
+
+        Args:
+            operation: The name of the operation, for example 'search' or 'bind'.
+            entries: The number of entries returned by the operation.
+        '''
+        with self.lock:
+            self.counters[operation] = self.counters.get(operation,0) + 1
+            self.counters['entries'] += entries
+
+    def resetCounters(self):
+        '''
+        Reset all operation counters to zero.
+        '''
+        with self.lock:
+            self.counters = {'bind':0,'search':0,'abandon':0,'entries':0}
+
+    def bind(self,who,cred):
+        '''
+        Check a simple bind.
+
+        Raises:
+            ldap.INVALID_CREDENTIALS if the credentials are wrong.
+        '''
+        if not who:
+            # Anonymous bind.
+            return
+        try:
+            entry = self.getEntry(who)
+        except ldap.NO_SUCH_OBJECT:
+            raise ldap.INVALID_CREDENTIALS({'desc':'Invalid credentials'})
+        if not cred or cred not in self.getValues(entry,'userPassword'):
+            raise ldap.INVALID_CREDENTIALS({'desc':'Invalid credentials'})
+
+    def search(self,base,scope,filterstr,attrlist,serverctrls):
+        '''
+        Run a search.
+
+        Returns:
+            A tuple of the list of (dn,attributes) results and a list of response controls.
+        '''
+        with self.lock:
+            if not base and scope == ldap.SCOPE_BASE:
+                rootDSE = {'namingContexts':[self.baseDN]}
+                if self.shape == 'ad':
+                    rootDSE['highestCommittedUSN'] = [str(self.usn)]
+                return [('',rootDSE)],[]
+
+            baseEntry = self.getEntry(base)
+            baseDN = baseEntry[0].lower()
+            if scope == ldap.SCOPE_BASE:
+                candidates = [baseEntry]
+            else:
+                candidates = []
+                for key in self.entries:
+                    if key == baseDN and scope == ldap.SCOPE_SUBTREE:
+                        candidates.append(self.entries[key])
+                    elif key.endswith(',' + baseDN):
+                        if scope == ldap.SCOPE_SUBTREE or key.count(',') == baseDN.count(',') + 1:
+                            candidates.append(self.entries[key])
+
+            matcher = FilterParser(self,filterstr).parse()
+            results = []
+            for entry in candidates:
+                if matcher(entry):
+                    results.append((entry[0],self.selectAttributes(entry,attrlist,scope)))
+
+        responseControls = []
+        for control in serverctrls or []:
+            if control.controlType == SimplePagedResultsControl.controlType:
+                offset = int(control.cookie or 0)
+                page = results[offset:offset + control.size]
+                nextOffset = offset + control.size
+                cookie = ''
+                if nextOffset < len(results):
+                    cookie = str(nextOffset)
+                responseControls.append(SimplePagedResultsControl(True,size=control.size,cookie=cookie))
+                results = page
+        return results,responseControls
+
+    def selectAttributes(self,entry,attrlist,scope):
+        '''
+        Build the attribute dictionary returned for an entry.
+        '''
+        if attrlist is None or '*' in attrlist:
+            names = list(entry[1].keys())
+        else:
+            names = [name for name in attrlist if name != '1.1']
+
+        selected = {}
+        for name in names:
+            rangeMatch = re.match(r'^([^;]+);range=(\d+)-(\d+|\*)$',name,re.I)
+            if rangeMatch:
+                name = rangeMatch.group(1)
+            lowerName = name.lower()
+            if lowerName == 'tokengroups':
+                # Constructed attribute. Only available on base-scope searches, like in Active Directory.
+                if not self.supportsTokenGroups or scope != ldap.SCOPE_BASE:
+                    continue
+                values = [self.getValues(self.entries[group],'objectSid')[0] for group in self.getTransitiveGroups(entry[0])]
+                stored = 'tokenGroups'
+            else:
+                stored = self.getAttributeName(entry[1],name) or name
+                values = self.getValues(entry,name)
+            if not values:
+                continue
+
+            if rangeMatch or (self.maxValRange and len(values) > self.maxValRange):
+                low = 0
+                if rangeMatch:
+                    low = int(rangeMatch.group(2))
+                high = low + (self.maxValRange or len(values)) - 1
+                if rangeMatch and rangeMatch.group(3) != '*':
+                    high = min(high,int(rangeMatch.group(3)))
+                if high >= len(values) - 1:
+                    selected['{0};range={1}-*'.format(stored,low)] = values[low:]
+                else:
+                    selected['{0};range={1}-{2}'.format(stored,low,high)] = values[low:high + 1]
+            else:
+                selected[stored] = list(values)
+        return selected
+
+class FilterParser:
+    '''
+    Parses an LDAP filter string into a function that tests entries of a FakeDirectory.
+    '''
+
+    def __init__(self,directory,filterstr):
+        '''
+        Args:
+            directory: The FakeDirectory that the filter will be run against.
+            filterstr: The filter string.
+        '''
+        self.directory = directory
+        self.text = filterstr.strip()
+        if not self.text.startswith('('):
+            self.text = '(' + self.text + ')'
+        self.position = 0
+
+    def parse(self):
+        '''
+        Returns:
+            A function that takes a [dn,attributes] entry and returns True if it matches the filter.
+
+        Raises:
+            ldap.FILTER_ERROR if the filter can't be parsed.
+        '''
+        try:
+            matcher = self.parseFilter()
+        except (IndexError,ValueError):
+            raise ldap.FILTER_ERROR({'desc':'Bad search filter'})
+        if self.position != len(self.text):
+            raise ldap.FILTER_ERROR({'desc':'Bad search filter'})
+        return matcher
+
+    def parseFilter(self):
+        if self.text[self.position] != '(':
+            raise ValueError()
+        self.position += 1
+        operator = self.text[self.position]
+        if operator in '&|!':
+            self.position += 1
+            children = []
+            while self.text[self.position] == '(':
+                children.append(self.parseFilter())
+            self.position += 1
+            if operator == '&':
+                return lambda entry: all([child(entry) for child in children])
+            elif operator == '|':
+                return lambda entry: any([child(entry) for child in children])
+            return lambda entry: not children[0](entry)
+
+        end = self.text.index(')',self.position)
+        item = self.text[self.position:end]
+        self.position = end + 1
+        return self.parseItem(item)
+
+    def unescape(self,value):
+        return re.sub(r'\\([0-9a-fA-F]{2})',lambda m: chr(int(m.group(1),16)),value)
+
+    def parseItem(self,item):
+        directory = self.directory
+        match = re.match(r'^([^:=<>~]+)(?::([0-9.]+))?:=(.*)$',item)
+        if match:
+            # Extensible match. Only the in-chain rule is supported.
+            attribute,rule,value = match.group(1),match.group(2),self.unescape(match.group(3)).lower()
+            if rule != MATCHING_RULE_IN_CHAIN or not directory.supportsInChain:
+                raise ldap.INAPPROPRIATE_MATCHING({'desc':'Inappropriate matching'})
+            if attribute.lower() == 'memberof':
+                return lambda entry: value in directory.getTransitiveGroups(entry[0])
+            return lambda entry: entry[0].lower() in directory.getTransitiveGroups(value)
+
+        match = re.match(r'^([^=<>~]+)(>=|<=|=)(.*)$',item)
+        if not match:
+            raise ValueError()
+        attribute,operator,rawValue = match.groups()
+
+        if operator == '=' and rawValue == '*':
+            return lambda entry: len(directory.getValues(entry,attribute)) > 0
+
+        if operator == '=' and '*' in rawValue:
+            pattern = '^' + '.*'.join([re.escape(self.unescape(part)) for part in rawValue.split('*')]) + '$'
+            expression = re.compile(pattern,re.I | re.S)
+            return lambda entry: any([expression.match(v) for v in directory.getValues(entry,attribute)])
+
+        value = self.unescape(rawValue)
+        if attribute.lower() == 'objectsid' and value.upper().startswith('S-1-'):
+            value = directory.encodeSid(value)
+
+        def compare(stored):
+            if stored.isdigit() and value.isdigit():
+                return cmp(int(stored),int(value))
+            return cmp(stored.lower(),value.lower())
+
+        if operator == '>=':
+            return lambda entry: any([compare(v) >= 0 for v in directory.getValues(entry,attribute)])
+        if operator == '<=':
+            return lambda entry: any([compare(v) <= 0 for v in directory.getValues(entry,attribute)])
+        if attribute.lower() == 'objectsid':
+            return lambda entry: value in directory.getValues(entry,attribute)
+        return lambda entry: any([compare(v) == 0 for v in directory.getValues(entry,attribute)])
+
+class FakeLDAPObject:
+    '''
+    A connection to a FakeDirectory. Offers the subset of python-ldap's LDAPObject methods that DirectoryTools uses.
+    '''
+
+    def __init__(self,directory,uri):
+        '''
+        Args:
+            directory: The FakeDirectory to answer operations from.
+            uri: The connection URI.
+        '''
+        ## The directory that operations are answered from.
+        self.directory = directory
+        ## The connection URI.
+        self.uri = uri
+        ## The host part of the URI.
+        self.host = re.sub(r'^[a-z]+://','',uri).split('/')[0]
+        ## Options set through set_option().
+        self.options = {}
+        ## Operations waiting to be collected through result3(), indexed by message ID.
+        self.pending = {}
+        ## The DN that the connection is bound as.
+        self.boundAs = ''
+        ## The last message ID handed out.
+        self.lastMessageId = 0
+        ## Set to True once the connection has been unbound.
+        self.closed = False
+
+    def getLatency(self):
+        return self.directory.hostLatency.get(self.host,self.directory.latency)
+
+    def checkConnection(self):
+        if self.closed or self.host in self.directory.downHosts:
+            raise ldap.SERVER_DOWN({'desc':"Can't contact LDAP server"})
+
+    def submit(self,operation,function):
+        '''
+        Queue an operation to be answered after the injected latency.
+
+        Returns:
+            The message ID of the operation.
+        '''
+        self.checkConnection()
+        self.lastMessageId += 1
+        self.pending[self.lastMessageId] = (time() + self.getLatency(),operation,function)
+        return self.lastMessageId
+
+    def set_option(self,option,value):
+        self.options[option] = value
+
+    def get_option(self,option):
+        return self.options.get(option)
+
+    def simple_bind(self,who='',cred=''):
+        def bind():
+            self.directory.bind(who,cred)
+            self.boundAs = who
+            return ldap.RES_BIND,[],[]
+        return self.submit('bind',bind)
+
+    def simple_bind_s(self,who='',cred=''):
+        resultType,data,msgid,controls = self.result3(self.simple_bind(who,cred))
+        return resultType,data,msgid,controls
+
+    def search_ext(self,base,scope,filterstr='(objectClass=*)',attrlist=None,attrsonly=0,serverctrls=None,clientctrls=None,timeout=-1,sizelimit=0):
+        def search():
+            results,controls = self.directory.search(base,scope,filterstr,attrlist,serverctrls)
+            return ldap.RES_SEARCH_RESULT,results,controls
+        return self.submit('search',search)
+
+    def search_ext_s(self,base,scope,filterstr='(objectClass=*)',attrlist=None,attrsonly=0,serverctrls=None,clientctrls=None,timeout=-1,sizelimit=0):
+        return self.result3(self.search_ext(base,scope,filterstr,attrlist,attrsonly,serverctrls))[1]
+
+    def search_s(self,base,scope,filterstr='(objectClass=*)',attrlist=None,attrsonly=0):
+        return self.search_ext_s(base,scope,filterstr,attrlist,attrsonly)
+
+    def result3(self,msgid=-1,all=1,timeout=None):
+        '''
+        Collect the result of an operation.
+
+        If timeout is 0, (None,None,None,None) is returned when the operation has not been answered yet. If the timeout is positive and runs out, ldap.TIMEOUT is raised, as python-ldap does.
+        '''
+        self.checkConnection()
+        if msgid == -1:
+            msgid = min(self.pending)
+        readyAt,operation,function = self.pending[msgid]
+        wait = readyAt - time()
+        if wait > 0:
+            if timeout is not None and timeout >= 0 and wait > timeout:
+                if timeout:
+                    sleep(timeout)
+                    raise ldap.TIMEOUT({'desc':'Timed out'})
+                return None,None,None,None
+            sleep(wait)
+        del self.pending[msgid]
+        try:
+            resultType,data,controls = function()
+        except:
+            self.directory.countOperation(operation)
+            raise
+        self.directory.countOperation(operation,len(data))
+        return resultType,data,msgid,controls
+
+    def abandon_ext(self,msgid,serverctrls=None,clientctrls=None):
+        self.pending.pop(msgid,None)
+        self.directory.countOperation('abandon')
+
+    def whoami_s(self):
+        self.checkConnection()
+        if self.boundAs:
+            return 'dn:' + self.boundAs
+        return ''
+
+    def unbind_s(self):
+        self.closed = True
+        self.pending.clear()
+
+    def unbind(self):
+        self.unbind_s()
+
+def generateDirectory(shape='openldap',users=100,groups=10,depth=2,fanout=3,membersPerGroup=10,password='password',baseDN='dc=example,dc=lan',latency=0.0,maxValRange=None):
+    '''
+    Generate a synthetic directory.
+
+    Groups are arranged in trees: group N has groups N*fanout+1 through N*fanout+fanout as nested members, down to the given depth. Users are spread over the groups in turn, membersPerGroup at a time. Nesting is not available in the 'openldap' shape, whose posixGroup entries list their members by UID.
+
+    Args:
+        shape: 'openldap', 'ad' or 'freeipa'.
+        users: The number of users to create.
+        groups: The number of groups to create.
+        depth: The maximum nesting depth of groups.
+        fanout: The number of nested groups in each group.
+        membersPerGroup: The number of direct user members of each group.
+        password: The password of every user.
+        baseDN: The base DN of the directory.
+        latency: The number of seconds that each operation takes to be answered.
+        maxValRange: Passed on to FakeDirectory.
+
+    Returns:
+        A tuple of the FakeDirectory and a dictionary of DirectoryTools properties for connecting to it.
+    '''
+    directory = FakeDirectory(shape=shape,baseDN=baseDN,latency=latency,maxValRange=maxValRange)
+
+    if shape == 'ad':
+        userRDN = groupRDN = 'CN=Users'
+        userDN = lambda i: 'CN=User {0},{1},{2}'.format(i,userRDN,baseDN)
+        groupDN = lambda i: 'CN=Group {0},{1},{2}'.format(i,groupRDN,baseDN)
+        userClasses = ['top','person','organizationalPerson','user']
+        groupClasses = ['top','group']
+    elif shape == 'freeipa':
+        userRDN,groupRDN = 'cn=users,cn=accounts','cn=groups,cn=accounts'
+        userDN = lambda i: 'uid=user{0},{1},{2}'.format(i,userRDN,baseDN)
+        groupDN = lambda i: 'cn=group{0},{1},{2}'.format(i,groupRDN,baseDN)
+        userClasses = ['top','person','organizationalperson','inetorgperson','posixaccount']
+        groupClasses = ['top','groupofnames','nestedgroup','posixgroup']
+    else:
+        userRDN,groupRDN = 'ou=people','ou=groups'
+        userDN = lambda i: 'uid=user{0},{1},{2}'.format(i,userRDN,baseDN)
+        groupDN = lambda i: 'cn=group{0},{1},{2}'.format(i,groupRDN,baseDN)
+        userClasses = ['top','person','organizationalPerson','inetOrgPerson','posixAccount']
+        groupClasses = ['top','posixGroup']
+
+    directory.addEntry(baseDN,{'objectClass':['top','domain']})
+    for rdn in set([userRDN,groupRDN]):
+        path = baseDN
+        for part in reversed(rdn.split(',')):
+            path = '{0},{1}'.format(part,path)
+            directory.addEntry(path,{'objectClass':['top','container']})
+
+    userNames = ['user{0}'.format(i) for i in range(users)]
+    groupNames = ['group{0}'.format(i) for i in range(groups)]
+
+    for i in range(users):
+        attributes = {'objectClass':userClasses,'cn':userNames[i],'userPassword':password}
+        if shape == 'ad':
+            attributes['sAMAccountName'] = userNames[i]
+        else:
+            attributes['uid'] = userNames[i]
+        directory.addEntry(userDN(i),attributes)
+
+    # Work out the nesting depth of each group. Group N is nested in group (N-1)/fanout.
+    levels = {}
+    for i in range(groups):
+        levels[i] = 0 if i == 0 or fanout < 1 else levels[(i - 1) // fanout] + 1
+
+    nextUser = 0
+    for i in range(groups):
+        members = []
+        for j in range(membersPerGroup):
+            if users:
+                members.append(nextUser % users)
+                nextUser += 1
+        attributes = {'objectClass':groupClasses,'cn':groupNames[i]}
+        if shape == 'openldap':
+            # The 'openldap' template resolves groups by their uid attribute.
+            attributes['uid'] = groupNames[i]
+            attributes['memberUid'] = [userNames[m] for m in members]
+        else:
+            memberDNs = [userDN(m) for m in members]
+            if fanout > 0:
+                for child in range(i * fanout + 1,i * fanout + fanout + 1):
+                    if child < groups and levels[child] <= depth:
+                        memberDNs.append(groupDN(child))
+            attributes['member'] = memberDNs
+            if shape == 'ad':
+                attributes['sAMAccountName'] = groupNames[i]
+        directory.addEntry(groupDN(i),attributes)
+
+    properties = {
+        index.BASE_DN:baseDN,
+        index.USER_RDN:userRDN,
+        index.GROUP_RDN:groupRDN,
+        index.SERVER_ADDRESS:'fake.{0}.lan'.format(shape),
+        index.PROXY_USER:userDN(0) if users else '',
+        index.PROXY_PASSWORD:password,
+    }
+    return directory,properties
@@ -0,0 +1,184 @@
+#!/usr/bin/python
+
+import threading
+from array import array
+from collections import deque
+from time import time
+
+class MembershipGraph:
+    '''
+    An in-memory index of group memberships, loaded from one sweep of the directory's groups.
+
+    Every group and member is interned as an integer ID. Direct memberships are kept as arrays of IDs in both directions (the members of each group, and the groups of each member). The transitive closure of a group or member is worked out the first time that it is asked for, and is then kept as a frozenset, so repeated membership checks are set lookups.
+
+    Keys are the lowercase DN of an entry, or the lowercase UID of a member on servers that do not store members as DNs.
+    '''
+
+    def __init__(self,nestedGroups=True,maxDepth=-1):
+        '''
+        Initializes an empty graph.
+
+        Args:
+            nestedGroups: If True, members of nested groups count as members of the groups above them. If False, only direct memberships are followed.
+            maxDepth: The number of levels of nested groups to follow below the direct members. Negative values follow every level.
+        '''
+        ## Whether members of nested groups count as members of the groups above them.
+        self.nestedGroups = nestedGroups
+        ## The number of levels of nested groups to follow. Negative values follow every level.
+        self.maxDepth = maxDepth
+        ## Node IDs, indexed by key.
+        self.ids = {}
+        ## Original form of each node's DN or UID, indexed by node ID.
+        self.names = []
+        ## Direct members of each node, indexed by node ID.
+        self.members = []
+        ## Groups that each node is a direct member of, indexed by node ID.
+        self.parents = []
+        ## IDs of the nodes that were loaded as groups.
+        self.groups = set()
+        ## UID of each group, indexed by node ID.
+        self.groupUids = {}
+        ## Group node IDs, indexed by lowercase group UID.
+        self.groupIds = {}
+        ## Memoized transitive members, indexed by group node ID.
+        self.memberClosures = {}
+        ## Memoized transitive groups, indexed by node ID.
+        self.groupClosures = {}
+        ## Lock guarding changes to the graph and the computation of closures.
+        self.lock = threading.RLock()
+        ## UNIX time at which the graph was loaded.
+        self.loaded = time()
+
+    def __len__(self):
+        return len(self.names)
+
+    def addGroup(self,dn,uid,members):
+        '''
+        Add a group, replacing its members if it is already in the graph.
+
+        Args:
+            dn: Distinguished name of the group.
+            uid: UID of the group, or None if it does not have one.
+            members: List of the values of the group's member attribute.
+        '''
+        with self.lock:
+            groupId = self.intern(dn)
+            self.groups.add(groupId)
+            memberIds = array('i',set([self.intern(member) for member in members]))
+
+            for memberId in self.members[groupId]:
+                self.parents[memberId].remove(groupId)
+            for memberId in memberIds:
+                self.parents[memberId].append(groupId)
+            self.members[groupId] = memberIds
+
+            oldUid = self.groupUids.pop(groupId,None)
+            if oldUid is not None and self.groupIds.get(oldUid.lower()) == groupId:
+                del self.groupIds[oldUid.lower()]
+            if uid is not None:
+                self.groupUids[groupId] = uid
+                self.groupIds[uid.lower()] = groupId
+
+            # Any closure may pass through this group.
+            self.memberClosures = {}
+            self.groupClosures = {}
+
+    def getGroupId(self,uid):
+        '''
+        Get the node ID of a group from its UID.
+
+        Returns:
+            The node ID, or None if there is no group with this UID.
+        '''
+        return self.groupIds.get(uid.lower())
+
+    def getGroups(self,nodeId):
+        '''
+        Get the groups that a node is a member of.
+
+        Args:
+            nodeId: ID of the member node.
+
+        Returns:
+            A frozenset of group node IDs.
+        '''
+        closure = self.groupClosures.get(nodeId)
+        if closure is None:
+            with self.lock:
+                closure = self.groupClosures[nodeId] = self.walk(nodeId,self.parents)
+        return closure
+
+    def getId(self,key):
+        '''
+        Get the node ID of a DN or member UID.
+
+        Returns:
+            The node ID, or None if the graph does not contain the key.
+        '''
+        return self.ids.get(key.lower())
+
+    def getMembers(self,groupId):
+        '''
+        Get the members of a group.
+
+        Args:
+            groupId: ID of the group node.
+
+        Returns:
+            A frozenset of member node IDs. Nested groups are included as members.
+        '''
+        closure = self.memberClosures.get(groupId)
+        if closure is None:
+            with self.lock:
+                closure = self.memberClosures[groupId] = self.walk(groupId,self.members)
+        return closure
+
+    def intern(self,key):
+        '''
+        Get the node ID of a DN or member UID, adding a node for it if needed.
+        '''
+        lowered = key.lower()
+        nodeId = self.ids.get(lowered)
+        if nodeId is None:
+            with self.lock:
+                nodeId = self.ids.setdefault(lowered,len(self.names))
+                if nodeId == len(self.names):
+                    self.names.append(key)
+                    self.members.append(array('i'))
+                    self.parents.append(array('i'))
+        return nodeId
+
+    def isGroup(self,nodeId):
+        '''
+        Check whether a node was loaded as a group.
+        '''
+        return nodeId in self.groups
+
+    def isMember(self,nodeId,groupId):
+        '''
+        Check whether a node is a member of a group.
+        '''
+        return nodeId in self.getMembers(groupId)
+
+    def walk(self,nodeId,edges):
+        '''
+        Follow edges from a node breadth-first. Only the first step is taken unless nestedGroups is set, and no more than maxDepth steps are taken after it. Cycles are followed once.
+
+        Returns:
+            A frozenset of the node IDs that were reached, not including nodeId unless it is part of a cycle.
+        '''
+        reached = set(edges[nodeId])
+        if not self.nestedGroups:
+            return frozenset(reached)
+
+        # Nodes waiting to be followed, with the number of steps that it took to reach them.
+        queue = deque([(reachedId,1) for reachedId in reached])
+        while queue:
+            currentId,steps = queue.popleft()
+            if steps > self.maxDepth and not self.maxDepth < 0:
+                continue
+            for nextId in edges[currentId]:
+                if nextId not in reached:
+                    reached.add(nextId)
+                    queue.append((nextId,steps + 1))
+        return frozenset(reached)
@@ -24,3 +24,46 @@ MAX_DEPTH = 'dir.max-depth'
 LDAP_PROPERTIES='dir.ldap-properties'
 DEFAULT_CACHE_CATEGORY='var.cache.category'
 DEFAULT_CACHE_ID='var.cache.id'
+## The number of proxy connections that the pool keeps open to each server.
+POOL_MIN_SIZE='pool.min'
+## The maximum number of proxy connections open at once, across all of the servers in SERVER_ADDRESS together. When the limit is reached, a connection that is idle on another server is closed to make room.
+POOL_MAX_SIZE='pool.max'
+## The number of seconds to wait for a connection when a pool is at its maximum size.
+POOL_TIMEOUT='pool.timeout'
+## Connections idle for longer than this many seconds are checked before being handed out.
+POOL_MAX_IDLE='pool.max-idle'
+## The maximum number of authentication connections open at once, across all of the servers in SERVER_ADDRESS together.
+AUTH_POOL_MAX_SIZE='pool.auth.max'
+PAGE_SIZE='dir.page-size'
+BATCH_SIZE='dir.batch-size'
+NESTED_ENGINE='dir.nested-engine'
+USE_TOKEN_GROUPS='dir.ad.token-groups'
+CACHE_MAX_ENTRIES='cache.max-entries'
+CACHE_TTL='cache.ttl'
+CACHE_CATEGORIES='cache.categories'
+NEGATIVE_CACHE_MAX_ENTRIES='cache.negative.max-entries'
+NEGATIVE_CACHE_TTL='cache.negative.ttl'
+ASYNC_CONNECTIONS='async.connections'
+ASYNC_POLL_INTERVAL='async.poll-interval'
+CACHE_PERSISTENT_PATH='cache.persistent.path'
+CACHE_PERSISTENT_CATEGORIES='cache.persistent.categories'
+CACHE_GROUP_MEMBERS='cache.group-members'
+SYNC_ATTRIBUTE='sync.attribute'
+SYNC_INTERVAL='sync.interval'
+SYNC_CLOCK_SKEW='sync.clock-skew'
+MEMBERSHIP_GRAPH='graph.enabled'
+MEMBERSHIP_GRAPH_TTL='graph.ttl'
+COALESCE_QUERIES='dir.coalesce-queries'
+SERVER_STRATEGY='server.strategy'
+SERVER_EJECT_AFTER='server.eject-after'
+SERVER_EJECT_TIME='server.eject-time'
+HEDGE_READS='server.hedge'
+HEDGE_PERCENTILE='server.hedge-percentile'
+HEDGE_MIN_DELAY='server.hedge-min-delay'
+HEDGE_BUDGET='server.hedge-budget'
+AUTH_CACHE='auth.cache.enabled'
+AUTH_CACHE_TTL='auth.cache.ttl'
+AUTH_CACHE_MAX_ENTRIES='auth.cache.max-entries'
+AUTH_CACHE_ITERATIONS='auth.cache.iterations'
+DAEMON_SOCKET='daemon.socket'
+DAEMON_SOCKET_MODE='daemon.socket-mode'
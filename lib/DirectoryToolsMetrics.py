@@ -0,0 +1,218 @@
+#!/usr/bin/python
+
+import threading
+from bisect import bisect_left
+
+## Default histogram bucket bounds, in seconds.
+DEFAULT_BUCKETS = (0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1.0,2.5,5.0,10.0)
+
+class MetricsHook(object):
+    '''
+    Receives measurements from DirectoryTools. Install one with DirectoryTools.setMetricsHook().
+
+    The default implementations do nothing, so a hook only needs to override the methods that it is interested in. Methods are called on the thread that did the work, so they must be thread-safe and quick.
+    '''
+
+    def attach(self,directoryTools):
+        '''
+        Called when the hook is installed.
+
+        Args:
+            directoryTools: The DirectoryTools object that the hook was installed on.
+        '''
+        pass
+
+    def operation(self,operation,method,elapsed,entries=0):
+        '''
+        Called when an LDAP operation has finished, successfully or not.
+
+        Args:
+            operation: The type of operation: 'search' or 'bind'.
+            method: The name of the public DirectoryTools method that the operation was sent for (for example 'isUserInGroup'), or None if it can't be told.
+            elapsed: The number of seconds that the operation took.
+            entries: The number of entries that a search returned.
+        '''
+        pass
+
+    def poolWait(self,pool,elapsed):
+        '''
+        Called when a connection has been checked out of a pool.
+
+        Args:
+            pool: The name of the pool: 'proxy' or 'auth'.
+            elapsed: The number of seconds that the checkout took.
+        '''
+        pass
+
+class Histogram:
+    '''
+    A latency histogram with fixed bucket bounds. Not thread-safe on its own.
+    '''
+
+    def __init__(self,buckets=DEFAULT_BUCKETS):
+        '''
+        Args:
+            buckets: Sorted upper bounds of the buckets, in seconds.
+        '''
+        ## Upper bounds of the buckets.
+        self.buckets = buckets
+        ## Number of observations in each bucket, with a last bucket for observations over every bound.
+        self.counts = [0] * (len(buckets) + 1)
+        ## Sum of all observations.
+        self.sum = 0.0
+        ## Number of observations.
+        self.count = 0
+
+    def observe(self,value):
+        '''
+        Add an observation.
+        '''
+        self.counts[bisect_left(self.buckets,value)] += 1
+        self.sum += value
+        self.count += 1
+
+class PrometheusExporter(MetricsHook):
+    '''
+    A MetricsHook that keeps counters and histograms, and renders them in the Prometheus text exposition format.
+
+    The exporter is also a WSGI application, so it can be mounted as the metrics endpoint of a WSGI server:
+
+        exporter = PrometheusExporter()
+        directoryTools.setMetricsHook(exporter)
+        ...
+        return exporter(environ,start_response)
+
+    Cache counters are read from the DirectoryTools object that the exporter is attached to each time the metrics are rendered.
+    '''
+
+    ## Content type of the text exposition format.
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self,prefix='directorytools',buckets=DEFAULT_BUCKETS):
+        '''
+        Args:
+            prefix: Prefix of every metric name.
+            buckets: Upper bounds of the latency histogram buckets, in seconds.
+        '''
+        ## Prefix of every metric name.
+        self.prefix = prefix
+        ## Upper bounds of the latency histogram buckets.
+        self.buckets = tuple(sorted(buckets))
+        ## The DirectoryTools object that cache counters are read from.
+        self.directoryTools = None
+        ## Operation counts, indexed by (operation,method).
+        self.operations = {}
+        ## Entries returned, indexed by (operation,method).
+        self.entries = {}
+        ## Operation latency histograms, indexed by operation type.
+        self.latencies = {}
+        ## Pool checkout histograms, indexed by pool name.
+        self.poolWaits = {}
+        ## Lock guarding the counters.
+        self.lock = threading.Lock()
+
+    def __call__(self,environ,start_response):
+        content = self.render()
+        start_response('200 OK',[('Content-Type',self.CONTENT_TYPE),('Content-Length',str(len(content)))])
+        return [content]
+
+    def attach(self,directoryTools):
+        self.directoryTools = directoryTools
+
+    def operation(self,operation,method,elapsed,entries=0):
+        key = (operation,method or '')
+        with self.lock:
+            self.operations[key] = self.operations.get(key,0) + 1
+            self.entries[key] = self.entries.get(key,0) + entries
+            if operation not in self.latencies:
+                self.latencies[operation] = Histogram(self.buckets)
+            self.latencies[operation].observe(elapsed)
+
+    def poolWait(self,pool,elapsed):
+        with self.lock:
+            if pool not in self.poolWaits:
+                self.poolWaits[pool] = Histogram(self.buckets)
+            self.poolWaits[pool].observe(elapsed)
+
+    def formatLabels(self,labels):
+        '''
+        Format label pairs as a Prometheus label set.
+
+        Args:
+            labels: List of (name,value) tuples.
+
+        Returns:
+            A string such as '{operation="search"}', or an empty string if there are no labels.
+        '''
+        if not labels:
+            return ''
+        pairs = []
+        for name,value in labels:
+            value = str(value).replace('\\','\\\\').replace('"','\\"').replace('\n','\\n')
+            pairs.append('{0}="{1}"'.format(name,value))
+        return '{' + ','.join(pairs) + '}'
+
+    def formatValue(self,value):
+        if isinstance(value,float):
+            return repr(value)
+        return str(value)
+
+    def render(self):
+        '''
+        Render all metrics in the Prometheus text exposition format.
+
+        Returns:
+            The metrics, as a string.
+        '''
+        with self.lock:
+            operations = self.operations.items()
+            entries = self.entries.items()
+            latencies = [(name,list(histogram.counts),histogram.sum,histogram.count) for name,histogram in self.latencies.items()]
+            poolWaits = [(name,list(histogram.counts),histogram.sum,histogram.count) for name,histogram in self.poolWaits.items()]
+
+        lines = []
+
+        def header(name,metricType,description):
+            lines.append('# HELP {0}_{1} {2}'.format(self.prefix,name,description))
+            lines.append('# TYPE {0}_{1} {2}'.format(self.prefix,name,metricType))
+
+        def sample(name,labels,value):
+            lines.append('{0}_{1}{2} {3}'.format(self.prefix,name,self.formatLabels(labels),self.formatValue(value)))
+
+        def histogram(name,labelName,histograms):
+            for label,counts,total,count in sorted(histograms):
+                cumulative = 0
+                for bound,bucketCount in zip(self.buckets,counts):
+                    cumulative += bucketCount
+                    sample(name + '_bucket',[(labelName,label),('le',repr(bound))],cumulative)
+                sample(name + '_bucket',[(labelName,label),('le','+Inf')],count)
+                sample(name + '_sum',[(labelName,label)],total)
+                sample(name + '_count',[(labelName,label)],count)
+
+        header('ldap_operations_total','counter','LDAP operations, by type and by the public method that they were sent for.')
+        for (operation,method),count in sorted(operations):
+            sample('ldap_operations_total',[('operation',operation),('method',method)],count)
+
+        header('ldap_entries_total','counter','Entries returned by LDAP operations, by type and by the public method that they were sent for.')
+        for (operation,method),count in sorted(entries):
+            sample('ldap_entries_total',[('operation',operation),('method',method)],count)
+
+        header('ldap_operation_seconds','histogram','Time taken by LDAP operations, by type.')
+        histogram('ldap_operation_seconds','operation',latencies)
+
+        header('pool_wait_seconds','histogram','Time taken to check a connection out of a pool.')
+        histogram('pool_wait_seconds','pool',poolWaits)
+
+        if self.directoryTools:
+            statistics = sorted(self.directoryTools.getCacheStatistics().items())
+            for index,name,metricType,description in (
+                (0,'cache_hits_total','counter','Cache lookups that found an item, by category.'),
+                (1,'cache_misses_total','counter','Cache lookups that did not find an item, by category.'),
+                (2,'cache_evictions_total','counter','Cache items removed to make room or because they expired, by category.'),
+                (3,'cache_entries','gauge','Items held in memory, by category.'),
+            ):
+                header(name,metricType,description)
+                for category,values in statistics:
+                    sample(name,[('category',category)],values[index])
+
+        return '\n'.join(lines) + '\n'
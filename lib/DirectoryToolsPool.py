@@ -0,0 +1,722 @@
+#!/usr/bin/python
+
+import itertools,math,random,sys,threading,ldap
+from collections import deque
+from contextlib import contextmanager
+from time import time
+
+import DirectoryToolsExceptions as exceptions
+
+## Server selection strategy that takes turns between servers.
+STRATEGY_ROUND_ROBIN = 'round-robin'
+## Server selection strategy that picks the server with the fewest operations in progress.
+STRATEGY_LEAST_OUTSTANDING = 'least-outstanding'
+## Server selection strategy that picks servers at random, weighted towards the ones that have been answering fastest.
+STRATEGY_LATENCY_WEIGHTED = 'latency-weighted'
+
+class ConnectionPool:
+    '''
+    A bounded, thread-safe pool of LDAP connection handles.
+
+    Handles are created on demand through a factory method (for example DirectoryTools.createProxyHandle), checked out by a caller for the duration of an operation, and then checked back in for the next caller.
+    '''
+
+    def __init__(self,factory,minSize=0,maxSize=10,timeout=None,maxIdle=60,healthCheck=None,limit=None):
+        '''
+        Initializes the pool. No connections are opened until the first checkout.
+
+        Args:
+            factory: Method that takes no arguments and returns a new, ready-to-use (bound) connection handle.
+            minSize: The number of connections that the pool will try to keep open.
+            maxSize: The maximum number of connections that the pool will have open at the same time. A value below 1 means that the pool is unbounded.
+            timeout: The number of seconds to wait for a connection to be checked back in when the pool is at its maximum size. A value of None will wait forever.
+            maxIdle: Connections that have been sitting in the pool for longer than this many seconds will be checked for health before being handed out.
+            healthCheck: Method that takes a handle and raises an exception if the handle is no longer usable. Defaults to ConnectionPool.checkHandle.
+            limit: If set, a PoolLimit on the number of connections that this pool and the other pools under the same limit have open between them.
+        '''
+
+        ## Method used to create new connection handles.
+        self.factory = factory
+        ## The number of connections that the pool will try to keep open.
+        self.minSize = max(int(minSize),0)
+        ## The maximum number of connections that the pool will have open at the same time.
+        self.maxSize = int(maxSize)
+        ## The number of seconds to wait for a connection to become available.
+        self.timeout = timeout
+        ## Connections idle for longer than this many seconds are checked before being handed out.
+        self.maxIdle = maxIdle
+        ## Method used to confirm that a connection is still usable.
+        self.healthCheck = healthCheck or self.checkHandle
+
+        ## Idle connections, stored as (handle,lastUsed) tuples. The most recently used connection is on the right.
+        self.idle = deque()
+        ## The number of connections that are either idle or checked out.
+        self.total = 0
+        ## Set to True once the pool has been filled to its minimum size.
+        self.filled = False
+        ## Set to True once the pool has been closed.
+        self.closed = False
+        ## Cap shared with other pools on the number of connections that they have open between them, or None.
+        self.limit = limit
+        if limit:
+            ## Condition used to wait for a connection to be checked back in. Pools under the same limit share it, since a connection checked in to one of them can make room in the others.
+            self.condition = limit.condition
+            limit.pools.append(self)
+        else:
+            self.condition = threading.Condition(threading.Lock())
+
+    def checkHandle(self,handle):
+        '''
+        Default health check. Performs a cheap base search against the root DSE.
+
+        Args:
+            handle: The connection handle to check.
+        '''
+        handle.search_s('',ldap.SCOPE_BASE,'(objectClass=*)',['1.1'])
+
+    def checkin(self,handle,discard=False,failed=False):
+        '''
+        Return a connection handle to the pool.
+
+        Args:
+            handle: A connection handle that was acquired through checkout().
+            discard: If True, the handle is considered broken. It will be closed instead of being put back into the pool.
+            failed: If True, the handle was lost because its server stopped responding. Implies discard. A ServerPool also counts this against the server.
+        '''
+        with self.condition:
+            if discard or failed or self.closed:
+                self.release()
+            else:
+                self.idle.append((handle,time()))
+                handle = None
+            self.notifyWaiters()
+
+        if handle is not None:
+            self.closeHandle(handle)
+
+    def checkout(self,timeout=False):
+        '''
+        Get a connection handle from the pool, creating a new one if there is room for it.
+
+        Args:
+            timeout: Override for the number of seconds to wait for a connection. Defaults to the pool's timeout.
+
+        Returns:
+            A connection handle. It must be returned through checkin() once the caller is done with it.
+        '''
+        if timeout is False:
+            timeout = self.timeout
+
+        if not self.filled:
+            self.fill()
+
+        deadline = None
+        if timeout is not None:
+            deadline = time() + timeout
+
+        evicted = None
+        with self.condition:
+            while True:
+                if self.closed:
+                    raise exceptions.PoolClosedException()
+                if self.idle:
+                    handle,lastUsed = self.idle.pop()
+                    break
+                if self.reserve():
+                    # A slot is reserved for a new connection. The connection itself is created outside of the lock.
+                    handle,lastUsed = None,None
+                    break
+                if self.limit and self.hasRoom():
+                    # The shared limit has been reached. Make room by closing the connection that has been idle the longest in another pool.
+                    evicted = self.limit.evict()
+                    if evicted:
+                        self.reserve()
+                        handle,lastUsed = None,None
+                        break
+
+                if deadline is None:
+                    self.condition.wait()
+                else:
+                    remaining = deadline - time()
+                    if remaining <= 0:
+                        raise exceptions.PoolTimeoutException(timeout=timeout)
+                    self.condition.wait(remaining)
+
+        if evicted:
+            evictedPool,evictedHandle = evicted
+            evictedPool.closeHandle(evictedHandle)
+        if handle is None:
+            return self.createHandle()
+
+        if self.maxIdle is not None and (time() - lastUsed) > self.maxIdle:
+            try:
+                self.healthCheck(handle)
+            except Exception:
+                # The connection has gone stale. Replace it with a freshly bound one, keeping its slot.
+                self.closeHandle(handle)
+                return self.createHandle()
+
+        return handle
+
+    def close(self):
+        '''
+        Close all idle connections and stop handing out new ones. Connections that are currently checked out are closed as they are checked back in.
+        '''
+        with self.condition:
+            self.closed = True
+            handles = [handle for handle,lastUsed in self.idle]
+            for handle in handles:
+                self.release()
+            self.idle.clear()
+            if self.limit and self in self.limit.pools:
+                self.limit.pools.remove(self)
+            self.condition.notify_all()
+
+        for handle in handles:
+            self.closeHandle(handle)
+
+    def closeHandle(self,handle):
+        '''
+        Unbind a connection handle, ignoring any errors.
+
+        Args:
+            handle: The connection handle to close.
+        '''
+        try:
+            handle.unbind_s()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        '''
+        Context manager wrapper around checkout() and checkin().
+
+        A handle that raised ldap.SERVER_DOWN while it was checked out is discarded instead of being returned to the pool.
+        '''
+        handle = self.checkout()
+        try:
+            yield handle
+        except ldap.SERVER_DOWN:
+            self.checkin(handle,failed=True)
+            raise
+        except:
+            self.checkin(handle)
+            raise
+        else:
+            self.checkin(handle)
+
+    def createHandle(self):
+        '''
+        Create a new connection through the factory method. Assumes that a slot has already been reserved in self.total.
+
+        Returns:
+            A new connection handle.
+        '''
+        try:
+            return self.factory()
+        except:
+            with self.condition:
+                self.release()
+                self.notifyWaiters()
+            raise
+
+    def fill(self):
+        '''
+        Open connections until the pool holds at least minSize connections.
+        '''
+        with self.condition:
+            if self.filled:
+                return
+            self.filled = True
+            needed = self.minSize - self.total
+
+        for i in range(needed):
+            with self.condition:
+                if self.closed or not self.reserve():
+                    return
+            self.checkin(self.createHandle())
+
+    def hasRoom(self):
+        '''
+        Check whether this pool is below its own maximum size, leaving aside any shared limit. Assumes that the lock is held.
+        '''
+        return self.maxSize < 1 or self.total < self.maxSize
+
+    def notifyWaiters(self):
+        '''
+        Wake up a caller that is waiting for a connection. Under a shared limit the waiters may belong to any of the pools, and not all of them can use the slot or connection that was freed, so all of them are woken. Assumes that the lock is held.
+        '''
+        if self.limit:
+            self.condition.notify_all()
+        else:
+            self.condition.notify()
+
+    def release(self):
+        '''
+        Give up the slot of a connection that has been closed or discarded. Assumes that the lock is held.
+        '''
+        self.total -= 1
+        if self.limit:
+            self.limit.total -= 1
+
+    def reserve(self):
+        '''
+        Reserve a slot for a new connection, if this pool and its shared limit have room for one. Assumes that the lock is held.
+
+        Returns:
+            True if a slot was reserved.
+        '''
+        if not self.hasRoom():
+            return False
+        if self.limit:
+            if not self.limit.hasRoom():
+                return False
+            self.limit.total += 1
+        self.total += 1
+        return True
+
+class PoolLimit:
+    '''
+    A cap on the number of connections that several ConnectionPools have open between them.
+
+    The pools share one lock, and a pool that is below its own maximum size can only open a connection while the shared total is below the cap. If it isn't, the pool closes the connection that has been idle the longest in one of the other pools to make room, or else waits for a connection to be checked in.
+    '''
+
+    def __init__(self,maxSize):
+        '''
+        Args:
+            maxSize: The maximum number of connections that the pools have open between them. A value below 1 means that there is no cap.
+        '''
+        ## The maximum number of connections that the pools have open between them.
+        self.maxSize = int(maxSize)
+        ## The number of connections that are open in all of the pools.
+        self.total = 0
+        ## Condition shared by the pools under the limit.
+        self.condition = threading.Condition(threading.Lock())
+        ## Pools under the limit.
+        self.pools = []
+
+    def evict(self):
+        '''
+        Take the connection that has been idle the longest out of its pool, freeing its slot. Assumes that the lock is held. The caller closes the connection once it has let go of the lock.
+
+        Returns:
+            A (pool,handle) tuple, or None if no pool has an idle connection.
+        '''
+        pools = [connectionPool for connectionPool in self.pools if connectionPool.idle]
+        if not pools:
+            return None
+        connectionPool = min(pools,key=lambda connectionPool: connectionPool.idle[0][1])
+        handle,lastUsed = connectionPool.idle.popleft()
+        connectionPool.release()
+        return connectionPool,handle
+
+    def hasRoom(self):
+        '''
+        Check whether another connection may be opened. Assumes that the lock is held.
+        '''
+        return self.maxSize < 1 or self.total < self.maxSize
+
+class Server:
+    '''
+    A directory server that connections can be made to, along with its health.
+    '''
+
+    def __init__(self,address,port):
+        '''
+        Args:
+            address: Host name or IP address of the server.
+            port: Port of the server.
+        '''
+        ## Host name or IP address of the server.
+        self.address = address
+        ## Port of the server.
+        self.port = port
+        ## The number of operations in progress on the server.
+        self.outstanding = 0
+        ## Moving average of the number of seconds that operations take, or None before the first operation.
+        self.latency = None
+        ## The number of failures since the last success.
+        self.failures = 0
+        ## UNIX time until which the server is ejected. A value of 0 means that the server is healthy.
+        self.ejectedUntil = 0
+        ## True while an operation is probing whether an ejected server has recovered.
+        self.probing = False
+
+    def __repr__(self):
+        return '{0}:{1}'.format(self.address,self.port)
+
+class ServerSelector:
+    '''
+    Picks the server for each new operation out of a list of replicas, and keeps track of their health.
+
+    Servers are ejected after a number of failures in a row, and are left alone for a while. Once that time has passed, a single operation is let through to probe the server. If it succeeds, the server is back in rotation, and if it fails, the server is ejected again. If every server is ejected, the one that is due back first is used anyway, so that a selector never refuses to pick a server.
+    '''
+
+    ## Weight given to the newest sample in the moving latency average.
+    LATENCY_SMOOTHING = 0.2
+
+    def __init__(self,servers,strategy=STRATEGY_ROUND_ROBIN,ejectAfter=1,ejectTime=30):
+        '''
+        Args:
+            servers: List of Server objects.
+            strategy: How to spread operations between healthy servers. One of STRATEGY_ROUND_ROBIN, STRATEGY_LEAST_OUTSTANDING or STRATEGY_LATENCY_WEIGHTED. Other values are treated as STRATEGY_ROUND_ROBIN.
+            ejectAfter: The number of failures in a row after which a server is ejected.
+            ejectTime: The number of seconds that an ejected server is left alone before it is probed.
+        '''
+        ## Servers to pick from.
+        self.servers = list(servers)
+        ## How to spread operations between healthy servers.
+        self.strategy = strategy
+        ## The number of failures in a row after which a server is ejected.
+        self.ejectAfter = max(int(ejectAfter),1)
+        ## The number of seconds that an ejected server is left alone.
+        self.ejectTime = ejectTime
+        ## Counter used to take turns between servers.
+        self.turns = itertools.count()
+        ## Lock guarding the health of the servers.
+        self.lock = threading.Lock()
+
+    def begin(self,server):
+        '''
+        Record that an operation has started on a server.
+        '''
+        with self.lock:
+            server.outstanding += 1
+
+    def cancel(self,server):
+        '''
+        Record that an operation picked a server, but gave up before it got to talk to the server, for example because no connection was free. If the operation was probing an ejected server, the server is left to be probed by the next operation.
+        '''
+        with self.lock:
+            server.probing = False
+
+    def choose(self,exclude=()):
+        '''
+        Pick a server for a new operation.
+
+        Args:
+            exclude: Servers that must not be picked, for example because they already failed the current operation.
+
+        Returns:
+            A Server, or None if every server is excluded.
+        '''
+        with self.lock:
+            now = time()
+            candidates = [server for server in self.servers if server not in exclude]
+            if not candidates:
+                return None
+
+            available = [server for server in candidates if not server.ejectedUntil or (server.ejectedUntil <= now and not server.probing)]
+            if not available:
+                # Everything is down. Try the server that is due back first rather than failing outright.
+                return min(candidates,key=lambda server: server.ejectedUntil)
+
+            # Rotate the list so that ties are broken in turns.
+            turn = self.turns.next() % len(available)
+            available = available[turn:] + available[:turn]
+
+            if self.strategy == STRATEGY_LEAST_OUTSTANDING:
+                server = min(available,key=lambda server: server.outstanding)
+            elif self.strategy == STRATEGY_LATENCY_WEIGHTED:
+                server = self.chooseByLatency(available)
+            else:
+                server = available[0]
+
+            if server.ejectedUntil:
+                # The ejection has run out. This operation probes whether the server is back.
+                server.probing = True
+            return server
+
+    def chooseByLatency(self,servers):
+        '''
+        Pick a server at random, with a chance inversely proportional to its average latency. Servers without a measured latency are weighted like the average server.
+        '''
+        known = [server.latency for server in servers if server.latency is not None]
+        default = 1.0
+        if known:
+            default = sum(known) / len(known)
+
+        weights = [1.0 / max(server.latency if server.latency is not None else default,0.0001) for server in servers]
+        point = random.uniform(0,sum(weights))
+        for server,weight in zip(servers,weights):
+            point -= weight
+            if point <= 0:
+                return server
+        return servers[-1]
+
+    def fail(self,server):
+        '''
+        Record a failure of a server that had no operation in progress, such as a failed connection attempt.
+        '''
+        with self.lock:
+            self.recordFailure(server)
+
+    def finish(self,server,elapsed=None,failed=False):
+        '''
+        Record that an operation started with begin() has finished.
+
+        Args:
+            server: The Server that the operation ran on.
+            elapsed: The number of seconds that the operation took.
+            failed: True if the operation failed because the server did not respond.
+        '''
+        with self.lock:
+            server.outstanding -= 1
+            if failed:
+                self.recordFailure(server)
+                return
+
+            server.failures = 0
+            server.ejectedUntil = 0
+            server.probing = False
+            if elapsed is not None:
+                if server.latency is None:
+                    server.latency = elapsed
+                else:
+                    server.latency += (elapsed - server.latency) * self.LATENCY_SMOOTHING
+
+    def recordFailure(self,server):
+        '''
+        Count a failure against a server, ejecting it if it has failed too many times in a row. Assumes that the lock is held.
+        '''
+        server.failures += 1
+        server.probing = False
+        if server.failures >= self.ejectAfter:
+            server.ejectedUntil = time() + self.ejectTime
+
+class ServerPool:
+    '''
+    A connection pool spread over several servers.
+
+    Each server has its own ConnectionPool. Every checkout asks a ServerSelector which server to use, and the time that the handle is checked out for is recorded against that server. If a connection can't be made to a server, the server is counted as failed and the next one is tried, so a dead server only costs the first operation that runs into it.
+
+    The maximum size applies to all of the servers together: the pools of the servers share a PoolLimit, so adding replicas spreads the same number of connections over more servers rather than multiplying it.
+
+    Offers the same checkout(), checkin(), connection() and close() methods as ConnectionPool.
+    '''
+
+    def __init__(self,selector,factory,minSize=0,maxSize=10,timeout=None,maxIdle=60,observer=None):
+        '''
+        Initializes the pool. No connections are opened until the first checkout.
+
+        Args:
+            selector: The ServerSelector that picks servers.
+            factory: Method that takes a Server and returns a new, ready-to-use connection handle to it.
+            minSize: The number of connections that each server's pool will try to keep open.
+            maxSize: The maximum number of connections that the pools of all servers will have open between them at the same time. A value below 1 means that the pools are unbounded.
+            timeout: The number of seconds to wait for a connection when a server's pool is at its maximum size.
+            maxIdle: Connections that have been idle for longer than this many seconds are checked for health before being handed out.
+            observer: If set, a method that is called with the number of seconds that each successful checkout took, including the time spent waiting for a free connection or opening a new one.
+        '''
+        ## The ServerSelector that picks servers.
+        self.selector = selector
+        ## Method used to create new connection handles to a server.
+        self.factory = factory
+        ## Cap on the connections of all servers together.
+        self.limit = PoolLimit(maxSize)
+        ## Settings passed on to the pool of each server.
+        self.poolSettings = {'minSize':minSize,'maxSize':maxSize,'timeout':timeout,'maxIdle':maxIdle,'limit':self.limit}
+        ## Connection pools, indexed by server.
+        self.pools = {}
+        ## Handles that are checked out, indexed by id(). Each value is a (server,pool,checkoutTime) tuple.
+        self.checkedOut = {}
+        ## Lock guarding pools and checkedOut.
+        self.lock = threading.Lock()
+        ## Method called with the duration of each checkout, if any.
+        self.observer = observer
+
+    def checkin(self,handle,discard=False,failed=False):
+        '''
+        Return a connection handle to the pool of its server.
+
+        Args:
+            handle: A connection handle that was acquired through checkout().
+            discard: If True, the handle is considered broken and is closed.
+            failed: If True, the handle was lost because its server stopped responding. The failure is counted against the server.
+        '''
+        with self.lock:
+            server,serverPool,started = self.checkedOut.pop(id(handle))
+        serverPool.checkin(handle,discard=discard,failed=failed)
+        self.selector.finish(server,time() - started,failed=failed)
+
+    def checkout(self,timeout=False,exclude=()):
+        '''
+        Get a connection handle to the server picked by the selector, moving on to the next server if a connection can't be made.
+
+        Args:
+            timeout: Override for the number of seconds to wait for a connection.
+            exclude: Servers that must not be used.
+
+        Returns:
+            A connection handle. It must be returned through checkin() once the caller is done with it.
+        '''
+        started = time()
+        tried = list(exclude)
+        excInfo = None
+        while True:
+            server = self.selector.choose(exclude=tried)
+            if server is None:
+                if not excInfo:
+                    # Every server was excluded.
+                    raise exceptions.ConnectionFailedException(originalException=None)
+                # Every server failed. Pass on the last error.
+                raise excInfo[0],excInfo[1],excInfo[2]
+
+            serverPool = self.getPool(server)
+            try:
+                handle = serverPool.checkout(timeout)
+            except (exceptions.ConnectionFailedException,exceptions.ProxyFailedException):
+                excInfo = sys.exc_info()
+                self.selector.fail(server)
+                tried.append(server)
+                continue
+            except:
+                # Nothing was learned about the server, but it must not be left marked as being probed.
+                self.selector.cancel(server)
+                raise
+
+            self.selector.begin(server)
+            now = time()
+            with self.lock:
+                self.checkedOut[id(handle)] = (server,serverPool,now)
+            if self.observer:
+                self.observer(now - started)
+            return handle
+
+    def close(self):
+        '''
+        Close the pools of all servers.
+        '''
+        with self.lock:
+            pools = self.pools.values()
+            self.pools = {}
+        for serverPool in pools:
+            serverPool.close()
+
+    @contextmanager
+    def connection(self):
+        '''
+        Context manager wrapper around checkout() and checkin().
+
+        A handle that raised ldap.SERVER_DOWN while it was checked out is discarded, and the failure is counted against its server.
+        '''
+        handle = self.checkout()
+        try:
+            yield handle
+        except ldap.SERVER_DOWN:
+            self.checkin(handle,failed=True)
+            raise
+        except:
+            self.checkin(handle)
+            raise
+        else:
+            self.checkin(handle)
+
+    def getServer(self,handle):
+        '''
+        Get the server that a checked out handle is connected to.
+        '''
+        with self.lock:
+            return self.checkedOut[id(handle)][0]
+
+    def getPool(self,server):
+        '''
+        Get the connection pool of a server, creating it if needed.
+        '''
+        with self.lock:
+            if server not in self.pools:
+                self.pools[server] = ConnectionPool(factory=lambda: self.factory(server),**self.poolSettings)
+            return self.pools[server]
+
+class HedgingPolicy:
+    '''
+    Decides when a slow search should also be sent to a second server.
+
+    The delay before hedging is a percentile of the recent search latencies, so only the slowest searches are hedged. Hedges are also limited by a budget: every search earns a fraction of a hedge, and a hedge can only be sent once a whole one has been earned. A budget of 0.05 means that at most about one search in twenty is sent twice, however slow the servers get.
+    '''
+
+    ## The number of latency samples needed before any search is hedged.
+    MIN_SAMPLES = 20
+    ## The number of new samples after which the delay is worked out again.
+    UPDATE_INTERVAL = 50
+    ## The largest number of unused hedges that can be saved up.
+    MAX_TOKENS = 10
+
+    def __init__(self,percentile=95,minDelay=0,budget=0.05,window=1000):
+        '''
+        Args:
+            percentile: The percentile of recent latencies to wait for before hedging.
+            minDelay: The shortest delay, in seconds, before hedging.
+            budget: The largest fraction of searches that may be hedged.
+            window: The number of recent latencies to keep.
+        '''
+        ## The percentile of recent latencies to wait for before hedging.
+        self.percentile = percentile
+        ## The shortest delay, in seconds, before hedging.
+        self.minDelay = minDelay
+        ## The largest fraction of searches that may be hedged.
+        self.budget = budget
+        ## Recent search latencies, in seconds.
+        self.samples = deque(maxlen=window)
+        ## The current delay, or None if there are not enough samples yet.
+        self.delay = None
+        ## The number of samples recorded since the delay was last worked out.
+        self.newSamples = 0
+        ## Hedges earned and not yet used.
+        self.tokens = 0.0
+        ## The number of searches that were hedged.
+        self.hedges = 0
+        ## The number of hedged searches that were answered by the second server first.
+        self.wins = 0
+        ## Lock guarding the samples and the budget.
+        self.lock = threading.Lock()
+
+    def nextDelay(self):
+        '''
+        Called once for every search. Adds the search's share of the budget, and gets the delay before hedging it.
+
+        Returns:
+            The number of seconds to wait before hedging, or None if the search should not be hedged.
+        '''
+        with self.lock:
+            self.tokens = min(self.tokens + self.budget,self.MAX_TOKENS)
+            if self.tokens < 1:
+                return None
+            return self.delay
+
+    def record(self,elapsed):
+        '''
+        Record how long a search took.
+        '''
+        with self.lock:
+            self.samples.append(elapsed)
+            self.newSamples += 1
+            if len(self.samples) < self.MIN_SAMPLES or (self.delay is not None and self.newSamples < self.UPDATE_INTERVAL):
+                return
+            ordered = sorted(self.samples)
+            position = min(max(int(math.ceil(self.percentile / 100.0 * len(ordered))) - 1,0),len(ordered) - 1)
+            self.delay = max(ordered[position],self.minDelay)
+            self.newSamples = 0
+
+    def recordWin(self):
+        '''
+        Record that the second server answered a hedged search first.
+        '''
+        with self.lock:
+            self.wins += 1
+
+    def spend(self):
+        '''
+        Take a hedge out of the budget.
+
+        Returns:
+            True if the budget allowed the hedge.
+        '''
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            self.hedges += 1
+            return True
@@ -0,0 +1,121 @@
+#!/usr/bin/python
+
+import threading
+
+import DirectoryTools
+import DirectoryToolsSchemas as schema
+
+'''
+A process-wide registry of DirectoryTools objects, keyed by their settings.
+
+Each DirectoryTools object has its own connection pools and cache. An application that builds a new object wherever it needs one (for example, once per request) binds the proxy user again each time and starts with an empty cache. Objects taken from the registry with the same settings are the same object, so they share one set of pools and one cache. Objects with any setting that differs are kept apart.
+
+Example:
+    import DirectoryToolsRegistry
+    dt = DirectoryToolsRegistry.getDirectoryTools(properties,'ad')
+'''
+
+def freeze(value):
+    '''
+    Make a hashable copy of a property value.
+
+    Args:
+        value: The value. Dictionaries, lists, tuples and sets are copied recursively.
+
+    Returns:
+        A hashable value that compares equal to the frozen copy of any equal value.
+    '''
+    if isinstance(value,dict):
+        return ('dict',tuple(sorted((key,freeze(item)) for key,item in value.items())))
+    if isinstance(value,(list,tuple)):
+        return ('list',tuple(freeze(item) for item in value))
+    if isinstance(value,(set,frozenset)):
+        return ('set',frozenset(freeze(item) for item in value))
+    return value
+
+class Registry:
+    '''
+    Hands out shared DirectoryTools objects, one for each distinct set of settings.
+
+    The settings of an object are the properties that it ends up with once its template, configuration file and properties have been merged. Two requests that merge to the same properties get the same object, however the properties were given.
+
+    Shared objects are safe to use from several threads. They should not be reconfigured with setProperty() or updateProperties(), since that would change them for every other user. If it happens anyway, the object no longer matches the settings that it was registered under, so later requests for those settings get a new object instead. The replaced object is left running for whoever still holds it, and is closed along with the others by close().
+    '''
+
+    def __init__(self):
+        ## Registered DirectoryTools objects, indexed by their frozen properties.
+        self.instances = {}
+        ## Objects that were replaced because they were reconfigured, waiting to be closed by close().
+        self.retired = []
+        ## Lock guarding instances, so that two threads asking for the same settings don't both create an object.
+        self.lock = threading.Lock()
+
+    def close(self):
+        '''
+        Close the connections of every registered object and every replaced object, and forget them. Later requests create new objects.
+        '''
+        with self.lock:
+            instances = self.instances.values() + self.retired
+            self.instances = {}
+            self.retired = []
+        for instance in instances:
+            instance.stopSync()
+            instance.closeConnections()
+
+    def get(self,properties=False,template='openldap',configFile=False,enableStdOut=False):
+        '''
+        Get the DirectoryTools object for some settings, creating it if there isn't one yet.
+
+        Args:
+            properties: Dictionary of properties, as for DirectoryTools().
+            template: Name of a schema template, as for DirectoryTools().
+            configFile: Optional path to a configuration file, as for DirectoryTools().
+            enableStdOut: Enable output through stdout, as for DirectoryTools(). Only used when a new object is created.
+
+        Returns:
+            A DirectoryTools object.
+        '''
+        key = freeze(self.mergeProperties(properties,template,configFile))
+        with self.lock:
+            instance = self.instances.get(key)
+            if instance is not None and freeze(instance.properties) != key:
+                # Reconfigured since it was handed out. It may still be in use, so it is only closed by close().
+                self.retired.append(instance)
+                instance = None
+            if instance is None:
+                instance = DirectoryTools.DirectoryTools(properties,template,configFile,enableStdOut)
+                self.instances[key] = instance
+            return instance
+
+    def mergeProperties(self,properties,template,configFile):
+        '''
+        Merge properties the way that DirectoryTools() does.
+
+        Args:
+            properties: Dictionary of properties, or False.
+            template: Name of a schema template, or False.
+            configFile: Path to a configuration file, or False.
+
+        Returns:
+            A dictionary of the merged properties.
+        '''
+        merged = DirectoryTools.DirectoryTools.defaultProperties.copy()
+        if template:
+            merged.update(schema.getTemplate(template))
+        if configFile:
+            merged.update(DirectoryTools.readConfigFile(configFile,DirectoryTools.DirectoryTools.CONFIG_SECTION_HEADER))
+        if properties:
+            merged.update(properties)
+        return merged
+
+## The registry used by getDirectoryTools().
+registry = Registry()
+
+def getDirectoryTools(properties=False,template='openldap',configFile=False,enableStdOut=False):
+    '''
+    Get the process-wide shared DirectoryTools object for some settings. See Registry.get().
+
+    Returns:
+        A DirectoryTools object.
+    '''
+    return registry.get(properties,template,configFile,enableStdOut)
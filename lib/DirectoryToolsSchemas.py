@@ -32,7 +32,8 @@ template['ad'] = {
     index.MEMBER_ATTRIBUTE:'member',
     index.MEMBER_ATTRIBUTE_IS_DN:True,
     index.NESTED_GROUPS:True,
-    index.LDAP_PROPERTIES:{ldap.OPT_REFERRALS:0}
+    index.LDAP_PROPERTIES:{ldap.OPT_REFERRALS:0},
+    index.SYNC_ATTRIBUTE:'uSNChanged'
 }
 
 template['freeipa'] = {
@@ -0,0 +1,66 @@
+#!/usr/bin/python
+
+import DirectoryToolsIndexes as index
+import DirectoryToolsExceptions as exceptions
+
+class Settings(object):
+    '''
+    A read-only snapshot of the directory properties that lookups read most often.
+
+    Values are read as plain attributes (for example settings.memberAttributeIsDN) instead of through DirectoryTools.getProperty(). DirectoryTools builds a new snapshot whenever one of these properties changes, so a snapshot is never modified after it has been created.
+    '''
+
+    ## Attribute names of the snapshot, paired with the property that each one is read from.
+    FIELDS = (
+        ('baseDN',index.BASE_DN),
+        ('userRDN',index.USER_RDN),
+        ('groupRDN',index.GROUP_RDN),
+        ('userClass',index.USER_CLASS),
+        ('groupClass',index.GROUP_CLASS),
+        ('userIndexAttribute',index.USER_INDEX_ATTRIBUTE),
+        ('groupIndexAttribute',index.GROUP_INDEX_ATTRIBUTE),
+        ('userUidAttribute',index.USER_UID_ATTRIBUTE),
+        ('groupUidAttribute',index.GROUP_UID_ATTRIBUTE),
+        ('memberAttribute',index.MEMBER_ATTRIBUTE),
+        ('memberAttributeIsDN',index.MEMBER_ATTRIBUTE_IS_DN),
+        ('nestedGroups',index.NESTED_GROUPS),
+        ('maxDepth',index.MAX_DEPTH),
+        ('batchSize',index.BATCH_SIZE),
+        ('pageSize',index.PAGE_SIZE),
+        ('nestedEngine',index.NESTED_ENGINE),
+        ('useTokenGroups',index.USE_TOKEN_GROUPS),
+        ('coalesceQueries',index.COALESCE_QUERIES),
+        ('hedgeReads',index.HEDGE_READS),
+    )
+
+    ## Properties that are part of the snapshot.
+    KEYS = frozenset([key for name,key in FIELDS])
+
+    __slots__ = [name for name,key in FIELDS]
+
+    def __init__(self,properties,defaultProperties):
+        '''
+        Build a snapshot.
+
+        Args:
+            properties: Dictionary of property values.
+            defaultProperties: Dictionary of default values for properties that are not in properties. Properties that are in neither dictionary are left unset, and raise a PropertyNotFoundException when they are read.
+        '''
+        for name,key in self.FIELDS:
+            if key in properties:
+                object.__setattr__(self,name,properties[key])
+            elif key in defaultProperties:
+                object.__setattr__(self,name,defaultProperties[key])
+
+    def __getattr__(self,name):
+        # Only called for slots that were left unset.
+        for fieldName,key in self.FIELDS:
+            if fieldName == name:
+                raise exceptions.PropertyNotFoundException(key=key,triedDefault=True)
+        raise AttributeError(name)
+
+    def __setattr__(self,name,value):
+        raise AttributeError("Settings snapshots are read-only. Use DirectoryTools.setProperty() instead.")
+
+    def __delattr__(self,name):
+        raise AttributeError("Settings snapshots are read-only. Use DirectoryTools.setProperty() instead.")
@@ -18,7 +18,7 @@ setup(name="DirectoryTools",
     author_email='alan@gadgeteering.ca',
     maintainer='Alan Deutscher',
     maintainer_email='alan@gadgeteering.ca',
-    py_modules=["DirectoryTools","DirectoryToolsExceptions","DirectoryToolsIndexes","DirectoryToolsSchemas"],
+    py_modules=["DirectoryTools","DirectoryToolsAsync","DirectoryToolsCache","DirectoryToolsClient","DirectoryToolsDaemon","DirectoryToolsExceptions","DirectoryToolsFakeServer","DirectoryToolsGraph","DirectoryToolsIndexes","DirectoryToolsMetrics","DirectoryToolsPool","DirectoryToolsRegistry","DirectoryToolsSchemas","DirectoryToolsSettings"],
     package_dir={"":"lib"},
     install_requires = ['python-ldap'],
     include_package_data=True,
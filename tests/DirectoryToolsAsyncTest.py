@@ -0,0 +1,164 @@
+#!/usr/bin/python
+
+import ldap
+import DirectoryTools
+import DirectoryToolsAsync
+import DirectoryToolsIndexes as indexes
+import DirectoryToolsExceptions as exceptions
+import DirectoryToolsFakeServer as fake
+import unittest
+
+'''
+README
+
+These tests run the non-blocking front-end (see DirectoryToolsAsync) against an in-process fake directory (see DirectoryToolsFakeServer), and compare its answers with those of the blocking methods.
+'''
+
+class DirectoryToolsAsyncTestsCommon:
+    '''
+    Sets up a fake directory in the shape named by self.shape, with a blocking and an asynchronous DirectoryTools object for it.
+    '''
+
+    ## The kind of server to imitate.
+    shape = 'openldap'
+
+    def setUp(self):
+        '''
+        Prepare DirectoryTools for testing against a fake directory.
+        '''
+        print '\nSetting up for: {0}'.format(self.id())
+
+        ## The fake directory.
+        self.directory,properties = fake.generateDirectory(self.shape,users=40,groups=8)
+        properties[indexes.LOG_LEVEL] = DirectoryTools.LOG_LEVEL_CRITICAL
+        properties[indexes.AUTH_POOL_MAX_SIZE] = 2
+        if self.shape == 'freeipa':
+            # The FreeIPA template does not name an index attribute for groups.
+            properties[indexes.GROUP_INDEX_ATTRIBUTE] = 'cn'
+
+        ## Blocking DirectoryTools object to compare answers with.
+        self.auth = DirectoryTools.DirectoryTools(properties,self.shape)
+        self.directory.install(self.auth)
+        ## AsyncDirectoryTools object to run tests with.
+        self.asyncAuth = DirectoryToolsAsync.AsyncDirectoryTools(properties,self.shape)
+        self.directory.install(self.asyncAuth)
+
+    def tearDown(self):
+        self.asyncAuth.closeConnections()
+        self.auth.closeConnections()
+
+    def test_authenticateParity(self):
+        '''
+        Authentication gives the same answers as authenticate().
+        '''
+        attempts = [('user1','password'),('user2','password'),('user1','wrong-password'),('nobody','password')]
+        expected = [self.auth.authenticate(userName,password) for userName,password in attempts]
+        self.assertEquals(expected,[True,True,False,False])
+        self.assertEquals(self.asyncAuth.run([self.asyncAuth.authenticateAsync(userName,password) for userName,password in attempts]),expected)
+
+    def test_groupParity(self):
+        '''
+        Group lookups give the same answers as the blocking methods.
+        '''
+        userClass = self.auth.getProperty(indexes.USER_CLASS)
+        uidAttribute = self.auth.getProperty(indexes.USER_UID_ATTRIBUTE)
+        groups = ['group{0}'.format(i) for i in range(4)]
+        users = ['user{0}'.format(i) for i in range(0,40,7)]
+
+        expected = [sorted(self.auth.getGroupMembers(group,objectClassFilter=userClass,uidAttribute=uidAttribute)) for group in groups]
+        self.assertTrue(expected[0])
+        members = self.asyncAuth.run([self.asyncAuth.getGroupMembersAsync(group,objectClassFilter=userClass,uidAttribute=uidAttribute) for group in groups])
+        self.assertEquals([sorted(memberList) for memberList in members],expected)
+
+        expected = [self.auth.isUserInGroup(user,'group1') for user in users]
+        self.assertTrue(True in expected and False in expected)
+        self.assertEquals(self.asyncAuth.run([self.asyncAuth.isUserInGroupAsync(user,'group1') for user in users]),expected)
+
+        expected = [sorted(self.auth.getUserGroups(user)) for user in users]
+        self.assertEquals([sorted(groupList) for groupList in self.asyncAuth.run([self.asyncAuth.getUserGroupsAsync(user) for user in users])],expected)
+
+class DirectoryToolsAsyncOpenLDAPTest(DirectoryToolsAsyncTestsCommon,unittest.TestCase):
+    '''
+    Unit tests against a fake OpenLDAP directory, including the connection handling of the asynchronous front-end.
+    '''
+    shape = 'openldap'
+
+    def test_authQueue(self):
+        '''
+        Binds beyond AUTH_POOL_MAX_SIZE wait in a queue, and are sent as earlier binds finish.
+        '''
+        userDNs = [self.auth.resolveUserDN('user{0}'.format(i)) for i in range(5)]
+        self.directory.resetCounters()
+        binds = [self.asyncAuth.bindAsync(userDN,'password') for userDN in userDNs]
+        self.assertEquals(len(self.asyncAuth.authConnections),2)
+        self.assertEquals(len(self.asyncAuth.authQueue),3)
+        self.assertEquals(self.directory.counters['bind'],0)
+
+        self.asyncAuth.run(binds)
+        self.assertEquals(len(self.asyncAuth.authQueue),0)
+        self.assertEquals(len(self.asyncAuth.authConnections),2)
+        self.assertEquals(self.directory.counters['bind'],5)
+
+    def test_serverDown(self):
+        '''
+        A search whose connection is lost fails over to a new connection, and the lost connection is dropped.
+        '''
+        query = self.asyncAuth.queryAsync('(uid=user1)',['uid'])
+        lost = self.asyncAuth.asyncConnections[0]
+        # The search is in flight when the connection goes down.
+        lost.handle.closed = True
+        results = self.asyncAuth.run(query)
+        self.assertEquals(len(results),1)
+        self.assertFalse(lost in self.asyncAuth.asyncConnections)
+        self.assertEquals(len(self.asyncAuth.asyncConnections),1)
+
+        # Authentication retries the same way.
+        self.assertTrue(self.asyncAuth.run(self.asyncAuth.authenticateAsync('user1','password')))
+        lost = self.asyncAuth.authConnections[0]
+        lost.handle.closed = True
+        self.assertTrue(self.asyncAuth.run(self.asyncAuth.authenticateAsync('user2','password')))
+        self.assertFalse(lost in self.asyncAuth.authConnections)
+
+    def test_closeConnections(self):
+        '''
+        Closing the connections fails every operation that is in flight or queued.
+        '''
+        search = self.asyncAuth.searchAsync(self.auth.getProperty(indexes.BASE_DN),ldap.SCOPE_SUBTREE,'(uid=user1)',['uid'])
+        binds = [self.asyncAuth.bindAsync(self.auth.resolveUserDN('user{0}'.format(i)),'password') for i in range(3)]
+        self.assertEquals(len(self.asyncAuth.authQueue),1)
+
+        self.asyncAuth.closeConnections()
+        for result in [search] + binds:
+            self.assertTrue(result.done())
+            self.assertRaises(exceptions.PoolClosedException,result.result)
+        self.assertEquals(len(self.asyncAuth.authQueue),0)
+        self.assertEquals(self.asyncAuth.asyncConnections + self.asyncAuth.authConnections,[])
+
+    def test_runTimeout(self):
+        '''
+        run() gives up once its timeout runs out, and refuses to wait on an operation that nothing is going to finish.
+        '''
+        self.directory.latency = 0.5
+        query = self.asyncAuth.queryAsync('(uid=user1)',['uid'])
+        self.assertRaises(exceptions.AsyncNotDoneException,query.result)
+        self.assertRaises(exceptions.AsyncTimeoutException,self.asyncAuth.run,query,0.05)
+        self.assertFalse(query.done())
+
+        # The search is still in flight, and can be waited on again.
+        self.assertEquals(len(self.asyncAuth.run(query)),1)
+        self.assertRaises(exceptions.AsyncNotDoneException,self.asyncAuth.run,DirectoryToolsAsync.AsyncResult())
+
+class DirectoryToolsAsyncActiveDirectoryTest(DirectoryToolsAsyncTestsCommon,unittest.TestCase):
+    '''
+    Unit tests against a fake Active Directory directory.
+    '''
+    shape = 'ad'
+
+class DirectoryToolsAsyncFreeIPATest(DirectoryToolsAsyncTestsCommon,unittest.TestCase):
+    '''
+    Unit tests against a fake FreeIPA directory.
+    '''
+    shape = 'freeipa'
+
+if __name__ == '__main__':
+    unittest.main()
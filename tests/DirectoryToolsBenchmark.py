@@ -0,0 +1,170 @@
+#!/usr/bin/python
+
+import argparse,os,random,resource,sys,traceback
+import cPickle as pickle
+from time import time
+
+import DirectoryTools
+import DirectoryToolsIndexes as indexes
+import DirectoryToolsFakeServer as fake
+
+'''
+README
+
+Benchmarks the main DirectoryTools lookups against an in-process fake directory, so that performance changes can be measured without a server.
+
+For each shape and lookup, the lookup is called with pseudo-random users and groups (the same ones on every run with the same seed). Reported for each lookup:
+- Round-trips: the number of searches and binds that reached the directory, per call.
+- Wall time: the total and average time of the calls.
+- Peak memory: the peak resident set size of the process, and how much it grew while the lookup ran.
+
+Each lookup runs in its own forked process where available, so that peak memory is measured separately for each one.
+
+Example:
+    PYTHONPATH=lib python tests/DirectoryToolsBenchmark.py --shape ad --users 5000 --groups 500 --latency 0.001
+'''
+
+## Lookups to benchmark, in the order that they are run.
+LOOKUPS = ['authenticate','getUsersInGroup','isUserInGroup','getUserGroups']
+
+def loadArguments():
+    '''
+    Parse the command line arguments.
+    '''
+    parser = argparse.ArgumentParser(description='Benchmark DirectoryTools against an in-process fake directory.')
+    parser.add_argument('--shape',choices=['openldap','ad','freeipa'],action='append',help='Kind of directory to imitate. Can be given more than once. Defaults to all of them.')
+    parser.add_argument('--lookup',choices=LOOKUPS,action='append',help='Lookup to benchmark. Can be given more than once. Defaults to all of them.')
+    parser.add_argument('--users',type=int,default=1000,help='Number of users in the directory.')
+    parser.add_argument('--groups',type=int,default=100,help='Number of groups in the directory.')
+    parser.add_argument('--depth',type=int,default=3,help='Maximum nesting depth of groups.')
+    parser.add_argument('--fanout',type=int,default=3,help='Number of nested groups in each group.')
+    parser.add_argument('--members',type=int,default=10,help='Number of direct user members of each group.')
+    parser.add_argument('--latency',type=float,default=0.0,help='Seconds that each LDAP operation takes to be answered.')
+    parser.add_argument('--iterations',type=int,default=100,help='Number of calls of each lookup.')
+    parser.add_argument('--seed',type=int,default=1,help='Seed for picking users and groups.')
+    parser.add_argument('--warm',action='store_true',help='Keep caches between calls. By default, caches are flushed before every call.')
+    return parser.parse_args()
+
+def getPeakMemory():
+    '''
+    Get the peak resident set size of this process.
+
+    Returns:
+        The peak resident set size, in kilobytes.
+    '''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # Reported in bytes instead of kilobytes.
+        peak = peak // 1024
+    return peak
+
+def runIsolated(function,*args):
+    '''
+    Call a function in a forked process, so that its peak memory is measured on its own. Calls the function directly where fork() is not available.
+
+    Returns:
+        The return value of the function.
+    '''
+    if not hasattr(os,'fork'):
+        return function(*args)
+
+    readFd,writeFd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(readFd)
+        try:
+            payload = pickle.dumps((True,function(*args)),pickle.HIGHEST_PROTOCOL)
+        except:
+            payload = pickle.dumps((False,traceback.format_exc()),pickle.HIGHEST_PROTOCOL)
+        with os.fdopen(writeFd,'wb') as output:
+            output.write(payload)
+        os._exit(0)
+
+    os.close(writeFd)
+    with os.fdopen(readFd,'rb') as source:
+        payload = source.read()
+    os.waitpid(pid,0)
+    succeeded,value = pickle.loads(payload)
+    if not succeeded:
+        raise RuntimeError('Benchmark failed:\n' + value)
+    return value
+
+def runLookup(directory,properties,shape,lookup,args):
+    '''
+    Benchmark one lookup.
+
+    Args:
+        directory: The FakeDirectory to run against.
+        properties: DirectoryTools properties for connecting to the directory.
+        shape: The kind of directory.
+        lookup: The name of the lookup.
+        args: The parsed command line arguments.
+
+    Returns:
+        A dictionary of results.
+    '''
+    startMemory = getPeakMemory()
+
+    dt = DirectoryTools.DirectoryTools(properties,shape)
+    directory.install(dt)
+
+    picker = random.Random(args.seed)
+    calls = []
+    for i in range(args.iterations):
+        user = 'user{0}'.format(picker.randrange(max(args.users,1)))
+        group = 'group{0}'.format(picker.randrange(max(args.groups,1)))
+        if lookup == 'authenticate':
+            calls.append((dt.authenticate,(user,'password')))
+        elif lookup == 'getUsersInGroup':
+            calls.append((dt.getUsersInGroup,(group,)))
+        elif lookup == 'isUserInGroup':
+            calls.append((dt.isUserInGroup,(user,group)))
+        else:
+            calls.append((dt.getUserGroups,(user,)))
+
+    # The proxy connection is opened and bound before timing starts.
+    with dt.getProxyPool().connection():
+        pass
+    directory.resetCounters()
+    elapsed = 0.0
+    for function,callArgs in calls:
+        if not args.warm:
+            dt.flushCaches()
+        started = time()
+        function(*callArgs)
+        elapsed += time() - started
+    dt.closeConnections()
+
+    roundTrips = directory.counters['search'] + directory.counters['bind']
+    return {
+        'roundTrips':roundTrips,
+        'entries':directory.counters['entries'],
+        'elapsed':elapsed,
+        'peakMemory':getPeakMemory(),
+        'memoryGrowth':getPeakMemory() - startMemory,
+    }
+
+def main():
+    args = loadArguments()
+    shapes = args.shape or ['openldap','ad','freeipa']
+    lookups = args.lookup or LOOKUPS
+
+    print 'users={0} groups={1} depth={2} fanout={3} members={4} latency={5} iterations={6} seed={7} caches={8}'.format(
+        args.users,args.groups,args.depth,args.fanout,args.members,args.latency,args.iterations,args.seed,('cold','warm')[args.warm])
+    print '{0:<9} {1:<16} {2:>12} {3:>12} {4:>10} {5:>10} {6:>10} {7:>10}'.format('shape','lookup','round-trips','per call','wall (s)','ms/call','peak (MB)','grew (MB)')
+
+    for shape in shapes:
+        directory,properties = fake.generateDirectory(shape,users=args.users,groups=args.groups,depth=args.depth,fanout=args.fanout,membersPerGroup=args.members,latency=args.latency)
+        properties[indexes.LOG_LEVEL] = DirectoryTools.LOG_LEVEL_CRITICAL
+        if shape == 'freeipa':
+            # The FreeIPA template does not name an index attribute for groups.
+            properties[indexes.GROUP_INDEX_ATTRIBUTE] = 'cn'
+
+        for lookup in lookups:
+            result = runIsolated(runLookup,directory,properties,shape,lookup,args)
+            calls = max(args.iterations,1)
+            print '{0:<9} {1:<16} {2:>12} {3:>12.2f} {4:>10.3f} {5:>10.3f} {6:>10.1f} {7:>10.1f}'.format(
+                shape,lookup,result['roundTrips'],float(result['roundTrips']) / calls,result['elapsed'],result['elapsed'] * 1000 / calls,result['peakMemory'] / 1024.0,result['memoryGrowth'] / 1024.0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,575 @@
+#!/usr/bin/python
+
+import os,sqlite3,tempfile,threading
+from time import sleep,time
+import DirectoryTools
+import DirectoryToolsCache
+import DirectoryToolsIndexes as indexes
+import DirectoryToolsExceptions as exceptions
+import DirectoryToolsFakeServer as fake
+import unittest
+
+'''
+README
+
+These tests check the DirectoryTools cache. Lookups run against an in-process fake directory (see DirectoryToolsFakeServer). Where expiry matters, time is read from a fake clock.
+'''
+
+class FakeClock:
+    '''
+    Stands in for time.time(). Every reading moves the clock forward by a fixed step.
+    '''
+
+    def __init__(self,now=1000.0,step=0):
+        ## The next reading.
+        self.now = now
+        ## Seconds to move forward after each reading.
+        self.step = step
+
+    def __call__(self):
+        now = self.now
+        self.now += self.step
+        return now
+
+class DirectoryToolsCacheTest(unittest.TestCase):
+    '''
+    Unit tests for DirectoryToolsCache.
+    '''
+
+    def setUp(self):
+        print '\nSetting up for: {0}'.format(self.id())
+
+        ## The fake clock.
+        self.clock = FakeClock()
+        ## The clock that the cache module read time from before the test.
+        self.originalTime = DirectoryToolsCache.time
+        DirectoryToolsCache.time = self.clock
+
+        ## The fake directory.
+        self.directory,properties = fake.generateDirectory('openldap',users=10,groups=2)
+        properties[indexes.LOG_LEVEL] = DirectoryTools.LOG_LEVEL_CRITICAL
+        properties[indexes.CACHE_TTL] = 60
+        ## DirectoryTools object to run tests with.
+        self.auth = DirectoryTools.DirectoryTools(properties,'openldap')
+        self.directory.install(self.auth)
+
+    def tearDown(self):
+        DirectoryToolsCache.time = self.originalTime
+
+    def test_expiryDuringLookup(self):
+        '''
+        An item that expires while it is being read is either returned or searched for again, and never raises KeyError.
+        '''
+        userDN = self.auth.resolveUserDN('user3')
+        self.assertTrue(userDN)
+        searches = self.directory.counters['search']
+
+        # Every reading of the clock now crosses the expiry of the cached DN.
+        self.clock.now += 59.5
+        self.clock.step = 1
+        self.assertEquals(self.auth.resolveUserDN('user3'),userDN)
+        self.assertEquals(self.directory.counters['search'],searches)
+
+        # Once it has expired, the DN is searched for again.
+        self.assertEquals(self.auth.resolveUserDN('user3'),userDN)
+        self.assertEquals(self.directory.counters['search'],searches + 1)
+
+    def getSyncedDirectoryTools(self):
+        '''
+        Make a DirectoryTools object for an Active Directory fake that caches group members, and take its first sync.
+
+        Returns:
+            A tuple of the FakeDirectory and the DirectoryTools object.
+        '''
+        directory,properties = fake.generateDirectory('ad',users=50,groups=8)
+        properties[indexes.LOG_LEVEL] = DirectoryTools.LOG_LEVEL_CRITICAL
+        properties[indexes.CACHE_GROUP_MEMBERS] = True
+        auth = DirectoryTools.DirectoryTools(properties,'ad')
+        directory.install(auth)
+        auth.syncCaches()
+        return directory,auth
+
+    def addMember(self,directory,auth,groupName,userName):
+        '''
+        Create a user in the fake directory, and add it to a group.
+
+        Returns:
+            The DN of the new user.
+        '''
+        userDN = 'CN={0},CN=Users,{1}'.format(userName,auth.getProperty(indexes.BASE_DN))
+        directory.addEntry(userDN,{'objectClass':['top','person','organizationalPerson','user'],'sAMAccountName':userName,'cn':userName})
+        groupDN = auth.resolveGroupDN(groupName)
+        directory.modifyEntry(groupDN,{'member':directory.getValues(directory.getEntry(groupDN),'member') + [userDN]})
+        return userDN
+
+    def test_cachedMiss(self):
+        '''
+        A name that could not be resolved is not searched for again, for users and groups, by name and by DN.
+        '''
+        lookups = [
+            (self.auth.resolveUserDN,'nobody'),
+            (self.auth.resolveGroupDN,'nogroup'),
+            (self.auth.resolveUserUID,'uid=nobody,ou=people,dc=example,dc=lan'),
+            (self.auth.resolveGroupUID,'cn=nogroup,ou=groups,dc=example,dc=lan'),
+            # Objects of the wrong class.
+            (self.auth.resolveUserUID,self.auth.resolveGroupDN('group1')),
+            (self.auth.resolveGroupUID,self.auth.resolveUserDN('user1')),
+        ]
+        for resolve,name in lookups:
+            self.assertFalse(resolve(name))
+        searches = self.directory.counters['search']
+        self.assertTrue(searches >= len(lookups))
+
+        for resolve,name in lookups:
+            self.assertFalse(resolve(name))
+        self.assertEquals(self.directory.counters['search'],searches)
+        self.assertTrue(self.auth.isCachedMiss('resolvedUsers','nobody'))
+        self.assertTrue(self.auth.isCachedMiss('resolvedUsers','uid=nobody,ou=people,dc=example,dc=lan'))
+        self.assertTrue(self.auth.isCachedMiss('resolvedGroups','cn=nogroup,ou=groups,dc=example,dc=lan'))
+        self.assertFalse(self.auth.isCachedMiss('resolvedUsers','user1'))
+        # Only resolution caches remember misses.
+        self.auth.cacheMiss('classCache','nobody')
+        self.assertFalse(self.auth.isCachedMiss('classCache','nobody'))
+
+    def test_cachedMissExpiry(self):
+        '''
+        A miss is forgotten after NEGATIVE_CACHE_TTL seconds, which is separate from CACHE_TTL.
+        '''
+        self.auth.setProperty(indexes.NEGATIVE_CACHE_TTL,10)
+        self.assertFalse(self.auth.resolveUserDN('nobody'))
+        self.assertTrue(self.auth.resolveUserDN('user1'))
+        searches = self.directory.counters['search']
+
+        self.clock.now += 9
+        self.assertFalse(self.auth.resolveUserDN('nobody'))
+        self.assertEquals(self.directory.counters['search'],searches)
+
+        # The user is created after the miss, and is found once the miss has expired.
+        self.clock.now += 2
+        self.assertFalse(self.auth.isCachedMiss('resolvedUsers','nobody'))
+        self.directory.addEntry('uid=nobody,ou=people,dc=example,dc=lan',{'objectClass':['top','person','inetOrgPerson','posixAccount'],'uid':'nobody','cn':'nobody'})
+        self.assertEquals(self.auth.resolveUserDN('nobody'),'uid=nobody,ou=people,dc=example,dc=lan')
+        self.assertEquals(self.directory.counters['search'],searches + 1)
+        # Resolved names still follow CACHE_TTL.
+        self.assertTrue(self.auth.resolveUserDN('user1'))
+        self.assertEquals(self.directory.counters['search'],searches + 1)
+
+    def test_syncClearsMiss(self):
+        '''
+        A miss is forgotten by the next sync once an entry with the name is created.
+        '''
+        directory,auth = self.getSyncedDirectoryTools()
+        self.assertFalse(auth.resolveUserDN('newbie'))
+        self.assertFalse(auth.resolveGroupDN('newgroup'))
+        self.assertTrue(auth.isCachedMiss('resolvedUsers','newbie'))
+
+        # A sync that does not see the name keeps the miss.
+        self.addMember(directory,auth,'group1','someone')
+        auth.syncCaches()
+        self.assertTrue(auth.isCachedMiss('resolvedUsers','newbie'))
+
+        userDN = self.addMember(directory,auth,'group1','newbie')
+        directory.addEntry('CN=newgroup,CN=Users,{0}'.format(auth.getProperty(indexes.BASE_DN)),{'objectClass':['top','group'],'sAMAccountName':'newgroup','cn':'newgroup','member':[userDN]})
+        auth.syncCaches()
+        self.assertFalse(auth.isCachedMiss('resolvedUsers','newbie'))
+        self.assertFalse(auth.isCachedMiss('resolvedGroups','newgroup'))
+        self.assertEquals(auth.resolveUserDN('newbie'),userDN)
+        self.assertTrue(auth.resolveGroupDN('newgroup'))
+
+    def test_syncDuringExpansion(self):
+        '''
+        Members read before a sync flushed them are not cached once the expansion finishes.
+        '''
+        directory,auth = self.getSyncedDirectoryTools()
+        newMembers = []
+        formatGroupMembers = auth.formatGroupMembers
+        def changeAfterRead(*args,**kwargs):
+            # The group has been read. Change it and sync before the expansion returns.
+            if not newMembers:
+                newMembers.append(self.addMember(directory,auth,'group1','newbie'))
+                self.assertTrue(auth.syncCaches())
+            return formatGroupMembers(*args,**kwargs)
+        auth.formatGroupMembers = changeAfterRead
+
+        members = auth.getGroupMembers('group1',returnMembersAsDN=True)
+        self.assertFalse(newMembers[0] in members)
+        self.assertTrue(newMembers[0] in auth.getGroupMembers('group1',returnMembersAsDN=True))
+
+    def test_syncDuringLookups(self):
+        '''
+        Lookups that run while the caches are being synced never fail.
+        '''
+        directory,auth = self.getSyncedDirectoryTools()
+        # Every change to the directory makes the next sync flush the cached members.
+        changes = threading.Thread(target=lambda: [self.addMember(directory,auth,'group{0}'.format(i % 8),'newbie{0}'.format(i)) for i in range(100)])
+
+        errors = []
+        def lookups():
+            for i in range(100):
+                try:
+                    auth.resolveUserDN('user{0}'.format(i % 50))
+                    auth.getGroupMembers('group{0}'.format(i % 8),returnMembersAsDN=True)
+                    auth.isUserInGroup('user{0}'.format(i % 50),'group0')
+                except Exception, e:
+                    errors.append(e)
+        threads = [threading.Thread(target=lookups) for i in range(5)]
+
+        auth.startSync(0.001)
+        try:
+            changes.start()
+            for thread in threads:
+                thread.start()
+            for thread in threads + [changes]:
+                thread.join()
+        finally:
+            auth.stopSync()
+        self.assertEquals(errors,[])
+
+class DirectoryToolsSingleFlightTest(unittest.TestCase):
+    '''
+    Unit tests for coalescing identical calls (see SingleFlight and the COALESCE_QUERIES property).
+    '''
+
+    ## The number of threads that make the same call.
+    threadCount = 5
+
+    def setUp(self):
+        print '\nSetting up for: {0}'.format(self.id())
+
+    def waitFor(self,condition):
+        '''
+        Wait for another thread to make a condition true.
+        '''
+        started = time()
+        while not condition():
+            self.assertTrue(time() - started < 5)
+            sleep(0.001)
+
+    def runThreads(self,target):
+        '''
+        Run target in threadCount threads at once.
+
+        Returns:
+            A list of what each thread returned, or of the exceptions that they raised.
+        '''
+        outcomes = []
+        def run():
+            try:
+                outcome = target()
+            except Exception, e:
+                outcome = e
+            outcomes.append(outcome)
+        threads = [threading.Thread(target=run) for i in range(self.threadCount)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def test_sharedResult(self):
+        '''
+        Calls with the same key while the first one is running wait for it and share its result.
+        '''
+        flight = DirectoryToolsCache.SingleFlight()
+        release = threading.Event()
+        runs = []
+        def call():
+            runs.append(1)
+            release.wait()
+            return ['result']
+
+        # Let the call finish once every thread is waiting for it.
+        releaser = threading.Thread(target=lambda: (self.waitFor(lambda: flight.shared == self.threadCount - 1),release.set()))
+        releaser.start()
+        outcomes = self.runThreads(lambda: flight.do('key',call))
+        releaser.join()
+
+        self.assertEquals(len(runs),1)
+        self.assertEquals(sorted([shared for result,shared in outcomes]),[False] + [True] * (self.threadCount - 1))
+        for result,shared in outcomes:
+            self.assertTrue(result is outcomes[0][0])
+        self.assertEquals(flight.calls,{})
+
+        # Nothing is kept once the call finishes.
+        self.assertEquals(flight.do('key',lambda: ['again']),(['again'],False))
+        self.assertEquals(flight.do('other',lambda: ['other']),(['other'],False))
+
+    def test_sharedException(self):
+        '''
+        An exception raised by the call reaches every thread that waited for it, and the key is free to run again.
+        '''
+        flight = DirectoryToolsCache.SingleFlight()
+        release = threading.Event()
+        def call():
+            release.wait()
+            raise ValueError('failed')
+
+        releaser = threading.Thread(target=lambda: (self.waitFor(lambda: flight.shared == self.threadCount - 1),release.set()))
+        releaser.start()
+        outcomes = self.runThreads(lambda: flight.do('key',call))
+        releaser.join()
+
+        self.assertEquals(len(outcomes),self.threadCount)
+        for outcome in outcomes:
+            self.assertTrue(isinstance(outcome,ValueError))
+        self.assertEquals(flight.calls,{})
+        self.assertEquals(flight.do('key',lambda: 'recovered'),('recovered',False))
+
+    def getDirectoryTools(self,coalesce=True):
+        '''
+        Get a DirectoryTools object for a slow fake directory.
+        '''
+        ## The fake directory.
+        self.directory,properties = fake.generateDirectory('openldap',users=10,groups=2,latency=0.2)
+        properties[indexes.LOG_LEVEL] = DirectoryTools.LOG_LEVEL_CRITICAL
+        properties[indexes.COALESCE_QUERIES] = coalesce
+        properties[indexes.POOL_MAX_SIZE] = self.threadCount
+        auth = DirectoryTools.DirectoryTools(properties,'openldap')
+        self.directory.install(auth)
+        self.addCleanup(auth.closeConnections)
+        return auth
+
+    def test_coalescedQueries(self):
+        '''
+        Identical searches made at the same time are sent to the server once, and every caller gets its own copy of the results.
+        '''
+        auth = self.getDirectoryTools()
+        outcomes = self.runThreads(lambda: auth.query('(uid=user1)',['uid']))
+        self.assertEquals(self.directory.counters['search'],1)
+        self.assertEquals(auth.queryFlight.shared,self.threadCount - 1)
+        self.assertEquals(auth.queryFlight.calls,{})
+        for results in outcomes:
+            self.assertEquals(results,outcomes[0])
+        self.assertEquals(len(set([id(results) for results in outcomes])),self.threadCount)
+
+        # Without coalescing, every caller searches.
+        auth = self.getDirectoryTools(coalesce=False)
+        self.runThreads(lambda: auth.query('(uid=user1)',['uid']))
+        self.assertEquals(self.directory.counters['search'],self.threadCount)
+
+    def test_coalescedQueryFailure(self):
+        '''
+        A search that the server rejects fails for every caller that waited for it.
+        '''
+        auth = self.getDirectoryTools()
+        outcomes = self.runThreads(lambda: auth.query('(uid=user1',['uid']))
+        self.assertEquals(len(outcomes),self.threadCount)
+        for outcome in outcomes:
+            self.assertTrue(isinstance(outcome,exceptions.BadQueryException))
+        self.assertEquals(self.directory.counters['search'],1)
+        self.assertEquals(auth.queryFlight.calls,{})
+        self.assertEquals(len(auth.query('(uid=user1)',['uid'])),1)
+
+class DirectoryToolsCacheStoreTest(unittest.TestCase):
+    '''
+    Unit tests for the persistent cache (see SqliteCacheStore and PersistentCacheBucket).
+    '''
+
+    def setUp(self):
+        print '\nSetting up for: {0}'.format(self.id())
+
+        handle,path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        ## Path of the database.
+        self.storePath = path
+
+        ## The fake clock.
+        self.clock = FakeClock()
+        ## The clock that the cache module read time from before the test.
+        self.originalTime = DirectoryToolsCache.time
+        DirectoryToolsCache.time = self.clock
+
+    def tearDown(self):
+        DirectoryToolsCache.time = self.originalTime
+        for suffix in ['','-wal','-shm']:
+            if os.path.exists(self.storePath + suffix):
+                os.unlink(self.storePath + suffix)
+
+    def test_ttl(self):
+        '''
+        Items expire by their TTL when they are read, whether they are read from memory or from the store.
+        '''
+        store = DirectoryToolsCache.SqliteCacheStore(self.storePath)
+        bucket = DirectoryToolsCache.PersistentCacheBucket(store,'resolvedUsers','general',ttl=60)
+        bucket['user1'] = 'uid=user1'
+        bucket.set('user2','uid=user2',ttl=120)
+        self.assertEquals(store.get('resolvedUsers','general','user1'),(True,'uid=user1',self.clock.now + 60))
+
+        # A new bucket reads the items from the store, and keeps their expiry times.
+        self.clock.now += 30
+        coldBucket = DirectoryToolsCache.PersistentCacheBucket(store,'resolvedUsers','general',ttl=60)
+        self.assertEquals(coldBucket.lookup('user1'),(True,'uid=user1'))
+
+        self.clock.now += 31
+        for cache in [bucket,coldBucket]:
+            self.assertEquals(cache.lookup('user1'),(False,None))
+            self.assertEquals(cache.lookup('user2'),(True,'uid=user2'))
+        self.assertEquals(store.get('resolvedUsers','general','user1'),(False,None,0))
+
+    def test_namespaces(self):
+        '''
+        Stores with different namespaces share a file without seeing each other's items.
+        '''
+        first = DirectoryToolsCache.SqliteCacheStore(self.storePath,namespace='first')
+        second = DirectoryToolsCache.SqliteCacheStore(self.storePath,namespace='second')
+        first.set('resolvedUsers','general','user1','uid=user1,dc=first')
+        second.set('resolvedUsers','general','user1','uid=user1,dc=second')
+        self.assertEquals(first.get('resolvedUsers','general','user1')[1],'uid=user1,dc=first')
+        self.assertEquals(second.get('resolvedUsers','general','user1')[1],'uid=user1,dc=second')
+
+        second.delete()
+        self.assertFalse(second.get('resolvedUsers','general','user1')[0])
+        self.assertTrue(first.get('resolvedUsers','general','user1')[0])
+        self.assertEquals(first.deleteMatching('resolvedUsers',lambda key,value: True),1)
+
+    def test_deleteMatching(self):
+        '''
+        deleteMatching() removes the items of one category that a function selects.
+        '''
+        store = DirectoryToolsCache.SqliteCacheStore(self.storePath)
+        for key,value in [('user1','uid=user1'),('uid=user1','user1'),('user2','uid=user2'),(None,'uid=user1')]:
+            store.set('resolvedUsers','general',key,value)
+        store.set('resolvedGroups','general','user1','uid=user1')
+
+        self.assertEquals(store.deleteMatching('resolvedUsers',lambda key,value: 'uid=user1' in (key,value)),3)
+        self.assertFalse(store.get('resolvedUsers','general','user1')[0])
+        self.assertFalse(store.get('resolvedUsers','general',None)[0])
+        self.assertTrue(store.get('resolvedUsers','general','user2')[0])
+        self.assertTrue(store.get('resolvedGroups','general','user1')[0])
+
+    def test_warmStart(self):
+        '''
+        A second DirectoryTools object using the same file starts with the names that the first one resolved.
+        '''
+        directory,properties = fake.generateDirectory('openldap',users=10,groups=2)
+        properties[indexes.LOG_LEVEL] = DirectoryTools.LOG_LEVEL_CRITICAL
+        properties[indexes.CACHE_PERSISTENT_PATH] = self.storePath
+
+        first = DirectoryTools.DirectoryTools(dict(properties),'openldap')
+        directory.install(first)
+        userDN = first.resolveUserDN('user1')
+        groupDN = first.resolveGroupDN('group1')
+        self.assertTrue(userDN and groupDN)
+        first.closeConnections()
+
+        directory.resetCounters()
+        second = DirectoryTools.DirectoryTools(dict(properties),'openldap')
+        directory.install(second)
+        self.assertEquals(second.resolveUserDN('user1'),userDN)
+        self.assertEquals(second.resolveGroupDN('group1'),groupDN)
+        self.assertEquals(directory.counters['search'],0)
+        second.closeConnections()
+
+class DirectoryToolsAuthCacheTest(unittest.TestCase):
+    '''
+    Unit tests for the authentication cache (see the AUTH_CACHE property).
+    '''
+
+    def setUp(self):
+        print '\nSetting up for: {0}'.format(self.id())
+
+        handle,path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        ## Path of the persistent cache.
+        self.storePath = path
+
+        ## The fake directory. Active Directory's uSNChanged makes syncs exact.
+        self.directory,properties = fake.generateDirectory('ad',users=10,groups=2)
+        properties[indexes.LOG_LEVEL] = DirectoryTools.LOG_LEVEL_CRITICAL
+        properties[indexes.AUTH_CACHE] = True
+        properties[indexes.AUTH_CACHE_ITERATIONS] = 1000
+        properties[indexes.CACHE_PERSISTENT_PATH] = self.storePath
+        # Asking for the authentication cache to be persisted must not make it so.
+        properties[indexes.CACHE_PERSISTENT_CATEGORIES] = ['resolvedUsers',DirectoryTools.DirectoryTools.AUTH_CACHE_CATEGORY]
+        ## Properties of the DirectoryTools objects.
+        self.properties = properties
+        ## DirectoryTools object to run tests with.
+        self.auth = self.getDirectoryTools()
+        ## DN of the user to authenticate as.
+        self.userDN = self.auth.resolveUserDN('user1')
+        self.directory.resetCounters()
+
+    def tearDown(self):
+        self.auth.closeConnections()
+        for suffix in ['','-wal','-shm']:
+            if os.path.exists(self.storePath + suffix):
+                os.unlink(self.storePath + suffix)
+
+    def getDirectoryTools(self):
+        auth = DirectoryTools.DirectoryTools(dict(self.properties),'ad')
+        self.directory.install(auth)
+        return auth
+
+    def test_repeatLogin(self):
+        '''
+        A repeated login with the same password is answered without a bind.
+        '''
+        self.assertTrue(self.auth.authenticate('user1','password'))
+        self.assertEquals(self.directory.counters['bind'],1)
+        self.assertTrue(self.auth.authenticate('user1','password'))
+        self.assertTrue(self.auth.authenticate(self.userDN,'password',userNameIsDN=True))
+        self.assertEquals(self.directory.counters['bind'],1)
+
+    def test_wrongPassword(self):
+        '''
+        A wrong password is checked against the server, and forgets the cached authentication.
+        '''
+        self.assertTrue(self.auth.authenticate('user1','password'))
+        self.assertFalse(self.auth.authenticate('user1','wrong-password'))
+        self.assertEquals(self.directory.counters['bind'],2)
+        self.assertFalse(self.auth.isCachedAuthentication(self.userDN,'password'))
+
+        self.assertTrue(self.auth.authenticate('user1','password'))
+        self.assertEquals(self.directory.counters['bind'],3)
+
+    def test_emptyPassword(self):
+        '''
+        An empty password is never answered from the cache, or cached.
+        '''
+        self.assertTrue(self.auth.authenticate('user1','password'))
+        self.assertFalse(self.auth.authenticate('user1',''))
+        self.assertEquals(self.directory.counters['bind'],2)
+
+        # An anonymous bind succeeds, but must not be remembered.
+        self.assertTrue(self.auth.authenticate('','',userNameIsDN=True))
+        self.assertFalse(self.auth.isCachedAuthentication('',''))
+        self.assertTrue(self.auth.authenticate('','',userNameIsDN=True))
+        self.assertEquals(self.directory.counters['bind'],4)
+
+    def test_syncForgetsChangedUser(self):
+        '''
+        A sync that finds the user's entry changed forgets the cached authentication, so a changed password takes effect.
+        '''
+        self.auth.syncCaches()
+        self.assertTrue(self.auth.authenticate('user1','password'))
+        self.directory.modifyEntry(self.userDN,{'userPassword':['new-password']})
+        self.assertTrue(self.auth.isCachedAuthentication(self.userDN,'password'))
+
+        self.assertTrue(self.auth.syncCaches())
+        self.assertFalse(self.auth.isCachedAuthentication(self.userDN,'password'))
+        self.assertFalse(self.auth.authenticate('user1','password'))
+        self.assertTrue(self.auth.authenticate('user1','new-password'))
+
+    def test_notPersisted(self):
+        '''
+        Cached authentications are kept in memory only, even if the category is listed as persistent.
+        '''
+        self.assertTrue(self.auth.authenticate('user1','password'))
+        connection = sqlite3.connect(self.storePath)
+        try:
+            categories = [row[0] for row in connection.execute('SELECT DISTINCT category FROM cache')]
+        finally:
+            connection.close()
+        self.assertTrue('resolvedUsers' in categories)
+        self.assertFalse(DirectoryTools.DirectoryTools.AUTH_CACHE_CATEGORY in categories)
+
+        # Another process sharing the store still binds.
+        other = self.getDirectoryTools()
+        try:
+            self.assertTrue(other.authenticate('user1','password'))
+        finally:
+            other.closeConnections()
+        self.assertEquals(self.directory.counters['bind'],2)
+
+if __name__ == '__main__':
+    unittest.main()
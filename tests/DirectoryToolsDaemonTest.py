@@ -0,0 +1,98 @@
+#!/usr/bin/python
+
+import os,shutil,tempfile,threading
+import DirectoryTools
+import DirectoryToolsIndexes as indexes
+import DirectoryToolsFakeServer as fake
+import DirectoryToolsExceptions as exceptions
+from DirectoryToolsClient import DirectoryToolsClient
+from DirectoryToolsDaemon import DirectoryToolsDaemon
+import unittest
+
+'''
+README
+
+These tests run a daemon against an in-process fake directory (see DirectoryToolsFakeServer), and send it lookups through a client.
+'''
+
+class DirectoryToolsDaemonTest(unittest.TestCase):
+    '''
+    Unit tests for the daemon and its client.
+    '''
+
+    def setUp(self):
+        '''
+        Start a daemon on a temporary socket.
+        '''
+        print '\nSetting up for: {0}'.format(self.id())
+
+        ## The fake directory.
+        self.directory,properties = fake.generateDirectory('ad',users=20,groups=4)
+        properties[indexes.LOG_LEVEL] = DirectoryTools.LOG_LEVEL_CRITICAL
+        auth = DirectoryTools.DirectoryTools(properties,'ad')
+        self.directory.install(auth)
+
+        ## Directory holding the socket.
+        self.socketDirectory = tempfile.mkdtemp()
+        ## Path of the socket.
+        self.socketPath = os.path.join(self.socketDirectory,'directorytools.sock')
+
+        ## The daemon being tested.
+        self.daemon = DirectoryToolsDaemon(auth,socketPath=self.socketPath)
+        self.daemon.listen()
+        ## Thread that the daemon serves requests on.
+        self.thread = threading.Thread(target=self.daemon.serveForever)
+        self.thread.daemon = True
+        self.thread.start()
+
+        ## Client to send requests with.
+        self.client = DirectoryToolsClient(self.socketPath,timeout=10)
+
+    def tearDown(self):
+        self.client.close()
+        self.daemon.server.shutdown()
+        self.thread.join()
+        shutil.rmtree(self.socketDirectory)
+
+    def test_lookups(self):
+        '''
+        Lookups give the same answers as the DirectoryTools object that answers them.
+        '''
+        self.assertTrue(self.client.ping())
+        self.assertTrue(self.client.authenticate('user1','password'))
+        self.assertFalse(self.client.authenticate('user1','wrong-password'))
+        members = self.client.getUsersInGroup('group0')
+        self.assertTrue(members)
+        self.assertEquals(sorted(members),sorted(self.daemon.directoryTools.getUsersInGroup('group0')))
+        self.assertEquals(sorted(self.client.getUserGroups(members[0])),sorted(self.daemon.directoryTools.getUserGroups(members[0])))
+        self.assertTrue(self.client.isUserInGroup(members[0],'group0'))
+
+    def test_connectionReused(self):
+        '''
+        Repeated lookups reuse the daemon's caches, and are sent over one connection.
+        '''
+        self.client.isUserInGroup('user1','group0')
+        connection = self.client.connection
+        coldSearches = self.directory.counters['search']
+        self.client.isUserInGroup('user1','group0')
+        self.assertTrue(self.client.connection is connection)
+        # The user and group names are already resolved.
+        self.assertTrue(self.directory.counters['search'] - coldSearches < coldSearches)
+
+    def test_reconnect(self):
+        '''
+        A client whose connection was closed by the daemon opens a new one.
+        '''
+        self.client.ping()
+        self.client.connection.close()
+        self.assertTrue(self.client.ping())
+
+    def test_unknownMethod(self):
+        '''
+        Only the published lookups can be called.
+        '''
+        self.assertRaises(exceptions.DaemonRequestException,self.client.call,'setProperty',indexes.BASE_DN,'')
+        self.assertTrue(self.client.ping())
+
+if __name__ == '__main__':
+    unittest.main()
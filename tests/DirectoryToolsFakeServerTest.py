@@ -0,0 +1,408 @@
+#!/usr/bin/python
+
+import base64
+import DirectoryTools
+import DirectoryToolsIndexes as indexes
+import DirectoryToolsFakeServer as fake
+from DirectoryToolsTestsCommon import DirectoryToolsTestsCommon as common
+from time import time
+import unittest
+
+'''
+README
+
+These tests run against an in-process fake directory, so they do not need a server.
+The directory is laid out like the test servers of the other test suites.
+
+Users UIDs:
+- alan
+- bob
+- carl
+- dave
+
+Groups:
+- admins
+    Members: alan
+- employees
+    Members: alan, bob
+- wiki-access
+    Members: carl, employees (nested). Servers without nesting list alan, bob and carl directly.
+- guests
+    Members: carl, dave
+'''
+
+class DirectoryToolsFakeServerTestsCommon(common):
+    '''
+    Sets up a fake directory in the shape named by self.shape, and adds tests that count the operations that reach it.
+    '''
+
+    ## The kind of server to imitate.
+    shape = 'openldap'
+    ## Base DN of the fake directory.
+    baseDN = 'dc=fake,dc=lan'
+
+    def setUp(self):
+        '''
+        Prepare DirectoryTools for testing against a fake directory.
+        '''
+        print '\nSetting up for: {0}'.format(self.id())
+
+        ## The fake directory.
+        self.directory = fake.FakeDirectory(shape=self.shape,baseDN=self.baseDN)
+
+        ## User password. All users have the same password.
+        self.userPassword = 'UserPassword1!'
+
+        userRDN,groupRDN = {'ad':('CN=Users','CN=Users'),'freeipa':('cn=users,cn=accounts','cn=groups,cn=accounts')}.get(self.shape,('ou=people','ou=groups'))
+        self.directory.addEntry(self.baseDN,{'objectClass':['top','domain']})
+        for rdn in set([userRDN,groupRDN]):
+            path = self.baseDN
+            for part in reversed(rdn.split(',')):
+                path = '{0},{1}'.format(part,path)
+                self.directory.addEntry(path,{'objectClass':['top','container']})
+
+        userDNs = {}
+        for name in ['alan','bob','carl','dave']:
+            if self.shape == 'ad':
+                userDNs[name] = 'CN={0},{1},{2}'.format(name.title(),userRDN,self.baseDN)
+                attributes = {'objectClass':['top','person','organizationalPerson','user'],'sAMAccountName':name}
+            else:
+                userDNs[name] = 'uid={0},{1},{2}'.format(name,userRDN,self.baseDN)
+                attributes = {'objectClass':['top','person','inetOrgPerson','posixAccount'],'uid':name}
+            attributes['cn'] = name
+            attributes['userPassword'] = self.userPassword
+            self.directory.addEntry(userDNs[name],attributes)
+
+        if self.shape == 'openldap':
+            # posixGroups can't be nested, so the members of employees are listed directly.
+            serviceMembers = (['alan','bob','carl'],[])
+        else:
+            serviceMembers = (['carl'],['employees'])
+        groups = [
+            ('admins',['alan'],[]),
+            ('employees',['alan','bob'],[]),
+            ('wiki-access',) + serviceMembers,
+            ('guests',['carl','dave'],[]),
+        ]
+        groupDNs = {}
+        for name,users,nested in groups:
+            groupDNs[name] = 'cn={0},{1},{2}'.format(name,groupRDN,self.baseDN)
+            if self.shape == 'openldap':
+                attributes = {'objectClass':['top','posixGroup'],'uid':name,'memberUid':users}
+            else:
+                attributes = {'objectClass':['top','group','groupofnames'],'member':[userDNs[user] for user in users] + [groupDNs[group] for group in nested]}
+                if self.shape == 'ad':
+                    attributes['sAMAccountName'] = name
+            attributes['cn'] = name
+            self.directory.addEntry(groupDNs[name],attributes)
+
+        properties = {
+            indexes.BASE_DN:self.baseDN,
+            indexes.USER_RDN:userRDN,
+            indexes.GROUP_RDN:groupRDN,
+            indexes.SERVER_ADDRESS:'fake.lan',
+            indexes.PROXY_USER:userDNs['alan'],
+            indexes.PROXY_PASSWORD:self.userPassword,
+            indexes.LOG_LEVEL:DirectoryTools.LOG_LEVEL_CRITICAL,
+        }
+
+        ## DirectoryTools object to run tests with.
+        self.auth = DirectoryTools.DirectoryTools(properties,self.shape)
+        self.directory.install(self.auth)
+
+        ## Name of the administrator group.
+        self.adminGroup = 'admins'
+        ## Name of the employee group.
+        self.employeeGroup = 'employees'
+        ## Name of the guest group.
+        self.guestGroup = 'guests'
+        ## Name of the service access group.
+        self.serviceGroup = 'wiki-access'
+
+        ## The expected number of direct members that are expected to be in the service group.
+        self.serviceGroupDirectUserMemberCount = 1
+        ## Intended number of direct and indirect users.
+        self.serviceGroupNestedUserMemberCount = 3
+
+        ## Name of user A.
+        self.userA = 'alan'
+        ## Name of user B.
+        self.userB = 'bob'
+        ## Name of user C.
+        self.userC = 'carl'
+        ## Name of user D.
+        self.userD = 'dave'
+
+        ## Target attribute for the getMultiAttribute test.
+        self.targetAttribute = 'email'
+        ## Target attributes for the getObjectAttributes test.
+        self.targetAttributes = ['objectClass','cn']
+
+    def test_cachedLookups(self):
+        '''
+        Resolved names are answered from the cache without searching again.
+        '''
+        userDN = self.auth.resolveUserDN(self.userC)
+        groupDN = self.auth.resolveGroupDN(self.serviceGroup)
+        self.assertTrue(userDN)
+        self.assertTrue(groupDN)
+        searches = self.directory.counters['search']
+        self.assertEquals(searches,2)
+
+        self.assertEquals(self.auth.resolveUserDN(self.userC),userDN)
+        self.assertEquals(self.auth.resolveGroupDN(self.serviceGroup),groupDN)
+        self.assertEquals(self.directory.counters['search'],searches)
+
+        self.auth.flushCaches()
+        self.auth.resolveUserDN(self.userC)
+        self.assertEquals(self.directory.counters['search'],searches + 1)
+
+    def test_getMultipleObjectAttributes(self):
+        '''
+        Objects are read in batches of BATCH_SIZE, with one search per object, and the reads in a batch wait on the server together.
+        '''
+        dns = [self.auth.resolveUserDN(user) for user in [self.userA,self.userB,self.userC,self.userD]]
+        dns += [self.auth.resolveGroupDN(group) for group in [self.adminGroup,self.employeeGroup,self.serviceGroup,self.guestGroup]]
+        missingDN = 'cn=nobody,{0}'.format(self.baseDN)
+        self.auth.setProperty(indexes.BATCH_SIZE,3)
+        self.directory.latency = 0.05
+        self.directory.resetCounters()
+
+        started = time()
+        results = self.auth.getMultipleObjectAttributes(dns + [missingDN],['cn'])
+        elapsed = time() - started
+        self.assertEquals(self.directory.counters['search'],len(dns) + 1)
+        self.assertEquals(sorted(results.keys()),sorted(dns))
+        for dn in dns:
+            self.assertEquals(results[dn]['cn'],self.directory.getValues(self.directory.getEntry(dn),'cn'))
+        # Three batches, rather than one round-trip per object.
+        self.assertTrue(elapsed < 0.05 * (len(dns) + 1) / 2,elapsed)
+
+    def test_baseScopeReads(self):
+        '''
+        Reading the attributes of an object returns that object alone, even when it has a subtree below it.
+        '''
+        self.directory.resetCounters()
+        results = self.auth.getObjectAttributes(self.baseDN,['objectClass'])
+        self.assertEquals(sorted(results['objectClass']),['domain','top'])
+        self.assertEquals(self.directory.counters['entries'],1)
+
+        self.assertEquals(self.auth.getSingleAttribute(self.auth.getUserBaseDN(),'objectClass'),'top')
+        self.assertTrue(self.auth.isObjectOfClass(self.baseDN,'domain'))
+        self.assertFalse(self.auth.isObjectOfClass(self.auth.getGroupBaseDN(),self.auth.getProperty(indexes.GROUP_CLASS)))
+        self.assertEquals(self.directory.counters['entries'],4)
+
+    def test_getUserGroups(self):
+        '''
+        Test listing the groups of a user.
+        '''
+        groups = self.auth.getUserGroups(self.userB)
+        print 'Displaying groups of {0}: {1}'.format(self.userB,groups)
+        self.assertTrue(self.employeeGroup in groups)
+        self.assertFalse(self.adminGroup in groups)
+
+    def test_queryIter(self):
+        '''
+        queryIter() asks for one page at a time as the results are read, and gives back its connection when it is closed early.
+        '''
+        self.auth.setProperty(indexes.PAGE_SIZE,1)
+        query = '(objectClass={0})'.format(self.auth.getProperty(indexes.USER_CLASS))
+        expected = sorted([dn for dn,attributes in self.auth.query(query,['cn'],self.auth.getUserBaseDN())])
+        self.assertEquals(len(expected),4)
+
+        self.directory.resetCounters()
+        results = self.auth.queryIter(query,['cn'],self.auth.getUserBaseDN())
+        self.assertEquals(self.directory.counters['search'],0)
+        first = results.next()
+        self.assertEquals(self.directory.counters['search'],1)
+        self.assertEquals(sorted([first[0]] + [dn for dn,attributes in results]),expected)
+        self.assertTrue(self.directory.counters['search'] >= len(expected))
+
+        self.auth.setProperty(indexes.PAGE_SIZE,2)
+        self.directory.resetCounters()
+        results = self.auth.queryIter(query,['cn'],self.auth.getUserBaseDN())
+        dn,attributes = results.next()
+        self.assertEquals(attributes['cn'],self.directory.getValues(self.directory.getEntry(dn),'cn'))
+        results.close()
+        self.assertEquals(self.directory.counters['search'],1)
+        self.assertEquals(self.directory.counters['entries'],2)
+        self.assertEquals(self.auth.getProxyPool().checkedOut,{})
+
+class DirectoryToolsFakeOpenLDAPTest(DirectoryToolsFakeServerTestsCommon,unittest.TestCase):
+    '''
+    Unit tests against a fake OpenLDAP directory.
+    '''
+    shape = 'openldap'
+
+    def setUp(self):
+        DirectoryToolsFakeServerTestsCommon.setUp(self)
+        # Members of the nested group are listed directly.
+        self.serviceGroupDirectUserMemberCount = 3
+
+    @unittest.skip('OpenLDAP posixGroups do not nest')
+    def test_getNestedGroupMembers(self):
+        '''
+        Dummy test. posixGroup members are UIDs, so groups can't be nested.
+        '''
+        self.assertTrue(True)
+
+class DirectoryToolsFakeActiveDirectoryTest(DirectoryToolsFakeServerTestsCommon,unittest.TestCase):
+    '''
+    Unit tests against a fake Active Directory directory.
+    '''
+    shape = 'ad'
+
+    def test_rangedMembers(self):
+        '''
+        Members are read in full when the server only returns a few values of an attribute at a time.
+        '''
+        expected = sorted(self.auth.getUsersInGroup(self.serviceGroup))
+        self.assertEquals(len(expected),self.serviceGroupNestedUserMemberCount)
+
+        self.auth.flushCaches()
+        self.directory.maxValRange = 1
+        self.assertEquals(sorted(self.auth.getUsersInGroup(self.serviceGroup)),expected)
+        self.assertEquals(len(self.auth.getMultiAttribute(self.auth.resolveGroupDN(self.serviceGroup),'member')),2)
+        self.assertTrue(self.auth.isUserInGroup(self.userB,self.serviceGroup))
+
+    def test_breadthFirstClassCache(self):
+        '''
+        The breadth-first engine only reads the groups on each level once the classes of their members are cached.
+        '''
+        self.auth.setProperty(indexes.NESTED_ENGINE,DirectoryTools.NESTED_ENGINE_BREADTH_FIRST)
+        groupDN = self.auth.resolveGroupDN(self.serviceGroup)
+        userClass = self.auth.getProperty(indexes.USER_CLASS)
+        members = sorted(self.auth.getGroupMembersBreadthFirst(groupDN))
+        filtered = sorted(self.auth.getGroupMembersBreadthFirst(groupDN,objectClassFilter=userClass))
+        self.assertEquals(len(filtered),self.serviceGroupNestedUserMemberCount)
+        self.assertTrue(self.auth.isUserInGroup(self.userB,self.serviceGroup))
+
+        # The service group and the employee group.
+        searches = self.directory.counters['search']
+        self.assertEquals(sorted(self.auth.getGroupMembersBreadthFirst(groupDN)),members)
+        self.assertEquals(self.directory.counters['search'],searches + 2)
+        searches = self.directory.counters['search']
+        self.assertEquals(sorted(self.auth.getGroupMembersBreadthFirst(groupDN,objectClassFilter=userClass)),filtered)
+        self.assertEquals(self.directory.counters['search'],searches + 2)
+        # A search for the user, then the service group and the employee group.
+        self.auth.resolveUserDN(self.userD)
+        searches = self.directory.counters['search']
+        self.assertTrue(self.auth.isUserInGroup(self.userB,self.serviceGroup))
+        self.assertFalse(self.auth.isUserInGroup(self.userD,self.serviceGroup))
+        self.assertEquals(self.directory.counters['search'],searches + 6)
+
+    def test_inChainFallback(self):
+        '''
+        The in-chain engine lets the server check nested memberships, and falls back to the recursive engine on a server that refuses the matching rule.
+        '''
+        self.auth.setProperty(indexes.NESTED_ENGINE,DirectoryTools.NESTED_ENGINE_IN_CHAIN)
+        self.auth.resolveUserDN(self.userB)
+        self.auth.resolveGroupDN(self.serviceGroup)
+        searches = self.directory.counters['search']
+        self.assertTrue(self.auth.isUserInGroup(self.userB,self.serviceGroup))
+        inChainSearches = self.directory.counters['search'] - searches
+        self.assertEquals(len(self.auth.getUsersInGroup(self.serviceGroup)),self.serviceGroupNestedUserMemberCount)
+        self.assertFalse(self.auth.inChainRejected)
+
+        self.auth.flushCaches()
+        self.directory.supportsInChain = False
+        self.assertTrue(self.auth.isUserInGroup(self.userB,self.serviceGroup))
+        self.assertTrue(self.auth.inChainRejected)
+        self.assertFalse(self.auth.isUserInGroup(self.userD,self.serviceGroup))
+        self.assertEquals(len(self.auth.getUsersInGroup(self.serviceGroup)),self.serviceGroupNestedUserMemberCount)
+        # The matching rule is not tried again, and the nested groups are searched one at a time.
+        self.auth.flushCaches()
+        self.directory.supportsInChain = True
+        self.auth.resolveUserDN(self.userB)
+        self.auth.resolveGroupDN(self.serviceGroup)
+        searches = self.directory.counters['search']
+        self.assertTrue(self.auth.isUserInGroup(self.userB,self.serviceGroup))
+        self.assertTrue(self.directory.counters['search'] - searches > inChainSearches)
+
+    def test_tokenGroups(self):
+        '''
+        With USE_TOKEN_GROUPS, the groups of a user are read from the SIDs in its tokenGroups attribute, including nested groups.
+        '''
+        self.auth.setProperty(indexes.USE_TOKEN_GROUPS,True)
+        self.auth.setProperty(indexes.NESTED_ENGINE,DirectoryTools.NESTED_ENGINE_IN_CHAIN)
+        userDN = self.auth.resolveUserDN(self.userB)
+        searches = self.directory.counters['search']
+        groups = self.auth.getUserGroups(self.userB)
+        self.assertEquals(sorted(groups),sorted([self.employeeGroup,self.serviceGroup]))
+        # One read of the user, and one search for the SIDs.
+        self.assertEquals(self.directory.counters['search'],searches + 2)
+
+        groupDNs = self.auth.getUserGroups(self.userB,returnGroupsAsDN=True)
+        self.assertEquals(sorted(groupDNs),sorted([self.auth.resolveGroupDN(group) for group in groups]))
+        for groupDN in groupDNs:
+            sid = DirectoryTools.Utilities().decodeMicrosoftSid(base64.b64encode(self.directory.getValues(self.directory.getEntry(groupDN),'objectSid')[0]))
+            self.assertEquals(self.auth.cache['resolvedSids'][self.auth.initCache('resolvedSids')[1]].lookup(sid),(True,(groupDN,self.auth.resolveGroupUID(groupDN))))
+
+        # A server that does not return tokenGroups is asked with the in-chain matching rule instead.
+        self.auth.flushCaches()
+        self.directory.supportsTokenGroups = False
+        self.assertEquals(sorted(self.auth.getUserGroups(self.userB)),sorted(groups))
+        self.assertFalse(self.auth.inChainRejected)
+
+        # If the server refuses the matching rule as well, only the direct groups of the user are listed.
+        self.auth.flushCaches()
+        self.directory.supportsInChain = False
+        self.assertEquals(self.auth.getUserGroups(self.userB),[self.employeeGroup])
+        self.assertTrue(self.auth.inChainRejected)
+        self.assertTrue(self.auth.getUserGroups(userDN,userNameIsDN=True))
+
+    def test_tokenGroupsCached(self):
+        '''
+        SIDs that have been mapped to groups are not searched for again, for any user. SIDs of groups outside of the group base DN are left out, and are not searched for again either.
+        '''
+        self.auth.setProperty(indexes.USE_TOKEN_GROUPS,True)
+        builtinDN = 'CN=Builtin,{0}'.format(self.baseDN)
+        self.directory.addEntry(builtinDN,{'objectClass':['top','container']})
+        self.directory.addEntry('CN=Remote Users,{0}'.format(builtinDN),{'objectClass':['top','group'],'cn':'Remote Users','sAMAccountName':'Remote Users','member':[self.auth.resolveUserDN(self.userB)]})
+        self.auth.resolveUserDN(self.userA)
+
+        searches = self.directory.counters['search']
+        self.assertEquals(sorted(self.auth.getUserGroups(self.userA)),sorted([self.adminGroup,self.employeeGroup,self.serviceGroup]))
+        self.assertEquals(self.directory.counters['search'],searches + 2)
+
+        # The groups of bob are a subset of those of alan, apart from the built-in group.
+        searches = self.directory.counters['search']
+        self.assertEquals(sorted(self.auth.getUserGroups(self.userB)),sorted([self.employeeGroup,self.serviceGroup]))
+        self.assertEquals(self.directory.counters['search'],searches + 2)
+        searches = self.directory.counters['search']
+        self.assertEquals(sorted(self.auth.getUserGroups(self.userB)),sorted([self.employeeGroup,self.serviceGroup]))
+        self.assertEquals(self.directory.counters['search'],searches + 1)
+
+    def test_pagedRangedMembers(self):
+        '''
+        A paged search reads ranged attributes on its own connection, so it works with a pool of one connection.
+        '''
+        self.directory.maxValRange = 1
+        self.auth.setProperty(indexes.POOL_MAX_SIZE,1)
+        self.auth.setProperty(indexes.POOL_TIMEOUT,1)
+        self.auth.setProperty(indexes.PAGE_SIZE,1)
+        query = '(objectClass={0})'.format(self.auth.getProperty(indexes.GROUP_CLASS))
+        groups = dict(self.auth.queryIter(query,['member'],self.auth.getGroupBaseDN()))
+
+        self.assertEquals(len(groups),4)
+        for dn,attributes in groups.items():
+            expected = self.directory.getValues(self.directory.getEntry(dn),'member')
+            self.assertEquals(sorted(attributes['member']),sorted(expected))
+        self.assertEquals(len(groups[self.auth.resolveGroupDN(self.serviceGroup)]['member']),2)
+        proxyPool = self.auth.getProxyPool()
+        self.assertEquals(proxyPool.checkedOut,{})
+        self.assertEquals(sum([serverPool.total for serverPool in proxyPool.pools.values()]),1)
+
+class DirectoryToolsFakeFreeIPATest(DirectoryToolsFakeServerTestsCommon,unittest.TestCase):
+    '''
+    Unit tests against a fake FreeIPA directory.
+    '''
+    shape = 'freeipa'
+
+    def setUp(self):
+        DirectoryToolsFakeServerTestsCommon.setUp(self)
+        # The FreeIPA template does not name an index attribute for groups.
+        self.auth.setProperty(indexes.GROUP_INDEX_ATTRIBUTE,'cn')
+
+if __name__ == '__main__':
+    unittest.main()
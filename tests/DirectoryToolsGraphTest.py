@@ -0,0 +1,226 @@
+#!/usr/bin/python
+
+import DirectoryTools
+import DirectoryToolsIndexes as indexes
+import DirectoryToolsExceptions as exceptions
+import DirectoryToolsFakeServer as fake
+from DirectoryToolsGraph import MembershipGraph
+import unittest
+
+'''
+README
+
+These tests check the in-memory membership graph (see DirectoryToolsGraph), both on its own and against the answers of the lookups that search the server. Lookups run against an in-process fake directory (see DirectoryToolsFakeServer).
+
+The graph in the unit tests is a chain of groups, with one user at each level:
+- a
+    Members: alan, b
+- b
+    Members: bob, c
+- c
+    Members: carl
+'''
+
+class MembershipGraphTest(unittest.TestCase):
+    '''
+    Unit tests for MembershipGraph.
+    '''
+
+    def setUp(self):
+        print '\nSetting up for: {0}'.format(self.id())
+
+    def getGraph(self,nestedGroups=True,maxDepth=-1):
+        '''
+        Build the graph that is described in the README.
+        '''
+        membershipGraph = MembershipGraph(nestedGroups=nestedGroups,maxDepth=maxDepth)
+        membershipGraph.addGroup('cn=a','a',['uid=alan','cn=b'])
+        membershipGraph.addGroup('cn=b','b',['uid=bob','cn=c'])
+        membershipGraph.addGroup('cn=c','c',['uid=carl'])
+        return membershipGraph
+
+    def getMembers(self,membershipGraph,uid):
+        '''
+        Returns:
+            The sorted names of the members of a group.
+        '''
+        return sorted([membershipGraph.names[memberId] for memberId in membershipGraph.getMembers(membershipGraph.getGroupId(uid))])
+
+    def getGroups(self,membershipGraph,key):
+        '''
+        Returns:
+            The sorted UIDs of the groups of a node.
+        '''
+        return sorted([membershipGraph.groupUids[groupId] for groupId in membershipGraph.getGroups(membershipGraph.getId(key))])
+
+    def test_closures(self):
+        '''
+        Members and groups are followed through nested groups in both directions, and names are matched without regard to case.
+        '''
+        membershipGraph = self.getGraph()
+        self.assertEquals(self.getMembers(membershipGraph,'a'),['cn=b','cn=c','uid=alan','uid=bob','uid=carl'])
+        self.assertEquals(self.getMembers(membershipGraph,'C'),['uid=carl'])
+        self.assertEquals(self.getGroups(membershipGraph,'UID=Carl'),['a','b','c'])
+        self.assertTrue(membershipGraph.isMember(membershipGraph.getId('uid=carl'),membershipGraph.getGroupId('a')))
+        self.assertFalse(membershipGraph.isMember(membershipGraph.getId('uid=alan'),membershipGraph.getGroupId('b')))
+        self.assertEquals(len(membershipGraph.groups),3)
+        self.assertEquals(len(membershipGraph),6)
+
+        # Only direct memberships are followed without nesting.
+        membershipGraph = self.getGraph(nestedGroups=False)
+        self.assertEquals(self.getMembers(membershipGraph,'a'),['cn=b','uid=alan'])
+        self.assertEquals(self.getGroups(membershipGraph,'uid=carl'),['c'])
+
+    def test_addGroup(self):
+        '''
+        Adding a group again replaces its members and its UID, and the closures that passed through it.
+        '''
+        membershipGraph = self.getGraph()
+        self.assertEquals(self.getGroups(membershipGraph,'uid=carl'),['a','b','c'])
+
+        membershipGraph.addGroup('cn=b','b2',['uid=bob'])
+        self.assertEquals(self.getGroups(membershipGraph,'uid=carl'),['c'])
+        self.assertEquals(self.getMembers(membershipGraph,'a'),['cn=b','uid=alan','uid=bob'])
+        self.assertTrue(membershipGraph.getGroupId('b') is None)
+        self.assertEquals(membershipGraph.getGroupId('b2'),membershipGraph.getId('cn=b'))
+
+    def test_cycles(self):
+        '''
+        Groups that are nested in each other are followed once, and every group in the cycle counts itself as a member.
+        '''
+        membershipGraph = self.getGraph()
+        membershipGraph.addGroup('cn=c','c',['uid=carl','cn=a'])
+        members = ['cn=a','cn=b','cn=c','uid=alan','uid=bob','uid=carl']
+        for uid in ['a','b','c']:
+            self.assertEquals(self.getMembers(membershipGraph,uid),members)
+        self.assertEquals(self.getGroups(membershipGraph,'uid=alan'),['a','b','c'])
+        self.assertEquals(self.getGroups(membershipGraph,'cn=b'),['a','b','c'])
+
+    def test_maxDepth(self):
+        '''
+        No more than maxDepth levels of nested groups are followed below the direct members.
+        '''
+        membershipGraph = self.getGraph(maxDepth=0)
+        self.assertEquals(self.getMembers(membershipGraph,'a'),['cn=b','uid=alan'])
+        self.assertEquals(self.getGroups(membershipGraph,'uid=carl'),['c'])
+
+        membershipGraph = self.getGraph(maxDepth=1)
+        self.assertEquals(self.getMembers(membershipGraph,'a'),['cn=b','cn=c','uid=alan','uid=bob'])
+        self.assertEquals(self.getGroups(membershipGraph,'uid=carl'),['b','c'])
+
+        membershipGraph = self.getGraph(maxDepth=2)
+        self.assertEquals(self.getMembers(membershipGraph,'a'),['cn=b','cn=c','uid=alan','uid=bob','uid=carl'])
+        self.assertEquals(self.getGroups(membershipGraph,'uid=carl'),['a','b','c'])
+
+class DirectoryToolsGraphParityTest(unittest.TestCase):
+    '''
+    Checks that lookups answered from the membership graph give the same answers as lookups that search the server.
+    '''
+
+    def setUp(self):
+        print '\nSetting up for: {0}'.format(self.id())
+
+        ## The fake directory. Groups are nested three levels deep.
+        self.directory,self.properties = fake.generateDirectory('ad',users=30,groups=15,depth=3,fanout=2,membersPerGroup=3)
+        self.properties[indexes.LOG_LEVEL] = DirectoryTools.LOG_LEVEL_CRITICAL
+        self.properties[indexes.NESTED_GROUPS] = True
+        ## Names of the users to check.
+        self.users = ['user{0}'.format(i) for i in range(30)]
+        ## Names of the groups to check.
+        self.groups = ['group{0}'.format(i) for i in range(15)]
+        ## DirectoryTools objects made by getDirectoryTools(), to be closed after the test.
+        self.instances = []
+
+    def tearDown(self):
+        for instance in self.instances:
+            instance.closeConnections()
+
+    def getDirectoryTools(self,**properties):
+        '''
+        Get a DirectoryTools object for the fake directory.
+
+        Args:
+            properties: Properties to set on top of those of the fake directory, named by their attribute in DirectoryToolsIndexes.
+        '''
+        merged = dict(self.properties)
+        for name in properties:
+            merged[getattr(indexes,name)] = properties[name]
+        instance = DirectoryTools.DirectoryTools(merged,'ad')
+        self.directory.install(instance)
+        self.instances.append(instance)
+        return instance
+
+    def assertParity(self,graphAuth,searchAuth,userGroups=True):
+        '''
+        Check that two DirectoryTools objects give the same answers to isUserInGroup(), getUsersInGroup() and, optionally, getUserGroups().
+
+        The recursive engine raises an ExceededMaxDepthException from isUserInGroup() when it runs out of depth on any branch, even if the user is in another branch, so those checks have no answer to compare with.
+        '''
+        self.assertTrue(graphAuth.getMembershipGraph())
+        self.assertFalse(searchAuth.getMembershipGraph())
+        for group in self.groups:
+            self.assertEquals(sorted(graphAuth.getUsersInGroup(group)),sorted(searchAuth.getUsersInGroup(group)))
+            for user in self.users:
+                try:
+                    expected = searchAuth.isUserInGroup(user,group)
+                except exceptions.ExceededMaxDepthException:
+                    continue
+                self.assertEquals(graphAuth.isUserInGroup(user,group),expected)
+        if userGroups:
+            for user in self.users:
+                self.assertEquals(sorted(graphAuth.getUserGroups(user)),sorted(searchAuth.getUserGroups(user)))
+
+    def test_nestedParity(self):
+        '''
+        Nested memberships match those of the recursive, breadth-first and in-chain engines.
+        '''
+        graphAuth = self.getDirectoryTools(MEMBERSHIP_GRAPH=True)
+        # group0 has three direct members.
+        self.assertTrue(len(graphAuth.getUsersInGroup('group0')) > 3)
+        # The default engine only lists the direct groups of a user, so getUserGroups() is compared with the in-chain engine.
+        self.assertParity(graphAuth,self.getDirectoryTools(NESTED_ENGINE=DirectoryTools.NESTED_ENGINE_RECURSIVE),userGroups=False)
+        self.assertParity(graphAuth,self.getDirectoryTools(NESTED_ENGINE=DirectoryTools.NESTED_ENGINE_BREADTH_FIRST),userGroups=False)
+        self.assertParity(graphAuth,self.getDirectoryTools(NESTED_ENGINE=DirectoryTools.NESTED_ENGINE_IN_CHAIN))
+
+    def test_directParity(self):
+        '''
+        Without nesting, memberships match the direct members and groups on the server.
+        '''
+        graphAuth = self.getDirectoryTools(MEMBERSHIP_GRAPH=True,NESTED_GROUPS=False)
+        self.assertParity(graphAuth,self.getDirectoryTools(NESTED_GROUPS=False))
+
+    def test_maxDepthParity(self):
+        '''
+        Memberships are limited by the MAX_DEPTH property in the same way as the recursive and breadth-first engines.
+        '''
+        for maxDepth in [0,1,2]:
+            graphAuth = self.getDirectoryTools(MEMBERSHIP_GRAPH=True,MAX_DEPTH=maxDepth)
+            self.assertTrue(len(graphAuth.getUsersInGroup('group0')) < len(self.getDirectoryTools(MEMBERSHIP_GRAPH=True).getUsersInGroup('group0')))
+            self.assertParity(graphAuth,self.getDirectoryTools(MAX_DEPTH=maxDepth,NESTED_ENGINE=DirectoryTools.NESTED_ENGINE_RECURSIVE),userGroups=False)
+            self.assertParity(graphAuth,self.getDirectoryTools(MAX_DEPTH=maxDepth,NESTED_ENGINE=DirectoryTools.NESTED_ENGINE_BREADTH_FIRST),userGroups=False)
+
+        # A graph that is already loaded is dropped when the depth changes.
+        graphAuth = self.getDirectoryTools(MEMBERSHIP_GRAPH=True)
+        members = len(graphAuth.getUsersInGroup('group0'))
+        graphAuth.setProperty(indexes.MAX_DEPTH,0)
+        self.assertTrue(len(graphAuth.getUsersInGroup('group0')) < members)
+
+    def test_cycleParity(self):
+        '''
+        Groups that are nested in each other give the same answers as the engines that search the server.
+        '''
+        searchAuth = self.getDirectoryTools()
+        # The deepest group contains the top group.
+        groupDN = searchAuth.resolveGroupDN('group14')
+        entry = self.directory.getEntry(groupDN)
+        self.directory.modifyEntry(groupDN,{'member':self.directory.getValues(entry,'member') + [searchAuth.resolveGroupDN('group0')]})
+
+        # Deep enough to go round the cycle.
+        graphAuth = self.getDirectoryTools(MEMBERSHIP_GRAPH=True,MAX_DEPTH=10)
+        self.assertEquals(sorted(graphAuth.getUsersInGroup('group14')),sorted(graphAuth.getUsersInGroup('group0')))
+        for engine in [DirectoryTools.NESTED_ENGINE_RECURSIVE,DirectoryTools.NESTED_ENGINE_BREADTH_FIRST]:
+            self.assertParity(graphAuth,self.getDirectoryTools(MAX_DEPTH=10,NESTED_ENGINE=engine),userGroups=False)
+        self.assertParity(graphAuth,self.getDirectoryTools(MAX_DEPTH=10,NESTED_ENGINE=DirectoryTools.NESTED_ENGINE_IN_CHAIN))
+
+if __name__ == '__main__':
+    unittest.main()
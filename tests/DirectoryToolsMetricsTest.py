@@ -0,0 +1,169 @@
+#!/usr/bin/python
+
+import DirectoryTools
+import DirectoryToolsIndexes as indexes
+import DirectoryToolsFakeServer as fake
+from DirectoryToolsMetrics import PrometheusExporter
+import unittest
+
+'''
+README
+
+These tests check the measurements that are passed to a metrics hook, and how the Prometheus exporter renders them (see DirectoryToolsMetrics). Lookups run against an in-process fake directory (see DirectoryToolsFakeServer).
+'''
+
+class DirectoryToolsMetricsTest(unittest.TestCase):
+    '''
+    Unit tests for the metrics hook and the Prometheus exporter.
+    '''
+
+    def setUp(self):
+        print '\nSetting up for: {0}'.format(self.id())
+
+        ## The fake directory.
+        self.directory,properties = fake.generateDirectory('openldap',users=10,groups=2)
+        properties[indexes.LOG_LEVEL] = DirectoryTools.LOG_LEVEL_CRITICAL
+        ## DirectoryTools object to run tests with.
+        self.auth = DirectoryTools.DirectoryTools(properties,'openldap')
+        self.directory.install(self.auth)
+        ## The exporter installed on self.auth.
+        self.exporter = PrometheusExporter()
+        self.auth.setMetricsHook(self.exporter)
+
+    def tearDown(self):
+        self.auth.closeConnections()
+
+    def getSamples(self):
+        '''
+        Render the metrics of the exporter.
+
+        Returns:
+            A dictionary of sample values, indexed by the metric name and label set of each sample.
+        '''
+        samples = {}
+        for line in self.exporter.render().splitlines():
+            if line.startswith('#'):
+                continue
+            name,value = line.rsplit(' ',1)
+            samples[name] = float(value)
+        return samples
+
+    def test_operations(self):
+        '''
+        Every operation that reaches the server is counted once, against the public method that it was sent for.
+        '''
+        self.assertTrue(self.auth.isUserInGroup('user0','group0'))
+        self.assertTrue(self.auth.authenticate('user1','password'))
+        self.assertEquals(self.directory.counters['search'],sum([count for (operation,method),count in self.exporter.operations.items() if operation == 'search']))
+        self.assertEquals(self.directory.counters['bind'],sum([count for (operation,method),count in self.exporter.operations.items() if operation == 'bind']))
+        self.assertEquals(sorted(set([method for operation,method in self.exporter.operations])),['authenticate','isUserInGroup'])
+
+        samples = self.getSamples()
+        searches = self.exporter.operations[('search','isUserInGroup')]
+        self.assertEquals(samples['directorytools_ldap_operations_total{operation="search",method="isUserInGroup"}'],searches)
+        self.assertEquals(samples['directorytools_ldap_operation_seconds_count{operation="search"}'],self.directory.counters['search'])
+
+        # Lookups that are answered from the cache are not counted.
+        self.auth.resolveUserDN('user2')
+        searches = self.directory.counters['search']
+        self.auth.resolveUserDN('user2')
+        self.assertEquals(self.directory.counters['search'],searches)
+        self.assertEquals(self.exporter.operations[('search','resolveUserDN')],1)
+
+    def test_callerMethod(self):
+        '''
+        Operations are counted against the DirectoryTools method that the caller called, however deep the stack of the caller is. The stack is not walked past the caller.
+        '''
+        def nested(depth):
+            if depth:
+                return nested(depth - 1)
+            return self.auth.resolveUserDN('user0')
+        self.assertTrue(nested(200))
+        self.assertEquals(sorted(self.exporter.operations.keys()),[('bind','resolveUserDN'),('search','resolveUserDN')])
+        self.assertTrue(self.auth.getCallerMethod() is None)
+
+        # A hook that is called back from a DirectoryTools method is outside of it, so the method it was called from is not found.
+        callers = []
+        def operation(operation,method,elapsed,entries=0):
+            callers.append((method,self.auth.getCallerMethod()))
+        self.exporter.operation = operation
+        self.auth.resolveUserDN('user1')
+        self.assertEquals(callers,[('resolveUserDN',None)])
+
+    def test_histogram(self):
+        '''
+        Histogram buckets are cumulative, and the +Inf bucket matches the count.
+        '''
+        for elapsed in [0.0005,0.003,0.003,0.2,20]:
+            self.exporter.operation('search','query',elapsed)
+        samples = self.getSamples()
+        bucket = lambda bound: samples['directorytools_ldap_operation_seconds_bucket{{operation="search",le="{0}"}}'.format(bound)]
+        self.assertEquals(bucket('0.001'),1)
+        self.assertEquals(bucket('0.0025'),1)
+        self.assertEquals(bucket('0.005'),3)
+        self.assertEquals(bucket('0.25'),4)
+        self.assertEquals(bucket('10.0'),4)
+        self.assertEquals(bucket('+Inf'),5)
+        self.assertEquals(samples['directorytools_ldap_operation_seconds_count{operation="search"}'],5)
+        self.assertAlmostEqual(samples['directorytools_ldap_operation_seconds_sum{operation="search"}'],20.2065)
+
+        previous = 0
+        for bound in self.exporter.buckets:
+            self.assertTrue(bucket(repr(bound)) >= previous)
+            previous = bucket(repr(bound))
+
+    def test_labelEscaping(self):
+        '''
+        Backslashes, double quotes and line feeds in label values are escaped.
+        '''
+        self.assertEquals(self.exporter.formatLabels([]),'')
+        self.assertEquals(self.exporter.formatLabels([('method','a"b\\c\nd')]),'{method="a\\"b\\\\c\\nd"}')
+
+        self.exporter.operation('search','a"b\nc',0.001)
+        lines = self.exporter.render().splitlines()
+        self.assertTrue('directorytools_ldap_operations_total{operation="search",method="a\\"b\\nc"} 1' in lines)
+
+    def test_cacheStatistics(self):
+        '''
+        Cache metrics are read from getCacheStatistics() each time they are rendered.
+        '''
+        self.auth.resolveUserDN('user0')
+        self.auth.resolveUserDN('user0')
+        statistics = self.auth.getCacheStatistics()
+        self.assertTrue(statistics)
+        samples = self.getSamples()
+        for category,(hits,misses,evictions,entries) in statistics.items():
+            labels = '{{category="{0}"}}'.format(category)
+            self.assertEquals(samples['directorytools_cache_hits_total' + labels],hits)
+            self.assertEquals(samples['directorytools_cache_misses_total' + labels],misses)
+            self.assertEquals(samples['directorytools_cache_evictions_total' + labels],evictions)
+            self.assertEquals(samples['directorytools_cache_entries' + labels],entries)
+
+        self.auth.flushCaches()
+        for category,(hits,misses,evictions,entries) in self.auth.getCacheStatistics().items():
+            self.assertEquals(self.getSamples()['directorytools_cache_entries{{category="{0}"}}'.format(category)],entries)
+
+        # Nothing is read from a DirectoryTools object when the exporter is not attached to one.
+        self.assertFalse('cache_entries' in PrometheusExporter().render())
+
+    def test_wsgi(self):
+        '''
+        The exporter answers WSGI requests with the rendered metrics.
+        '''
+        self.auth.isUserInGroup('user0','group0')
+        responses = []
+        def start_response(status,headers):
+            responses.append((status,headers))
+        body = ''.join(self.exporter({'REQUEST_METHOD':'GET','PATH_INFO':'/metrics'},start_response))
+
+        self.assertEquals(len(responses),1)
+        status,headers = responses[0]
+        headers = dict(headers)
+        self.assertEquals(status,'200 OK')
+        self.assertEquals(headers['Content-Type'],PrometheusExporter.CONTENT_TYPE)
+        self.assertEquals(int(headers['Content-Length']),len(body))
+        self.assertTrue(isinstance(body,str))
+        self.assertTrue('directorytools_ldap_operations_total{operation="search",method="isUserInGroup"}' in body)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,506 @@
+#!/usr/bin/python
+
+import threading
+from time import sleep,time
+import DirectoryTools
+import DirectoryToolsIndexes as indexes
+import DirectoryToolsExceptions as exceptions
+import DirectoryToolsFakeServer as fake
+from DirectoryToolsPool import HedgingPolicy
+import unittest
+
+'''
+README
+
+These tests check how connections are pooled and spread over servers (see DirectoryToolsPool). Connections are made to an in-process fake directory (see DirectoryToolsFakeServer), which can make a server slow or unreachable by its host name.
+'''
+
+class DirectoryToolsPoolTestsCommon:
+    '''
+    Sets up a fake directory that is served by the hosts in self.servers.
+    '''
+
+    ## Addresses of the fake servers.
+    servers = 'fast slow'
+
+    def setUp(self):
+        print '\nSetting up for: {0}'.format(self.id())
+
+        ## The fake directory.
+        self.directory,properties = fake.generateDirectory('openldap',users=20,groups=2)
+        properties[indexes.LOG_LEVEL] = DirectoryTools.LOG_LEVEL_CRITICAL
+        properties[indexes.SERVER_ADDRESS] = self.servers
+        properties.update(self.getProperties())
+        ## DirectoryTools object to run tests with.
+        self.auth = DirectoryTools.DirectoryTools(properties,'openldap')
+        self.directory.install(self.auth)
+
+    def tearDown(self):
+        self.auth.closeConnections()
+
+    def assertAllCheckedIn(self):
+        '''
+        Check that every proxy connection has been returned to its pool.
+        '''
+        proxyPool = self.auth.getProxyPool()
+        self.assertEquals(proxyPool.checkedOut,{})
+        for serverPool in proxyPool.pools.values():
+            self.assertEquals(serverPool.total,len(serverPool.idle))
+
+    def getProperties(self):
+        '''
+        Returns:
+            Properties to set on top of those of the fake directory.
+        '''
+        return {}
+
+    def search(self,userName='user1'):
+        '''
+        Look up a user with a search that is not answered from a cache.
+
+        Returns:
+            The DN of the user.
+        '''
+        results = self.auth.query('(uid={0})'.format(userName),['uid'])
+        self.assertEquals(len(results),1)
+        return results[0][0]
+
+class DirectoryToolsConnectionPoolTest(DirectoryToolsPoolTestsCommon,unittest.TestCase):
+    '''
+    Unit tests for the connection pool of a single server (see ConnectionPool and the POOL_* properties).
+    '''
+
+    servers = 'fast'
+
+    def getProperties(self):
+        return {indexes.POOL_MAX_SIZE:2,indexes.POOL_TIMEOUT:0.1}
+
+    def getServerPool(self):
+        '''
+        Get the proxy connection pool of the server.
+        '''
+        proxyPool = self.auth.getProxyPool()
+        return proxyPool.getPool(self.auth.getServerSelector().servers[0])
+
+    def test_minSize(self):
+        '''
+        The pool opens POOL_MIN_SIZE connections on first use, and reuses them afterwards.
+        '''
+        self.auth.setProperty(indexes.POOL_MIN_SIZE,2)
+        self.search()
+        serverPool = self.getServerPool()
+        self.assertEquals(serverPool.total,2)
+        self.assertEquals(len(serverPool.idle),2)
+        binds = self.directory.counters['bind']
+        self.assertEquals(binds,2)
+
+        for i in range(5):
+            self.search('user{0}'.format(i))
+        self.assertEquals(self.directory.counters['bind'],binds)
+        self.assertEquals(serverPool.total,2)
+
+    def test_maxSize(self):
+        '''
+        No more than POOL_MAX_SIZE connections are open at once. Searches beyond that wait for a connection to be checked back in.
+        '''
+        self.auth.setProperty(indexes.POOL_TIMEOUT,5)
+        self.directory.latency = 0.02
+        errors = []
+        def searches(first):
+            try:
+                # Different users, so that the searches are not coalesced.
+                for i in range(first,first + 3):
+                    self.search('user{0}'.format(i))
+            except Exception, e:
+                errors.append(e)
+        threads = [threading.Thread(target=searches,args=(i * 3,)) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEquals(errors,[])
+        self.assertEquals(self.getServerPool().total,2)
+        self.assertEquals(self.directory.counters['bind'],2)
+        self.assertAllCheckedIn()
+
+    def test_timeout(self):
+        '''
+        A checkout gives up with a PoolTimeoutException once it has waited POOL_TIMEOUT seconds for a connection.
+        '''
+        proxyPool = self.auth.getProxyPool()
+        handles = [proxyPool.checkout() for i in range(2)]
+        started = time()
+        self.assertRaises(exceptions.PoolTimeoutException,proxyPool.checkout)
+        self.assertTrue(time() - started >= 0.1)
+        # Searches are not retried, and the error is not taken for a bad query.
+        self.assertRaises(exceptions.PoolTimeoutException,self.search)
+
+        # A connection that is checked in while a checkout is waiting is handed over.
+        threading.Timer(0.05,proxyPool.checkin,[handles.pop()]).start()
+        self.search()
+        proxyPool.checkin(handles.pop())
+        self.assertAllCheckedIn()
+        self.assertEquals(self.getServerPool().total,2)
+
+    def test_authPool(self):
+        '''
+        authenticate() reuses its pooled connections. A wrong password leaves the connection in the pool, and a connection that the server dropped is replaced once.
+        '''
+        self.assertTrue(self.auth.authenticate('user1','password'))
+        authPool = self.auth.getAuthPool()
+        serverPool = authPool.getPool(self.auth.getServerSelector().servers[0])
+        self.assertFalse(self.auth.authenticate('user1','wrong-password'))
+        self.assertTrue(self.auth.authenticate('user2','password'))
+        self.assertEquals(serverPool.total,1)
+        self.assertEquals(len(serverPool.idle),1)
+
+        # The server drops the idle connection.
+        handle,lastUsed = serverPool.idle[0]
+        handle.closed = True
+        self.assertTrue(self.auth.authenticate('user1','password'))
+        self.assertEquals(serverPool.total,1)
+        self.assertFalse(serverPool.idle[0][0] is handle)
+        self.assertEquals(authPool.checkedOut,{})
+
+    def test_idleExpiry(self):
+        '''
+        A connection that sat idle for longer than POOL_MAX_IDLE seconds is checked before it is handed out, and is replaced if it has gone stale.
+        '''
+        self.auth.setProperty(indexes.POOL_MAX_IDLE,0.05)
+        self.search()
+        serverPool = self.getServerPool()
+        checked = []
+        healthCheck = serverPool.healthCheck
+        serverPool.healthCheck = lambda handle: (checked.append(handle),healthCheck(handle))
+        stale = serverPool.idle[-1][0]
+        stale.closed = True
+
+        # The stale connection fails its health check, and a new one is bound in its place.
+        binds = self.directory.counters['bind']
+        sleep(0.1)
+        self.search()
+        self.assertEquals(checked,[stale])
+        self.assertEquals(self.directory.counters['bind'],binds + 1)
+        self.assertFalse(stale in [handle for handle,lastUsed in serverPool.idle])
+        self.assertEquals(serverPool.total,1)
+
+        # A connection that is still healthy is kept.
+        healthy = serverPool.idle[-1][0]
+        self.search()
+        self.assertEquals(checked,[stale])
+        sleep(0.1)
+        self.search()
+        self.assertEquals(checked,[stale,healthy])
+        self.assertTrue(serverPool.idle[-1][0] is healthy)
+        self.assertEquals(self.directory.counters['bind'],binds + 1)
+
+    def test_serverDown(self):
+        '''
+        A connection that raises SERVER_DOWN is discarded instead of being put back in the pool, and the search is retried on a new connection.
+        '''
+        self.auth.setProperty(indexes.POOL_MAX_IDLE,60)
+        self.search()
+        serverPool = self.getServerPool()
+        lost = serverPool.idle[-1][0]
+        lost.closed = True
+
+        binds = self.directory.counters['bind']
+        self.search()
+        self.assertEquals(self.directory.counters['bind'],binds + 1)
+        self.assertEquals(serverPool.total,1)
+        self.assertFalse(lost in [handle for handle,lastUsed in serverPool.idle])
+        self.assertAllCheckedIn()
+
+class DirectoryToolsHedgingTest(DirectoryToolsPoolTestsCommon,unittest.TestCase):
+    '''
+    Unit tests for hedged searches (see the HEDGE_READS property).
+    '''
+
+    def getProperties(self):
+        return {indexes.HEDGE_READS:True,indexes.HEDGE_BUDGET:1.0,indexes.HEDGE_MIN_DELAY:0.005}
+
+    def warmUp(self,searches=HedgingPolicy.MIN_SAMPLES):
+        '''
+        Run searches while both servers are fast.
+
+        Returns:
+            The hedging policy.
+        '''
+        for i in range(searches):
+            self.search()
+        return self.auth.getHedgingPolicy()
+
+    def test_noHedgeBeforeMinSamples(self):
+        '''
+        Searches are not hedged until there are enough latency samples to pick a delay.
+        '''
+        policy = self.warmUp(HedgingPolicy.MIN_SAMPLES - 1)
+        self.assertTrue(policy.delay is None)
+
+        self.directory.hostLatency['slow:389'] = 0.05
+        self.search()
+        self.search()
+        self.assertEquals(policy.hedges,0)
+        self.assertEquals(self.directory.counters['abandon'],0)
+        self.assertTrue(policy.delay is not None)
+
+    def test_loserAbandoned(self):
+        '''
+        A slow search is sent to the other server as well, and the search that loses is abandoned.
+        '''
+        policy = self.warmUp()
+        self.assertEquals(policy.delay,0.005)
+
+        self.directory.hostLatency['slow:389'] = 0.5
+        started = time()
+        for i in range(4):
+            self.search()
+        # Every search that went to the slow server first was answered by the fast one.
+        self.assertTrue(time() - started < 0.5)
+        self.assertTrue(policy.hedges >= 1)
+        self.assertEquals(policy.wins,policy.hedges)
+        self.assertEquals(self.directory.counters['abandon'],policy.hedges)
+        self.assertAllCheckedIn()
+
+    def test_budget(self):
+        '''
+        No more than a HEDGE_BUDGET fraction of searches are hedged, however slow the servers are.
+        '''
+        self.auth.setProperty(indexes.HEDGE_BUDGET,0.125)
+        policy = self.warmUp()
+
+        self.directory.hostLatency['fast:389'] = self.directory.hostLatency['slow:389'] = 0.02
+        for i in range(20):
+            self.search()
+        self.assertTrue(policy.hedges >= 1)
+        self.assertTrue(policy.hedges <= 40 * 0.125)
+        self.assertEquals(self.directory.counters['abandon'],policy.hedges)
+        self.assertAllCheckedIn()
+
+    def test_checkedIn(self):
+        '''
+        Connections are returned to their pools whichever way a hedged search ends.
+        '''
+        self.warmUp()
+        self.directory.hostLatency['slow:389'] = 0.2
+        for i in range(2):
+            # Answered by the first server or the second.
+            self.search()
+            self.assertAllCheckedIn()
+
+            # Rejected by the server.
+            self.assertRaises(exceptions.BadQueryException,self.auth.query,'(uid=user1',['uid'])
+            self.assertAllCheckedIn()
+
+        # A server that goes down is skipped.
+        self.directory.downHosts.add('slow:389')
+        for i in range(2):
+            self.search()
+            self.assertAllCheckedIn()
+
+class DirectoryToolsServerSelectionTest(DirectoryToolsPoolTestsCommon,unittest.TestCase):
+    '''
+    Unit tests for spreading connections over several servers (see ServerSelector and ServerPool).
+    '''
+
+    servers = 'a b c'
+
+    def getProperties(self):
+        return {indexes.SERVER_EJECT_AFTER:1,indexes.SERVER_EJECT_TIME:30}
+
+    def getServer(self,host):
+        '''
+        Get the Server object for a host.
+        '''
+        for server in self.auth.getServerSelector().servers:
+            if server.address == host:
+                return server
+
+    def test_failover(self):
+        '''
+        Lookups keep working while a server is down, and the server is ejected.
+        '''
+        self.directory.downHosts.add('a:389')
+        for i in range(6):
+            self.assertTrue(self.search('user{0}'.format(i)))
+            self.assertTrue(self.auth.authenticate('user{0}'.format(i),'password'))
+        server = self.getServer('a')
+        self.assertTrue(server.ejectedUntil > time())
+        self.assertEquals(self.auth.getProxyPool().getPool(server).total,0)
+        self.assertAllCheckedIn()
+
+    def test_ejectAfter(self):
+        '''
+        A server is only ejected after SERVER_EJECT_AFTER failures in a row, and is then left alone.
+        '''
+        self.auth.setProperty(indexes.SERVER_EJECT_AFTER,3)
+        self.auth.closeConnections()
+        server = self.getServer('a')
+        self.directory.downHosts.add('a:389')
+
+        searches = 0
+        while server.failures < 3:
+            self.assertEquals(server.ejectedUntil,0)
+            self.search()
+            searches += 1
+            self.assertTrue(searches < 20)
+        self.assertTrue(server.ejectedUntil > time())
+
+        for i in range(6):
+            self.search()
+        self.assertEquals(server.failures,3)
+
+    def test_probe(self):
+        '''
+        Once SERVER_EJECT_TIME has passed, one operation probes an ejected server. A server that answers is back in rotation, and one that doesn't is ejected again.
+        '''
+        self.auth.setProperty(indexes.SERVER_EJECT_TIME,0.1)
+        self.auth.closeConnections()
+        server = self.getServer('a')
+        self.directory.downHosts.add('a:389')
+        while not server.ejectedUntil:
+            self.search()
+        ejectedUntil = server.ejectedUntil
+
+        # Still down when it is probed.
+        sleep(0.15)
+        while server.ejectedUntil == ejectedUntil:
+            self.search()
+        self.assertTrue(server.ejectedUntil > time())
+        self.assertEquals(server.failures,2)
+
+        # Back up when it is probed.
+        self.directory.downHosts.clear()
+        sleep(0.15)
+        for i in range(6):
+            self.search()
+        self.assertEquals(server.ejectedUntil,0)
+        self.assertEquals(server.failures,0)
+        self.assertTrue(self.auth.getProxyPool().getPool(server).total > 0)
+
+    def test_probeReleased(self):
+        '''
+        A probe that gives up before it reaches the server, such as on a closed or full pool, leaves the server to be probed again.
+        '''
+        self.auth.setProperty(indexes.SERVER_EJECT_TIME,0.1)
+        self.auth.closeConnections()
+        server = self.getServer('a')
+        self.directory.downHosts.add('a:389')
+        while not server.ejectedUntil:
+            self.search()
+        self.directory.downHosts.clear()
+
+        proxyPool = self.auth.getProxyPool()
+        proxyPool.getPool(server).close()
+        others = [other for other in self.auth.getServerSelector().servers if other is not server]
+        sleep(0.15)
+        self.assertRaises(exceptions.PoolClosedException,proxyPool.checkout,exclude=others)
+        self.assertFalse(server.probing)
+
+        # The next probe gets through, and the server is back in rotation.
+        del proxyPool.pools[server]
+        for i in range(6):
+            self.search()
+        self.assertEquals(server.ejectedUntil,0)
+        self.assertTrue(proxyPool.getPool(server).total > 0)
+        self.assertAllCheckedIn()
+
+    def test_sharedMaxSize(self):
+        '''
+        POOL_MAX_SIZE caps the connections of all servers together. A server with no room takes over the connection that has been idle the longest on another server, or waits for one to be checked in.
+        '''
+        self.auth.setProperty(indexes.POOL_MAX_SIZE,2)
+        self.auth.setProperty(indexes.POOL_TIMEOUT,0.1)
+        self.auth.closeConnections()
+        proxyPool = self.auth.getProxyPool()
+        handles = [proxyPool.checkout() for i in range(2)]
+        self.assertRaises(exceptions.PoolTimeoutException,proxyPool.checkout)
+        self.assertEquals(proxyPool.limit.total,2)
+
+        # The connection checked in to one server is closed to make room on the third.
+        idleServer = proxyPool.getServer(handles[0])
+        proxyPool.checkin(handles[0])
+        busyServer = proxyPool.getServer(handles[1])
+        handle = proxyPool.checkout(exclude=[idleServer,busyServer])
+        self.assertTrue(handles[0].closed)
+        self.assertEquals(proxyPool.getPool(idleServer).total,0)
+        self.assertEquals(proxyPool.limit.total,2)
+        proxyPool.checkin(handle)
+        proxyPool.checkin(handles[1])
+
+        self.auth.setProperty(indexes.POOL_TIMEOUT,5)
+        self.directory.latency = 0.02
+        errors = []
+        def searches(first):
+            try:
+                # Different users, so that the searches are not coalesced.
+                for i in range(first,first + 3):
+                    self.search('user{0}'.format(i))
+            except Exception, e:
+                errors.append(e)
+        threads = [threading.Thread(target=searches,args=(i * 3,)) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEquals(errors,[])
+        proxyPool = self.auth.getProxyPool()
+        self.assertTrue(sum([serverPool.total for serverPool in proxyPool.pools.values()]) <= 2)
+        self.assertEquals(sum([serverPool.total for serverPool in proxyPool.pools.values()]),proxyPool.limit.total)
+        self.assertAllCheckedIn()
+
+    def test_roundRobin(self):
+        '''
+        The round-robin strategy takes turns between the healthy servers.
+        '''
+        selector = self.auth.getServerSelector()
+        chosen = [selector.choose().address for i in range(9)]
+        self.assertEquals(sorted(chosen),['a'] * 3 + ['b'] * 3 + ['c'] * 3)
+
+        self.directory.downHosts.add('b:389')
+        for i in range(6):
+            self.search()
+        chosen = [selector.choose().address for i in range(6)]
+        self.assertEquals(sorted(chosen),['a'] * 3 + ['c'] * 3)
+
+    def test_leastOutstanding(self):
+        '''
+        The least-outstanding strategy picks the server with the fewest operations in progress.
+        '''
+        self.auth.setProperty(indexes.SERVER_STRATEGY,DirectoryTools.SERVER_STRATEGY_LEAST_OUTSTANDING)
+        self.auth.closeConnections()
+        proxyPool = self.auth.getProxyPool()
+        handles = [proxyPool.checkout() for i in range(3)]
+        # One connection to each server. Keep a second one busy on two of them.
+        busy = [proxyPool.getServer(handle) for handle in handles]
+        self.assertEquals(sorted([server.address for server in busy]),['a','b','c'])
+        handles += [proxyPool.checkout() for i in range(2)]
+        idle = [server for server in self.auth.getServerSelector().servers if server.outstanding == 1]
+        self.assertEquals(len(idle),1)
+
+        for i in range(3):
+            handle = proxyPool.checkout()
+            self.assertTrue(proxyPool.getServer(handle) is idle[0])
+            proxyPool.checkin(handle)
+        for handle in handles:
+            proxyPool.checkin(handle)
+        self.assertAllCheckedIn()
+
+    def test_latencyWeighted(self):
+        '''
+        The latency-weighted strategy favours the servers that answer quickly.
+        '''
+        self.auth.setProperty(indexes.SERVER_STRATEGY,DirectoryTools.SERVER_STRATEGY_LATENCY_WEIGHTED)
+        self.auth.closeConnections()
+        self.directory.hostLatency['b:389'] = self.directory.hostLatency['c:389'] = 0.02
+        selector = self.auth.getServerSelector()
+        while [server for server in selector.servers if server.latency is None]:
+            self.search()
+
+        chosen = [selector.choose().address for i in range(200)]
+        self.assertTrue(chosen.count('a') > 150)
+
+if __name__ == '__main__':
+    unittest.main()
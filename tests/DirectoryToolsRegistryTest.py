@@ -0,0 +1,108 @@
+#!/usr/bin/python
+
+import os,tempfile
+import DirectoryTools
+import DirectoryToolsIndexes as indexes
+import DirectoryToolsFakeServer as fake
+from DirectoryToolsRegistry import Registry
+import unittest
+
+'''
+README
+
+These tests check which DirectoryTools objects a registry shares. Lookups run against an in-process fake directory (see DirectoryToolsFakeServer).
+'''
+
+class DirectoryToolsRegistryTest(unittest.TestCase):
+    '''
+    Unit tests for DirectoryToolsRegistry.
+    '''
+
+    def setUp(self):
+        print '\nSetting up for: {0}'.format(self.id())
+
+        ## The fake directory.
+        self.directory,self.properties = fake.generateDirectory('openldap',users=10,groups=2)
+        self.properties[indexes.LOG_LEVEL] = DirectoryTools.LOG_LEVEL_CRITICAL
+        ## The registry being tested.
+        self.registry = Registry()
+
+    def tearDown(self):
+        self.registry.close()
+
+    def test_sameSettingsShared(self):
+        '''
+        Requests with the same settings share one object, and so one cache and one proxy bind.
+        '''
+        first = self.registry.get(dict(self.properties),'openldap')
+        self.directory.install(first)
+        self.assertTrue(first.resolveUserDN('user1'))
+        binds = self.directory.counters['bind']
+        searches = self.directory.counters['search']
+
+        second = self.registry.get(dict(self.properties),'openldap')
+        self.assertTrue(second is first)
+        self.assertTrue(second.resolveUserDN('user1'))
+        self.assertEquals(self.directory.counters['bind'],binds)
+        self.assertEquals(self.directory.counters['search'],searches)
+
+    def test_differentSettingsIsolated(self):
+        '''
+        Requests with different settings get separate objects.
+        '''
+        first = self.registry.get(dict(self.properties),'openldap')
+        other = dict(self.properties)
+        other[indexes.PROXY_USER] = 'uid=user2,ou=people,{0}'.format(self.properties[indexes.BASE_DN])
+        self.assertFalse(self.registry.get(other,'openldap') is first)
+        self.assertFalse(self.registry.get(dict(self.properties),'ad') is first)
+        self.assertTrue(self.registry.get(dict(self.properties),'openldap').cache is first.cache)
+
+    def test_configFile(self):
+        '''
+        Settings are compared after merging, so a configuration file and a dictionary with the same values give the same object.
+        '''
+        handle,path = tempfile.mkstemp(suffix='.ini')
+        try:
+            with os.fdopen(handle,'w') as configFile:
+                configFile.write('[DirectoryTools]\n{0} = {1}\n'.format(indexes.BASE_DN,self.properties[indexes.BASE_DN]))
+            properties = dict(self.properties)
+            del properties[indexes.BASE_DN]
+            self.assertTrue(self.registry.get(properties,'openldap',path) is self.registry.get(dict(self.properties),'openldap'))
+        finally:
+            os.unlink(path)
+
+    def test_reconfiguredNotShared(self):
+        '''
+        An object that was reconfigured after it was handed out is not handed out again for its old settings.
+        '''
+        first = self.registry.get(dict(self.properties),'openldap')
+        first.setProperty(indexes.MAX_DEPTH,1)
+        self.assertFalse(self.registry.get(dict(self.properties),'openldap') is first)
+
+    def test_reconfiguredClosed(self):
+        '''
+        An object that was replaced because it was reconfigured keeps working until the registry is closed, and is then closed with the others.
+        '''
+        first = self.registry.get(dict(self.properties),'openldap')
+        self.directory.install(first)
+        first.startSync(60)
+        self.assertTrue(first.resolveUserDN('user1'))
+        first.setProperty(indexes.MAX_DEPTH,1)
+
+        second = self.registry.get(dict(self.properties),'openldap')
+        self.directory.install(second)
+        self.assertFalse(second is first)
+        self.assertTrue(self.registry.get(dict(self.properties),'openldap') is second)
+        self.assertEquals(self.registry.retired,[first])
+        self.assertTrue(first.syncThread)
+        self.assertTrue(first.resolveUserDN('user2'))
+
+        self.registry.close()
+        for instance in [first,second]:
+            self.assertFalse(instance.syncThread)
+            self.assertTrue(instance.proxyPool is None)
+        self.assertEquals(self.registry.retired,[])
+        self.assertEquals(self.registry.instances,{})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,8 @@
 
 import DirectoryTools
 import DirectoryToolsIndexes as indexes
+import DirectoryToolsExceptions as exceptions
+from DirectoryToolsSettings import Settings
 import unittest
 
 class DirectoryToolsTestsCommon(object):
@@ -111,6 +113,30 @@ class DirectoryToolsTestsCommon(object):
         self.assertFalse(isNotMember)
         
     
+    def test_printDebug(self):
+        '''
+        Debug messages with a secrecy level above LOG_LEVEL are dropped without being formatted, and the level follows changes to the property.
+        '''
+        formatted = []
+        class Value(object):
+            def __format__(self,spec):
+                formatted.append(spec)
+                return 'value'
+        
+        self.auth.setProperty(indexes.LOG_LEVEL,DirectoryTools.LOG_LEVEL_DEBUG)
+        self.assertFalse(self.auth.printDebug("Message: {0}",DirectoryTools.LOG_LEVEL_ERROR,Value()))
+        self.assertEquals(formatted,[])
+        
+        self.auth.updateProperties({indexes.LOG_LEVEL:DirectoryTools.LOG_LEVEL_ERROR})
+        self.assertEquals(self.auth.logLevel,DirectoryTools.LOG_LEVEL_ERROR)
+        self.assertTrue(self.auth.printDebug("Message: {0}",DirectoryTools.LOG_LEVEL_ERROR,Value()))
+        self.assertEquals(formatted,[''])
+        
+        # Nothing is printed at LOG_LEVEL_NONE, whatever the level of the message.
+        self.auth.setProperty(indexes.LOG_LEVEL,DirectoryTools.LOG_LEVEL_NONE)
+        self.assertFalse(self.auth.printDebug("Message: {0}",DirectoryTools.LOG_LEVEL_CRITICAL,Value()))
+        self.assertEquals(formatted,[''])
+    
     def test_properties(self):
         '''
         Test the retrieval and manipulation of properties.
@@ -144,6 +170,36 @@ class DirectoryToolsTestsCommon(object):
         self.assertNotEquals(oldValueA,newValueA)
         self.assertNotEquals(oldValueB,newValueB)
         
+    def test_settings(self):
+        '''
+        The settings snapshot is rebuilt when one of its properties changes, and can't be changed itself.
+        '''
+        snapshot = self.auth.settings
+        self.assertEquals(snapshot.nestedGroups,self.auth.getProperty(indexes.NESTED_GROUPS))
+        self.assertEquals(snapshot.memberAttribute,self.auth.getProperty(indexes.MEMBER_ATTRIBUTE))
+        
+        nestedGroups = not bool(snapshot.nestedGroups)
+        self.auth.setProperty(indexes.NESTED_GROUPS,nestedGroups)
+        self.assertEquals(self.auth.settings.nestedGroups,nestedGroups)
+        self.assertEquals(snapshot.nestedGroups,not nestedGroups)
+        
+        self.auth.updateProperties({indexes.MAX_DEPTH:7})
+        self.assertEquals(self.auth.settings.maxDepth,7)
+        # Properties outside of the snapshot leave it alone.
+        snapshot = self.auth.settings
+        self.auth.setProperty(indexes.LOG_LEVEL,DirectoryTools.LOG_LEVEL_CRITICAL)
+        self.assertTrue(self.auth.settings is snapshot)
+        
+        self.assertRaises(AttributeError,setattr,snapshot,'maxDepth',1)
+        self.assertRaises(AttributeError,delattr,snapshot,'maxDepth')
+        self.assertRaises(AttributeError,setattr,snapshot,'unknown',1)
+        self.assertRaises(AttributeError,getattr,snapshot,'unknown')
+        self.assertEquals(snapshot.maxDepth,7)
+        
+        # A property with no value and no default can't be read.
+        self.assertRaises(exceptions.PropertyNotFoundException,getattr,Settings({},{}),'baseDN')
+        self.assertEquals(Settings({},{indexes.BASE_DN:'dc=default'}).baseDN,'dc=default')
+        
 if __name__ == '__main__':
     print "Run these tests through an inheriting class that creates a connection to an LDAP server through DirectoryTools. Aborting..."
     exit(1)